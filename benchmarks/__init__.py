@@ -0,0 +1,6 @@
+# Benchmarks for eg. They use only the standard library and generate their own
+# synthetic corpora, so they can be run anywhere eg itself runs:
+#
+#   python -m benchmarks.run --quick
+#
+# See benchmarks/run.py for the available options.
@@ -0,0 +1,280 @@
+import json
+import os
+import shutil
+import time
+
+
+# Synthetic corpora for the benchmarks. Everything generated here is
+# deterministic, so that results from different runs and machines are
+# comparable, and corpora are reused if they already exist with the same
+# parameters.
+
+# Written at the top of a generated corpus to record how it was generated.
+_MARKER_FILE_NAME = '.corpus.json'
+
+# Bump this when the generated corpora change, so that stale ones are rebuilt.
+CORPUS_VERSION = 1
+
+# Commands are spread over directories holding at most this many files each.
+_FILES_PER_DIR = 100
+
+# One in this many default commands is also given a custom example file, and
+# one in this many is given an alias.
+_CUSTOM_EVERY = 10
+_ALIAS_EVERY = 100
+
+# The custom dir is nested this deep, which is deeper than people tend to go.
+_CUSTOM_DEPTH = 3
+
+# A block of markdown with every construct eg formats: headings, indented code
+# with and without prompts, backticks, and runs of blank lines for squeeze.
+_EXAMPLE_BLOCK = """# {name}
+
+print the examples for {name}
+
+    $ {name} --example input.txt
+
+    {name} -r `ls` output
+
+
+# Basics
+
+
+
+run {name} over `every` file in a directory
+
+    $ find . -type f -exec {name} {{}} \\;
+
+    $ {name} -v | less -R
+    output that is indented but has no prompt
+
+
+## Notes
+
+{name} is not a real program. This text is here so that the examples look like
+the shipped ones, with `inline code` and prose mixed together across lines
+that are about as long as lines in real examples tend to be.
+
+
+
+"""
+
+
+def get_command_name(i):
+    """Return the name of the ith generated command."""
+    return 'cmd{:06d}'.format(i)
+
+
+def get_example_text(name):
+    """Return the text of a small example file for the command name."""
+    return _EXAMPLE_BLOCK.format(name=name)
+
+
+def write_example_file(path, size_bytes, name='synthetic'):
+    """
+    Write an example file of at least size_bytes to path by repeating a block
+    of example text. Returns path.
+    """
+    block = get_example_text(name).encode('utf-8')
+    # Write in large chunks so that 50 MB files don't take long to make.
+    chunk = block * max(1, (1024 * 1024) // len(block))
+
+    written = 0
+    with open(path, 'wb') as f:
+        while written < size_bytes:
+            to_write = chunk
+            remaining = size_bytes - written
+            if remaining < len(chunk):
+                num_blocks = (remaining + len(block) - 1) // len(block)
+                to_write = block * num_blocks
+            f.write(to_write)
+            written += len(to_write)
+
+    return path
+
+
+def get_example_file(root, size_bytes):
+    """
+    Return the path to an example file of at least size_bytes beneath root,
+    generating it if necessary.
+    """
+    path = os.path.join(root, 'files', 'size-{}.md'.format(size_bytes))
+    if os.path.isfile(path) and os.path.getsize(path) >= size_bytes:
+        return path
+    _make_dirs(os.path.dirname(path))
+    return write_example_file(path, size_bytes)
+
+
+def get_command_corpus(root, num_commands):
+    """
+    Return a tuple of (examples_dir, custom_dir) for a corpus of num_commands
+    commands beneath root, generating it if necessary.
+
+    The examples dir holds one file per command, spread over directories of
+    at most _FILES_PER_DIR files, and an aliases file. The custom dir holds
+    files for a tenth of the commands, nested _CUSTOM_DEPTH deep.
+    """
+    corpus_dir = os.path.join(root, 'commands-{}'.format(num_commands))
+    examples_dir = os.path.join(corpus_dir, 'examples')
+    custom_dir = os.path.join(corpus_dir, 'custom')
+
+    params = {'version': CORPUS_VERSION, 'num_commands': num_commands}
+    if _read_marker(corpus_dir) != params:
+        if os.path.isdir(corpus_dir):
+            shutil.rmtree(corpus_dir)
+        _write_command_corpus(examples_dir, custom_dir, num_commands)
+        _write_marker(corpus_dir, params)
+
+    return examples_dir, custom_dir
+
+
+def _write_command_corpus(examples_dir, custom_dir, num_commands):
+    aliases = {}
+
+    for i in range(num_commands):
+        name = get_command_name(i)
+        text = get_example_text(name)
+
+        default_dir = os.path.join(
+            examples_dir,
+            'd{:04d}'.format(i // _FILES_PER_DIR)
+        )
+        _write_text(os.path.join(default_dir, name + '.md'), text)
+
+        if i % _CUSTOM_EVERY == 0:
+            nested = [
+                'c{:02d}'.format((i // (_FILES_PER_DIR * 10 ** level)) % 10)
+                for level in range(_CUSTOM_DEPTH)
+            ]
+            nested_dir = os.path.join(custom_dir, *nested)
+            _write_text(os.path.join(nested_dir, name + '.md'), text)
+
+        if i % _ALIAS_EVERY == 0:
+            aliases['alias-' + name] = name
+
+    _write_text(
+        os.path.join(examples_dir, 'aliases.json'),
+        json.dumps(aliases, sort_keys=True)
+    )
+
+    # eg won't persist an index of directories modified in the last couple of
+    # seconds, so age the corpus as if it had been there a while.
+    age_tree(examples_dir)
+    age_tree(custom_dir)
+
+
+def get_search_corpus(root, num_files):
+    """
+    Return a tuple of (examples_dir, custom_dir) for a corpus of num_files
+    example files beneath root, generating it if necessary.
+
+    Unlike the command corpus, where every file says the same thing, each file
+    here is made of a pair of sections taken from the examples that ship with
+    eg, so that words are spread over files about as unevenly as in real
+    examples. One in _ALIAS_EVERY files is a custom example.
+    """
+    corpus_dir = os.path.join(root, 'search-{}'.format(num_files))
+    examples_dir = os.path.join(corpus_dir, 'examples')
+    custom_dir = os.path.join(corpus_dir, 'custom')
+
+    params = {'version': CORPUS_VERSION, 'num_files': num_files}
+    if _read_marker(corpus_dir) != params:
+        if os.path.isdir(corpus_dir):
+            shutil.rmtree(corpus_dir)
+        _write_search_corpus(examples_dir, custom_dir, num_files)
+        _write_marker(corpus_dir, params)
+
+    return examples_dir, custom_dir
+
+
+def _write_search_corpus(examples_dir, custom_dir, num_files):
+    sections = _get_shipped_sections()
+    for i in range(num_files):
+        name = get_command_name(i)
+        # Stepping through the sections at two different strides gives every
+        # file a different pair.
+        first = sections[i % len(sections)]
+        second = sections[(i * 7 + 3) % len(sections)]
+        text = '# {}\n\n{}\n{}'.format(name, first, second)
+
+        parent_dir = examples_dir
+        if i % _ALIAS_EVERY == 0:
+            parent_dir = custom_dir
+        file_dir = os.path.join(
+            parent_dir,
+            'd{:04d}'.format(i // _FILES_PER_DIR)
+        )
+        _write_text(os.path.join(file_dir, name + '.md'), text)
+
+    age_tree(examples_dir)
+    age_tree(custom_dir)
+    # Files read while they were racy are checked by their contents until
+    # they settle, so age them too, as if they had been there a while.
+    age_files(examples_dir)
+    age_files(custom_dir)
+
+
+def _get_shipped_sections():
+    """
+    Return the text of every section of the examples that ship with eg, in a
+    deterministic order.
+    """
+    # Imported here so that generating the other corpora doesn't depend on
+    # the search code.
+    from eg import search
+
+    shipped_dir = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        'eg',
+        'examples'
+    )
+    result = []
+    for file_name in sorted(os.listdir(shipped_dir)):
+        if not file_name.endswith('.md'):
+            continue
+        with open(os.path.join(shipped_dir, file_name), 'r') as f:
+            contents = f.read()
+        for heading, body in search.get_sections(contents):
+            result.append('## {}\n{}\n'.format(heading, body))
+    return result
+
+
+def age_files(root, seconds=60):
+    """Move the mtimes of every file beneath root into the past."""
+    past = time.time() - seconds
+    for basedir, dirs, file_names in os.walk(root):
+        for file_name in file_names:
+            os.utime(os.path.join(basedir, file_name), (past, past))
+
+
+def age_tree(root, seconds=60):
+    """Move the mtimes of root and every directory beneath it into the past."""
+    past = time.time() - seconds
+    for basedir, dirs, file_names in os.walk(root):
+        os.utime(basedir, (past, past))
+
+
+def _read_marker(corpus_dir):
+    try:
+        with open(os.path.join(corpus_dir, _MARKER_FILE_NAME), 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write_marker(corpus_dir, params):
+    _write_text(
+        os.path.join(corpus_dir, _MARKER_FILE_NAME),
+        json.dumps(params, sort_keys=True)
+    )
+
+
+def _write_text(path, text):
+    _make_dirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write(text)
+
+
+def _make_dirs(path):
+    if not os.path.isdir(path):
+        os.makedirs(path)
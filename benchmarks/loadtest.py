@@ -0,0 +1,342 @@
+import argparse
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks import corpus
+from eg import config
+from http import client as http_client
+from urllib import parse as url_parse
+
+
+# Load tests `eg --serve`. Starts a server over a synthetic corpus, or uses the
+# one at --url, and has --concurrency clients each make --requests requests
+# for random programs as fast as they can, reporting the latency percentiles
+# and throughput of every scenario:
+#
+#   python -m benchmarks.loadtest --concurrency 16 --requests 200
+#
+# Scenarios:
+#   cold: the first request for each program, which renders it
+#   warm: programs already rendered, served from memory
+#   conditional: requests with a matching If-None-Match, answered with 304
+#   missing: programs with no examples, answered with 404
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REQUESTS = 100
+DEFAULT_NUM_COMMANDS = 1000
+
+SCENARIOS = ['cold', 'warm', 'conditional', 'missing']
+
+# How long to wait for a server started by the load test to accept
+# connections.
+_STARTUP_TIMEOUT_S = 30
+
+
+def get_percentile(sorted_values, fraction):
+    """
+    Return the value at fraction (from 0 to 1) of the way through
+    sorted_values, using the nearest rank.
+    """
+    if not sorted_values:
+        return None
+    index = int(round(fraction * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def get_summary(latencies_s, elapsed_s):
+    """
+    Return a dict summarizing the latencies, in seconds, of requests made
+    over elapsed_s seconds.
+    """
+    latencies_s = sorted(latencies_s)
+    return {
+        'requests': len(latencies_s),
+        'p50_ms': get_percentile(latencies_s, 0.5) * 1000,
+        'p99_ms': get_percentile(latencies_s, 0.99) * 1000,
+        'max_ms': latencies_s[-1] * 1000,
+        'requests_per_s': len(latencies_s) / max(elapsed_s, 1e-9),
+    }
+
+
+def format_summary(scenario, summary):
+    return (
+        '{:<12} {:>6} requests  p50 {:>7.2f} ms  p99 {:>7.2f} ms  '
+        'max {:>7.2f} ms  {:>8.1f} req/s'
+    ).format(
+        scenario,
+        summary['requests'],
+        summary['p50_ms'],
+        summary['p99_ms'],
+        summary['max_ms'],
+        summary['requests_per_s'],
+    )
+
+
+def run_clients(host, port, paths_per_client, headers_for_path=None):
+    """
+    Request every path in each list of paths_per_client, one client thread
+    per list, all at once. headers_for_path, if given, returns the headers to
+    send for a path. Returns a tuple of (latencies in seconds, elapsed seconds,
+    {status: count}).
+    """
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(len(paths_per_client) + 1)
+
+    def client(paths):
+        start_barrier.wait()
+        my_latencies = []
+        my_statuses = {}
+        for path in paths:
+            headers = headers_for_path(path) if headers_for_path else {}
+            start = time.perf_counter()
+            status, response_headers = _request(host, port, path, headers)
+            my_latencies.append(time.perf_counter() - start)
+            my_statuses[status] = my_statuses.get(status, 0) + 1
+        with lock:
+            latencies.extend(my_latencies)
+            for status, count in my_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [
+        threading.Thread(target=client, args=(paths,))
+        for paths in paths_per_client
+    ]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start, statuses
+
+
+def run_load_test(host, port, programs, concurrency, num_requests):
+    """
+    Run every scenario against the server at host and port, using programs,
+    a list of programs with examples. Returns a list of (scenario, summary,
+    statuses).
+    """
+    rng = random.Random(0)
+    results = []
+
+    # Each client asks for programs no other client has, so each request is
+    # the first for its program.
+    cold_programs = list(programs)
+    rng.shuffle(cold_programs)
+    cold_paths = []
+    for i in range(concurrency):
+        start = i * num_requests
+        cold_paths.append(
+            ['/' + program for program in
+             cold_programs[start:start + num_requests]]
+        )
+    results.append(
+        ('cold',) + _summarize(run_clients(host, port, cold_paths))
+    )
+
+    # Everything requested from here on has been rendered.
+    rendered = [path for paths in cold_paths for path in paths]
+    warm_paths = [
+        [rng.choice(rendered) for j in range(num_requests)]
+        for i in range(concurrency)
+    ]
+    results.append(
+        ('warm',) + _summarize(run_clients(host, port, warm_paths))
+    )
+
+    etags = {}
+    for path in set(path for paths in warm_paths for path in paths):
+        status, headers = _request(host, port, path, {})
+        etags[path] = headers.get('etag')
+    results.append(
+        ('conditional',) + _summarize(run_clients(
+            host,
+            port,
+            warm_paths,
+            lambda path: {'If-None-Match': etags[path]}
+        ))
+    )
+
+    missing_paths = [
+        ['/no-such-program-{}'.format(j) for j in range(num_requests)]
+        for i in range(concurrency)
+    ]
+    results.append(
+        ('missing',) + _summarize(run_clients(host, port, missing_paths))
+    )
+    return results
+
+
+def _summarize(run_result):
+    latencies, elapsed, statuses = run_result
+    return get_summary(latencies, elapsed), statuses
+
+
+def _request(host, port, path, headers):
+    """Make a GET request, returning (status, headers) once it's read."""
+    connection = http_client.HTTPConnection(host, port)
+    try:
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        response_headers = dict(
+            (name.lower(), value) for name, value in response.getheaders()
+        )
+        return response.status, response_headers
+    finally:
+        connection.close()
+
+
+def _get_free_port():
+    sock = socket.socket()
+    try:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def _start_server(examples_dir, custom_dir, port, num_threads, env):
+    """Start `eg --serve` in a separate process and wait until it's up."""
+    command = [
+        sys.executable, '-m', 'eg',
+        '--serve',
+        '--port', str(port),
+        '--examples-dir', examples_dir,
+        '--custom-dir', custom_dir,
+        '--no-color',
+    ]
+    if num_threads:
+        command += ['--jobs', str(num_threads)]
+    proc = subprocess.Popen(
+        command,
+        stdout=subprocess.DEVNULL,
+        env=env
+    )
+    deadline = time.time() + _STARTUP_TIMEOUT_S
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), 1).close()
+            return proc
+        except (IOError, OSError):
+            if proc.poll() is not None:
+                break
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError('eg --serve did not start')
+
+
+def _parse_arguments(argv):
+    parser = argparse.ArgumentParser(
+        description='Load test eg --serve and report latency percentiles.'
+    )
+    parser.add_argument(
+        '--url',
+        help=(
+            'load test the server at this URL, whose examples must include '
+            'those of the synthetic corpus, rather than starting one'
+        )
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help='the number of clients. Defaults to {}.'.format(
+            DEFAULT_CONCURRENCY
+        )
+    )
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=DEFAULT_REQUESTS,
+        help='the number of requests each client makes per scenario. '
+        'Defaults to {}.'.format(DEFAULT_REQUESTS)
+    )
+    parser.add_argument(
+        '--threads',
+        type=int,
+        help='the number of threads the server handles requests with'
+    )
+    parser.add_argument(
+        '--corpus-dir',
+        help=(
+            'generate the corpus here and keep it for later runs, rather '
+            'than in a temporary directory'
+        )
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_arguments(sys.argv[1:] if argv is None else argv)
+
+    # Enough commands that no cold request repeats a program.
+    num_commands = max(
+        DEFAULT_NUM_COMMANDS,
+        args.concurrency * args.requests
+    )
+    root = args.corpus_dir or tempfile.mkdtemp(prefix='eg-loadtest-')
+    env = dict(os.environ)
+    # Keep the server away from the caches of the user running it.
+    env[config.ENV_XDG_CACHE_HOME] = os.path.join(root, 'cache')
+
+    proc = None
+    try:
+        examples_dir, custom_dir = corpus.get_command_corpus(
+            root,
+            num_commands
+        )
+        corpus.age_files(root)
+        corpus.age_tree(root)
+        programs = [corpus.get_command_name(i) for i in range(num_commands)]
+
+        if args.url:
+            url = url_parse.urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            host, port = '127.0.0.1', _get_free_port()
+            proc = _start_server(
+                examples_dir,
+                custom_dir,
+                port,
+                args.threads,
+                env
+            )
+
+        print('{} clients, {} requests each per scenario'.format(
+            args.concurrency,
+            args.requests
+        ))
+        results = run_load_test(
+            host,
+            port,
+            programs,
+            args.concurrency,
+            args.requests
+        )
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+        if not args.corpus_dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    for scenario, summary, statuses in results:
+        print(format_summary(scenario, summary) + '  statuses: ' + ', '.join(
+            '{}x{}'.format(count, status)
+            for status, count in sorted(statuses.items())
+        ))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,624 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+from benchmarks import corpus
+from eg import bundle
+from eg import catalog
+from eg import color
+from eg import complete
+from eg import config
+from eg import index
+from eg import search
+from eg import substitute
+from eg import suggest
+from eg import util
+
+
+# Times each stage of eg's pipeline over synthetic corpora and writes the
+# results as JSON. Given a baseline written by an earlier run, flags every
+# result that has regressed by more than a threshold and exits non-zero.
+#
+#   python -m benchmarks.run --quick --output before.json
+#   python -m benchmarks.run --quick --compare before.json
+
+# Bump this when the layout of the results file changes.
+RESULTS_VERSION = 1
+
+# The sizes of the command corpora used for lookup and list.
+COMMAND_COUNTS = [100, 1000, 10000, 100000]
+QUICK_COMMAND_COUNTS = [100, 1000]
+
+# The sizes of the example files used for colorize and squeeze.
+FILE_SIZES = [1024, 64 * 1024, 1024 * 1024, 50 * 1024 * 1024]
+QUICK_FILE_SIZES = [1024, 64 * 1024, 1024 * 1024]
+
+# The number of substitutions applied by the substitute stage.
+NUM_SUBSTITUTIONS = 40
+
+# The sizes of the corpora used for search, and the query timed on them.
+SEARCH_FILE_COUNTS = [1000, 10000, 50000]
+QUICK_SEARCH_FILE_COUNTS = [1000]
+SEARCH_QUERY = 'extract files from a tar archive'
+
+# A result is a regression if its median is this fraction slower than the
+# baseline...
+DEFAULT_THRESHOLD = 0.2
+
+# ...and slower by at least this many seconds, below which it's noise.
+_MIN_DELTA_SECONDS = 0.0005
+
+# Every call is timed at least _MIN_RUNS times, and then repeatedly until
+# _TARGET_SECONDS have passed or it has been run _MAX_RUNS times.
+_MIN_RUNS = 3
+_MAX_RUNS = 100
+_TARGET_SECONDS = 0.5
+
+
+def time_call(fn, setup=None):
+    """
+    Time calls to fn, calling setup before each one if it is given. setup is
+    not timed. Returns a dict with the median and fastest time in seconds and
+    the number of runs.
+    """
+    timings = []
+    total = 0
+    while len(timings) < _MAX_RUNS:
+        if len(timings) >= _MIN_RUNS and total >= _TARGET_SECONDS:
+            break
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        total += elapsed
+
+    timings.sort()
+    return {
+        'median_s': timings[len(timings) // 2],
+        'min_s': timings[0],
+        'runs': len(timings),
+    }
+
+
+def _get_config(examples_dir, custom_dir):
+    return config.Config(
+        examples_dir=examples_dir,
+        custom_dir=custom_dir,
+        use_color=False,
+        color_config=None,
+        pager_cmd=None,
+        squeeze=False,
+        subs=[],
+        editor_cmd=None,
+    )
+
+
+def _clear_indexes():
+    """Remove every persisted index, so the next lookup walks the tree."""
+    shutil.rmtree(
+        os.path.join(config.get_cache_dir(), index.INDEX_DIR_NAME),
+        ignore_errors=True
+    )
+    catalog.clear_catalogs()
+
+
+def bench_lookup(root, quick):
+    """
+    Time finding the paths of a program by walking the tree, from the
+    persisted index, and via a Catalog built from the persisted indexes, which
+    is what a fresh eg process does.
+    """
+    for num_commands in QUICK_COMMAND_COUNTS if quick else COMMAND_COUNTS:
+        examples_dir, custom_dir = corpus.get_command_corpus(
+            root,
+            num_commands
+        )
+        program = corpus.get_command_name(num_commands // 2)
+        resolved_config = _get_config(examples_dir, custom_dir)
+        param = 'commands={}'.format(num_commands)
+
+        def find_paths():
+            util.get_file_paths_for_program(program, examples_dir)
+
+        def find_paths_with_catalog():
+            examples = catalog.get_catalog(resolved_config)
+            examples.get_paths(examples.resolve(program))
+
+        yield 'lookup.walk', param, time_call(find_paths, _clear_indexes)
+        yield 'lookup.index', param, time_call(find_paths)
+        yield 'lookup.catalog', param, time_call(
+            find_paths_with_catalog,
+            catalog.clear_catalogs
+        )
+
+
+def bench_list(root, quick):
+    """Time building the output of `eg --list` in a fresh process."""
+    for num_commands in QUICK_COMMAND_COUNTS if quick else COMMAND_COUNTS:
+        examples_dir, custom_dir = corpus.get_command_corpus(
+            root,
+            num_commands
+        )
+        resolved_config = _get_config(examples_dir, custom_dir)
+
+        def list_commands():
+            util.get_list_of_all_supported_commands(resolved_config)
+
+        # Build the persisted indexes outside of the timing.
+        list_commands()
+        yield 'list', 'commands={}'.format(num_commands), time_call(
+            list_commands,
+            catalog.clear_catalogs
+        )
+
+
+def bench_colorize(root, quick):
+    """
+    Time colorizing example files of increasing size, both in a single pass
+    and with the pass per kind of thing colored that it replaced.
+    """
+    colorizer = color.EgColorizer(config.get_default_color_config())
+    for size, text in _get_example_texts(root, quick):
+        param = 'bytes={}'.format(size)
+        yield 'colorize', param, time_call(
+            lambda: colorizer.colorize_text(text)
+        )
+        yield 'colorize.passes', param, time_call(
+            lambda: colorizer.colorize_text_in_passes(text)
+        )
+
+
+def bench_squeeze(root, quick):
+    """
+    Time squeezing example files of increasing size, both as a string and as
+    a stream of chunks.
+    """
+    for size, text in _get_example_texts(root, quick):
+        param = 'bytes={}'.format(size)
+        chunks = list(util.get_line_aligned_chunks(
+            text[start:start + util.CHUNK_SIZE]
+            for start in range(0, len(text), util.CHUNK_SIZE)
+        ))
+        yield 'squeeze', param, time_call(
+            lambda: util.get_squeezed_contents(text)
+        )
+        yield 'squeeze.chunks', param, time_call(
+            lambda: ''.join(util.get_squeezed_chunks(iter(chunks)))
+        )
+
+
+def bench_substitute(root, quick):
+    """
+    Time applying an egrc's worth of substitutions to example files of
+    increasing size, both as a chain and one at a time.
+    """
+    subs = _get_substitutions()
+    chain = substitute.SubstitutionChain(subs)
+    for size, text in _get_example_texts(root, quick):
+        param = 'bytes={}'.format(size)
+
+        def apply_in_order():
+            result = text
+            for sub in subs:
+                result = sub.apply_and_get_result(result)
+
+        yield 'substitute', param, time_call(
+            lambda: chain.apply_and_get_result(text)
+        )
+        yield 'substitute.in_order', param, time_call(apply_in_order)
+
+
+def bench_render(root, quick):
+    """
+    Time formatting example files of increasing size with color, squeeze, and
+    substitutions: as a single string, streamed in chunks, and up to the first
+    chunk of the stream, which is when the pager can show the first screen.
+    """
+    color_config = config.get_default_color_config()
+    subs = _get_substitutions()
+    for size in QUICK_FILE_SIZES if quick else FILE_SIZES:
+        path = corpus.get_example_file(root, size)
+        param = 'bytes={}'.format(size)
+
+        def render_string():
+            util.get_formatted_contents(
+                util.get_contents_from_files(path),
+                True,
+                color_config,
+                True,
+                subs
+            )
+
+        def get_chunks():
+            return util.get_formatted_chunks(
+                util.get_chunks_from_files(path),
+                True,
+                color_config,
+                True,
+                subs
+            )
+
+        yield 'render', param, time_call(render_string)
+        yield 'render.stream', param, time_call(
+            lambda: [chunk for chunk in get_chunks()]
+        )
+        yield 'render.first_chunk', param, time_call(
+            lambda: next(iter(get_chunks()))
+        )
+
+
+def bench_passthrough(root, quick):
+    """
+    Time writing example files of increasing size out unformatted, as eg does
+    with color, squeeze, and substitutions all off: copying the raw bytes, and
+    decoding, streaming through the formatter, and encoding again.
+    """
+    buffer = bytearray(util.CHUNK_SIZE)
+    out_fd = os.open(os.devnull, os.O_WRONLY)
+    try:
+        for size in QUICK_FILE_SIZES if quick else FILE_SIZES:
+            path = corpus.get_example_file(root, size)
+            param = 'bytes={}'.format(size)
+
+            def write_decoded():
+                chunks = util.get_formatted_chunks(
+                    util.get_chunks_from_files(path),
+                    False,
+                    None,
+                    False,
+                    None
+                )
+                for chunk in chunks:
+                    os.write(out_fd, chunk.encode('utf-8'))
+
+            yield 'passthrough', param, time_call(
+                lambda: bundle.write_file_to(path, out_fd, buffer)
+            )
+            yield 'passthrough.decoded', param, time_call(write_decoded)
+    finally:
+        os.close(out_fd)
+
+
+def bench_page(root, quick):
+    """
+    Time to first screen: from paging example files of increasing size,
+    formatted with color and squeeze, until the pager has read the first byte
+    and quit. The pager is `head -c 1`, whose output is thrown away.
+    """
+    pager_config = _get_config(None, None)._replace(
+        use_color=True,
+        color_config=config.get_default_color_config(),
+        squeeze=True,
+        pager_cmd='head -c 1'
+    )
+    # The pager writes to the stdout it inherits from us.
+    stdout_fd = os.dup(1)
+    devnull_fd = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull_fd, 1)
+    try:
+        for size in QUICK_FILE_SIZES if quick else FILE_SIZES:
+            path = corpus.get_example_file(root, size)
+            yield 'page.first_screen', 'bytes={}'.format(size), time_call(
+                lambda: util.page_chunks(
+                    util.get_rendered_chunks([path], pager_config),
+                    pager_config.pager_cmd
+                )
+            )
+    finally:
+        os.dup2(stdout_fd, 1)
+        os.close(stdout_fd)
+        os.close(devnull_fd)
+
+
+def _get_substitutions():
+    """
+    Return NUM_SUBSTITUTIONS substitutions like those in an egrc: mostly
+    words replaced with other words, with a few regular expressions.
+    """
+    result = [
+        substitute.Substitution('^    \\$ ', '    > ', True),
+        substitute.Substitution('\\bsynthetic\\b', 'example', False),
+    ]
+    i = 0
+    while len(result) < NUM_SUBSTITUTIONS:
+        result.append(
+            substitute.Substitution(
+                'word{:02d}'.format(i),
+                'replaced{:02d}'.format(i),
+                False
+            )
+        )
+        i += 1
+    return result
+
+
+def bench_search(root, quick):
+    """
+    Time a search against an up to date index, and a search that first has to
+    bring the index up to date after a custom example is edited.
+    """
+    for num_files in QUICK_SEARCH_FILE_COUNTS if quick else SEARCH_FILE_COUNTS:
+        examples_dir, custom_dir = corpus.get_search_corpus(root, num_files)
+        resolved_config = _get_config(examples_dir, custom_dir)
+        edited_path = os.path.join(
+            custom_dir,
+            'd0000',
+            corpus.get_command_name(0) + '.md'
+        )
+        with open(edited_path, 'r') as f:
+            original = f.read()
+        param = 'files={}'.format(num_files)
+        edits = []
+
+        def edit_custom_file():
+            # Saved as editors do, by replacing the file, which changes the
+            # mtime of its directory.
+            edits.append(None)
+            with open(edited_path + '.tmp', 'w') as f:
+                f.write(original + 'edited\n' * len(edits))
+            os.rename(edited_path + '.tmp', edited_path)
+            past = time.time() - 60
+            os.utime(edited_path, (past, past))
+            os.utime(os.path.dirname(edited_path), (past, past))
+
+        def run_search():
+            search.search(resolved_config, SEARCH_QUERY)
+
+        # Build the index outside of the timing.
+        run_search()
+        yield 'search.query', param, time_call(run_search)
+        yield 'search.update', param, time_call(run_search, edit_custom_file)
+
+
+def bench_suggest(root, quick):
+    """
+    Time suggesting programs for a misspelled name, including building the
+    suggestion index, against a stored index, and without any index by
+    measuring the distance to every name.
+    """
+    for num_commands in QUICK_COMMAND_COUNTS if quick else COMMAND_COUNTS:
+        examples_dir, custom_dir = corpus.get_command_corpus(
+            root,
+            num_commands
+        )
+        examples = catalog.get_catalog(_get_config(examples_dir, custom_dir))
+        names = suggest._get_names(examples)
+        # A transposition of a real name.
+        name = corpus.get_command_name(num_commands // 2)
+        misspelled = name[1] + name[0] + name[2:]
+        param = 'commands={}'.format(num_commands)
+
+        def remove_index():
+            index_path = suggest._get_index_path(examples_dir, custom_dir)
+            if os.path.exists(index_path):
+                os.remove(index_path)
+
+        def get_suggestions():
+            suggest.get_suggestions(examples, misspelled)
+
+        def scan_names():
+            for candidate in names:
+                suggest.get_distance(
+                    misspelled,
+                    candidate,
+                    suggest.MAX_DISTANCE
+                )
+
+        yield 'suggest.build', param, time_call(get_suggestions, remove_index)
+        yield 'suggest.lookup', param, time_call(get_suggestions)
+        yield 'suggest.scan', param, time_call(scan_names)
+
+
+def bench_complete(root, quick):
+    """
+    Time completing a prefix of a program name from the stored table of names,
+    and when the table has to be built from a Catalog first.
+    """
+    for num_commands in QUICK_COMMAND_COUNTS if quick else COMMAND_COUNTS:
+        examples_dir, custom_dir = corpus.get_command_corpus(
+            root,
+            num_commands
+        )
+        # The table is only stored for a corpus old enough to trust.
+        corpus.age_files(root)
+        corpus.age_tree(root)
+        prefix = corpus.get_command_name(num_commands // 2)[:-1]
+        param = 'commands={}'.format(num_commands)
+
+        def remove_table():
+            table_path = complete._get_table_path(examples_dir, custom_dir)
+            if os.path.exists(table_path):
+                os.remove(table_path)
+            catalog.clear_catalogs()
+
+        def get_completions():
+            complete.get_completions(prefix, examples_dir, custom_dir)
+
+        yield 'complete.build', param, time_call(get_completions, remove_table)
+        yield 'complete.table', param, time_call(get_completions)
+
+
+def _get_example_texts(root, quick):
+    """Yield (size, text) for example files of each size."""
+    for size in QUICK_FILE_SIZES if quick else FILE_SIZES:
+        path = corpus.get_example_file(root, size)
+        with open(path, 'r') as f:
+            yield size, f.read()
+
+
+# The stages that can be benchmarked, in the order they are run. Each is a
+# generator taking the corpus root and whether this is a quick run, and
+# yielding (stage, parameter, timing) tuples.
+STAGES = [
+    ('lookup', bench_lookup),
+    ('list', bench_list),
+    ('colorize', bench_colorize),
+    ('squeeze', bench_squeeze),
+    ('substitute', bench_substitute),
+    ('render', bench_render),
+    ('passthrough', bench_passthrough),
+    ('page', bench_page),
+    ('search', bench_search),
+    ('suggest', bench_suggest),
+    ('complete', bench_complete),
+]
+
+
+def get_result_key(stage, param):
+    return '{}/{}'.format(stage, param)
+
+
+def run_stages(root, stage_names, quick):
+    """
+    Run the stages named in stage_names over corpora beneath root. Returns the
+    results in the format written to results files.
+    """
+    results = {}
+    for name, bench in STAGES:
+        if name not in stage_names:
+            continue
+        for stage, param, timing in bench(root, quick):
+            key = get_result_key(stage, param)
+            results[key] = timing
+            sys.stderr.write(
+                '{:<40} {:>12.6f} s  ({} runs)\n'.format(
+                    key,
+                    timing['median_s'],
+                    timing['runs']
+                )
+            )
+
+    return {
+        'version': RESULTS_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare the medians of current against baseline, both as returned by
+    run_stages(). Returns a list of (key, baseline_s, current_s, ratio,
+    is_regression) tuples for every result present in both, sorted by key.
+    """
+    result = []
+    baseline_results = baseline['results']
+    for key, timing in sorted(current['results'].items()):
+        if key not in baseline_results:
+            continue
+        baseline_s = baseline_results[key]['median_s']
+        current_s = timing['median_s']
+        ratio = current_s / baseline_s if baseline_s else float('inf')
+        is_regression = (
+            ratio > 1 + threshold and
+            current_s - baseline_s > _MIN_DELTA_SECONDS
+        )
+        result.append((key, baseline_s, current_s, ratio, is_regression))
+    return result
+
+
+def format_comparison(comparison):
+    lines = [
+        '{:<40} {:>12} {:>12} {:>8}'.format(
+            'benchmark',
+            'baseline s',
+            'current s',
+            'ratio'
+        )
+    ]
+    for key, baseline_s, current_s, ratio, is_regression in comparison:
+        lines.append(
+            '{:<40} {:>12.6f} {:>12.6f} {:>7.2f}x{}'.format(
+                key,
+                baseline_s,
+                current_s,
+                ratio,
+                '  REGRESSION' if is_regression else ''
+            )
+        )
+    return '\n'.join(lines)
+
+
+def _parse_arguments(argv):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the stages of eg over synthetic corpora.'
+    )
+    parser.add_argument(
+        '--quick',
+        action='store_true',
+        help='use only the smaller corpora'
+    )
+    parser.add_argument(
+        '--stage',
+        action='append',
+        choices=[name for name, bench in STAGES],
+        help='run only this stage. Can be given more than once.'
+    )
+    parser.add_argument(
+        '--corpus-dir',
+        help=(
+            'generate corpora here and keep them for later runs, rather than '
+            'in a temporary directory'
+        )
+    )
+    parser.add_argument(
+        '--output',
+        help='write the results as JSON to this file'
+    )
+    parser.add_argument(
+        '--compare',
+        metavar='BASELINE',
+        help='compare the results to those in this results file'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help=(
+            'flag results slower than the baseline by more than this '
+            'fraction. Defaults to {}.'.format(DEFAULT_THRESHOLD)
+        )
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_arguments(sys.argv[1:] if argv is None else argv)
+    stage_names = args.stage or [name for name, bench in STAGES]
+
+    root = args.corpus_dir or tempfile.mkdtemp(prefix='eg-benchmarks-')
+    # Keep the benchmarks away from the caches of the user running them.
+    os.environ[config.ENV_XDG_CACHE_HOME] = os.path.join(root, 'cache')
+
+    try:
+        results = run_stages(root, stage_names, args.quick)
+    finally:
+        if not args.corpus_dir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        comparison = compare(baseline, results, args.threshold)
+        print(format_comparison(comparison))
+        if any(entry[4] for entry in comparison):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,12 @@
-from eg import core
+import sys
 
+from eg import complete
 
-core.run_eg()
+
+# Shells complete on every keypress, so don't load the rest of eg for it.
+prefix = complete.get_fast_prefix(sys.argv[1:])
+if prefix is not None:
+    complete.show_completions(prefix)
+else:
+    from eg import core
+    core.run_eg()
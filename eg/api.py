@@ -0,0 +1,341 @@
+import threading
+
+from collections import namedtuple
+from collections import OrderedDict
+from eg import catalog
+from eg import config as eg_config
+from eg import index
+from eg import util
+
+
+# A Python API for programs that embed eg rather than running it, such as web
+# servers. Nothing here reads sys.argv, prints, or pages: every function
+# returns its result. All of them are safe to call from many threads at once.
+#
+# Rendered examples are kept in a bounded, least recently used cache shared by
+# every thread. Each entry remembers the sizes and mtimes of the files it was
+# rendered from and is thrown away as soon as any of them change, so edits to
+# the examples show up on the next call.
+
+# The number of rendered entries kept in memory.
+DEFAULT_CACHE_SIZE = 256
+
+# What is known about the examples for a program.
+#    program: the program as it was given
+#    resolved_program: the program after resolving aliases
+#    paths: the paths of the files with examples for it, custom examples first
+Entry = namedtuple(
+    'Entry',
+    [
+        'program',
+        'resolved_program',
+        'paths',
+    ]
+)
+
+# Examples rendered from a single read of their files.
+#    rendered: the examples, formatted as by render()
+#    digest: the digest of the contents of the files they were rendered from,
+#        as returned by get_digest()
+Rendering = namedtuple(
+    'Rendering',
+    [
+        'rendered',
+        'digest',
+    ]
+)
+
+# Guards everything below, along with building Catalogs, which write indexes
+# to the eg cache dir.
+_lock = threading.Lock()
+
+# {(paths, options): (stats, Rendering)}, least recently used first.
+_rendered = OrderedDict()
+_max_entries = DEFAULT_CACHE_SIZE
+
+# {paths: (stats, digest)}, least recently used first.
+_digests = OrderedDict()
+
+# {use_color: (egrc mtimes, Config)} for the configs used when none is given.
+_default_configs = {}
+
+
+def get_config(
+    egrc_path=None,
+    examples_dir=None,
+    custom_dir=None,
+    use_color=None,
+    pager_cmd=None,
+    squeeze=None,
+):
+    """
+    Return a Config resolved from the arguments, the egrc, and the defaults,
+    just as for the command line. Paths that can't be found are not reported.
+    """
+    return eg_config.get_resolved_config(
+        egrc_path=egrc_path,
+        examples_dir=examples_dir,
+        custom_dir=custom_dir,
+        use_color=use_color,
+        pager_cmd=pager_cmd,
+        squeeze=squeeze,
+        debug=False,
+    )
+
+
+def lookup(program, config=None):
+    """
+    Return an Entry describing the examples for program, resolving aliases,
+    or None if there are none. If config is None, the config is resolved from
+    the egrc and the defaults.
+    """
+    if config is None:
+        config = _get_default_config(use_color=False)
+    examples = _get_catalog(config)
+    resolved_program = examples.resolve(program)
+    paths = examples.get_paths(resolved_program)
+    if not paths:
+        return None
+    return Entry(
+        program=program,
+        resolved_program=resolved_program,
+        paths=paths,
+    )
+
+
+def render(program, config=None, color=False):
+    """
+    Return the examples for program formatted according to config, or None if
+    there are none. If color is True the output is colorized, with the colors
+    in config if it has any. If config is None, the config is resolved from
+    the egrc and the defaults.
+    """
+    rendering = render_with_digest(program, config=config, color=color)
+    if rendering is None:
+        return None
+    return rendering.rendered
+
+
+def render_with_digest(program, config=None, color=False, is_current=None):
+    """
+    Return a Rendering of the examples for program, formatted as by render(),
+    or None if there are none. The output and the digest come from the same
+    read of the files, so the digest always describes the output, even if the
+    files change in between.
+
+    is_current, if given, is called with the digest when the output isn't
+    cached. If it returns True the caller already has the output, so the
+    contents aren't formatted and the Rendering has None for rendered.
+    """
+    if config is None:
+        config = _get_default_config(use_color=color)
+    elif color and config.color_config is None:
+        config = config._replace(
+            use_color=True,
+            color_config=eg_config.get_default_color_config()
+        )
+    else:
+        config = config._replace(use_color=color)
+
+    entry = lookup(program, config)
+    if entry is None:
+        return None
+
+    key = (
+        tuple(entry.paths),
+        (
+            config.use_color,
+            config.color_config if config.use_color else None,
+            config.squeeze,
+            tuple(config.subs or []),
+        )
+    )
+    stats = _get_stats(entry.paths)
+    cached = _get_cached(_rendered, key, stats)
+    if cached is not None:
+        return cached
+
+    # Rendering is done without holding the lock, so threads rendering
+    # different programs don't wait on each other. Two threads rendering the
+    # same program at once both do the work, and the result is the same.
+    raw_contents = util.get_contents_from_files(*entry.paths)
+    digest = _get_raw_digest([raw_contents])
+    _put_cached(_digests, tuple(entry.paths), stats, digest)
+    if is_current is not None and is_current(digest):
+        return Rendering(rendered=None, digest=digest)
+
+    result = Rendering(
+        rendered=util.get_formatted_contents(
+            raw_contents,
+            use_color=config.use_color,
+            color_config=config.color_config,
+            squeeze=config.squeeze,
+            subs=config.subs
+        ),
+        digest=digest
+    )
+    _put_cached(_rendered, key, stats, result)
+    return result
+
+
+def get_digest(entry):
+    """
+    Return a hex digest of the contents of the files for entry, an Entry as
+    returned by lookup(). It changes whenever any of the files do, so is
+    suitable for telling if previously rendered examples are still current.
+    Like rendered entries, digests are cached until the files change.
+    """
+    key = tuple(entry.paths)
+    stats = _get_stats(entry.paths)
+    cached = _get_cached(_digests, key, stats)
+    if cached is not None:
+        return cached
+
+    result = _get_raw_digest(util.get_chunks_from_files(*entry.paths))
+    _put_cached(_digests, key, stats, result)
+    return result
+
+
+def list_commands(config=None):
+    """
+    Return a sorted list of the programs and aliases with examples, formatted
+    as for `eg --list`. If config is None, the config is resolved from the
+    egrc and the defaults.
+    """
+    if config is None:
+        config = _get_default_config(use_color=False)
+    # Building the list looks up the Catalog, which is refreshed first so the
+    # list is never older than the examples.
+    _get_catalog(config)
+    return util.get_list_of_all_supported_commands(config)
+
+
+def resolve(program, config=None):
+    """
+    Return the program that program is an alias for, or program itself if it
+    isn't an alias. If config is None, the config is resolved from the egrc
+    and the defaults.
+    """
+    if config is None:
+        config = _get_default_config(use_color=False)
+    return _get_catalog(config).resolve(program)
+
+
+def is_in_alias_cycle(program, config=None):
+    """
+    Return True if program is an alias that never resolves to a program
+    because following it leads around a cycle of aliases. If config is None,
+    the config is resolved from the egrc and the defaults.
+    """
+    if config is None:
+        config = _get_default_config(use_color=False)
+    return program in _get_catalog(config).alias_cycles
+
+
+def get_suggestions(program, config=None):
+    """
+    Return the names with examples that are close enough to program to be what
+    was meant, for when program has none. If config is None, the config is
+    resolved from the egrc and the defaults.
+    """
+    if config is None:
+        config = _get_default_config(use_color=False)
+    # Suggesting may write its index to the eg cache dir, like building a
+    # Catalog does.
+    with _lock:
+        examples = catalog.get_catalog(config, refresh_if_stale=True)
+        return util.get_suggestions(examples, program)
+
+
+def set_cache_size(max_entries):
+    """
+    Keep at most max_entries rendered entries in memory, discarding the least
+    recently used ones if there are already more.
+    """
+    global _max_entries
+    with _lock:
+        _max_entries = max_entries
+        for cache in (_rendered, _digests):
+            while len(cache) > _max_entries:
+                cache.popitem(last=False)
+
+
+def clear_cache():
+    """Forget every rendered entry, digest, and resolved config."""
+    with _lock:
+        _rendered.clear()
+        _digests.clear()
+        _default_configs.clear()
+
+
+def _get_raw_digest(chunks):
+    # Imported here so that only callers of this pay for it.
+    from eg import render_cache
+    return render_cache.get_digest(chunks)
+
+
+def _get_cached(cache, key, stats):
+    """
+    Return the value for key in cache, one of the least recently used caches
+    above, if it was stored with stats, else None. Entries stored with other
+    stats are out of date and are dropped.
+    """
+    with _lock:
+        cached = cache.pop(key, None)
+        if cached is not None and cached[0] == stats:
+            # Put it back as the most recently used.
+            cache[key] = cached
+            return cached[1]
+    return None
+
+
+def _put_cached(cache, key, stats, value):
+    """
+    Store value for key in cache along with stats, unless stats is None,
+    discarding the least recently used entries if there are too many.
+    """
+    if stats is None:
+        return
+    with _lock:
+        cache.pop(key, None)
+        cache[key] = (stats, value)
+        while len(cache) > _max_entries:
+            cache.popitem(last=False)
+
+
+def _get_default_config(use_color):
+    """
+    Return the Config resolved from the egrc and the defaults, with color on
+    or off according to use_color whatever the egrc says. It is resolved again
+    only if the egrc has changed.
+    """
+    egrc_mtimes = eg_config.get_egrc_mtimes(None)
+    with _lock:
+        cached = _default_configs.get(use_color)
+    if cached is not None and cached[0] == egrc_mtimes:
+        return cached[1]
+
+    result = get_config(use_color=use_color)
+    with _lock:
+        _default_configs[use_color] = (egrc_mtimes, result)
+    return result
+
+
+def _get_catalog(config):
+    with _lock:
+        return catalog.get_catalog(config, refresh_if_stale=True)
+
+
+def _get_stats(paths):
+    """
+    Return a tuple of (size, mtime) for each of paths, or None if any can't be
+    found or was modified too recently for its mtime to be trusted. Files in
+    bundles are represented by their bundle.
+    """
+    result = []
+    for path in paths:
+        stamp = index.get_trusted_stamp(path)
+        if stamp is None:
+            return None
+        result.append(stamp)
+    return tuple(result)
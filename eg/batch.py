@@ -0,0 +1,212 @@
+import json
+import os
+import sys
+
+from collections import namedtuple
+from eg import catalog
+from eg import index
+from eg import util
+
+
+# Renders the examples of many programs in one process, for tools that would
+# otherwise run eg once per program and pay for starting up and resolving the
+# config every time. The config and the catalog of examples are resolved once
+# by the parent, and the examples are rendered in parallel by a pool of worker
+# processes. Results are always written in the order the programs were given,
+# whatever order the workers finish in.
+
+# The value of --batch meaning that program names are read from stdin.
+STDIN_FILE_NAME = '-'
+
+# The suffix of the files written to the output dir.
+OUTPUT_FILE_SUFFIX = '.txt'
+
+# The rendered examples of a program given to the batch.
+#    program: the program as it was given
+#    resolved_program: the program after resolving aliases
+#    rendered: the rendered examples, or None if there are none
+BatchResult = namedtuple(
+    'BatchResult',
+    [
+        'program',
+        'resolved_program',
+        'rendered',
+    ]
+)
+
+# The config used by worker processes started by map_with_config(), set when
+# each worker starts.
+_worker_config = None
+
+
+def read_programs(batch_file):
+    """
+    Return the program names listed in batch_file, one per line, ignoring
+    blank lines. If batch_file is STDIN_FILE_NAME they are read from stdin.
+    """
+    if batch_file == STDIN_FILE_NAME:
+        lines = sys.stdin.readlines()
+    else:
+        with open(batch_file, 'r') as f:
+            lines = f.readlines()
+    return [line.strip() for line in lines if line.strip()]
+
+
+def get_default_num_jobs():
+    """Return the number of workers used if none is given: one per CPU."""
+    import multiprocessing
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def render_programs(programs, config, num_jobs=None):
+    """
+    Render the examples of every program in programs according to config,
+    using up to num_jobs worker processes. Returns a list of BatchResults in
+    the same order as programs.
+    """
+    examples = catalog.get_catalog(config)
+
+    # Aliases and programs given more than once are rendered only once.
+    resolved_programs = []
+    paths_to_render = []
+    paths_to_position = {}
+    for program in programs:
+        resolved_program = examples.resolve(program)
+        paths = tuple(examples.get_paths(resolved_program))
+        resolved_programs.append((program, resolved_program, paths))
+        if paths and paths not in paths_to_position:
+            paths_to_position[paths] = len(paths_to_render)
+            paths_to_render.append(paths)
+
+    rendered = map_with_config(_render, paths_to_render, config, num_jobs)
+
+    result = []
+    for program, resolved_program, paths in resolved_programs:
+        result.append(BatchResult(
+            program=program,
+            resolved_program=resolved_program,
+            rendered=rendered[paths_to_position[paths]] if paths else None,
+        ))
+    return result
+
+
+def run_batch(batch_file, config, output_dir=None, num_jobs=None):
+    """
+    Render the examples of the programs listed in batch_file. If output_dir is
+    given, the examples of each program are written to a file named for the
+    program within it, and programs without examples are reported on stderr.
+    Otherwise each program is written to stdout as a line of JSON.
+    """
+    programs = read_programs(batch_file)
+    results = render_programs(programs, config, num_jobs)
+
+    if output_dir:
+        _write_results_to_dir(results, output_dir)
+    else:
+        _write_results_as_json(results, sys.stdout)
+
+
+def get_result_json(batch_result):
+    """
+    Return batch_result as a line of JSON, without a newline. Programs without
+    examples have an error in place of their output.
+    """
+    value = {
+        'program': batch_result.program,
+        'resolved_program': batch_result.resolved_program,
+        'output': batch_result.rendered,
+    }
+    if batch_result.rendered is None:
+        value['error'] = util.get_no_entry_message(batch_result.program)
+    return json.dumps(value, sort_keys=True)
+
+
+def map_with_config(fn, items, config, num_jobs=None):
+    """
+    Return a list of fn(config, item) for every item in items, in the same
+    order, calling fn in up to num_jobs worker processes. fn must be a
+    function defined at the top level of a module, so that workers can find
+    it. config is sent to each worker once, rather than with every item.
+    """
+    items = list(items)
+    if num_jobs is None:
+        num_jobs = get_default_num_jobs()
+    num_jobs = min(num_jobs, len(items))
+
+    if num_jobs <= 1:
+        return [fn(config, item) for item in items]
+
+    import multiprocessing
+    pool = multiprocessing.Pool(
+        num_jobs,
+        initializer=_init_worker,
+        initargs=(config,)
+    )
+    try:
+        # map() returns results in the order they were asked for. Handing each
+        # worker several items at a time keeps the overhead of passing them
+        # back and forth down.
+        chunksize = max(1, len(items) // (num_jobs * 4))
+        return pool.map(
+            _call_in_worker,
+            [(fn, item) for item in items],
+            chunksize
+        )
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _init_worker(config):
+    global _worker_config
+    _worker_config = config
+    # Building the catalog opens any bundles the examples are in, which
+    # workers that weren't forked from the parent need in order to read them.
+    catalog.get_catalog(config)
+
+
+def _call_in_worker(fn_and_item):
+    fn, item = fn_and_item
+    return fn(_worker_config, item)
+
+
+def _render(config, paths):
+    return util.get_rendered_contents(paths, config)
+
+
+def _write_results_to_dir(results, output_dir):
+    for batch_result in results:
+        if batch_result.rendered is None:
+            sys.stderr.write(
+                util.get_no_entry_message(batch_result.program) + '\n'
+            )
+            continue
+        if not _is_file_name(batch_result.program):
+            sys.stderr.write(
+                'Not writing examples for ' +
+                batch_result.program +
+                ', as it is not a valid file name.\n'
+            )
+            continue
+        output_path = os.path.join(
+            output_dir,
+            batch_result.program + OUTPUT_FILE_SUFFIX
+        )
+        if not index.write_file_atomically(output_path, batch_result.rendered):
+            sys.stderr.write('Could not write ' + output_path + '\n')
+
+
+def _is_file_name(program):
+    """True if program can be used as a file name in the output dir."""
+    return (
+        os.path.basename(program) == program and
+        program not in (os.curdir, os.pardir)
+    )
+
+
+def _write_results_as_json(results, output_file):
+    for batch_result in results:
+        output_file.write(get_result_json(batch_result) + '\n')
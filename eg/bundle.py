@@ -0,0 +1,391 @@
+import bisect
+import errno
+import mmap
+import os
+import struct
+
+from eg import index
+
+
+# A bundle packs every file in a directory of examples into a single file that
+# eg can memory-map, replacing an open/read/close per example with slices of
+# one mapping. The layout is:
+#
+#   header:      magic, format version, number of entries
+#   name table:  one record per file, sorted by file name. Each record holds
+#                the lengths of the file name and of the path relative to the
+#                bundled directory, the offset of the body from the start of
+#                the bundle and the length of the body, followed by the file
+#                name and relative path themselves.
+#   bodies:      the raw bytes of every file, concatenated.
+#
+# All integers are little-endian.
+BUNDLE_MAGIC = b'EGBUNDLE'
+BUNDLE_VERSION = 1
+
+_HEADER = struct.Struct('<8sII')
+_RECORD = struct.Struct('<HHQQ')
+
+# Files in bundles are encoded and decoded with this encoding.
+BUNDLE_ENCODING = 'utf-8'
+
+# The most bytes os.sendfile is asked to copy at once.
+_SENDFILE_BLOCK_SIZE = 1024 * 1024 * 1024
+
+# Errors from os.sendfile meaning it can't copy between the two files, e.g.
+# because one is on a file system that doesn't support it.
+_SENDFILE_UNSUPPORTED_ERRNOS = (
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.ENOTSOCK,
+    errno.EOPNOTSUPP,
+)
+
+# Bundles opened by this process, keyed by the path to the bundle file. Files
+# in a bundle are addressed as if the bundle were a directory, e.g.
+# /path/to/examples.egb/nested/cp.md, which can never collide with a real path
+# because the bundle is a file. A bundle is opened again if the file at its
+# path is replaced, as by --build-bundle, or changes.
+_bundles = {}
+
+
+class BundleError(Exception):
+    """Raised when a file is not a bundle that eg can read."""
+    pass
+
+
+class Bundle():
+    """
+    A read-only view of a bundle file. The name table is parsed once when the
+    bundle is opened, and the contents of files are sliced out of a memory map
+    on demand.
+    """
+
+    def __init__(self, bundle_path):
+        """
+        Open the bundle at bundle_path. Raises BundleError if the file is not a
+        bundle.
+        """
+        self.bundle_path = bundle_path
+
+        with open(bundle_path, 'rb') as f:
+            # Taken from the open file, so it is certainly the one mapped.
+            self.file_key = _get_file_key(os.fstat(f.fileno()))
+            try:
+                self._map = mmap.mmap(
+                    f.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ
+                )
+            except ValueError:
+                # mmap refuses to map empty files.
+                raise BundleError('not a bundle: ' + bundle_path)
+
+        if len(self._map) < _HEADER.size:
+            raise BundleError('not a bundle: ' + bundle_path)
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != BUNDLE_MAGIC:
+            raise BundleError('not a bundle: ' + bundle_path)
+        if version != BUNDLE_VERSION:
+            raise BundleError(
+                'unsupported bundle version {} in {}'.format(
+                    version,
+                    bundle_path
+                )
+            )
+
+        # Parallel lists, sorted by file name so we can bisect on names.
+        self._names = []
+        self._rel_paths = []
+        self._spans = []
+
+        position = _HEADER.size
+        for _ in range(count):
+            name_len, path_len, offset, length = _RECORD.unpack_from(
+                self._map,
+                position
+            )
+            position += _RECORD.size
+            name = self._map[position:position + name_len]
+            position += name_len
+            rel_path = self._map[position:position + path_len]
+            position += path_len
+
+            self._names.append(name.decode(BUNDLE_ENCODING))
+            self._rel_paths.append(rel_path.decode(BUNDLE_ENCODING))
+            self._spans.append((offset, length))
+
+    def get_paths(self, file_name):
+        """
+        Return the paths of every file in the bundle named file_name, in the
+        order they were bundled.
+        """
+        start = bisect.bisect_left(self._names, file_name)
+        end = bisect.bisect_right(self._names, file_name, start)
+        return [
+            self._get_full_path(self._rel_paths[i]) for i in range(start, end)
+        ]
+
+    def get_index(self):
+        """
+        Return an index of the bundle in the same format as index.get_index()
+        returns for a directory.
+        """
+        result = {}
+        for name, rel_path in zip(self._names, self._rel_paths):
+            result.setdefault(name, []).append(self._get_full_path(rel_path))
+        return result
+
+    def read(self, path):
+        """
+        Return the contents of the file at path, which must be a path in this
+        bundle as returned by get_paths() or get_index().
+        """
+        offset, length = self._get_span(path)
+        data = self._map[offset:offset + length]
+        return data.decode(BUNDLE_ENCODING)
+
+    def read_chunks(self, path, chunk_size):
+        """
+        Yield the contents of the file at path in chunks of about chunk_size
+        characters, without decoding the whole file at once. Chunks are cut
+        just after a newline, so no character is ever split between them.
+        """
+        offset, length = self._get_span(path)
+        end = offset + length
+        while offset < end:
+            cut = min(offset + chunk_size, end)
+            if cut < end:
+                # Newlines never occur inside an encoded character.
+                newline = self._map.rfind(b'\n', offset, cut)
+                if newline < 0:
+                    newline = self._map.find(b'\n', cut, end)
+                cut = end if newline < 0 else newline + 1
+            yield self._map[offset:cut].decode(BUNDLE_ENCODING)
+            offset = cut
+
+    def write_to(self, path, fd):
+        """
+        Write the raw bytes of the file at path to the file descriptor fd,
+        straight from the memory map without copying them.
+        """
+        offset, length = self._get_span(path)
+        view = memoryview(self._map)[offset:offset + length]
+        try:
+            _write_all(fd, view)
+        finally:
+            view.release()
+
+    def _get_span(self, path):
+        """
+        Return the (offset, length) of the file at path within the bundle.
+        Raises IOError if path is not in the bundle.
+        """
+        rel_path = path[len(self.bundle_path) + 1:]
+        name = os.path.basename(rel_path)
+        start = bisect.bisect_left(self._names, name)
+        end = bisect.bisect_right(self._names, name, start)
+        for i in range(start, end):
+            if self._rel_paths[i] == rel_path:
+                return self._spans[i]
+        raise IOError('no such file in bundle: ' + path)
+
+    def _get_full_path(self, rel_path):
+        return os.path.join(self.bundle_path, rel_path)
+
+
+def is_bundle(path):
+    """
+    True if path is a file that starts with the bundle magic, else False.
+    """
+    if not path:
+        return False
+    if path in _bundles:
+        return True
+    if not os.path.isfile(path):
+        return False
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(BUNDLE_MAGIC)) == BUNDLE_MAGIC
+    except (IOError, OSError):
+        return False
+
+
+def get_bundle(bundle_path):
+    """
+    Return the Bundle at bundle_path, opening it the first time it is
+    requested by this process and again whenever the file has since been
+    replaced or changed.
+    """
+    result = _bundles.get(bundle_path)
+    if result is None or result.file_key != _get_file_key(
+        os.stat(bundle_path)
+    ):
+        # A Bundle already handed out keeps its own mapping, so anything
+        # still reading from it is unaffected.
+        result = Bundle(bundle_path)
+        _bundles[bundle_path] = result
+    return result
+
+
+def _get_file_key(file_stat):
+    """
+    Return what identifies the version of a file from its os.stat() result.
+    Rewriting a bundle replaces it with a new file, changing the inode, and
+    changing it in place changes the mtime or size.
+    """
+    return (
+        file_stat.st_dev,
+        file_stat.st_ino,
+        index.get_stat_mtime(file_stat),
+        file_stat.st_size,
+    )
+
+
+def get_bundle_for_path(path):
+    """
+    Return the open Bundle containing path, or None if path is not inside a
+    bundle opened by this process. Does not touch the disk.
+    """
+    for bundle_path, result in _bundles.items():
+        if path.startswith(bundle_path + os.sep):
+            return result
+    return None
+
+
+def read_file(path):
+    """
+    Return the contents of the file at path, which may be a regular file or a
+    file inside a bundle.
+    """
+    containing_bundle = get_bundle_for_path(path)
+    if containing_bundle:
+        return containing_bundle.read(path)
+
+    with open(path, 'r') as f:
+        return f.read()
+
+
+def read_chunks(path, chunk_size):
+    """
+    Yield the contents of the file at path, which may be a regular file or a
+    file inside a bundle, in chunks of about chunk_size characters.
+    """
+    containing_bundle = get_bundle_for_path(path)
+    if containing_bundle:
+        for chunk in containing_bundle.read_chunks(path, chunk_size):
+            yield chunk
+        return
+
+    with open(path, 'r') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def write_file_to(path, fd, buffer):
+    """
+    Write the raw bytes of the file at path, which may be a regular file or a
+    file inside a bundle, to the file descriptor fd. Regular files are copied
+    by the kernel with os.sendfile where it can, and otherwise read into
+    buffer, a bytearray reused between calls.
+    """
+    containing_bundle = get_bundle_for_path(path)
+    if containing_bundle:
+        containing_bundle.write_to(path, fd)
+        return
+
+    with open(path, 'rb') as f:
+        if _sendfile(f.fileno(), fd):
+            return
+        view = memoryview(buffer)
+        try:
+            while True:
+                num_read = f.readinto(buffer)
+                if not num_read:
+                    break
+                _write_all(fd, view[:num_read])
+        finally:
+            view.release()
+
+
+def _sendfile(in_fd, out_fd):
+    """
+    Copy everything in in_fd to out_fd with os.sendfile. False if sendfile
+    can't copy between these, in which case nothing has been copied, else
+    True.
+    """
+    sendfile = getattr(os, 'sendfile', None)
+    if sendfile is None:
+        return False
+
+    offset = 0
+    while True:
+        try:
+            num_sent = sendfile(out_fd, in_fd, offset, _SENDFILE_BLOCK_SIZE)
+        except OSError as e:
+            if offset == 0 and e.errno in _SENDFILE_UNSUPPORTED_ERRNOS:
+                return False
+            raise
+        if num_sent == 0:
+            return True
+        offset += num_sent
+
+
+def _write_all(fd, data):
+    """Write all of data, a bytes-like object, to the file descriptor fd."""
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view):]
+
+
+def write_bundle(dir_to_bundle, bundle_path):
+    """
+    Pack every file beneath dir_to_bundle into a bundle at bundle_path. Returns
+    the number of files bundled.
+    """
+    entries = []
+    bundle_abs_path = os.path.abspath(bundle_path)
+
+    for basedir, dirs, file_names in os.walk(dir_to_bundle):
+        # Sort so that bundling the same tree always gives the same bundle.
+        dirs.sort()
+        for file_name in sorted(file_names):
+            full_path = os.path.join(basedir, file_name)
+            if os.path.abspath(full_path) == bundle_abs_path:
+                continue
+            rel_path = os.path.relpath(full_path, dir_to_bundle)
+            with open(full_path, 'rb') as f:
+                body = f.read()
+            entries.append((
+                file_name.encode(BUNDLE_ENCODING),
+                rel_path.encode(BUNDLE_ENCODING),
+                body,
+            ))
+
+    # sort() is stable, so files sharing a name keep their walk order.
+    entries.sort(key=lambda entry: entry[0].decode(BUNDLE_ENCODING))
+
+    table_size = sum(
+        _RECORD.size + len(name) + len(rel_path)
+        for name, rel_path, body in entries
+    )
+
+    header = _HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(entries))
+    table = []
+    bodies = []
+    offset = _HEADER.size + table_size
+    for name, rel_path, body in entries:
+        table.append(_RECORD.pack(len(name), len(rel_path), offset, len(body)))
+        table.append(name)
+        table.append(rel_path)
+        bodies.append(body)
+        offset += len(body)
+
+    contents = b''.join([header] + table + bodies)
+    if not index.write_file_atomically(bundle_path, contents, binary=True):
+        raise IOError('could not write bundle to ' + bundle_path)
+
+    return len(entries)
@@ -0,0 +1,374 @@
+import marshal
+import os
+
+from eg import bundle
+from eg import config
+from eg import index
+
+
+# The file name suffix expected for example files.
+EXAMPLE_FILE_SUFFIX = '.md'
+
+# The name of the file storing mappings of aliases to programs with entries.
+ALIAS_FILE_NAME = 'aliases.json'
+
+# Bump this when the layout of an aliases snapshot changes.
+ALIAS_SNAPSHOT_VERSION = 1
+
+# The directory, within the eg cache dir, holding snapshots of the aliases.
+ALIAS_SNAPSHOT_DIR_NAME = 'aliases'
+
+# Catalogs already built by this process, keyed by (examples_dir, custom_dir).
+_catalogs = {}
+
+
+class Catalog():
+    """
+    Everything eg knows about the examples in a pair of directories: which
+    programs have default examples, which have custom examples, and which names
+    are aliases. It is built from a single pass over each directory, after
+    which all queries are answered from memory.
+    """
+
+    def __init__(self, examples_dir, custom_dir):
+        """
+        Build the Catalog:
+            examples_dir: the directory of examples that ship with eg, or None
+            custom_dir: the directory of user-defined examples, or None
+        Both paths must be fully expanded. Either may be a bundle created by
+        bundle.write_bundle() instead of a directory.
+        """
+        self.examples_dir = examples_dir
+        self.custom_dir = custom_dir
+
+        default_index, default_mtimes = load_file_index(examples_dir)
+        custom_index, custom_mtimes = load_file_index(custom_dir)
+
+        # {program: [path, ...]}
+        self.default_paths = _get_example_paths(default_index)
+        self.custom_paths = _get_example_paths(custom_index)
+
+        # The aliases files at the top of each directory. Those in the custom
+        # dir win over those shipped with eg.
+        alias_file_paths = [
+            _get_alias_file_path(examples_dir, default_index),
+            _get_alias_file_path(custom_dir, custom_index),
+        ]
+        alias_file_mtimes = _get_alias_file_mtimes(alias_file_paths)
+
+        # {alias: program}, with every alias mapped straight to the program
+        # it finally resolves to, so that resolving is a single lookup.
+        # Aliases that never resolve to a program because they lead into a
+        # cycle are left out and kept in alias_cycles instead. custom_aliases
+        # is the set of aliases defined in the custom dir.
+        self.aliases, self.alias_cycles, self.custom_aliases = _load_aliases(
+            alias_file_paths
+        )
+
+        # The mtimes of everything the Catalog was built from. Editing an
+        # aliases file doesn't change the mtime of its directory, so they are
+        # tracked separately.
+        self._mtimes = [
+            default_mtimes,
+            custom_mtimes,
+            alias_file_mtimes,
+        ]
+
+    def is_stale(self):
+        """
+        True if any of the directories, bundles, or aliases the Catalog was
+        built from have changed since, else False.
+        """
+        return any(index.is_stale(mtimes) for mtimes in self._mtimes)
+
+    def get_mtimes(self):
+        """
+        Return a list of the dicts of {path: mtime} for everything the Catalog
+        was built from, in the format described in index.load_index(). Any of
+        them may be None.
+        """
+        return list(self._mtimes)
+
+    def resolve(self, program):
+        """
+        Take a program that may be an alias for another program and return the
+        resolved program.
+
+        Aliases of aliases are followed until they reach a program that is not
+        an alias. Aliases in a cycle are not resolved.
+
+        Returns the original program if the program is not an alias.
+        """
+        return self.aliases.get(program, program)
+
+    def get_default_paths(self, program):
+        """Return the paths of the default examples for program."""
+        return list(self.default_paths.get(program, []))
+
+    def get_custom_paths(self, program):
+        """Return the paths of the custom examples for program."""
+        return list(self.custom_paths.get(program, []))
+
+    def get_paths(self, program):
+        """
+        Return the paths of all the examples for program, custom examples
+        first. program is not resolved, so aliases should be resolved first.
+        """
+        return self.get_custom_paths(program) + self.get_default_paths(program)
+
+    def get_default_programs(self):
+        """Return a set of the programs with default examples."""
+        return set(self.default_paths)
+
+    def get_custom_programs(self):
+        """Return a set of the programs with custom examples."""
+        return set(self.custom_paths)
+
+
+def get_catalog(config, refresh_if_stale=False):
+    """
+    Return the Catalog for the directories in config. A Catalog is built at
+    most once per process for each pair of directories, unless
+    refresh_if_stale is True and the directories have changed since it was
+    built. Long-running processes should pass refresh_if_stale=True.
+    """
+    key = (config.examples_dir, config.custom_dir)
+    result = _catalogs.get(key)
+    if result is not None and refresh_if_stale and result.is_stale():
+        result = None
+    if result is None:
+        result = Catalog(config.examples_dir, config.custom_dir)
+        _catalogs[key] = result
+    return result
+
+
+def clear_catalogs():
+    """
+    Forget every Catalog built by this process, so that the next call to
+    get_catalog() sees any changes made to the directories since.
+    """
+    _catalogs.clear()
+
+
+def get_alias_closure(aliases):
+    """
+    Take aliases in the format {'alias': 'program'}, where a program may itself
+    be an alias, and return a tuple of (closure, cycles):
+        closure: a dict mapping every alias to the program it finally resolves
+            to, which is not an alias
+        cycles: a set of the aliases that never resolve to a program because
+            following them leads around a cycle. These are not in closure.
+    """
+    closure = {}
+    cycles = set()
+    for alias in aliases:
+        # Follow the chain until reaching something already known, or a name
+        # that isn't an alias, or a name seen before on this chain. This is
+        # done iteratively, as chains may be long.
+        chain = []
+        on_chain = set()
+        name = alias
+        while (
+            name in aliases and
+            name not in closure and
+            name not in cycles and
+            name not in on_chain
+        ):
+            chain.append(name)
+            on_chain.add(name)
+            name = aliases[name]
+
+        if name in cycles or name in on_chain:
+            cycles.update(chain)
+        else:
+            target = closure.get(name, name)
+            for link in chain:
+                closure[link] = target
+    return closure, cycles
+
+
+def get_file_index(path):
+    """
+    Return an index in the format of index.get_index() for path, which may be
+    either a directory or a bundle.
+    """
+    return load_file_index(path)[0]
+
+
+def load_file_index(path):
+    """
+    Return a tuple of (file_index, mtimes) for path, which may be either a
+    directory or a bundle. mtimes is as described in index.load_index().
+    """
+    if bundle.is_bundle(path):
+        file_index = bundle.get_bundle(path).get_index()
+        return file_index, {path: index.get_mtime(path)}
+    return index.load_index(path)
+
+
+def is_example_file(file_name):
+    """
+    True if the file_name is an example file, else False.
+    """
+    return file_name.endswith(EXAMPLE_FILE_SUFFIX)
+
+
+def get_program_from_file_name(file_name):
+    """
+    Return the file name without the suffix, or the file name itself if it
+    does not have the suffix.
+    """
+    if is_example_file(file_name):
+        return file_name[:-len(EXAMPLE_FILE_SUFFIX)]
+    return file_name
+
+
+def _get_example_paths(file_index):
+    """
+    Take an index as returned by index.get_index() and return a dict of
+    {program: [path, ...]} containing only example files.
+    """
+    result = {}
+    for file_name, paths in file_index.items():
+        if is_example_file(file_name):
+            program = get_program_from_file_name(file_name)
+            result.setdefault(program, []).extend(paths)
+    return result
+
+
+def _get_alias_file_path(examples_dir, file_index):
+    """
+    Return the path to the aliases file at the top of examples_dir, or None if
+    there is no such file according to file_index.
+    """
+    if not examples_dir:
+        return None
+
+    alias_file_path = os.path.join(examples_dir, ALIAS_FILE_NAME)
+    if alias_file_path not in file_index.get(ALIAS_FILE_NAME, []):
+        return None
+
+    return alias_file_path
+
+
+def _get_alias_file_mtimes(alias_file_paths):
+    """
+    Return a dict of {path: mtime} for the aliases files in alias_file_paths,
+    any of which may be None. Files inside bundles are covered by the mtime of
+    the bundle itself.
+    """
+    result = {}
+    for alias_file_path in alias_file_paths:
+        if alias_file_path and not bundle.get_bundle_for_path(alias_file_path):
+            result[alias_file_path] = index.get_mtime(alias_file_path)
+    return result
+
+
+def _load_aliases(alias_file_paths):
+    """
+    Return a tuple of (closure, cycles, custom_aliases) for the aliases files
+    at alias_file_paths, a list of the default and the custom aliases file,
+    either of which may be None. closure and cycles are as returned by
+    get_alias_closure() for the aliases in both files, with those in the
+    custom file winning, and custom_aliases is the set of aliases in the
+    custom file.
+
+    The result is kept in a snapshot in the eg cache dir, so that as long as
+    the aliases files are unchanged it is loaded with a single read rather
+    than by parsing every file and computing the closure again.
+    """
+    if not any(alias_file_paths):
+        return {}, set(), set()
+
+    snapshot_path = _get_alias_snapshot_path(alias_file_paths)
+    snapshot_key = _get_alias_snapshot_key(alias_file_paths)
+    result = _read_alias_snapshot(snapshot_path, snapshot_key)
+    if result is not None:
+        return result
+
+    default_file_path, custom_file_path = alias_file_paths
+    aliases = _get_aliases(default_file_path)
+    custom_aliases = _get_aliases(custom_file_path)
+    aliases.update(custom_aliases)
+    closure, cycles = get_alias_closure(aliases)
+    result = closure, cycles, set(custom_aliases)
+
+    _write_alias_snapshot(snapshot_path, snapshot_key, result)
+    return result
+
+
+def _get_aliases(alias_file_path):
+    """
+    Return the aliases defined in the aliases file at alias_file_path, in the
+    format {'alias': 'resolved_program'}. If alias_file_path is None, returns
+    an empty dict.
+    """
+    if not alias_file_path:
+        return {}
+
+    import json
+    return json.loads(bundle.read_file(alias_file_path))
+
+
+def _get_alias_snapshot_path(alias_file_paths):
+    # The paths of the aliases files are part of the key stored in the
+    # snapshot.
+    return config.get_snapshot_path(
+        ALIAS_SNAPSHOT_DIR_NAME,
+        '\0'.join(path or '' for path in alias_file_paths)
+    )
+
+
+def _get_alias_snapshot_key(alias_file_paths):
+    """
+    Return the key a snapshot of the aliases in alias_file_paths must have to
+    be used, or None if a file can't be found or was modified too recently for
+    its mtime to be trusted. Files inside bundles are represented by the
+    bundle.
+    """
+    stats = []
+    for alias_file_path in alias_file_paths:
+        if not alias_file_path:
+            stats.append(None)
+            continue
+        stamp = index.get_trusted_stamp(alias_file_path)
+        if stamp is None:
+            return None
+        stats.append((alias_file_path,) + stamp)
+    return (ALIAS_SNAPSHOT_VERSION, tuple(stats))
+
+
+def _read_alias_snapshot(snapshot_path, snapshot_key):
+    """
+    Return the (closure, cycles, custom_aliases) in the snapshot at
+    snapshot_path, or None if it is missing, damaged, or doesn't have
+    snapshot_key.
+    """
+    if snapshot_key is None:
+        return None
+    try:
+        with open(snapshot_path, 'rb') as f:
+            key, closure, cycles, custom_aliases = marshal.loads(f.read())
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if key != snapshot_key:
+        return None
+    return closure, set(cycles), set(custom_aliases)
+
+
+def _write_alias_snapshot(snapshot_path, snapshot_key, aliases):
+    """
+    Save aliases, a tuple of (closure, cycles, custom_aliases), as the
+    snapshot at snapshot_path with snapshot_key.
+    """
+    if snapshot_key is None:
+        return
+    closure, cycles, custom_aliases = aliases
+    try:
+        contents = marshal.dumps(
+            (snapshot_key, closure, sorted(cycles), sorted(custom_aliases))
+        )
+    except (TypeError, ValueError):
+        # Something in an aliases file that marshal can't represent.
+        return
+    index.write_file_atomically(snapshot_path, contents, binary=True)
@@ -0,0 +1,308 @@
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+
+
+# A thin client for the eg daemon. It deliberately imports nothing from eg at
+# module level, so that asking a running daemon to render costs little more
+# than starting the interpreter. If no daemon is running it falls back to
+# running eg in process.
+#
+# Only the user running eg may talk to their daemon. The socket must be in a
+# directory that user owns and nobody else can enter, and where the platform
+# can tell, the process at the other end must belong to the same user. The
+# client never trusts the daemon with anything it runs: the pager comes from
+# the client's own arguments and egrc.
+
+# Environment variable pointing at the per-user runtime directory.
+ENV_XDG_RUNTIME_DIR = 'XDG_RUNTIME_DIR'
+
+# Used if $XDG_RUNTIME_DIR is not set. A per-user directory is created in it.
+DEFAULT_RUNTIME_PARENT_DIR = '/tmp'
+
+SOCKET_NAME = 'daemon.sock'
+
+# Values of the 'status' field of a response header.
+STATUS_OK = 'ok'
+STATUS_NO_ENTRY = 'no-entry'
+STATUS_FALLBACK = 'fallback'
+
+# Fields in requests and response headers.
+FIELD_ARGV = 'argv'
+FIELD_CWD = 'cwd'
+FIELD_STATUS = 'status'
+FIELD_MESSAGE = 'message'
+
+# Requests, headers, and bodies are sent in this encoding.
+ENCODING = 'utf-8'
+
+# How long to wait on the daemon before giving up and rendering in process.
+TIMEOUT_SECONDS = 10
+
+_CHUNK_SIZE = 64 * 1024
+
+# The options of eg the client needs the values of itself, to page output.
+_CONFIG_FILE_OPTIONS = ['-f', '--config-file']
+_PAGER_CMD_OPTIONS = ['--pager-cmd']
+
+# struct ucred, as returned for SO_PEERCRED on Linux: pid, uid, and gid.
+_UCRED_FORMAT = '3i'
+
+# struct xucred, as returned for LOCAL_PEERCRED on macOS and the BSDs. It
+# starts with a version and the uid, followed by groups, which aren't needed.
+_XUCRED_FORMAT = '2I'
+_XUCRED_SIZE = 76
+_SOL_LOCAL = 0
+
+
+def get_runtime_dir():
+    """
+    Return the per-user directory holding the daemon socket. It is not
+    guaranteed to exist.
+    """
+    runtime_dir = os.getenv(ENV_XDG_RUNTIME_DIR)
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'eg')
+    return os.path.join(
+        DEFAULT_RUNTIME_PARENT_DIR,
+        'eg-{}'.format(os.getuid())
+    )
+
+
+def get_socket_path():
+    """Return the path of the per-user daemon socket."""
+    return os.path.join(get_runtime_dir(), SOCKET_NAME)
+
+
+def connect(socket_path=None):
+    """
+    Return a socket connected to the daemon, or None if no daemon is running
+    or the socket can't be trusted to lead to one run by this user.
+    """
+    socket_path = socket_path or get_socket_path()
+    if not is_private_dir(os.path.dirname(socket_path)):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(TIMEOUT_SECONDS)
+    try:
+        sock.connect(socket_path)
+    except (socket.error, OSError):
+        sock.close()
+        return None
+    if not is_peer_trusted(sock):
+        sock.close()
+        return None
+    return sock
+
+
+def is_private_dir(path):
+    """
+    True if path is a directory, not a link to one, owned by this user and
+    with mode 0700, else False.
+    """
+    try:
+        dir_stat = os.lstat(path)
+    except OSError:
+        return False
+    return (
+        stat.S_ISDIR(dir_stat.st_mode) and
+        dir_stat.st_uid == os.getuid() and
+        stat.S_IMODE(dir_stat.st_mode) == 0o700
+    )
+
+
+def is_peer_trusted(sock):
+    """
+    True if the process at the other end of sock, a connected Unix socket,
+    belongs to this user, else False. Where the platform can't tell, True is
+    returned, and the private directory holding the socket is relied on.
+    """
+    peer_uid = get_peer_uid(sock)
+    return peer_uid is None or peer_uid == os.getuid()
+
+
+def get_peer_uid(sock):
+    """
+    Return the uid of the process at the other end of sock, a connected Unix
+    socket, or None if the platform can't tell.
+    """
+    try:
+        if hasattr(socket, 'SO_PEERCRED'):
+            credentials = sock.getsockopt(
+                socket.SOL_SOCKET,
+                socket.SO_PEERCRED,
+                struct.calcsize(_UCRED_FORMAT)
+            )
+            return struct.unpack(_UCRED_FORMAT, credentials)[1]
+        if hasattr(socket, 'LOCAL_PEERCRED'):
+            credentials = sock.getsockopt(
+                _SOL_LOCAL,
+                socket.LOCAL_PEERCRED,
+                _XUCRED_SIZE
+            )
+            return struct.unpack_from(_XUCRED_FORMAT, credentials)[1]
+    except (socket.error, OSError, struct.error):
+        # Asking failed, so don't trust the peer.
+        return -1
+    return None
+
+
+def request(argv, cwd, socket_path=None):
+    """
+    Ask the daemon to handle argv as if eg had been run in cwd.
+
+    Returns a tuple of (header, response_file), where header is the decoded
+    response header and response_file is a binary file positioned at the start
+    of the rendered body. The caller must close response_file. Returns None if
+    no daemon is running or it did not respond.
+    """
+    sock = connect(socket_path)
+    if sock is None:
+        return None
+
+    try:
+        message = json.dumps({FIELD_ARGV: argv, FIELD_CWD: cwd})
+        sock.sendall(message.encode(ENCODING) + b'\n')
+        sock.shutdown(socket.SHUT_WR)
+
+        response_file = sock.makefile('rb')
+        header_line = response_file.readline()
+        header = json.loads(header_line.decode(ENCODING))
+    except (socket.error, OSError, ValueError):
+        sock.close()
+        return None
+
+    # The file holds its own reference to the socket.
+    sock.close()
+    return header, response_file
+
+
+def main():
+    """
+    Entry point for the client. Renders via the daemon if one is running,
+    otherwise runs eg in process.
+    """
+    argv = sys.argv[1:]
+    is_terminal = _is_terminal()
+    if not is_terminal and '--color' not in argv:
+        # As when eg runs in process, piped output isn't colored unless color
+        # is asked for.
+        argv = ['--no-color'] + argv
+
+    response = request(argv, os.getcwd())
+    if response is None:
+        _run_in_process()
+        return
+
+    header, response_file = response
+    try:
+        status = header.get(FIELD_STATUS)
+        if status == STATUS_OK and not is_terminal:
+            _write_response(response_file)
+        elif status == STATUS_OK:
+            _show_response(_get_pager_cmd(argv), response_file)
+        elif status == STATUS_NO_ENTRY:
+            print(header[FIELD_MESSAGE])
+        else:
+            _run_in_process()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        response_file.close()
+
+
+def _run_in_process():
+    """Run eg in this process, exactly as if the daemon didn't exist."""
+    from eg import core
+    core.run_eg()
+
+
+def _is_terminal():
+    try:
+        return sys.stdout.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def _write_response(response_file):
+    """Write the body of a response to stdout as it arrives."""
+    out = getattr(sys.stdout, 'buffer', sys.stdout)
+    try:
+        while True:
+            chunk = response_file.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(chunk)
+        out.flush()
+    except (IOError, OSError):
+        # Whatever was reading stdout quit before reading everything.
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        os.close(devnull)
+
+
+def _get_pager_cmd(argv):
+    """
+    Return the pager command eg would use if run with argv, resolved from argv
+    and the egrc as eg itself does. This never comes from the daemon, so that
+    nothing at the other end of the socket decides what the client runs.
+    """
+    # Imported here as only paging needs it.
+    from eg import config
+    return config.get_pager_cmd(
+        _get_option_value(argv, _CONFIG_FILE_OPTIONS),
+        _get_option_value(argv, _PAGER_CMD_OPTIONS)
+    )
+
+
+def _get_option_value(argv, option_names):
+    """
+    Return the value given in argv for the option with any of option_names,
+    as `--option value`, `--option=value`, or `-ovalue` for a short option, or
+    None if it isn't given. The last value wins, as with argparse.
+    """
+    result = None
+    i = 0
+    while i < len(argv):
+        arg = argv[i]
+        if arg == '--':
+            break
+        for name in option_names:
+            if arg == name and i + 1 < len(argv):
+                i += 1
+                result = argv[i]
+            elif name.startswith('--') and arg.startswith(name + '='):
+                result = arg[len(name) + 1:]
+            elif (
+                not name.startswith('--') and
+                arg.startswith(name) and
+                len(arg) > len(name)
+            ):
+                result = arg[len(name):]
+        i += 1
+    return result
+
+
+def _show_response(pager_cmd, response_file):
+    """
+    Show the body of a response on the terminal the same way as eg shows its
+    own output: written straight out if it fits on the screen, and otherwise
+    streamed to pager_cmd as it arrives.
+    """
+    # Imported here as only paging needs them.
+    import codecs
+    from eg import util
+    decoder = codecs.getincrementaldecoder(ENCODING)('replace')
+
+    def get_chunks():
+        while True:
+            chunk = response_file.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', True)
+
+    util.show_chunks(get_chunks(), pager_cmd)
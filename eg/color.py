@@ -2,6 +2,9 @@ import re
 import sys
 
 
+_BACKTICKS_PATTERN = re.compile('`([^`]+)`')
+
+
 class EgColorizer():
 
     def __init__(self, color_config):
@@ -66,6 +69,62 @@ class EgColorizer():
 
     def colorize_text(self, text):
         """Colorize the text."""
+        # This is done in a single pass over the lines of the text, which
+        # classifies each line once as a heading, a block indent, or prose.
+        # The output is identical to that of colorize_text_in_passes(), which
+        # is kept for the color configs this can't handle.
+        if not self._can_colorize_in_one_pass():
+            return self.colorize_text_in_passes(text)
+
+        color_config = self.color_config
+        heading_start = color_config.pound
+        heading_middle = color_config.pound_reset + color_config.heading
+        heading_end = color_config.heading_reset
+        code_start = '    ' + color_config.prompt
+        code_middle = color_config.prompt_reset + color_config.code
+        code_end = color_config.code_reset
+        backticks = (
+            '`' +
+            color_config.backticks +
+            r'\1' +
+            color_config.backticks_reset +
+            '`'
+        )
+        sub_backticks = _BACKTICKS_PATTERN.sub
+
+        lines = text.split('\n')
+        for i, line in enumerate(lines):
+            if line.startswith('#'):
+                rest = line.lstrip('#')
+                pounds = line[:len(line) - len(rest)]
+                if '`' in rest:
+                    rest = sub_backticks(backticks, rest)
+                lines[i] = (
+                    heading_start +
+                    pounds +
+                    heading_middle +
+                    rest +
+                    heading_end
+                )
+            elif line.startswith('    '):
+                # Backticks in block indents are part of the example code, so
+                # are left alone.
+                if line.startswith('$', 4):
+                    lines[i] = (
+                        code_start + '$' + code_middle + line[5:] + code_end
+                    )
+                else:
+                    lines[i] = code_start + code_middle + line[4:] + code_end
+            elif '`' in line:
+                lines[i] = sub_backticks(backticks, line)
+
+        return '\n'.join(lines)
+
+    def colorize_text_in_passes(self, text):
+        """
+        Colorize the text with a separate pass for each kind of thing that is
+        colored.
+        """
         # As originally implemented, this method acts upon all the contents of
         # the file as a single string using the MULTILINE option of the re
         # package. I believe this was ostensibly for performance reasons, but
@@ -84,6 +143,23 @@ class EgColorizer():
         result = self.colorize_backticks(result)
         return result
 
+    def _can_colorize_in_one_pass(self):
+        """
+        True if colorize_text() gives the same output as
+        colorize_text_in_passes() for the color config, else False.
+
+        Each pass sees the colors added by the passes before it, so colors
+        containing newlines or backticks, or a pound color starting with a
+        block indent, can change what later passes match. Backslashes in colors
+        are interpreted as escapes by re.sub().
+        """
+        for value in self.color_config:
+            if not isinstance(value, str):
+                return False
+            if '\n' in value or '`' in value or '\\' in value:
+                return False
+        return not self.color_config.pound.startswith('    ')
+
     def _color_helper(self, text, pattern, repl):
         # < 2.7 didn't have the flags named argument.
         if sys.version_info < (2, 7):
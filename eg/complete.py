@@ -0,0 +1,237 @@
+import array
+import marshal
+import sys
+
+from eg import config
+from eg import index
+
+
+# Completes the names of programs for shells, e.g. for `eg ta<TAB>`. Shells
+# run `eg --complete PREFIX` on every keypress, so this skips what eg normally
+# does at startup: arguments aren't parsed with argparse, only the directories
+# are read from the egrc, and no Catalog is built. Instead the names of every
+# program and alias are kept sorted in a table in the eg cache dir, along with
+# the mtimes of everything they came from. Completing is reading the table,
+# checking the mtimes, and a binary search for the first name with the prefix.
+#
+# bin/eg checks for `--complete PREFIX` before importing eg.core at all, and
+# eg.core handles --complete alongside the other options when it is combined
+# with --config-file, --examples-dir, or --custom-dir.
+
+# Bump this when the layout of a table changes.
+COMPLETE_TABLE_VERSION = 1
+
+# The directory, within the eg cache dir, holding the tables.
+COMPLETE_DIR_NAME = 'complete'
+
+# The typecode of the array of offsets into the names in a table.
+_OFFSET_TYPECODE = 'I'
+
+# The shells completion scripts can be generated for.
+SHELLS = ['bash', 'zsh', 'fish']
+
+_BASH_SCRIPT = """# bash completion for eg. Load it with:
+#   source <(eg --completion-script bash)
+_eg_complete() {
+    local cur="${COMP_WORDS[COMP_CWORD]}"
+    case "$cur" in
+        -*) return 0 ;;
+    esac
+    local IFS=$'\\n'
+    COMPREPLY=($(command eg --complete "$cur" 2>/dev/null))
+}
+complete -F _eg_complete eg
+"""
+
+_ZSH_SCRIPT = """#compdef eg
+# zsh completion for eg. Load it after compinit with:
+#   source <(eg --completion-script zsh)
+_eg() {
+    local -a programs
+    programs=("${(@f)$(command eg --complete "$PREFIX" 2>/dev/null)}")
+    compadd -a programs
+}
+compdef _eg eg
+"""
+
+_FISH_SCRIPT = """# fish completion for eg. Load it with:
+#   eg --completion-script fish | source
+complete -c eg -f -a '(command eg --complete (commandline -ct) 2>/dev/null)'
+"""
+
+_SCRIPTS = {
+    'bash': _BASH_SCRIPT,
+    'zsh': _ZSH_SCRIPT,
+    'fish': _FISH_SCRIPT,
+}
+
+
+def get_fast_prefix(argv):
+    """
+    Return the prefix if argv, not including the program name, is exactly
+    `--complete PREFIX` or `--complete`, else None.
+    """
+    if argv[:1] != ['--complete'] or len(argv) > 2:
+        return None
+    return argv[1] if len(argv) == 2 else ''
+
+
+def show_completions(
+    prefix,
+    egrc_path=None,
+    examples_dir=None,
+    custom_dir=None
+):
+    """
+    Write the names of the programs and aliases starting with prefix to
+    stdout, one per line. The dirs are resolved as for the rest of eg.
+    """
+    examples_dir, custom_dir = config.get_example_dirs(
+        egrc_path,
+        examples_dir,
+        custom_dir
+    )
+    names = get_completions(prefix, examples_dir, custom_dir)
+    if names:
+        sys.stdout.write('\n'.join(names) + '\n')
+
+
+def get_completion_script(shell):
+    """
+    Return the script that sets up completion of eg for shell, one of SHELLS.
+    """
+    return _SCRIPTS[shell]
+
+
+def get_completions(prefix, examples_dir, custom_dir):
+    """
+    Return the sorted names of the programs and aliases with examples in
+    examples_dir and custom_dir that start with prefix. Both dirs must be
+    fully expanded.
+    """
+    names, offsets = _get_table(examples_dir, custom_dir)
+    result = []
+    for i in range(_find_first(names, offsets, prefix), len(offsets) - 1):
+        name = _get_name(names, offsets, i)
+        if not name.startswith(prefix):
+            break
+        result.append(name)
+    return result
+
+
+def _get_table(examples_dir, custom_dir):
+    """
+    Return the table of names for examples_dir and custom_dir, from the stored
+    table if it is up to date, and otherwise from a Catalog, storing it for
+    next time.
+
+    A table is a tuple of (names, offsets). names is every name, sorted and
+    joined by newlines, and offsets is an array of where each name starts in
+    it, followed by where one after it would start. A single string and array
+    load far more quickly than a list of tens of thousands of strings.
+    """
+    table_path = _get_table_path(examples_dir, custom_dir)
+    table = _read_table(table_path, examples_dir, custom_dir)
+    if table is not None:
+        return table
+
+    # Imported here so that completing from the table doesn't pay for it.
+    from eg import catalog
+    examples = catalog.Catalog(examples_dir, custom_dir)
+    table = _build_table(sorted(
+        examples.get_default_programs() |
+        examples.get_custom_programs() |
+        set(examples.aliases)
+    ))
+    _write_table(
+        table_path,
+        examples_dir,
+        custom_dir,
+        examples.get_mtimes(),
+        table
+    )
+    return table
+
+
+def _build_table(sorted_names):
+    offsets = array.array(_OFFSET_TYPECODE, [0])
+    for name in sorted_names:
+        offsets.append(offsets[-1] + len(name) + 1)
+    return '\n'.join(sorted_names), offsets
+
+
+def _get_name(names, offsets, i):
+    return names[offsets[i]:offsets[i + 1] - 1]
+
+
+def _find_first(names, offsets, prefix):
+    """
+    Return the index of the first name in the table not sorting before
+    prefix, which is the first starting with prefix if any do.
+    """
+    low = 0
+    high = len(offsets) - 1
+    while low < high:
+        middle = (low + high) // 2
+        if _get_name(names, offsets, middle) < prefix:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def _get_table_path(examples_dir, custom_dir):
+    # The dirs are part of the table.
+    return config.get_snapshot_path(
+        COMPLETE_DIR_NAME,
+        '{}\0{}'.format(examples_dir or '', custom_dir or '')
+    )
+
+
+def _read_table(table_path, examples_dir, custom_dir):
+    """
+    Return the table stored at table_path, or None if it is missing, damaged,
+    for other dirs, or anything it was built from has changed.
+    """
+    try:
+        with open(table_path, 'rb') as f:
+            version, dirs, mtimes, names, offset_bytes = marshal.loads(
+                f.read()
+            )
+        offsets = array.array(_OFFSET_TYPECODE)
+        offsets.frombytes(offset_bytes)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if version != COMPLETE_TABLE_VERSION:
+        return None
+    if dirs != (examples_dir, custom_dir):
+        return None
+    # Each name is followed by a newline, except the last. An empty table
+    # has no names, and a single offset of 0.
+    expected_end = len(names) + 1 if len(offsets) > 1 else 0
+    if not offsets or offsets[-1] != expected_end:
+        return None
+    if any(index.is_stale(path_mtimes) for path_mtimes in mtimes):
+        return None
+    return names, offsets
+
+
+def _write_table(table_path, examples_dir, custom_dir, mtimes, table):
+    """
+    Store table at table_path, unless mtimes, the mtimes of everything it was
+    built from, can't be trusted to change when a name does.
+    """
+    if not all(index.is_trusted(path_mtimes) for path_mtimes in mtimes):
+        return
+
+    try:
+        contents = marshal.dumps((
+            COMPLETE_TABLE_VERSION,
+            (examples_dir, custom_dir),
+            mtimes,
+            table[0],
+            table[1].tobytes(),
+        ))
+    except ValueError:
+        return
+    index.write_file_atomically(table_path, contents, binary=True)
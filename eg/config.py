@@ -1,20 +1,29 @@
-import ast
+import marshal
 import os
 
 from collections import namedtuple
-from eg import substitute
 
-# Support Python 2 and 3.
-try:
-    import ConfigParser
-except:
-    from configparser import ConfigParser
+# ast and ConfigParser are imported only when an egrc is actually read, so that
+# eg doesn't pay for them when there is no egrc or it is never consulted.
+#
+# The values read from an egrc are also kept in a snapshot in the eg cache dir,
+# keyed by the path, size, and mtime of the egrc. As long as the egrc is
+# unchanged, later runs load the values from the snapshot with a single read
+# and never parse the egrc or import either module. Paths in the snapshot are
+# kept as they were written in the egrc and are expanded on every run, as they
+# may refer to environment variables.
 
 
 # Environment variables to try for accessing an editor.
 ENV_VISUAL = 'VISUAL'
 ENV_EDITOR = 'EDITOR'
 
+# Environment variable pointing at the base directory for user configuration.
+ENV_XDG_CONFIG_HOME = 'XDG_CONFIG_HOME'
+
+# Environment variable pointing at the base directory for user caches.
+ENV_XDG_CACHE_HOME = 'XDG_CACHE_HOME'
+
 # The directory containing example files, relative to the eg executable. The
 # directory structure is assumed to be:
 # eg.py*
@@ -24,8 +33,14 @@ ENV_EDITOR = 'EDITOR'
 DEFAULT_EXAMPLES_DIR = os.path.join(os.path.dirname(__file__), 'examples')
 DEFAULT_CUSTOM_DIR = None
 DEFAULT_EGRC_PATH = os.path.join('~', '.egrc')
+DEFAULT_XDG_CONFIG_HOME = os.path.join('~', '.config')
 DEFAULT_USE_COLOR = True
 
+# Where caches live if $XDG_CACHE_HOME is not set. eg keeps its caches in an
+# `eg` directory beneath this.
+DEFAULT_CACHE_HOME = os.path.join('~', '.cache')
+CACHE_DIR_NAME = 'eg'
+
 # We're using less -R to support color on Unix machines, which by default don't
 # let their output from less be colorized. Other options:
 # -M: show line number information in the bottom of screen (current/pages X%)
@@ -40,6 +55,12 @@ DEFAULT_EDITOR_CMD = None
 # We need this just because the ConfigParser library requires it.
 DEFAULT_SECTION = 'eg-config'
 
+# Bump this when the layout of an egrc snapshot changes.
+EGRC_SNAPSHOT_VERSION = 1
+
+# The directory, within the eg cache dir, holding egrc snapshots.
+EGRC_SNAPSHOT_DIR_NAME = 'config'
+
 # Properties in the rc file.
 EG_EXAMPLES_DIR = 'examples-dir'
 CUSTOM_EXAMPLES_DIR = 'custom-dir'
@@ -70,6 +91,24 @@ Config = namedtuple(
     ]
 )
 
+# The values in an egrc as they were written, before paths are expanded and
+# substitutions are parsed. Anything not in the egrc is None.
+#    colors: a tuple of the values of a ColorConfig
+#    subs: a list of substitutions in their list representation
+_EgrcValues = namedtuple(
+    '_EgrcValues',
+    [
+        'examples_dir',
+        'custom_dir',
+        'use_color',
+        'pager_cmd',
+        'editor_cmd',
+        'colors',
+        'squeeze',
+        'subs',
+    ]
+)
+
 # A struct with color values
 ColorConfig = namedtuple(
     'ColorConfig',
@@ -160,6 +199,22 @@ def get_egrc_config(cli_egrc_path):
     cli_egrc_path: the path to the egrc as given on the command line via
         --config-file
     """
+    config_path = _get_egrc_path(cli_egrc_path)
+
+    # Start as if nothing was defined in the egrc.
+    egrc_config = get_empty_config()
+
+    if os.path.isfile(config_path):
+        egrc_config = get_config_tuple_from_egrc(config_path)
+
+    return egrc_config
+
+
+def _get_egrc_path(cli_egrc_path):
+    """
+    Return the path of the egrc that get_egrc_config() reads, which may not
+    exist.
+    """
     # We have to be a little crafty here, because we want to support people
     # having an XDG_CONFIG_HOME dir that doesn't contain the config file. This
     # will allow a smooth transition for XDG users that started using eg when we
@@ -176,8 +231,7 @@ def get_egrc_config(cli_egrc_path):
       # The freedesktop.org spec says '$HOME/.config' should be used if the
       # environment variable is not set or is empty. os.getenv() will be falsey
       # if it is either not set (None) or an empty string.
-      default_xdg_dir = os.path.join('~', '.config')
-      xdg_home_dir = os.getenv('XDG_CONFIG_HOME') or default_xdg_dir
+      xdg_home_dir = os.getenv(ENV_XDG_CONFIG_HOME) or DEFAULT_XDG_CONFIG_HOME
 
       xdg_config_path = os.path.join(xdg_home_dir, 'eg', 'egrc')
       xdg_config_path = get_expanded_path(xdg_config_path)
@@ -188,14 +242,33 @@ def get_egrc_config(cli_egrc_path):
       # Fall back to our home directory.
       config_path = get_expanded_path(DEFAULT_EGRC_PATH)
 
+    return config_path
 
-    # Start as if nothing was defined in the egrc.
-    egrc_config = get_empty_config()
 
-    if os.path.isfile(config_path):
-        egrc_config = get_config_tuple_from_egrc(config_path)
-
-    return egrc_config
+def get_egrc_mtimes(cli_egrc_path):
+    """
+    Return the mtimes of every location the egrc might be read from, in the
+    order get_egrc_config() looks at them. A file appearing at a location that
+    takes priority changes the result, just as editing the file in use does.
+    Long-running processes can use this to tell when a resolved Config is out
+    of date.
+    """
+    xdg_home_dir = os.getenv(ENV_XDG_CONFIG_HOME) or DEFAULT_XDG_CONFIG_HOME
+    candidates = [
+        cli_egrc_path,
+        os.path.join(xdg_home_dir, 'eg', 'egrc'),
+        DEFAULT_EGRC_PATH,
+    ]
+    result = []
+    for path in candidates:
+        mtime = None
+        if path:
+            try:
+                mtime = os.stat(get_expanded_path(path)).st_mtime
+            except OSError:
+                pass
+        result.append(mtime)
+    return tuple(result)
 
 
 def get_resolved_config(
@@ -222,7 +295,7 @@ def get_resolved_config(
     # invalid. If you pass a path to a nonexistent egrc, for example, it's
     # helpful to know. If you don't have an egrc, and thus one isn't found
     # later at the default location, we don't want to notify them.
-    inform_if_paths_invalid(egrc_path, examples_dir, custom_dir)
+    inform_if_paths_invalid(egrc_path, examples_dir, custom_dir, debug=debug)
 
     # Expand the paths so we can use them with impunity later.
     examples_dir = get_expanded_path(examples_dir)
@@ -303,6 +376,55 @@ def get_resolved_config(
     return result
 
 
+def get_example_dirs(egrc_path, examples_dir, custom_dir):
+    """
+    Return a tuple of the fully expanded (examples_dir, custom_dir) that
+    get_resolved_config() would resolve for the same arguments, without
+    resolving anything else or checking that the paths exist. This is for
+    callers that need nothing but the examples and can't afford the rest.
+    """
+    egrc_values = _get_egrc_values_if_present(egrc_path)
+
+    resolved_examples_dir = get_priority(
+        get_expanded_path(examples_dir),
+        get_expanded_path(egrc_values and egrc_values.examples_dir),
+        DEFAULT_EXAMPLES_DIR
+    )
+    resolved_custom_dir = get_priority(
+        get_expanded_path(custom_dir),
+        get_expanded_path(egrc_values and egrc_values.custom_dir),
+        DEFAULT_CUSTOM_DIR
+    )
+    return (
+        get_expanded_path(resolved_examples_dir),
+        get_expanded_path(resolved_custom_dir),
+    )
+
+
+def get_pager_cmd(egrc_path, pager_cmd):
+    """
+    Return the pager command that get_resolved_config() would resolve for the
+    same arguments, without resolving anything else.
+    """
+    egrc_values = _get_egrc_values_if_present(egrc_path)
+    return get_priority(
+        pager_cmd,
+        egrc_values and egrc_values.pager_cmd,
+        DEFAULT_PAGER_CMD
+    )
+
+
+def _get_egrc_values_if_present(egrc_path):
+    """
+    Return the _EgrcValues of the egrc that get_egrc_config() would read for
+    egrc_path, or None if there is no egrc.
+    """
+    config_path = _get_egrc_path(egrc_path)
+    if not os.path.isfile(config_path):
+        return None
+    return _get_egrc_values(config_path)
+
+
 def get_config_tuple_from_egrc(egrc_path):
     """
     Create a Config named tuple from the values specified in the .egrc. Expands
@@ -311,7 +433,49 @@ def get_config_tuple_from_egrc(egrc_path):
     egrc_path must exist and point a file.
 
     If not present in the .egrc, properties of the Config are returned as None.
+
+    The values are loaded from a snapshot of the egrc if it is unchanged since
+    the snapshot was taken, and the egrc is only parsed if not.
     """
+    values = _get_egrc_values(egrc_path)
+
+    subs = None
+    if values.subs is not None:
+        subs = [parse_substitution_from_list(sub) for sub in values.subs]
+
+    return Config(
+        examples_dir=get_expanded_path(values.examples_dir),
+        custom_dir=get_expanded_path(values.custom_dir),
+        color_config=ColorConfig(*values.colors),
+        use_color=values.use_color,
+        pager_cmd=values.pager_cmd,
+        editor_cmd=values.editor_cmd,
+        squeeze=values.squeeze,
+        subs=subs,
+    )
+
+
+def _get_egrc_values(egrc_path):
+    """
+    Return the _EgrcValues of the egrc at egrc_path, from its snapshot if it
+    is unchanged since the snapshot was taken, and by parsing it if not.
+    """
+    snapshot_key = _get_egrc_snapshot_key(egrc_path)
+    values = _read_egrc_snapshot(egrc_path, snapshot_key)
+    if values is None:
+        values = _get_values_from_egrc(egrc_path)
+        _write_egrc_snapshot(egrc_path, snapshot_key, values)
+    return values
+
+
+def _get_values_from_egrc(egrc_path):
+    """Parse the egrc at egrc_path, returning an _EgrcValues."""
+    # Support Python 2 and 3.
+    try:
+        import ConfigParser
+    except:
+        from configparser import ConfigParser
+
     with open(egrc_path, 'r') as egrc:
         try:
             config = ConfigParser.RawConfigParser()
@@ -330,11 +494,9 @@ def get_config_tuple_from_egrc(egrc_path):
 
         if config.has_option(DEFAULT_SECTION, EG_EXAMPLES_DIR):
             examples_dir = config.get(DEFAULT_SECTION, EG_EXAMPLES_DIR)
-            examples_dir = get_expanded_path(examples_dir)
 
         if config.has_option(DEFAULT_SECTION, CUSTOM_EXAMPLES_DIR):
             custom_dir = config.get(DEFAULT_SECTION, CUSTOM_EXAMPLES_DIR)
-            custom_dir = get_expanded_path(custom_dir)
 
         if config.has_option(DEFAULT_SECTION, USE_COLOR):
             use_color_raw = config.get(DEFAULT_SECTION, USE_COLOR)
@@ -342,11 +504,11 @@ def get_config_tuple_from_egrc(egrc_path):
 
         if config.has_option(DEFAULT_SECTION, PAGER_CMD):
             pager_cmd_raw = config.get(DEFAULT_SECTION, PAGER_CMD)
-            pager_cmd = ast.literal_eval(pager_cmd_raw)
+            pager_cmd = _literal_eval(pager_cmd_raw)
 
         if config.has_option(DEFAULT_SECTION, EDITOR_CMD):
             editor_cmd_raw = config.get(DEFAULT_SECTION, EDITOR_CMD)
-            editor_cmd = ast.literal_eval(editor_cmd_raw)
+            editor_cmd = _literal_eval(editor_cmd_raw)
 
         color_config = get_custom_color_config_from_egrc(config)
 
@@ -355,20 +517,80 @@ def get_config_tuple_from_egrc(egrc_path):
             squeeze = _parse_bool_from_raw_egrc_value(squeeze_raw)
 
         if config.has_section(SUBSTITUTION_SECTION):
-            subs = get_substitutions_from_config(config)
+            subs = _get_substitution_lists_from_config(config)
 
-        return Config(
+        return _EgrcValues(
             examples_dir=examples_dir,
             custom_dir=custom_dir,
-            color_config=color_config,
             use_color=use_color,
             pager_cmd=pager_cmd,
             editor_cmd=editor_cmd,
+            colors=tuple(color_config),
             squeeze=squeeze,
             subs=subs,
         )
 
 
+def _get_egrc_snapshot_path(egrc_path):
+    # The full path is part of the key stored in the snapshot.
+    return get_snapshot_path(EGRC_SNAPSHOT_DIR_NAME, egrc_path)
+
+
+def _get_egrc_snapshot_key(egrc_path):
+    """
+    Return the key a snapshot of the egrc at egrc_path must have to be used,
+    or None if the egrc can't be found.
+    """
+    # index imports this module, so can't be imported at the top.
+    from eg import index
+    stamp = index.get_stamp(egrc_path)
+    if stamp is None:
+        return None
+    size, mtime, is_racy = stamp
+    return (EGRC_SNAPSHOT_VERSION, egrc_path, size, mtime)
+
+
+def _read_egrc_snapshot(egrc_path, snapshot_key):
+    """
+    Return the _EgrcValues in the snapshot of the egrc at egrc_path, or None
+    if there is no snapshot with snapshot_key or it is damaged.
+    """
+    if snapshot_key is None:
+        return None
+    try:
+        with open(_get_egrc_snapshot_path(egrc_path), 'rb') as f:
+            key, values = marshal.loads(f.read())
+        values = _EgrcValues(*values)
+    except (IOError, OSError, EOFError, ValueError, TypeError):
+        return None
+    if key != snapshot_key or len(values.colors) != len(ColorConfig._fields):
+        return None
+    return values
+
+
+def _write_egrc_snapshot(egrc_path, snapshot_key, values):
+    """
+    Save values as the snapshot of the egrc at egrc_path, unless the egrc was
+    modified too recently for its mtime to be trusted.
+    """
+    # index imports this module, so can't be imported at the top.
+    from eg import index
+    if snapshot_key is None:
+        return
+    if index.get_trusted_stamp(egrc_path) is None:
+        return
+    try:
+        contents = marshal.dumps((snapshot_key, tuple(values)))
+    except ValueError:
+        # Something in the egrc that marshal can't represent.
+        return
+    index.write_file_atomically(
+        _get_egrc_snapshot_path(egrc_path),
+        contents,
+        binary=True
+    )
+
+
 def get_expanded_path(path):
     """Expand ~ and variables in a path. If path is not truthy, return None."""
     if path:
@@ -380,6 +602,31 @@ def get_expanded_path(path):
         return None
 
 
+def get_cache_dir():
+    """
+    Return the fully expanded path to the directory eg uses for its caches.
+
+    The freedesktop.org spec says '$HOME/.cache' should be used if
+    XDG_CACHE_HOME is not set or is empty. The directory is not guaranteed to
+    exist.
+    """
+    cache_home = os.getenv(ENV_XDG_CACHE_HOME) or DEFAULT_CACHE_HOME
+    return get_expanded_path(os.path.join(cache_home, CACHE_DIR_NAME))
+
+
+def get_snapshot_path(dir_name, key):
+    """
+    Return the path of the file for the string key in the directory dir_name
+    within the eg cache dir. The file is named after a CRC-32 of key, which
+    only spreads keys across files, so different keys may share a file.
+    Whatever is stored in it must include the key and be treated as missing
+    if the key doesn't match.
+    """
+    import zlib
+    name = '{:08x}'.format(zlib.crc32(key.encode('utf-8')) & 0xffffffff)
+    return os.path.join(get_cache_dir(), dir_name, name)
+
+
 def get_editor_cmd_from_environment():
     """
     Gets and editor command from environment variables.
@@ -466,7 +713,13 @@ def _get_color_from_config(config, option):
     if not config.has_option(COLOR_SECTION, option):
         return None
     else:
-        return ast.literal_eval(config.get(COLOR_SECTION, option))
+        return _literal_eval(config.get(COLOR_SECTION, option))
+
+
+def _literal_eval(raw_value):
+    """Parse raw_value from the egrc as a Python literal."""
+    import ast
+    return ast.literal_eval(raw_value)
 
 
 def parse_substitution_from_list(list_rep):
@@ -489,6 +742,9 @@ def parse_substitution_from_list(list_rep):
         if type(is_multiline) is not bool:
             raise SyntaxError('is_multiline must be a boolean')
 
+    # Imported here so that completion, which reads only the dirs from the
+    # egrc, doesn't pay for compiling regular expressions.
+    from eg import substitute
     result = substitute.Substitution(pattern, replacement, is_multiline)
     return result
 
@@ -501,13 +757,23 @@ def get_substitutions_from_config(config):
     will be printed and an error will be thrown.
     """
     result = []
+    for list_rep in _get_substitution_lists_from_config(config):
+        substitution = parse_substitution_from_list(list_rep)
+        result.append(substitution)
+    return result
+
+
+def _get_substitution_lists_from_config(config):
+    """
+    Return the substitutions in the config in their list representation,
+    sorted alphabetically by pattern name, without checking them.
+    """
+    result = []
     pattern_names = config.options(SUBSTITUTION_SECTION)
     pattern_names.sort()
     for name in pattern_names:
         pattern_val = config.get(SUBSTITUTION_SECTION, name)
-        list_rep = ast.literal_eval(pattern_val)
-        substitution = parse_substitution_from_list(list_rep)
-        result.append(substitution)
+        result.append(_literal_eval(pattern_val))
     return result
 
 
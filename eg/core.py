@@ -1,8 +1,11 @@
 import argparse
-import pydoc
+import os
 import sys
 
+from eg import bundle
+from eg import complete
 from eg import config
+from eg import render_cache
 from eg import util
 
 
@@ -34,8 +37,13 @@ def _show_list_message(resolved_config):
         ' custom and default files'
     )
     msg_line_4 = '    ' + '  only default files (no symbol)'
-    msg_line_5 = ''
-    msg_line_6 = 'Programs supported by eg: '
+    msg_line_5 = (
+        '    ' +
+        util.FLAG_CUSTOM_ALIAS +
+        ' alias from the custom dir'
+    )
+    msg_line_6 = ''
+    msg_line_7 = 'Programs supported by eg: '
 
     preamble = [
         msg_line_1,
@@ -43,15 +51,140 @@ def _show_list_message(resolved_config):
         msg_line_3,
         msg_line_4,
         msg_line_5,
-        msg_line_6
+        msg_line_6,
+        msg_line_7
     ]
 
     complete_message = '\n'.join(preamble)
     complete_message += '\n' + '\n'.join(supported_programs)
 
+    alias_cycle_warning = util.get_alias_cycle_warning(resolved_config)
+    if alias_cycle_warning:
+        complete_message += '\n\n' + alias_cycle_warning
+
+    import pydoc
     pydoc.pager(complete_message)
 
 
+def _build_bundle(dir_to_bundle, bundle_path):
+    """
+    Pack the examples in dir_to_bundle into a bundle at bundle_path.
+    """
+    if not os.path.isdir(dir_to_bundle):
+        print('Could not find directory to bundle at: ' + dir_to_bundle)
+        return
+
+    num_files = bundle.write_bundle(dir_to_bundle, bundle_path)
+    print('Bundled {} files into {}'.format(num_files, bundle_path))
+
+
+def _handle_cache_command(cache_command):
+    """
+    Perform one of the render_cache.CACHE_COMMANDS and report the result.
+    """
+    if cache_command == render_cache.CMD_STATS:
+        stats = render_cache.get_stats()
+        print('Cache dir: ' + stats.cache_dir)
+        print('Entries: {}'.format(stats.num_entries))
+        print('Size: {} of {} bytes'.format(
+            stats.total_bytes,
+            stats.max_bytes
+        ))
+    elif cache_command == render_cache.CMD_CLEAR:
+        removed = render_cache.clear()
+        print('Removed {} entries'.format(removed))
+    elif cache_command == render_cache.CMD_VERIFY:
+        checked, removed = render_cache.verify()
+        print('Checked {} entries, removed {} corrupt entries'.format(
+            checked,
+            removed
+        ))
+
+
+def _show_search_results(resolved_config, query):
+    """
+    Show the sections of the examples that best match query, best first.
+    """
+    # Imported here so that only searches pay for loading the search code.
+    from eg import search
+    results = search.search(resolved_config, query)
+    if not results:
+        print('No examples match: ' + query)
+        return
+
+    for result in results:
+        # The first heading of an example is usually just the program.
+        if result.heading and result.heading != result.program:
+            print('{}: {}'.format(result.program, result.heading))
+        else:
+            print(result.program)
+
+
+def _get_config_for_stdout(resolved_config, use_color_arg):
+    """
+    Return resolved_config without color if stdout isn't a terminal, as when
+    piping to grep, unless color was asked for with --color.
+    """
+    if (
+        resolved_config.use_color and
+        use_color_arg is None and
+        util.get_screen_size() is None
+    ):
+        return resolved_config._replace(use_color=False)
+    return resolved_config
+
+
+def _get_config_for_batch(resolved_config, use_color_arg):
+    """
+    Return resolved_config without color unless color was asked for with
+    --color. Batch output is written to JSON or to files, where escape
+    sequences only get in the way.
+    """
+    if resolved_config.use_color and not use_color_arg:
+        return resolved_config._replace(use_color=False)
+    return resolved_config
+
+
+def _render_batch(
+    resolved_config,
+    batch_file,
+    output_dir,
+    num_jobs,
+    use_color_arg=None
+):
+    """
+    Render the examples of every program listed in batch_file, without
+    paging them. Output is colored only if use_color_arg, the value of
+    --color, is True.
+    """
+    # Imported here so that only batches pay for loading the batch code.
+    from eg import batch
+    batch.run_batch(
+        batch_file,
+        _get_config_for_batch(resolved_config, use_color_arg),
+        output_dir=output_dir,
+        num_jobs=num_jobs
+    )
+
+
+def _prerender(resolved_config, num_jobs):
+    """
+    Render the examples of every program into the render cache and report how
+    quickly that went.
+    """
+    # Imported here so that only pre-renders pay for loading the code.
+    from eg import prerender
+    prerender_stats = prerender.prerender(resolved_config, num_jobs=num_jobs)
+    print(prerender.get_report(prerender_stats))
+
+
+def _serve(resolved_config, port, num_threads):
+    """Serve the examples over HTTP until interrupted."""
+    # Imported here so that only the server pays for loading the HTTP code.
+    from eg import server
+    server.serve(resolved_config, port=port, num_threads=num_threads)
+
+
 def _handle_no_editor():
     """
     Handles the case where a user has requested to edit a file the custom
@@ -63,10 +196,13 @@ def _handle_no_editor():
     )
 
 
-def _parse_arguments():
+def _parse_arguments(argv=None):
     """
     Constructs and parses the command line arguments for eg. Returns an args
     object as returned by parser.parse_args().
+
+    argv: the arguments to parse, not including the program name. If None,
+        sys.argv is used.
     """
     parser = argparse.ArgumentParser(
         description='eg provides examples of common command usage.'
@@ -141,20 +277,128 @@ def _parse_arguments():
         help='Do not colorize output.'
     )
 
+    parser.add_argument(
+        '--build-bundle',
+        nargs=2,
+        metavar=('DIR', 'OUT'),
+        help="""Pack the examples in DIR into a single bundle file at OUT. A
+        bundle can be used anywhere an examples or custom dir can."""
+    )
+
+    parser.add_argument(
+        '--cache',
+        choices=render_cache.CACHE_COMMANDS,
+        dest='cache_command',
+        help="""Operate the cache of rendered output: show statistics about
+        it, clear it, or verify its entries and remove any that are
+        corrupt."""
+    )
+
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help="""Run in the foreground as a daemon that renders examples for
+        eg-client over a per-user socket, keeping config and examples in
+        memory between requests."""
+    )
+
+    parser.add_argument(
+        '--search',
+        metavar='QUERY',
+        help="""Show the programs and section headings of the examples that
+        best match QUERY, searching headings, prose, and code."""
+    )
+
+    parser.add_argument(
+        '--batch',
+        metavar='FILE',
+        help="""Render the examples of every program listed in FILE, one per
+        line, or on stdin if FILE is -. Output is written as a line of JSON
+        per program, or to --output-dir, and is never paged."""
+    )
+
+    parser.add_argument(
+        '--output-dir',
+        metavar='DIR',
+        help="""With --batch, write the examples of each program to
+        DIR/PROGRAM.txt rather than to stdout."""
+    )
+
+    parser.add_argument(
+        '--prerender',
+        action='store_true',
+        help="""Render the examples of every program into the render cache, so
+        the first view of each is quick after examples or formatting options
+        change. Programs whose output is already cached are skipped."""
+    )
+
+    parser.add_argument(
+        '--jobs',
+        type=int,
+        metavar='N',
+        help="""With --batch or --prerender, render with N worker processes.
+        Defaults to the number of CPUs. With --serve, handle requests with N
+        threads."""
+    )
+
+    parser.add_argument(
+        '--serve',
+        action='store_true',
+        help="""Serve rendered examples over HTTP on localhost, as text, ANSI,
+        HTML, or JSON."""
+    )
+
+    parser.add_argument(
+        '--port',
+        type=int,
+        metavar='PORT',
+        help='With --serve, the port to listen on. Defaults to 8000.'
+    )
+
+    parser.add_argument(
+        '--complete',
+        metavar='PREFIX',
+        help="""List the programs and aliases with examples that start with
+        PREFIX, one per line, for shell completion."""
+    )
+
+    parser.add_argument(
+        '--completion-script',
+        choices=complete.SHELLS,
+        help="""Print a script that sets up completion of programs for the
+        given shell, e.g. source <(eg --completion-script bash)."""
+    )
+
     parser.add_argument(
         'program',
         nargs='?',
         help='The program for which to display examples.'
     )
 
-    args = parser.parse_args()
+    if argv is None:
+        argv = sys.argv[1:]
 
-    if len(sys.argv) < 2:
+    args = parser.parse_args(argv)
+
+    if len(argv) < 1:
         # Too few arguments. We can't specify this using argparse alone, so we
         # have to manually check.
         parser.print_help()
         parser.exit()
-    elif not args.version and not args.list and not args.program:
+    elif (
+        not args.version and
+        not args.list and
+        not args.build_bundle and
+        not args.cache_command and
+        not args.daemon and
+        not args.search and
+        not args.batch and
+        not args.prerender and
+        not args.serve and
+        args.complete is None and
+        not args.completion_script and
+        not args.program
+    ):
         parser.error(_MSG_BAD_ARGS)
     else:
         return args
@@ -163,6 +407,43 @@ def _parse_arguments():
 def run_eg():
     args = _parse_arguments()
 
+    if args.build_bundle:
+        dir_to_bundle, bundle_path = args.build_bundle
+        _build_bundle(
+            config.get_expanded_path(dir_to_bundle),
+            config.get_expanded_path(bundle_path)
+        )
+        return
+
+    if args.cache_command:
+        _handle_cache_command(args.cache_command)
+        return
+
+    if args.completion_script:
+        script = complete.get_completion_script(args.completion_script)
+        sys.stdout.write(script)
+        return
+
+    if args.complete is not None:
+        complete.show_completions(
+            args.complete,
+            egrc_path=args.config_file,
+            examples_dir=args.examples_dir,
+            custom_dir=args.custom_dir
+        )
+        return
+
+    if args.daemon:
+        # Imported here as the daemon depends on this module.
+        from eg import daemon
+        daemon.serve()
+        return
+
+    if args.version and not args.list:
+        # The version doesn't depend on the config, so don't pay to resolve it.
+        _show_version()
+        return
+
     resolved_config = config.get_resolved_config(
         egrc_path=args.config_file,
         examples_dir=args.examples_dir,
@@ -174,15 +455,30 @@ def run_eg():
 
     if args.list:
         _show_list_message(resolved_config)
-    elif args.version:
-        _show_version()
+    elif args.batch:
+        _render_batch(
+            resolved_config,
+            args.batch,
+            args.output_dir,
+            args.jobs,
+            use_color_arg=args.use_color
+        )
+    elif args.prerender:
+        _prerender(resolved_config, args.jobs)
+    elif args.serve:
+        _serve(resolved_config, args.port, args.jobs)
+    elif args.search:
+        _show_search_results(resolved_config, args.search)
     elif args.edit:
         if not resolved_config.editor_cmd:
             _handle_no_editor()
         else:
             util.edit_custom_examples(args.program, resolved_config)
     else:
-        util.handle_program(args.program, resolved_config)
+        util.handle_program(
+            args.program,
+            _get_config_for_stdout(resolved_config, args.use_color)
+        )
 
 
 # We want people to be able to use eg without pip, by so we'll allow this to be
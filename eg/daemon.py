@@ -0,0 +1,228 @@
+import json
+import os
+import signal
+import socketserver
+import sys
+
+from eg import catalog
+from eg import client
+from eg import config
+from eg import core
+from eg import util
+
+
+# The daemon keeps resolved configs, catalogs of examples, and compiled
+# regular expressions in memory and renders examples for eg clients over a
+# per-user Unix socket. It only renders examples. Everything else a client
+# asks for, like --list or --edit, is answered with STATUS_FALLBACK and the
+# client runs eg itself.
+
+
+class DaemonState():
+    """
+    The state the daemon keeps between requests. Every cached value is checked
+    against the files it was built from before it is used, so edits to the
+    egrc, the aliases, or the examples are picked up by the next request.
+    """
+
+    def __init__(self):
+        # {config args: (egrc mtimes, Config)}
+        self._configs = {}
+
+    def handle(self, argv, cwd):
+        """
+        Handle a request to run eg with argv in cwd. Returns a tuple of
+        (header, body), where header is a dict to send to the client and body
+        is the rendered string, which is empty unless the status is
+        client.STATUS_OK.
+        """
+        # Relative paths given on the command line are relative to the client.
+        os.chdir(cwd)
+
+        try:
+            args = core._parse_arguments(argv)
+        except SystemExit:
+            # argparse wants to print help or an error, which the client does
+            # best itself.
+            return _get_fallback_response()
+
+        if not _is_render_request(args):
+            return _get_fallback_response()
+
+        resolved_config = self._get_config(args)
+        examples = catalog.get_catalog(resolved_config, refresh_if_stale=True)
+        resolved_program = examples.resolve(args.program)
+        paths = examples.get_paths(resolved_program)
+
+        if not paths:
+            header = {
+                client.FIELD_STATUS: client.STATUS_NO_ENTRY,
+                client.FIELD_MESSAGE: util.get_no_entry_message(
+                    args.program,
+                    util.get_suggestions(examples, args.program),
+                    in_alias_cycle=args.program in examples.alias_cycles
+                ),
+            }
+            return header, ''
+
+        body = util.get_rendered_contents(paths, resolved_config)
+        return {client.FIELD_STATUS: client.STATUS_OK}, body
+
+    def _get_config(self, args):
+        """
+        Return the resolved Config for args, resolving it again only if the
+        egrc it would come from has changed.
+        """
+        key = (
+            args.config_file,
+            args.examples_dir,
+            args.custom_dir,
+            args.use_color,
+            args.pager_cmd,
+            args.squeeze,
+            os.getcwd(),
+        )
+        egrc_mtimes = config.get_egrc_mtimes(args.config_file)
+
+        cached = self._configs.get(key)
+        if cached and cached[0] == egrc_mtimes:
+            return cached[1]
+
+        resolved_config = config.get_resolved_config(
+            egrc_path=args.config_file,
+            examples_dir=args.examples_dir,
+            custom_dir=args.custom_dir,
+            use_color=args.use_color,
+            pager_cmd=args.pager_cmd,
+            squeeze=args.squeeze,
+            debug=False,
+        )
+        self._configs[key] = (egrc_mtimes, resolved_config)
+        return resolved_config
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Reads a request from a client and writes back the response."""
+
+    def handle(self):
+        if not client.is_peer_trusted(self.request):
+            # Examples are read as the user running the daemon, so nobody
+            # else gets to ask for them.
+            return
+        try:
+            request = json.loads(self.rfile.readline().decode(client.ENCODING))
+            header, body = self.server.state.handle(
+                request[client.FIELD_ARGV],
+                request[client.FIELD_CWD]
+            )
+        except Exception:
+            # Whatever went wrong, the client can surface it properly by
+            # running eg itself.
+            header, body = _get_fallback_response()
+
+        response = json.dumps(header) + '\n' + body
+        try:
+            self.wfile.write(response.encode(client.ENCODING))
+        except (IOError, OSError):
+            # The client went away, e.g. because the user quit the pager.
+            pass
+
+
+def serve(socket_path=None):
+    """
+    Serve requests on the per-user socket until interrupted. If a daemon is
+    already serving on the socket, says so and returns.
+    """
+    socket_path = socket_path or client.get_socket_path()
+
+    existing = client.connect(socket_path)
+    if existing:
+        existing.close()
+        print('An eg daemon is already running at: ' + socket_path)
+        return
+
+    if not _prepare_socket_path(socket_path):
+        print(
+            'Not serving at: ' + socket_path + '. Its directory must belong '
+            'to you and be private to you, with mode 0700.'
+        )
+        return
+
+    server = socketserver.UnixStreamServer(socket_path, _RequestHandler)
+    server.state = DaemonState()
+    print('eg daemon listening at: ' + socket_path)
+    _exit_cleanly_on_sigterm()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        _remove_if_exists(socket_path)
+
+
+def _exit_cleanly_on_sigterm():
+    """
+    Turn SIGTERM into a normal exit, so that the socket is removed when the
+    daemon is killed. Signal handlers can only be installed from the main
+    thread, which is fine to skip when serving from another one.
+    """
+    try:
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    except ValueError:
+        pass
+
+
+def _prepare_socket_path(socket_path):
+    """
+    Make sure the directory for socket_path exists and is private to the
+    user, and remove any socket left behind by a daemon that has died.
+    Returns False, touching nothing, if the directory already exists but
+    isn't private to the user, as someone else could then answer in place of
+    the daemon. Returns True otherwise.
+    """
+    socket_dir = os.path.dirname(socket_path)
+    if not os.path.lexists(socket_dir):
+        try:
+            os.makedirs(socket_dir, 0o700)
+            # The umask may have taken permissions off, but never adds any.
+            os.chmod(socket_dir, 0o700)
+        except OSError:
+            # Someone else made it first. Whose it is is checked below.
+            pass
+    if not client.is_private_dir(socket_dir):
+        return False
+    _remove_if_exists(socket_path)
+    return True
+
+
+def _remove_if_exists(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _is_render_request(args):
+    """True if args ask only for the examples of a program, else False."""
+    return bool(
+        args.program and
+        not args.list and
+        not args.version and
+        not args.edit and
+        not args.build_bundle and
+        not args.cache_command and
+        not args.daemon and
+        not args.search and
+        not args.batch and
+        not args.prerender and
+        not args.serve and
+        args.complete is None and
+        not args.completion_script
+    )
+
+
+def _get_fallback_response():
+    """Return a response telling the client to run eg itself."""
+    return {client.FIELD_STATUS: client.STATUS_FALLBACK}, ''
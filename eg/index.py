@@ -0,0 +1,276 @@
+import os
+import time
+
+from eg import config
+
+
+# Bump this when the layout of an index file changes. Indexes written with a
+# different version are treated as stale and rebuilt.
+INDEX_VERSION = 1
+
+# The directory, within the eg cache dir, where indexes are stored.
+INDEX_DIR_NAME = 'index'
+
+# Filesystems report directory mtimes with limited granularity. A directory
+# modified within this many seconds of being walked might change again without
+# its mtime moving, so we refuse to trust an index built from it.
+RACY_MTIME_WINDOW = 2
+
+# Keys in the serialized index.
+_KEY_VERSION = 'version'
+_KEY_ROOT = 'root'
+_KEY_DIRS = 'dirs'
+_KEY_FILES = 'files'
+
+
+def get_index(dir_to_search):
+    """
+    Return a dict mapping file names to every full path under dir_to_search
+    with that name, in the order os.walk() visits them:
+
+        {'cp.md': ['/path/to/examples/cp.md', '/path/to/examples/a/cp.md']}
+
+    The index is persisted in the eg cache dir and reused for as long as the
+    mtimes of all the directories it covers are unchanged, which costs one
+    stat() per directory instead of a listing of each. If the index is missing
+    or stale the tree is walked and the index rewritten.
+
+    If dir_to_search is falsey, returns an empty dict.
+    """
+    return load_index(dir_to_search)[0]
+
+
+def load_index(dir_to_search):
+    """
+    Return a tuple of (files, dir_mtimes) for dir_to_search. files is the
+    index as returned by get_index(). dir_mtimes maps every directory the index
+    covers to its mtime when the index was built, and can be passed to
+    is_stale() to tell if the index has since gone stale. dir_mtimes is None if
+    the directory could not be reliably indexed, in which case the index
+    should always be considered stale.
+
+    If dir_to_search is falsey, returns ({}, {}).
+    """
+    if not dir_to_search:
+        return {}, {}
+
+    index_path = _get_index_path(dir_to_search)
+    stored = _load_index(index_path)
+    if stored and _is_index_fresh(stored, dir_to_search):
+        return stored[_KEY_FILES], stored[_KEY_DIRS]
+
+    dir_mtimes, files = _walk_and_build_index(dir_to_search)
+    if dir_mtimes:
+        _save_index(index_path, dir_to_search, dir_mtimes, files)
+
+    return files, dir_mtimes
+
+
+def is_stale(mtimes):
+    """
+    Take a dict of {path: mtime}, such as the dir_mtimes returned by
+    load_index(), and return True if any of the paths has been modified since,
+    else False. None is always stale.
+    """
+    if mtimes is None:
+        return True
+    for path, mtime in mtimes.items():
+        if get_mtime(path) != mtime:
+            return True
+    return False
+
+
+def _walk_and_build_index(dir_to_search):
+    """
+    Walk dir_to_search and return a tuple of (dir_mtimes, files).
+
+    dir_mtimes maps each directory visited to its mtime. It is None if the
+    index should not be saved, e.g. because the directory does not exist or
+    was being modified while we walked it. files is as described in
+    get_index().
+    """
+    walk_started = time.time()
+    dir_mtimes = {}
+    files = {}
+
+    for basedir, dirs, file_names in os.walk(dir_to_search):
+        if dir_mtimes is not None:
+            mtime = get_mtime(basedir)
+            if mtime is None or mtime >= walk_started - RACY_MTIME_WINDOW:
+                dir_mtimes = None
+            else:
+                dir_mtimes[basedir] = mtime
+
+        for file_name in file_names:
+            files.setdefault(file_name, []).append(
+                os.path.join(basedir, file_name)
+            )
+
+    if not dir_mtimes or dir_to_search not in dir_mtimes:
+        # Nothing was walked, so we have no way to notice the directory
+        # appearing later.
+        dir_mtimes = None
+
+    return dir_mtimes, files
+
+
+def _is_index_fresh(stored, dir_to_search):
+    """
+    True if the stored index was built for dir_to_search and none of the
+    directories it covers have been modified since, else False.
+    """
+    if stored.get(_KEY_VERSION) != INDEX_VERSION:
+        return False
+    if stored.get(_KEY_ROOT) != dir_to_search:
+        return False
+
+    return not is_stale(stored[_KEY_DIRS])
+
+
+def get_mtime(path):
+    """Return the mtime of path, or None if it cannot be stat'd."""
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def get_stamp(path, trusted_before=None):
+    """
+    Return a tuple of (size, mtime, is_racy) for the file at path, or None if
+    it cannot be stat'd. size and mtime change whenever the file does, and
+    mtime is in nanoseconds where Python reports them. is_racy is True if the
+    file was modified at or after trusted_before, which defaults to
+    RACY_MTIME_WINDOW seconds ago, in which case it might change again without
+    its mtime moving. A file in a bundle opened by this process is stamped
+    with its bundle.
+    """
+    # bundle imports this module, so can't be imported at the top.
+    from eg import bundle
+    containing_bundle = bundle.get_bundle_for_path(path)
+    if containing_bundle:
+        path = containing_bundle.bundle_path
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if trusted_before is None:
+        trusted_before = time.time() - RACY_MTIME_WINDOW
+    return stat.st_size, get_stat_mtime(stat), stat.st_mtime >= trusted_before
+
+
+def get_trusted_stamp(path):
+    """
+    Return a tuple of (size, mtime) for the file at path as get_stamp() does,
+    or None if it cannot be stat'd or is racy.
+    """
+    stamp = get_stamp(path)
+    if stamp is None or stamp[2]:
+        return None
+    return stamp[:2]
+
+
+def get_stat_mtime(stat):
+    """
+    Return the mtime from the os.stat() result stat, in nanoseconds where
+    Python reports them.
+    """
+    # Python 2 has no st_mtime_ns.
+    return getattr(stat, 'st_mtime_ns', stat.st_mtime)
+
+
+def is_trusted(mtimes):
+    """
+    Take a dict of {path: mtime}, such as the dir_mtimes returned by
+    load_index(), and return True if none of the paths were modified too
+    recently for their mtimes to be trusted to change with them, else False.
+    None is never trusted.
+    """
+    if mtimes is None:
+        return False
+    trusted_before = time.time() - RACY_MTIME_WINDOW
+    for mtime in mtimes.values():
+        if mtime is None or mtime >= trusted_before:
+            return False
+    return True
+
+
+def _get_index_path(dir_to_search):
+    """
+    Return the path of the index file for dir_to_search. The file name is a
+    digest of the path so that every directory gets its own index.
+    """
+    import hashlib
+    digest = hashlib.sha1(dir_to_search.encode('utf-8')).hexdigest()
+    return os.path.join(
+        config.get_cache_dir(),
+        INDEX_DIR_NAME,
+        digest + '.json'
+    )
+
+
+def _load_index(index_path):
+    """
+    Return the deserialized index at index_path, or None if it does not exist
+    or cannot be read.
+    """
+    import json
+    try:
+        with open(index_path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _save_index(index_path, dir_to_search, dir_mtimes, files):
+    """
+    Write the index to index_path. The index is a cache, so failing to write
+    it is not an error.
+    """
+    import json
+    serialized = {
+        _KEY_VERSION: INDEX_VERSION,
+        _KEY_ROOT: dir_to_search,
+        _KEY_DIRS: dir_mtimes,
+        _KEY_FILES: files,
+    }
+    write_file_atomically(index_path, json.dumps(serialized))
+
+
+def get_tmp_path(path):
+    """
+    Return the path of a temporary file to write path by way of, unique to
+    this process and thread so that concurrent writers never share one.
+    """
+    # Imported here as most runs of eg never write anything.
+    import threading
+    return '{}.{}.{}.tmp'.format(
+        path,
+        os.getpid(),
+        threading.current_thread().ident
+    )
+
+
+def write_file_atomically(path, contents, binary=False):
+    """
+    Write contents to path by way of a temporary file and a rename, so readers
+    never see a partially written file. Creates any missing parent directories.
+    contents must be bytes if binary is True, else a string.
+
+    Returns True on success, or False if the file could not be written.
+    """
+    tmp_path = get_tmp_path(path)
+    try:
+        parent_dir = os.path.dirname(path)
+        if parent_dir and not os.path.isdir(parent_dir):
+            os.makedirs(parent_dir)
+        with open(tmp_path, 'wb' if binary else 'w') as f:
+            f.write(contents)
+        os.rename(tmp_path, path)
+        return True
+    except (IOError, OSError):
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return False
@@ -0,0 +1,179 @@
+import time
+
+from collections import namedtuple
+from eg import batch
+from eg import catalog
+from eg import render_cache
+from eg import util
+
+
+# Renders the examples of every program into the render cache, so that the
+# first view of each after the examples or the formatting options change
+# doesn't pay for formatting.
+#
+# Output is cached under a key built from the sizes and mtimes of a program's
+# files and the formatting options, the same key used when the examples are
+# viewed, so a program is only read and rendered again if the options have
+# changed, its files have, or its output is no longer in the cache.
+
+_ENCODING = 'utf-8'
+
+# What happened during a pre-render.
+#    num_programs: the number of programs with examples
+#    num_rendered: the number of programs whose examples were rendered
+#    num_skipped: the number of programs whose output was already cached
+#    num_files: the number of files read
+#    num_bytes: the combined size of the files read
+#    elapsed_s: the number of seconds it took
+#    num_evicted: the number of programs whose output didn't fit in the cache
+#    num_unwritten: the number of programs whose output couldn't be written to
+#        the cache at all, e.g. because the cache dir is read-only
+PrerenderStats = namedtuple(
+    'PrerenderStats',
+    [
+        'num_programs',
+        'num_rendered',
+        'num_skipped',
+        'num_files',
+        'num_bytes',
+        'elapsed_s',
+        'num_evicted',
+        'num_unwritten',
+    ]
+)
+
+
+def prerender(resolved_config, num_jobs=None):
+    """
+    Render the examples of every program with examples into the render
+    cache, formatted according to resolved_config, using up to num_jobs worker
+    processes. Programs whose output is already cached are skipped. Returns a
+    PrerenderStats.
+    """
+    started = time.time()
+    examples = catalog.get_catalog(resolved_config)
+    programs = sorted(
+        examples.get_default_programs() | examples.get_custom_programs()
+    )
+
+    render_keys = {}
+    to_render = []
+    for program in programs:
+        paths = examples.get_paths(program)
+        render_key = _get_key_for_paths(resolved_config, paths)
+        if render_key is not None and render_cache.has(render_key):
+            render_keys[program] = render_key
+        else:
+            to_render.append((program, paths))
+
+    results = batch.map_with_config(
+        _prerender_paths,
+        [paths for program, paths in to_render],
+        resolved_config,
+        num_jobs
+    )
+
+    num_files = 0
+    num_bytes = 0
+    num_unwritten = 0
+    for (program, paths), (render_key, size) in zip(to_render, results):
+        if size is not None:
+            num_files += len(paths)
+            num_bytes += size
+        if render_cache.has(render_key):
+            render_keys[program] = render_key
+        else:
+            num_unwritten += 1
+
+    # The cache is bounded, so the output of some programs may have pushed
+    # out that of others.
+    render_cache.evict()
+    num_evicted = sum(
+        1 for render_key in render_keys.values()
+        if not render_cache.has(render_key)
+    )
+
+    return PrerenderStats(
+        num_programs=len(programs),
+        num_rendered=len(to_render),
+        num_skipped=len(programs) - len(to_render),
+        num_files=num_files,
+        num_bytes=num_bytes,
+        elapsed_s=time.time() - started,
+        num_evicted=num_evicted,
+        num_unwritten=num_unwritten,
+    )
+
+
+def get_report(prerender_stats):
+    """Return a message describing prerender_stats for the user."""
+    elapsed_s = max(prerender_stats.elapsed_s, 1e-6)
+    result = (
+        'Pre-rendered {} of {} programs ({} unchanged) in {:.2f} s: '
+        '{:.1f} files/s, {:.2f} MB/s'
+    ).format(
+        prerender_stats.num_rendered,
+        prerender_stats.num_programs,
+        prerender_stats.num_skipped,
+        prerender_stats.elapsed_s,
+        prerender_stats.num_files / elapsed_s,
+        prerender_stats.num_bytes / elapsed_s / (1024 * 1024),
+    )
+    if prerender_stats.num_unwritten:
+        result += (
+            '\n{} programs could not be written to the render cache in {}.'
+        ).format(
+            prerender_stats.num_unwritten,
+            render_cache.get_render_cache_dir()
+        )
+    if prerender_stats.num_evicted:
+        result += (
+            '\n{} programs did not fit in the render cache and will be'
+            ' rendered again when viewed.'
+        ).format(prerender_stats.num_evicted)
+    return result
+
+
+def _prerender_paths(resolved_config, paths):
+    """
+    Render the contents of the files at paths into the render cache unless
+    they are already there. Returns a tuple of (render cache key, size of the
+    contents in bytes), with a size of None if the output was already cached
+    and the files weren't read.
+    """
+    # Keyed the same way as when the examples are viewed, so that viewing
+    # them finds the output without reading the files.
+    render_key = _get_key_for_paths(resolved_config, paths)
+    if render_key is not None and render_cache.has(render_key):
+        return render_key, None
+
+    raw_contents = util.get_contents_from_files(*paths)
+    if render_key is None:
+        render_key = render_cache.get_key(
+            raw_contents,
+            use_color=resolved_config.use_color,
+            color_config=resolved_config.color_config,
+            squeeze=resolved_config.squeeze,
+            subs=resolved_config.subs
+        )
+    if not render_cache.has(render_key):
+        formatted_contents = util.get_formatted_contents(
+            raw_contents,
+            use_color=resolved_config.use_color,
+            color_config=resolved_config.color_config,
+            squeeze=resolved_config.squeeze,
+            subs=resolved_config.subs
+        )
+        # The cache is trimmed once everything has been rendered.
+        render_cache.put(render_key, formatted_contents, max_bytes=None)
+    return render_key, len(raw_contents.encode(_ENCODING))
+
+
+def _get_key_for_paths(resolved_config, paths):
+    return render_cache.get_key_for_paths(
+        paths,
+        use_color=resolved_config.use_color,
+        color_config=resolved_config.color_config,
+        squeeze=resolved_config.squeeze,
+        subs=resolved_config.subs
+    )
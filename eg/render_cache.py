@@ -0,0 +1,490 @@
+import os
+
+from collections import namedtuple
+from eg import config
+from eg import index
+
+
+# Bump this whenever a change to eg alters rendered output for the same input,
+# so that output cached by older versions is never served.
+RENDER_CACHE_VERSION = 2
+
+# The directory, within the eg cache dir, where rendered output is stored.
+RENDER_CACHE_DIR_NAME = 'render'
+
+# The cache is trimmed back under this many bytes, least recently used entries
+# first, whenever a new entry is added.
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+
+# Entries are stored as a header holding the hex digest of the body and its
+# length in bytes, a newline, and the body encoded with this encoding. The
+# length lets an entry be checked with a stat() before it is streamed, and the
+# digest lets `eg --cache verify` detect any other corruption.
+_ENCODING = 'utf-8'
+_HEADER_FORMAT = '{} {:016x}\n'
+
+# The subcommands understood by `eg --cache`.
+CMD_STATS = 'stats'
+CMD_CLEAR = 'clear'
+CMD_VERIFY = 'verify'
+CACHE_COMMANDS = [CMD_STATS, CMD_CLEAR, CMD_VERIFY]
+
+# A summary of the contents of the cache.
+#    cache_dir: the directory holding the entries
+#    num_entries: the number of entries in the cache
+#    total_bytes: the combined size of the entries
+#    max_bytes: the size the cache is trimmed back to
+CacheStats = namedtuple(
+    'CacheStats',
+    [
+        'cache_dir',
+        'num_entries',
+        'total_bytes',
+        'max_bytes',
+    ]
+)
+
+
+# Entries are read back this many characters at a time when streamed.
+_READ_SIZE = 64 * 1024
+
+
+def get_key(raw_contents, use_color, color_config, squeeze, subs):
+    """
+    Return the key under which the result of formatting raw_contents with the
+    given options is cached. The arguments are those accepted by
+    util.get_formatted_contents(), and everything that affects its output is
+    part of the key.
+    """
+    return get_key_for_digest(
+        get_digest([raw_contents]),
+        use_color=use_color,
+        color_config=color_config,
+        squeeze=squeeze,
+        subs=subs
+    )
+
+
+def get_digest(chunks):
+    """
+    Return the digest of the raw contents made up of the strings in chunks,
+    as used by get_key_for_digest(). The chunks are hashed one at a time, so
+    the contents never need to be held in memory at once.
+    """
+    import hashlib
+    hasher = hashlib.sha256()
+    for chunk in chunks:
+        hasher.update(chunk.encode(_ENCODING))
+    return hasher.hexdigest()
+
+
+def get_key_for_paths(paths, use_color, color_config, squeeze, subs):
+    """
+    Return the key under which the result of formatting the contents of the
+    files at paths with the given options is cached. The key is built from
+    the size and mtime of each file rather than its contents, so nothing is
+    read to look it up. Returns None if any of the files is missing or was
+    modified too recently for its mtime to be trusted, in which case the
+    output shouldn't be cached.
+    """
+    return get_key_for_stamps(
+        [get_stamp(path) for path in paths],
+        use_color,
+        color_config,
+        squeeze,
+        subs
+    )
+
+
+def get_key_for_stamps(stamps, use_color, color_config, squeeze, subs):
+    """
+    Return the same key as get_key_for_paths() for files with the stamps
+    returned by get_stamp(), for callers that stat the files themselves.
+    Returns None if any of the stamps is None.
+    """
+    if any(stamp is None for stamp in stamps):
+        return None
+    return _get_hash(
+        [RENDER_CACHE_VERSION, tuple(stamps)] +
+        _get_options(use_color, color_config, squeeze, subs)
+    )
+
+
+def get_key_for_digest(raw_digest, use_color, color_config, squeeze, subs):
+    """
+    Return the same key as get_key() for raw contents with the digest
+    raw_digest, as returned by get_digest().
+    """
+    return _get_hash(
+        [RENDER_CACHE_VERSION, raw_digest] +
+        _get_options(use_color, color_config, squeeze, subs)
+    )
+
+
+def get_options_key(use_color, color_config, squeeze, subs):
+    """
+    Return a key that changes whenever the output of formatting any contents
+    with the given options might change, for telling whether previously
+    rendered output is still current.
+    """
+    return _get_hash(
+        [RENDER_CACHE_VERSION] +
+        _get_options(use_color, color_config, squeeze, subs)
+    )
+
+
+def has(key):
+    """
+    True if there is an entry for key, else False. Unlike get(), the entry is
+    not read or checked.
+    """
+    return os.path.isfile(_get_entry_path(key))
+
+
+def get(key):
+    """
+    Return the rendered output cached under key, or None if there is no valid
+    entry. A hit marks the entry as recently used.
+    """
+    entry_path = _get_entry_path(key)
+    body = _read_entry(entry_path)
+    if body is None:
+        return None
+
+    try:
+        # The mtime of an entry records when it was last used.
+        os.utime(entry_path, None)
+    except OSError:
+        pass
+
+    return body
+
+
+def put(key, rendered, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Cache rendered under key, then evict least recently used entries until the
+    cache is no larger than max_bytes. If max_bytes is None nothing is evicted,
+    which saves looking at every entry when adding many at once, and evict()
+    should be called once they have all been added. Failing to write is not an
+    error, as the output can always be rendered again.
+    """
+    import hashlib
+    body = rendered.encode(_ENCODING)
+    header = _get_header(hashlib.sha1(body).hexdigest(), len(body))
+    index.write_file_atomically(
+        _get_entry_path(key),
+        header + body,
+        binary=True
+    )
+    if max_bytes is not None:
+        _evict(max_bytes)
+
+
+def get_chunks(key):
+    """
+    Return an iterator over the rendered output cached under key in chunks of
+    strings, or None if there is no valid entry. Unlike get(), the output is
+    never held in memory at once, and only the length of the entry is
+    checked, not its digest. A hit marks the entry as recently used.
+    """
+    entry_path = _get_entry_path(key)
+    entry_file = _open_entry(entry_path)
+    if entry_file is None:
+        return None
+
+    try:
+        os.utime(entry_path, None)
+    except OSError:
+        pass
+
+    return _read_chunks(entry_file)
+
+
+def put_chunks(key, chunks, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Yield every string in chunks, caching them under key as they go by. The
+    entry is only added once chunks is exhausted, and not at all if the
+    output grows larger than max_bytes or the iteration is abandoned, so a
+    partial result is never cached. Failing to write is not an error.
+    """
+    import hashlib
+    entry_path = _get_entry_path(key)
+    tmp_path = index.get_tmp_path(entry_path)
+    hasher = hashlib.sha1()
+    num_bytes = 0
+    tmp_file = _open_tmp_file(tmp_path)
+    try:
+        if tmp_file is not None:
+            # The header is filled in once the body is known.
+            tmp_file.write(_get_header('0' * hasher.digest_size * 2, 0))
+
+        for chunk in chunks:
+            yield chunk
+            if tmp_file is None:
+                continue
+            body = chunk.encode(_ENCODING)
+            num_bytes += len(body)
+            hasher.update(body)
+            try:
+                tmp_file.write(body)
+                is_written = num_bytes <= max_bytes
+            except (IOError, OSError):
+                is_written = False
+            if not is_written:
+                # Too large to cache, or the disk is full. Keep going, as the
+                # output is still wanted.
+                tmp_file.close()
+                _remove(tmp_path)
+                tmp_file = None
+
+        if tmp_file is not None:
+            try:
+                tmp_file.seek(0)
+                tmp_file.write(_get_header(hasher.hexdigest(), num_bytes))
+                tmp_file.close()
+                os.rename(tmp_path, entry_path)
+                _evict(max_bytes)
+            except (IOError, OSError):
+                _remove(tmp_path)
+            tmp_file = None
+    finally:
+        if tmp_file is not None:
+            tmp_file.close()
+            _remove(tmp_path)
+
+
+def evict(max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Remove least recently used entries until the cache is no larger than
+    max_bytes.
+    """
+    _evict(max_bytes)
+
+
+def get_stats(max_bytes=DEFAULT_MAX_BYTES):
+    """Return a CacheStats describing the cache."""
+    entries = _get_entries()
+    return CacheStats(
+        cache_dir=get_render_cache_dir(),
+        num_entries=len(entries),
+        total_bytes=sum(size for path, size, mtime in entries),
+        max_bytes=max_bytes,
+    )
+
+
+def clear():
+    """Remove every entry from the cache. Returns the number removed."""
+    removed = 0
+    for path, size, mtime in _get_entries():
+        if _remove(path):
+            removed += 1
+    return removed
+
+
+def verify():
+    """
+    Check every entry against its digest, removing any that are corrupt.
+    Returns a tuple of (number of entries checked, number removed).
+    """
+    checked = 0
+    removed = 0
+    for path, size, mtime in _get_entries():
+        checked += 1
+        if _read_entry(path) is None and _remove(path):
+            removed += 1
+    return checked, removed
+
+
+def get_render_cache_dir():
+    """Return the directory holding the cached rendered output."""
+    return os.path.join(config.get_cache_dir(), RENDER_CACHE_DIR_NAME)
+
+
+def _get_options(use_color, color_config, squeeze, subs):
+    """
+    Return a list of the values of the formatting options that affect the
+    output.
+    """
+    result = [bool(use_color)]
+    # Colors only matter if they are applied.
+    result.append(tuple(color_config) if use_color and color_config else None)
+    result.append(bool(squeeze))
+    for sub in subs or []:
+        result.append((sub.pattern, sub.repl, sub.is_multiline))
+    return result
+
+
+def _get_hash(values):
+    """Return the hex digest of the list of values."""
+    import hashlib
+    hasher = hashlib.sha256()
+    for value in values:
+        # Separate the parts with a character that can't appear in repr() so
+        # that adjacent values can't run together.
+        hasher.update(repr(value).encode(_ENCODING))
+        hasher.update(b'\0')
+    return hasher.hexdigest()
+
+
+def get_stamp(path):
+    """
+    Return a tuple of (path, size, mtime) for the file at path, or None if it
+    can't be found or was modified too recently for its mtime to be trusted.
+    Files in bundles are stamped with their bundle.
+    """
+    stamp = index.get_trusted_stamp(path)
+    if stamp is None:
+        return None
+    return (path,) + stamp
+
+
+def _get_header(digest, body_length):
+    return _HEADER_FORMAT.format(digest, body_length).encode(_ENCODING)
+
+
+def _parse_header(header):
+    """
+    Return a tuple of (digest, body length) from the header line of an
+    entry, or None if it isn't one.
+    """
+    parts = header.rstrip(b'\n').split(b' ')
+    if len(parts) != 2 or not header.endswith(b'\n'):
+        return None
+    try:
+        return parts[0], int(parts[1], 16)
+    except ValueError:
+        return None
+
+
+def _get_entry_path(key):
+    return os.path.join(get_render_cache_dir(), key)
+
+
+def _read_entry(entry_path):
+    """
+    Return the body of the entry at entry_path, or None if it is missing,
+    unreadable, or does not match its digest.
+    """
+    try:
+        with open(entry_path, 'rb') as f:
+            data = f.read()
+    except (IOError, OSError):
+        return None
+
+    import hashlib
+    header, separator, body = data.partition(b'\n')
+    parsed = _parse_header(header + separator)
+    if parsed is None:
+        return None
+    digest, body_length = parsed
+    if len(body) != body_length:
+        return None
+    if hashlib.sha1(body).hexdigest().encode(_ENCODING) != digest:
+        return None
+
+    try:
+        return body.decode(_ENCODING)
+    except UnicodeDecodeError:
+        return None
+
+
+def _open_entry(entry_path):
+    """
+    Return the entry at entry_path open for reading as text from the start of
+    its body, or None if it is missing, unreadable, or not as long as its
+    header says. Checking the digest would mean reading the entry twice, so
+    it is left to verify().
+    """
+    import io
+    try:
+        f = open(entry_path, 'rb')
+    except (IOError, OSError):
+        return None
+
+    try:
+        header = f.readline()
+        parsed = _parse_header(header)
+        if (
+            parsed is None or
+            os.fstat(f.fileno()).st_size != len(header) + parsed[1]
+        ):
+            f.close()
+            return None
+    except (IOError, OSError):
+        f.close()
+        return None
+
+    # newline='' leaves line endings exactly as they were cached.
+    return io.TextIOWrapper(f, encoding=_ENCODING, newline='')
+
+
+def _read_chunks(entry_file):
+    """Yield the rest of entry_file in chunks of strings, then close it."""
+    with entry_file:
+        while True:
+            chunk = entry_file.read(_READ_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _open_tmp_file(tmp_path):
+    """
+    Open tmp_path for writing, creating the cache dir if needed. Returns None
+    if it can't be opened.
+    """
+    try:
+        parent_dir = os.path.dirname(tmp_path)
+        if not os.path.isdir(parent_dir):
+            os.makedirs(parent_dir)
+        return open(tmp_path, 'wb')
+    except (IOError, OSError):
+        return None
+
+
+def _get_entries():
+    """
+    Return a list of (path, size, mtime) tuples for every entry in the cache.
+    Temporary files from in-progress writes are not entries.
+    """
+    cache_dir = get_render_cache_dir()
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return []
+
+    result = []
+    for name in names:
+        if name.endswith('.tmp'):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        result.append((path, stat.st_size, stat.st_mtime))
+    return result
+
+
+def _evict(max_bytes):
+    """Remove least recently used entries until the cache fits in max_bytes."""
+    entries = _get_entries()
+    total_bytes = sum(size for path, size, mtime in entries)
+    if total_bytes <= max_bytes:
+        return
+
+    entries.sort(key=lambda entry: entry[2])
+    for path, size, mtime in entries:
+        if total_bytes <= max_bytes:
+            break
+        if _remove(path):
+            total_bytes -= size
+
+
+def _remove(path):
+    """Remove the file at path. Returns True if it was removed."""
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
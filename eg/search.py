@@ -0,0 +1,838 @@
+import array
+import bisect
+import hashlib
+import heapq
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+
+from collections import namedtuple
+from eg import bundle
+from eg import catalog
+from eg import config
+from eg import index
+
+
+# Full-text search over every section of every example. Each section, i.e. a
+# heading and the prose and code beneath it, is a document. Documents are
+# stored in an inverted index in the eg cache dir and ranked with BM25.
+#
+# The index is made of segments, each covering a set of files, and a manifest
+# naming the segments in use. When files change, only they are read again: a
+# new segment is written for them and their documents in older segments are
+# marked deleted. Once there are too many segments or deleted documents the
+# whole index is rebuilt.
+#
+# A segment file has the layout:
+#
+#   header:      magic, format version, number of documents, number of terms,
+#                offset of the strings
+#   doc table:   one record per document giving the offset and length of its
+#                strings
+#   term table:  one offset per term, pointing at the term's entry, sorted by
+#                term so that it can be binary searched in place
+#   entries:     per term the length of the term, the number of postings, the
+#                largest weight, the term itself, the ids of the documents
+#                containing it and the BM25 weight of the term in each of them
+#   strings:     per document its program, heading, and path, separated by
+#                null characters
+#
+# All integers are little-endian.
+
+# Bump this when the layout of segments or the manifest changes, or when
+# documents are tokenized differently. Indexes with another version are
+# rebuilt.
+SEARCH_INDEX_VERSION = 3
+
+# The directory, within the eg cache dir, holding the search indexes.
+SEARCH_DIR_NAME = 'search'
+
+# The number of results returned by default.
+DEFAULT_LIMIT = 20
+
+SEGMENT_MAGIC = b'EGSEARCH'
+
+# BM25 parameters, at the values most implementations default to.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Words in headings count this many times over words in the body.
+HEADING_WEIGHT = 2
+
+# The index is rebuilt from scratch rather than given another segment once it
+# has this many segments, or once this fraction of its documents are deleted.
+MAX_SEGMENTS = 8
+MAX_DELETED_FRACTION = 0.25
+
+# Searches stop looking for new documents once the best ones can't be beaten,
+# but only while there are at most this many candidates, as checking costs a
+# pass over them.
+_MAX_PRUNING_CANDIDATES = 10000
+
+# Words too common to be worth indexing.
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in',
+    'into', 'is', 'it', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'with',
+])
+
+_HEADER = struct.Struct('<8sIIIQ')
+_DOC = struct.Struct('<II')
+_TERM_OFFSET = struct.Struct('<Q')
+_TERM = struct.Struct('<HIf')
+
+_ENCODING = 'utf-8'
+_MANIFEST_FILE_NAME = 'manifest.json'
+_FILES_FILE_NAME = 'files.json'
+_SEGMENT_PREFIX = 'seg-'
+
+# Runs of letters and digits, in any script.
+_TOKEN_PATTERN = re.compile(r'[^\W_]+', re.UNICODE)
+_HEADING_PATTERN = re.compile(r'^#+\s*(.*?)\s*$')
+
+# A section matching a query.
+#    program: the program the example is for
+#    heading: the heading of the section, which is empty for any text before
+#        the first heading in a file
+#    path: the file the section is in
+#    score: the BM25 score of the section for the query
+SearchResult = namedtuple(
+    'SearchResult',
+    [
+        'program',
+        'heading',
+        'path',
+        'score',
+    ]
+)
+
+
+class Segment():
+    """
+    A read-only view of a segment file. Nothing is parsed up front: terms are
+    looked up by binary searching the memory-mapped term table.
+    """
+
+    def __init__(self, segment_path, contents=None):
+        """
+        Open the segment at segment_path. If contents is given, the segment
+        is read from those bytes instead, and segment_path is only used in
+        errors.
+        """
+        if contents is not None:
+            self._map = contents
+        else:
+            with open(segment_path, 'rb') as f:
+                self._map = mmap.mmap(
+                    f.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ
+                )
+
+        magic, version, num_docs, num_terms, strings_offset = (
+            _HEADER.unpack_from(self._map, 0)
+        )
+        if magic != SEGMENT_MAGIC or version != SEARCH_INDEX_VERSION:
+            self.close()
+            raise ValueError('not a search segment: ' + segment_path)
+
+        self.num_docs = num_docs
+        self._num_terms = num_terms
+        self._strings_offset = strings_offset
+        self._term_table_offset = _HEADER.size + num_docs * _DOC.size
+
+    def get_postings(self, term):
+        """
+        Return a tuple of (doc_ids, weights, max_weight) for the documents
+        containing term, or None if no document does. doc_ids and weights are
+        arrays, sorted by document id.
+        """
+        wanted = term.encode(_ENCODING)
+        low = 0
+        high = self._num_terms
+        while low < high:
+            middle = (low + high) // 2
+            entry_offset, = _TERM_OFFSET.unpack_from(
+                self._map,
+                self._term_table_offset + middle * _TERM_OFFSET.size
+            )
+            term_len, count, max_weight = _TERM.unpack_from(
+                self._map,
+                entry_offset
+            )
+            start = entry_offset + _TERM.size
+            candidate = self._map[start:start + term_len]
+            if candidate < wanted:
+                low = middle + 1
+            elif candidate > wanted:
+                high = middle
+            else:
+                ids_start = start + term_len
+                weights_start = ids_start + count * 4
+                doc_ids = _read_array('I', self._map[ids_start:weights_start])
+                weights = _read_array(
+                    'f',
+                    self._map[weights_start:weights_start + count * 4]
+                )
+                return doc_ids, weights, max_weight
+        return None
+
+    def get_doc(self, doc_id):
+        """Return a tuple of (program, heading, path) for doc_id."""
+        offset, length = _DOC.unpack_from(
+            self._map,
+            _HEADER.size + doc_id * _DOC.size
+        )
+        start = self._strings_offset + offset
+        strings = self._map[start:start + length].decode(_ENCODING)
+        program, heading, path = strings.split('\0')
+        return program, heading, path
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+def search(resolved_config, query, limit=DEFAULT_LIMIT):
+    """
+    Return up to limit SearchResults for the sections of the examples in the
+    directories of resolved_config that best match query, best first. The
+    index is brought up to date first.
+    """
+    examples_dir = resolved_config.examples_dir
+    custom_dir = resolved_config.custom_dir
+    search_dir = get_search_dir(examples_dir, custom_dir)
+
+    terms = get_tokens(query)
+    manifest = _load_json(os.path.join(search_dir, _MANIFEST_FILE_NAME))
+    if not _is_fresh(manifest, examples_dir, custom_dir):
+        manifest = update_index(search_dir, manifest, examples_dir, custom_dir)
+        if manifest is None:
+            return _search_in_memory(examples_dir, custom_dir, terms, limit)
+
+    try:
+        return _query(search_dir, manifest, terms, limit)
+    except (IOError, OSError, ValueError, struct.error):
+        # The index is damaged, e.g. a segment has gone missing, so build it
+        # again from nothing.
+        manifest = update_index(search_dir, None, examples_dir, custom_dir)
+        if manifest is None:
+            return _search_in_memory(examples_dir, custom_dir, terms, limit)
+        return _query(search_dir, manifest, terms, limit)
+
+
+def get_tokens(text):
+    """
+    Return the words of text that are indexed, lowercased, in the order they
+    appear.
+    """
+    return [
+        token for token in _TOKEN_PATTERN.findall(text.lower())
+        if token not in STOP_WORDS
+    ]
+
+
+def get_sections(contents):
+    """
+    Split the contents of an example file into a list of (heading, body)
+    tuples, one per section. Text before the first heading is a section with
+    an empty heading.
+    """
+    result = []
+    heading = ''
+    body = []
+    for line in contents.splitlines():
+        match = _HEADING_PATTERN.match(line)
+        if not match:
+            body.append(line)
+            continue
+        if heading or any(body_line.strip() for body_line in body):
+            result.append((heading, '\n'.join(body)))
+        heading = match.group(1)
+        body = []
+
+    if heading or any(body_line.strip() for body_line in body):
+        result.append((heading, '\n'.join(body)))
+
+    return result
+
+
+def get_search_dir(examples_dir, custom_dir):
+    """
+    Return the directory holding the search index for the pair of
+    directories. The name is a digest of both, so that every pair gets its
+    own index.
+    """
+    key = '{}\0{}'.format(examples_dir or '', custom_dir or '')
+    digest = hashlib.sha1(key.encode(_ENCODING)).hexdigest()
+    return os.path.join(config.get_cache_dir(), SEARCH_DIR_NAME, digest)
+
+
+def update_index(search_dir, manifest, examples_dir, custom_dir):
+    """
+    Bring the index in search_dir up to date with the files in examples_dir
+    and custom_dir, reading only the files that have changed since manifest
+    was written. Returns the new manifest, or None if the index couldn't be
+    written, e.g. because the cache dir is read-only.
+    """
+    dir_mtimes, programs = _get_example_files(examples_dir, custom_dir)
+
+    # {path: [mtime, size, first doc id, number of docs, total doc length,
+    # crc]}, where crc is None unless the file was read while it was still
+    # racy, as described in _get_stamps().
+    files = None
+    if _is_usable(manifest, examples_dir, custom_dir):
+        files = _load_json(os.path.join(search_dir, _FILES_FILE_NAME))
+
+    stamps, racy = _get_stamps(programs, files, manifest, dir_mtimes)
+    changed = []
+    settled = []
+    for path in sorted(programs):
+        stored = files.get(path) if files else None
+        if stored is None or stored[:2] != stamps[path]:
+            changed.append(path)
+        elif stored[5] is not None and path not in racy:
+            # Read while it might still have been changing without its mtime
+            # moving, so only its contents can tell whether it has since.
+            if _get_crc(path) == stored[5]:
+                settled.append(path)
+            else:
+                changed.append(path)
+    stale = changed + [path for path in files or [] if path not in programs]
+
+    if files is not None:
+        deleted = set(manifest['deleted'])
+        for path in stale:
+            if path in files:
+                first_doc_id, count, length = files[path][2:5]
+                deleted.update(range(first_doc_id, first_doc_id + count))
+        if (
+            len(manifest['segments']) >= MAX_SEGMENTS or
+            len(deleted) > MAX_DELETED_FRACTION * manifest['next_doc_id']
+        ):
+            files = None
+
+    if files is None:
+        # Start again from nothing.
+        changed = sorted(programs)
+        files = {}
+        deleted = set()
+        segments = []
+        next_doc_id = 0
+        num_docs = 0
+        total_length = 0
+    else:
+        segments = list(manifest['segments'])
+        next_doc_id = manifest['next_doc_id']
+        num_docs = manifest['num_docs']
+        total_length = manifest['total_length']
+        for path in stale:
+            if path in files:
+                first_doc_id, count, length = files.pop(path)[2:5]
+                num_docs -= count
+                total_length -= length
+
+        for path in settled:
+            files[path][5] = None
+
+    docs = []
+    for path in changed:
+        # Taken before the file is read for its documents, so a change made
+        # in between is seen next time rather than missed.
+        crc = _get_crc(path) if path in racy else None
+        file_docs = _get_docs(programs[path], path)
+        length = sum(doc[4] for doc in file_docs)
+        files[path] = stamps[path] + [
+            next_doc_id + len(docs),
+            len(file_docs),
+            length,
+            crc,
+        ]
+        docs.extend(file_docs)
+        num_docs += len(file_docs)
+        total_length += length
+
+    if docs:
+        segment_name = '{}{}-{}.bin'.format(
+            _SEGMENT_PREFIX,
+            next_doc_id,
+            os.getpid()
+        )
+        if not write_segment(
+            os.path.join(search_dir, segment_name),
+            docs,
+            float(total_length) / num_docs
+        ):
+            return None
+        segments.append([segment_name, next_doc_id, len(docs)])
+        next_doc_id += len(docs)
+
+    result = {
+        'version': SEARCH_INDEX_VERSION,
+        'examples_dir': examples_dir,
+        'custom_dir': custom_dir,
+        'dirs': dir_mtimes,
+        # Racy files are checked on every search until they have settled.
+        'num_racy': sum(1 for entry in files.values() if entry[5] is not None),
+        'segments': segments,
+        'deleted': sorted(deleted),
+        'next_doc_id': next_doc_id,
+        'num_docs': num_docs,
+        'total_length': total_length,
+    }
+
+    # The manifest is written last, so that a reader sees either the old
+    # index or the new one.
+    index.write_file_atomically(
+        os.path.join(search_dir, _FILES_FILE_NAME),
+        json.dumps(files)
+    )
+    index.write_file_atomically(
+        os.path.join(search_dir, _MANIFEST_FILE_NAME),
+        json.dumps(result)
+    )
+    _remove_unused_segments(search_dir, segments)
+
+    return result
+
+
+def write_segment(segment_path, docs, average_length):
+    """
+    Write a segment holding docs to segment_path, as built by
+    get_segment_contents(). Returns False if it couldn't be written.
+    """
+    return index.write_file_atomically(
+        segment_path,
+        get_segment_contents(docs, average_length),
+        binary=True
+    )
+
+
+def get_segment_contents(docs, average_length):
+    """
+    Return the bytes of a segment holding docs. docs is a list of (program,
+    heading, path, term_counts, length) tuples, and the documents get ids in
+    the order given. Term weights are computed against average_length, the
+    average length of every document in the index.
+    """
+    postings = {}
+    doc_table = []
+    strings = []
+    strings_length = 0
+    for doc_id, (program, heading, path, term_counts, length) in enumerate(
+        docs
+    ):
+        encoded = '\0'.join([program, heading, path]).encode(_ENCODING)
+        doc_table.append(_DOC.pack(strings_length, len(encoded)))
+        strings.append(encoded)
+        strings_length += len(encoded)
+
+        normalizer = BM25_K1 * (
+            1 - BM25_B + BM25_B * length / average_length
+        )
+        for term, count in term_counts.items():
+            weight = count * (BM25_K1 + 1) / (count + normalizer)
+            postings.setdefault(term, []).append((doc_id, weight))
+
+    terms = sorted(term.encode(_ENCODING) for term in postings)
+    entries_offset = (
+        _HEADER.size +
+        len(docs) * _DOC.size +
+        len(terms) * _TERM_OFFSET.size
+    )
+
+    term_table = []
+    entries = []
+    offset = entries_offset
+    for term in terms:
+        term_postings = postings[term.decode(_ENCODING)]
+        doc_ids = array.array('I', [doc_id for doc_id, weight in term_postings])
+        weights = array.array('f', [weight for doc_id, weight in term_postings])
+        entry = b''.join([
+            _TERM.pack(len(term), len(term_postings), max(weights)),
+            term,
+            _write_array(doc_ids),
+            _write_array(weights),
+        ])
+        term_table.append(_TERM_OFFSET.pack(offset))
+        entries.append(entry)
+        offset += len(entry)
+
+    header = _HEADER.pack(
+        SEGMENT_MAGIC,
+        SEARCH_INDEX_VERSION,
+        len(docs),
+        len(terms),
+        offset
+    )
+    return b''.join([header] + doc_table + term_table + entries + strings)
+
+
+def _query(search_dir, manifest, terms, limit):
+    """Return the SearchResults for terms from the index in search_dir."""
+    num_docs = manifest['num_docs']
+    if not terms or not num_docs:
+        return []
+
+    bases = [base for name, base, count in manifest['segments']]
+    segments = [
+        Segment(os.path.join(search_dir, name))
+        for name, base, count in manifest['segments']
+    ]
+
+    try:
+        return _get_results(
+            segments,
+            bases,
+            set(manifest['deleted']),
+            num_docs,
+            terms,
+            limit
+        )
+    finally:
+        for segment in segments:
+            segment.close()
+
+
+def _search_in_memory(examples_dir, custom_dir, terms, limit):
+    """
+    Return the SearchResults for terms from a segment built in memory from
+    every example file, for when the index can't be stored.
+    """
+    dir_mtimes, programs = _get_example_files(examples_dir, custom_dir)
+    docs = []
+    for path in sorted(programs):
+        docs.extend(_get_docs(programs[path], path))
+    if not terms or not docs:
+        return []
+
+    average_length = float(sum(doc[4] for doc in docs)) / len(docs)
+    segment = Segment(None, get_segment_contents(docs, average_length))
+    return _get_results([segment], [0], set(), len(docs), terms, limit)
+
+
+def _get_results(segments, bases, deleted, num_docs, terms, limit):
+    """
+    Return the SearchResults for terms from segments, the documents of each
+    of which are numbered from the matching entry in bases.
+    """
+    scores = _get_scores(
+        segments,
+        bases,
+        deleted,
+        num_docs,
+        set(terms),
+        limit
+    )
+    result = []
+    for doc_id in _get_best(scores, limit):
+        position = bisect.bisect_right(bases, doc_id) - 1
+        program, heading, path = segments[position].get_doc(
+            doc_id - bases[position]
+        )
+        result.append(SearchResult(
+            program=program,
+            heading=heading,
+            path=path,
+            score=scores[doc_id],
+        ))
+    return result
+
+
+def _get_best(scores, limit):
+    """Return the ids of the limit best scoring documents, best first."""
+    if len(scores) <= limit:
+        best = list(scores)
+    else:
+        # Comparing bare floats is much cheaper than going through a key
+        # function for every document.
+        threshold = heapq.nlargest(limit, scores.values())[-1]
+        best = [
+            doc_id for doc_id, score in scores.items() if score >= threshold
+        ]
+    # Break ties by document id so that results are stable.
+    return heapq.nsmallest(
+        limit,
+        best,
+        key=lambda doc_id: (-scores[doc_id], doc_id)
+    )
+
+
+def _get_scores(segments, bases, deleted, num_docs, terms, limit):
+    """
+    Return a dict of {doc_id: score} holding at least the limit best scoring
+    documents for terms.
+
+    Terms are scored one at a time, rarest first. Once the limit best scores
+    so far are at least the most that the remaining terms could add up to, no
+    document that hasn't matched yet can make the cut, so the remaining terms
+    only add to the scores of documents already found. This saves scoring
+    every document containing a common word when a query also has rare ones.
+    """
+    # [(upper_bound, idf, [(base, doc_ids, weights), ...], doc_freq), ...]
+    term_postings = []
+    for term in terms:
+        postings = []
+        doc_freq = 0
+        max_weight = 0
+        for segment, base in zip(segments, bases):
+            found = segment.get_postings(term)
+            if found is None:
+                continue
+            doc_ids, weights, segment_max_weight = found
+            postings.append((base, doc_ids, weights))
+            doc_freq += len(doc_ids)
+            max_weight = max(max_weight, segment_max_weight)
+        if deleted:
+            for base, doc_ids, weights in postings:
+                doc_freq -= len(
+                    deleted.intersection(map(base.__add__, doc_ids))
+                )
+        if doc_freq <= 0:
+            continue
+        idf = math.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+        term_postings.append((idf * max_weight, idf, postings, doc_freq))
+
+    term_postings.sort(key=lambda entry: entry[3])
+    remaining_bound = sum(entry[0] for entry in term_postings)
+
+    scores = {}
+    only_update = False
+    for upper_bound, idf, postings, doc_freq in term_postings:
+        remaining_bound -= upper_bound
+        if only_update:
+            _add_to_existing_scores(scores, idf, postings, bases)
+            continue
+
+        scores = _add_scores(scores, idf, postings)
+        if deleted:
+            for doc_id in deleted.intersection(scores):
+                del scores[doc_id]
+
+        if limit <= len(scores) <= _MAX_PRUNING_CANDIDATES:
+            threshold = heapq.nlargest(limit, scores.values())[-1]
+            only_update = threshold >= remaining_bound
+
+    return scores
+
+
+def _add_scores(scores, idf, postings):
+    """
+    Add idf times the weight of every posting to scores, returning the new
+    scores. scores may be modified in place or replaced.
+    """
+    # Filling a dict from the postings happens in C, so the Python loop runs
+    # over whichever of the scores and the postings is smaller. Segments
+    # never share documents, so the postings of one term never collide.
+    num_postings = sum(len(doc_ids) for base, doc_ids, weights in postings)
+    if num_postings > len(scores):
+        old_scores = scores
+        scores = {}
+        for base, doc_ids, weights in postings:
+            if base:
+                doc_ids = map(base.__add__, doc_ids)
+            scores.update(zip(doc_ids, map(idf.__mul__, weights)))
+        for doc_id, score in old_scores.items():
+            scores[doc_id] = scores.get(doc_id, 0) + score
+        return scores
+
+    for base, doc_ids, weights in postings:
+        if base:
+            doc_ids = map(base.__add__, doc_ids)
+        for doc_id, weight in zip(doc_ids, weights):
+            scores[doc_id] = scores.get(doc_id, 0) + idf * weight
+    return scores
+
+
+def _add_to_existing_scores(scores, idf, postings, bases):
+    """
+    Add idf times the weight of the postings for documents already in scores,
+    ignoring the rest.
+    """
+    postings_by_base = dict(
+        (base, (doc_ids, weights)) for base, doc_ids, weights in postings
+    )
+    for doc_id in scores:
+        base = bases[bisect.bisect_right(bases, doc_id) - 1]
+        if base not in postings_by_base:
+            continue
+        doc_ids, weights = postings_by_base[base]
+        local_id = doc_id - base
+        position = bisect.bisect_left(doc_ids, local_id)
+        if position < len(doc_ids) and doc_ids[position] == local_id:
+            scores[doc_id] += idf * weights[position]
+
+
+def _get_docs(program, path):
+    """
+    Return the documents for the sections of the example file at path, as
+    described in write_segment(). A file that can't be read has none.
+    """
+    try:
+        contents = bundle.read_file(path)
+    except (IOError, OSError, UnicodeDecodeError):
+        return []
+
+    program_tokens = get_tokens(program)
+    result = []
+    for heading, body in get_sections(contents):
+        term_counts = {}
+        tokens = (
+            program_tokens +
+            get_tokens(heading) * HEADING_WEIGHT +
+            get_tokens(body)
+        )
+        for token in tokens:
+            term_counts[token] = term_counts.get(token, 0) + 1
+        result.append((program, heading, path, term_counts, len(tokens)))
+    return result
+
+
+def _get_example_files(examples_dir, custom_dir):
+    """
+    Return a tuple of (dir_mtimes, programs) for the example files in both
+    directories. dir_mtimes is as described in index.load_index(), covering
+    both directories. programs maps the path of every example file to its
+    program.
+    """
+    dir_mtimes = {}
+    programs = {}
+    for root in [examples_dir, custom_dir]:
+        file_index, mtimes = catalog.load_file_index(root)
+        if mtimes is None or dir_mtimes is None:
+            dir_mtimes = None
+        else:
+            dir_mtimes.update(mtimes)
+
+        for file_name, paths in file_index.items():
+            if not catalog.is_example_file(file_name):
+                continue
+            program = catalog.get_program_from_file_name(file_name)
+            for path in paths:
+                programs[path] = program
+
+    return dir_mtimes, programs
+
+
+def _get_stamps(programs, files, manifest, dir_mtimes):
+    """
+    Return a tuple of (stamps, racy). stamps is a dict mapping every path in
+    programs to an [mtime, size] list that changes whenever the file does,
+    as from index.get_stamp(), or [None, None] if it is missing. Files in
+    directories that haven't changed since manifest was written are taken to
+    be unchanged too, and their stamps are taken from files rather than the
+    disk, so that bringing the index up to date doesn't stat every file.
+
+    racy is the set of paths modified too recently for their stamps to be
+    trusted, which may yet change without their mtime moving. The contents of
+    these are checked again once they have settled.
+    """
+    unchanged_dirs = set()
+    if files and manifest.get('dirs') and dir_mtimes:
+        unchanged_dirs = set(
+            path for path, mtime in manifest['dirs'].items()
+            if dir_mtimes.get(path) == mtime
+        )
+
+    stamps = {}
+    racy = set()
+    for path in programs:
+        stored = files.get(path) if files else None
+        if (
+            stored is not None and
+            stored[0] is not None and
+            stored[5] is None and
+            os.path.dirname(path) in unchanged_dirs
+        ):
+            stamps[path] = stored[:2]
+            continue
+        stamp = index.get_stamp(path)
+        if stamp is None:
+            stamps[path] = [None, None]
+            continue
+        size, mtime, is_racy = stamp
+        stamps[path] = [mtime, size]
+        if is_racy:
+            racy.add(path)
+    return stamps, racy
+
+
+def _get_crc(path):
+    """
+    Return the CRC-32 of the contents of the file at path. A file that can't
+    be read has the CRC-32 of nothing.
+    """
+    try:
+        contents = bundle.read_file(path)
+    except (IOError, OSError, UnicodeDecodeError):
+        contents = ''
+    return zlib.crc32(contents.encode(_ENCODING)) & 0xffffffff
+
+
+def _is_usable(manifest, examples_dir, custom_dir):
+    """True if manifest was written for these directories by this version."""
+    return bool(
+        manifest and
+        manifest.get('version') == SEARCH_INDEX_VERSION and
+        manifest.get('examples_dir') == examples_dir and
+        manifest.get('custom_dir') == custom_dir
+    )
+
+
+def _is_fresh(manifest, examples_dir, custom_dir):
+    """
+    True if the index described by manifest is up to date, else False.
+
+    This runs before every search, so only the directories are checked, as
+    index.py does: adding, removing, or replacing a file changes the mtime of
+    its directory. A file edited in place, which leaves its directory alone,
+    is read again once the directory next changes. Files that were racy when
+    they were read are checked every time until they have settled.
+    """
+    if not _is_usable(manifest, examples_dir, custom_dir):
+        return False
+    if manifest['num_racy']:
+        return False
+    return not index.is_stale(manifest['dirs'])
+
+
+def _remove_unused_segments(search_dir, segments):
+    in_use = set(name for name, base, count in segments)
+    try:
+        names = os.listdir(search_dir)
+    except OSError:
+        return
+    for name in names:
+        if name.startswith(_SEGMENT_PREFIX) and name not in in_use:
+            try:
+                os.remove(os.path.join(search_dir, name))
+            except OSError:
+                pass
+
+
+def _load_json(path):
+    """Return the JSON in the file at path, or None if it can't be read."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _read_array(typecode, data):
+    result = array.array(typecode)
+    result.frombytes(data)
+    if sys.byteorder != 'little':
+        result.byteswap()
+    return result
+
+
+def _write_array(values):
+    if sys.byteorder != 'little':
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
@@ -0,0 +1,346 @@
+import hashlib
+import json
+
+from concurrent import futures
+from http import server as http_server
+from urllib import parse as url_parse
+from eg import api
+from eg import batch
+from eg import render_cache
+from eg import util
+
+
+# Serves rendered examples over HTTP, for sites that would otherwise run eg
+# once per page view. Requests are handled by a fixed pool of threads sharing
+# the caches in eg.api, so each example is rendered once until its files
+# change.
+#
+#   GET /             the programs with examples, as for `eg --list`
+#   GET /PROGRAM      the examples for PROGRAM
+#
+# Either takes ?format=text, ansi, html, or json. Examples are sent with an
+# ETag derived from the contents of their files and the formatting options,
+# and a request whose If-None-Match matches it gets a 304 without anything
+# being rendered.
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8000
+DEFAULT_NUM_THREADS = 8
+
+# The formats examples can be served in.
+FORMAT_TEXT = 'text'
+FORMAT_ANSI = 'ansi'
+FORMAT_HTML = 'html'
+FORMAT_JSON = 'json'
+
+CONTENT_TYPES = {
+    FORMAT_TEXT: 'text/plain; charset=utf-8',
+    FORMAT_ANSI: 'text/plain; charset=utf-8',
+    FORMAT_HTML: 'text/html; charset=utf-8',
+    FORMAT_JSON: 'application/json',
+}
+
+_ENCODING = 'utf-8'
+
+_HTML_PAGE = """<!DOCTYPE html>
+<html>
+<head><meta charset="utf-8"><title>{title}</title></head>
+<body><pre>{body}</pre></body>
+</html>
+"""
+
+
+def serve(resolved_config, port=None, num_threads=None):
+    """
+    Serve the examples in resolved_config over HTTP on port until
+    interrupted, handling requests with num_threads threads.
+    """
+    server = make_server(
+        resolved_config,
+        port=DEFAULT_PORT if port is None else port,
+        num_threads=num_threads
+    )
+    host, port = server.server_address[:2]
+    print('eg serving examples at: http://{}:{}/'.format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def make_server(resolved_config, host=DEFAULT_HOST, port=0, num_threads=None):
+    """
+    Return a server, not yet serving, for the examples in resolved_config on
+    host and port. A port of 0 picks a free one, which can be found in
+    server_address.
+    """
+    server = _PooledHTTPServer(
+        (host, port),
+        _RequestHandler,
+        num_threads or DEFAULT_NUM_THREADS
+    )
+    server.resolved_config = resolved_config
+    return server
+
+
+def get_etag(entry, digest, resolved_config, output_format):
+    """
+    Return the ETag for the examples of entry, an api.Entry, served in
+    output_format according to resolved_config. digest is that of the
+    contents of the files, from api.Rendering.
+    """
+    color_config = None
+    if output_format == FORMAT_ANSI:
+        color_config = _get_ansi_config(resolved_config).color_config
+    options_key = render_cache.get_options_key(
+        use_color=output_format == FORMAT_ANSI,
+        color_config=color_config,
+        squeeze=resolved_config.squeeze,
+        subs=resolved_config.subs
+    )
+    value = '\0'.join([
+        digest,
+        options_key,
+        output_format,
+        entry.program,
+    ])
+    return '"' + hashlib.sha1(value.encode(_ENCODING)).hexdigest() + '"'
+
+
+def is_etag_match(if_none_match, etag):
+    """
+    True if the value of an If-None-Match header matches etag, else False.
+    Weak comparison is used, as is right for GET requests.
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def get_rendering(entry, resolved_config, output_format, is_current=None):
+    """
+    Return the api.Rendering of the examples of entry for output_format, or
+    None if there are none. is_current is passed on to
+    api.render_with_digest().
+    """
+    if output_format == FORMAT_ANSI:
+        return api.render_with_digest(
+            entry.program,
+            _get_ansi_config(resolved_config),
+            color=True,
+            is_current=is_current
+        )
+    return api.render_with_digest(
+        entry.program,
+        resolved_config,
+        color=False,
+        is_current=is_current
+    )
+
+
+def get_body(entry, rendered, output_format):
+    """
+    Return the examples of entry as a string in output_format, given rendered,
+    as from get_rendering().
+    """
+    if output_format == FORMAT_HTML:
+        return _get_html(entry.program, rendered)
+    if output_format == FORMAT_JSON:
+        return _get_json(entry.program, entry.resolved_program, rendered)
+    return rendered
+
+
+def _get_ansi_config(resolved_config):
+    """
+    Return resolved_config with color on. The colors in it are used if it has
+    any, and api.render() falls back to the defaults if not.
+    """
+    return resolved_config._replace(use_color=True)
+
+
+def _get_html(title, text):
+    # Imported here so that only HTML requests pay for it.
+    import html
+    return _HTML_PAGE.format(
+        title=html.escape(title),
+        body=html.escape(text)
+    )
+
+
+def _get_json(program, resolved_program, rendered):
+    return batch.get_result_json(batch.BatchResult(
+        program=program,
+        resolved_program=resolved_program,
+        rendered=rendered,
+    ))
+
+
+class _PooledHTTPServer(http_server.HTTPServer):
+    """An HTTPServer handing each request to one of a fixed pool of threads."""
+
+    # Connections waiting to be accepted. The default of 5 makes clients
+    # beyond that wait for a retransmit when many connect at once.
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, num_threads):
+        http_server.HTTPServer.__init__(self, server_address, handler_class)
+        self._pool = futures.ThreadPoolExecutor(num_threads)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(
+            self._process_request_in_pool,
+            request,
+            client_address
+        )
+
+    def _process_request_in_pool(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        http_server.HTTPServer.server_close(self)
+        self._pool.shutdown(wait=True)
+
+
+class _RequestHandler(http_server.BaseHTTPRequestHandler):
+    """
+    Answers GET and HEAD requests for examples and the list of them. Each
+    connection is closed after one response, so a slow client holds on to a
+    thread from the pool no longer than its request takes.
+    """
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def log_message(self, format, *args):
+        # Logging every request to stderr slows serving down noticeably.
+        pass
+
+    def _respond(self, send_body):
+        resolved_config = self.server.resolved_config
+        url = url_parse.urlsplit(self.path)
+        query = url_parse.parse_qs(url.query)
+        output_format = query.get('format', [FORMAT_TEXT])[-1]
+        if output_format not in CONTENT_TYPES:
+            self._send(
+                400,
+                FORMAT_TEXT,
+                'Unknown format: ' + output_format + '\n',
+                send_body
+            )
+            return
+
+        program = url_parse.unquote(url.path).lstrip('/')
+        if not program:
+            self._send(
+                200,
+                output_format,
+                _get_list_body(resolved_config, output_format),
+                send_body
+            )
+            return
+
+        # The ETag and the body come from the same read of the files, so
+        # an ETag never describes a different version of them than the body.
+        if_none_match = self.headers.get('If-None-Match')
+        entry = api.lookup(program, resolved_config)
+        rendering = None
+        if entry is not None:
+            rendering = get_rendering(
+                entry,
+                resolved_config,
+                output_format,
+                is_current=lambda digest: is_etag_match(
+                    if_none_match,
+                    get_etag(entry, digest, resolved_config, output_format)
+                )
+            )
+        if rendering is None:
+            # The examples may have been removed since they were looked up.
+            self._send(
+                404,
+                output_format,
+                _get_no_entry_body(resolved_config, program, output_format),
+                send_body
+            )
+            return
+
+        etag = get_etag(
+            entry,
+            rendering.digest,
+            resolved_config,
+            output_format
+        )
+        if is_etag_match(if_none_match, etag):
+            self._send(304, output_format, None, send_body, etag)
+            return
+
+        self._send(
+            200,
+            output_format,
+            get_body(entry, rendering.rendered, output_format),
+            send_body,
+            etag
+        )
+
+    def _send(self, status, output_format, body, send_body, etag=None):
+        """
+        Send a response with status, and body as its content unless it is
+        None or send_body is False.
+        """
+        encoded = body.encode(_ENCODING) if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', CONTENT_TYPES[output_format])
+        if etag:
+            self.send_header('ETag', etag)
+            # Caches may keep examples, but must check they're still current.
+            self.send_header('Cache-Control', 'no-cache')
+        if status != 304:
+            self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        if send_body and status != 304:
+            try:
+                self.wfile.write(encoded)
+            except (IOError, OSError):
+                # The client went away.
+                pass
+
+
+def _get_list_body(resolved_config, output_format):
+    commands = api.list_commands(resolved_config)
+    if output_format == FORMAT_JSON:
+        return json.dumps(commands)
+    text = '\n'.join(commands) + '\n'
+    if output_format == FORMAT_HTML:
+        return _get_html('eg', text)
+    return text
+
+
+def _get_no_entry_body(resolved_config, program, output_format):
+    if output_format == FORMAT_JSON:
+        return _get_json(program, api.resolve(program, resolved_config), None)
+    message = util.get_no_entry_message(
+        program,
+        api.get_suggestions(program, resolved_config),
+        in_alias_cycle=api.is_in_alias_cycle(program, resolved_config)
+    )
+    if output_format == FORMAT_HTML:
+        return _get_html(program, message)
+    return message + '\n'
@@ -1,5 +1,28 @@
 import re
 
+try:
+    from re import _constants as sre_constants
+    from re import _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+
+# Ranges in character classes wider than this aren't worth tracking character
+# by character, so patterns using them are never fused.
+_MAX_RANGE_SIZE = 256
+
+# The most chains kept by get_chain(). There is normally one per config.
+_MAX_CHAINS = 32
+
+_chains = {}
+
+# sre_parse is private and the shape of what it returns changes between
+# Python versions. Anything it returns that we don't understand raises one of
+# these, and the substitution is then treated as one that can't be fused or
+# applied line by line.
+_INTROSPECTION_ERRORS = (AttributeError, TypeError, ValueError)
+
 
 class Substitution:
     """
@@ -20,21 +43,411 @@ class Substitution:
         self.repl = replacement
         self.is_multiline = is_multiline
 
+        # Compiled once here rather than on every application.
+        if self.is_multiline:
+            self._compiled = re.compile(self.pattern, re.MULTILINE)
+        else:
+            self._compiled = re.compile(self.pattern)
+
     def apply_and_get_result(self, string):
         """
         Perform the substitution represented by this object on string and return
         the result.
         """
-        if self.is_multiline:
-            compiled_pattern = re.compile(self.pattern, re.MULTILINE)
-        else:
-            compiled_pattern = re.compile(self.pattern)
-
-        result = re.sub(compiled_pattern, self.repl, string)
+        result = re.sub(self._compiled, self.repl, string)
         return result
 
+    def _get_key(self):
+        return (self.pattern, self.repl, self.is_multiline)
+
     def __eq__(self, other):
         if isinstance(other, self.__class__):
-            return self.__dict__ == other.__dict__
+            return self._get_key() == other._get_key()
+        else:
+            return False
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._get_key())
+
+
+class SubstitutionChain:
+    """
+    A list of substitutions applied in order, each to the result of the one
+    before, with as few passes over the text as possible.
+
+    Runs of substitutions that can't affect each other are fused into a single
+    regular expression, with a named group for each substitution unless they
+    all replace plain text, and applied in one pass. The rest are applied one
+    at a time. Either way the result is the same as applying every
+    substitution in turn.
+    """
+
+    def __init__(self, substitutions):
+        self.substitutions = list(substitutions)
+
+        # A list of (pattern, function returning the replacement for a match)
+        # for fused runs, and (substitution, None) for substitutions applied
+        # on their own.
+        self._steps = []
+
+        # The tuples returned by _get_fusion_info() for the run being built.
+        run = []
+        for sub in self.substitutions:
+            info = _get_fusion_info(sub)
+            if info is None:
+                self._add_run(run)
+                run = []
+                self._steps.append((sub, None))
+            elif _can_fuse(run, info):
+                run.append(info)
+            else:
+                self._add_run(run)
+                run = [info]
+        self._add_run(run)
+
+        # Worked out by is_line_local() the first time it is needed.
+        self._is_line_local = None
+
+    def _add_run(self, run):
+        if len(run) == 1:
+            self._steps.append((run[0][0], None))
+        elif run and all(info[3] is not None for info in run):
+            # Plain text only, so a match is enough to tell which substitution
+            # it belongs to. Leaving out groups lets re skip quickly through
+            # text that can't match.
+            replacements = dict((info[3], info[0].repl) for info in run)
+            pattern = '|'.join(re.escape(literal) for literal in replacements)
+            self._steps.append((
+                re.compile(pattern),
+                lambda match: replacements[match.group()]
+            ))
+        elif run:
+            parts = []
+            replacements = {}
+            all_chars = set()
+            for i, (sub, chars, max_width, literal) in enumerate(run):
+                name = 's{}'.format(i)
+                parts.append('(?P<{}>{})'.format(name, sub.pattern))
+                replacements[name] = sub.repl
+                all_chars |= chars
+            # The lookahead rejects positions no alternative can match before
+            # trying each in turn.
+            pattern = '(?=[{}])(?:{})'.format(
+                ''.join(re.escape(c) for c in sorted(all_chars)),
+                '|'.join(parts)
+            )
+            self._steps.append((
+                re.compile(pattern),
+                lambda match: replacements[match.lastgroup]
+            ))
+
+    def get_num_passes(self):
+        """Return the number of passes made over the text."""
+        return len(self._steps)
+
+    def is_line_local(self):
+        """
+        True if applying the chain to each line of a text on its own gives the
+        same result as applying it to the whole text, else False.
+        """
+        if self._is_line_local is None:
+            self._is_line_local = all(
+                _is_line_local(sub) for sub in self.substitutions
+            )
+        return self._is_line_local
+
+    def apply_and_get_result(self, string):
+        """
+        Perform every substitution on string in order and return the result.
+        """
+        result = string
+        for step, get_replacement in self._steps:
+            if get_replacement is None:
+                result = step.apply_and_get_result(result)
+            else:
+                result = step.sub(get_replacement, result)
+        return result
+
+
+def get_chain(substitutions):
+    """
+    Return a SubstitutionChain for the list substitutions. Chains are kept, so
+    building one is paid for once per list rather than on every render.
+    """
+    key = tuple(substitutions)
+    result = _chains.get(key)
+    if result is None:
+        if len(_chains) >= _MAX_CHAINS:
+            _chains.clear()
+        result = SubstitutionChain(substitutions)
+        _chains[key] = result
+    return result
+
+
+def _can_fuse(run, info):
+    """
+    True if the substitution described by info, as returned by
+    _get_fusion_info(), can be fused with the run of substitutions before it,
+    else False.
+
+    Fusing it into the run means it is matched against the text before any of
+    the run has been applied, rather than after. That is only safe if nothing
+    in the run can create or destroy a match for it, and if its matches can't
+    overlap those of the run.
+    """
+    sub, chars, max_width, literal = info
+    for earlier, earlier_chars, earlier_max_width, earlier_literal in run:
+        if literal is not None and earlier_literal is not None:
+            # Plain text can be checked exactly: it is only affected by
+            # replacing or inserting text it could overlap.
+            if (
+                _can_overlap(literal, earlier_literal) or
+                _can_overlap(literal, earlier.repl)
+            ):
+                return False
+        elif chars & earlier_chars or chars & set(earlier.repl):
+            # A match only ever consumes characters the pattern can match, so
+            # it is enough that none of those characters are matched or
+            # inserted by the earlier substitution.
+            return False
+        if not earlier.repl and max_width > 1:
+            # Deleting text can join two halves of a match together.
+            return False
+    return True
+
+
+def _can_overlap(first, second):
+    """
+    True if an occurrence of first and an occurrence of second in the same
+    text can share a character, else False.
+    """
+    if not first or not second:
+        return False
+    if first in second or second in first:
+        return True
+    for length in range(1, min(len(first), len(second))):
+        if first.endswith(second[:length]) or second.endswith(first[:length]):
+            return True
+    return False
+
+
+def _get_fusion_info(sub):
+    """
+    Return a tuple of (sub, chars, max_width, literal) if sub can be fused
+    with other substitutions, else None. chars is the set of characters that
+    matches of sub can contain, max_width the length of the longest possible
+    match, and literal the text the pattern matches if it only matches plain
+    text, else None.
+
+    A substitution can be fused if its matches don't depend on what surrounds
+    them and its replacement is plain text. That rules out anchors,
+    lookarounds, backreferences, capturing groups, inline flags, categories
+    like digits or whitespace, and backslashes in the replacement.
+    """
+    if not isinstance(sub, Substitution):
+        return None
+    if not sub.pattern or '\\' in sub.repl:
+        return None
+    try:
+        return _get_parsed_fusion_info(sub)
+    except _INTROSPECTION_ERRORS:
+        # Applied on its own, which is always correct, just slower.
+        return None
+
+
+def _get_parsed_fusion_info(sub):
+    parsed = sre_parse.parse(sub.pattern)
+    state = _get_state(parsed)
+    if state.flags & ~sre_constants.SRE_FLAG_UNICODE:
+        return None
+    if state.groups > 1:
+        return None
+    min_width, max_width = parsed.getwidth()
+    if min_width == 0:
+        return None
+
+    chars = _get_chars(parsed)
+    if chars is None:
+        return None
+
+    literal = None
+    if all(str(op) == 'LITERAL' for op, value in parsed):
+        literal = ''.join(chr(value) for op, value in parsed)
+    return sub, chars, max_width, literal
+
+
+def _get_state(parsed):
+    """
+    Return the object holding the flags and group count of the parsed
+    pattern. It is called state from Python 3.8 and pattern before that.
+    """
+    return getattr(parsed, 'state', None) or parsed.pattern
+
+
+def _get_chars(parsed):
+    """
+    Return the set of characters the parsed pattern can match, or None if it
+    contains anything but literals, character classes, alternation,
+    non-capturing groups, and repetition.
+    """
+    result = set()
+    for op, value in parsed:
+        name = str(op)
+        if name == 'LITERAL':
+            result.add(chr(value))
+        elif name == 'IN':
+            for item_op, item_value in value:
+                item_name = str(item_op)
+                if item_name == 'LITERAL':
+                    result.add(chr(item_value))
+                elif item_name == 'RANGE':
+                    low, high = item_value
+                    if high - low > _MAX_RANGE_SIZE:
+                        return None
+                    result.update(chr(c) for c in range(low, high + 1))
+                else:
+                    return None
+        elif name == 'BRANCH':
+            for branch in value[1]:
+                chars = _get_chars(branch)
+                if chars is None:
+                    return None
+                result |= chars
+        elif name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            chars = _get_chars(value[2])
+            if chars is None:
+                return None
+            result |= chars
+        elif name == 'SUBPATTERN':
+            group, add_flags, del_flags, subpattern = value
+            if group is not None or add_flags or del_flags:
+                return None
+            chars = _get_chars(subpattern)
+            if chars is None:
+                return None
+            result |= chars
         else:
+            return None
+    return result
+
+
+def _is_line_local(sub):
+    """
+    True if applying sub to each line of a text, without its newline, gives
+    the same result as applying it to the whole text, else False.
+
+    That is the case if no match can contain a newline or depend on what is
+    on another line. Anchors are allowed if they match at line boundaries, as
+    they do with re.MULTILINE, and so are word boundaries, as a newline is
+    not part of a word. Lookarounds are not allowed, as they can see past the
+    end of the line.
+    """
+    if not isinstance(sub, Substitution):
+        return False
+    try:
+        parsed = sre_parse.parse(sub.pattern)
+        flags = _get_state(parsed).flags
+        if flags & sre_constants.SRE_FLAG_DOTALL:
             return False
+        is_multiline = (
+            sub.is_multiline or bool(flags & sre_constants.SRE_FLAG_MULTILINE)
+        )
+        return _is_line_local_pattern(parsed, is_multiline)
+    except _INTROSPECTION_ERRORS:
+        # The whole text is then substituted at once, which is always correct.
+        return False
+
+
+def _is_line_local_pattern(parsed, is_multiline):
+    """
+    True if nothing in the parsed pattern can match a newline or look beyond
+    the line it is matching on, else False. is_multiline is True if ^ and $
+    match at line boundaries.
+    """
+    for op, value in parsed:
+        name = str(op)
+        if name == 'LITERAL':
+            if value == ord('\n'):
+                return False
+        elif name == 'NOT_LITERAL':
+            if value != ord('\n'):
+                return False
+        elif name == 'ANY':
+            # Without DOTALL, which is checked by the caller, . never matches
+            # a newline.
+            pass
+        elif name == 'IN':
+            if _can_match_newline(value):
+                return False
+        elif name == 'AT':
+            at_name = str(value)
+            if at_name in ('AT_BEGINNING', 'AT_END'):
+                if not is_multiline:
+                    return False
+            elif at_name not in ('AT_BOUNDARY', 'AT_NON_BOUNDARY'):
+                return False
+        elif name == 'BRANCH':
+            for branch in value[1]:
+                if not _is_line_local_pattern(branch, is_multiline):
+                    return False
+        elif name in ('MAX_REPEAT', 'MIN_REPEAT', 'POSSESSIVE_REPEAT'):
+            if not _is_line_local_pattern(value[2], is_multiline):
+                return False
+        elif name == 'SUBPATTERN':
+            group, add_flags, del_flags, subpattern = value
+            if add_flags & sre_constants.SRE_FLAG_DOTALL:
+                return False
+            subpattern_is_multiline = is_multiline
+            if add_flags & sre_constants.SRE_FLAG_MULTILINE:
+                subpattern_is_multiline = True
+            if del_flags & sre_constants.SRE_FLAG_MULTILINE:
+                subpattern_is_multiline = False
+            if not _is_line_local_pattern(subpattern, subpattern_is_multiline):
+                return False
+        elif name == 'ATOMIC_GROUP':
+            if not _is_line_local_pattern(value, is_multiline):
+                return False
+        elif name == 'GROUPREF':
+            # Only ever matches text already matched by a group.
+            pass
+        elif name == 'GROUPREF_EXISTS':
+            group, yes, no = value
+            for branch in (yes, no):
+                if branch and not _is_line_local_pattern(branch, is_multiline):
+                    return False
+        else:
+            return False
+    return True
+
+
+def _can_match_newline(items):
+    """
+    True if the character class made up of the parsed items can match a
+    newline, else False.
+    """
+    newline = ord('\n')
+    is_negated = False
+    contains_newline = False
+    for item_op, item_value in items:
+        item_name = str(item_op)
+        if item_name == 'NEGATE':
+            is_negated = True
+        elif item_name == 'LITERAL':
+            contains_newline = contains_newline or item_value == newline
+        elif item_name == 'RANGE':
+            low, high = item_value
+            contains_newline = contains_newline or low <= newline <= high
+        elif item_name == 'CATEGORY':
+            # Digits, words, and non-whitespace are the only categories that
+            # never include a newline.
+            contains_newline = contains_newline or str(item_value) not in (
+                'CATEGORY_DIGIT',
+                'CATEGORY_WORD',
+                'CATEGORY_NOT_SPACE',
+            )
+        else:
+            return True
+    return contains_newline != is_negated
@@ -0,0 +1,358 @@
+import array
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+from eg import config
+from eg import index
+
+
+# Suggestions for programs eg has no examples for, e.g. `tar` for `eg tarr`.
+#
+# Candidates come from a symmetric delete dictionary: every string that can be
+# made by deleting up to MAX_DISTANCE characters from a name maps back to that
+# name. Two strings within MAX_DISTANCE edits of each other always share such
+# a delete, so looking up the deletes of what the user typed finds every name
+# that might be close, at a cost that depends on the length of what was typed
+# and not on the number of names. The candidates are then checked with the
+# real edit distance.
+#
+# The dictionary is stored in the eg cache dir along with a fingerprint of what
+# it was built from, and is rebuilt whenever that changes. The file has the
+# layout:
+#
+#   header:      magic, format version, number of names, number of deletes,
+#                fingerprint
+#   name table:  one offset per name, pointing at the name
+#   key table:   one offset per delete, pointing at its entry, sorted by the
+#                delete so that it can be binary searched in place
+#   entries:     per delete its length, the number of names it came from, the
+#                delete itself, and the indexes of the names
+#   names:       per name its length and the name itself
+#
+# All integers are little-endian.
+
+# Bump this when the layout of the dictionary file changes.
+SUGGEST_INDEX_VERSION = 1
+
+# The directory, within the eg cache dir, holding the dictionaries.
+SUGGEST_DIR_NAME = 'suggest'
+
+SUGGEST_MAGIC = b'EGSUGGST'
+
+# Names more than this many edits away from what was typed aren't suggested.
+MAX_DISTANCE = 2
+
+# The most suggestions made for one program.
+MAX_SUGGESTIONS = 3
+
+_HEADER = struct.Struct('<8sIII20s')
+_OFFSET = struct.Struct('<Q')
+_KEY = struct.Struct('<HI')
+_NAME = struct.Struct('<H')
+
+_ENCODING = 'utf-8'
+
+
+class SuggestIndex():
+    """
+    A read-only view of a dictionary file. Nothing is parsed up front: deletes
+    are looked up by binary searching the memory-mapped key table.
+    """
+
+    def __init__(self, index_path, contents=None):
+        """
+        Open the dictionary at index_path. If contents is given, the
+        dictionary is read from those bytes instead, and index_path is only
+        used in errors.
+        """
+        if contents is not None:
+            self._map = contents
+        else:
+            with open(index_path, 'rb') as f:
+                self._map = mmap.mmap(
+                    f.fileno(),
+                    0,
+                    access=mmap.ACCESS_READ
+                )
+
+        magic, version, num_names, num_keys, fingerprint = (
+            _HEADER.unpack_from(self._map, 0)
+        )
+        if magic != SUGGEST_MAGIC or version != SUGGEST_INDEX_VERSION:
+            self.close()
+            raise ValueError('not a suggestion index: ' + index_path)
+
+        self.fingerprint = fingerprint
+        self._num_keys = num_keys
+        self._names_offset = _HEADER.size
+        self._keys_offset = _HEADER.size + num_names * _OFFSET.size
+
+    def get_candidates(self, word):
+        """
+        Return the set of names within MAX_DISTANCE deletes of sharing a
+        delete with word. Every name within MAX_DISTANCE edits of word is in
+        it, along with some that are further away.
+        """
+        result = set()
+        for delete in get_deletes(word, MAX_DISTANCE):
+            for name_index in self._get_name_indexes(delete):
+                result.add(self._get_name(name_index))
+        return result
+
+    def _get_name_indexes(self, key):
+        wanted = key.encode(_ENCODING)
+        low = 0
+        high = self._num_keys
+        while low < high:
+            middle = (low + high) // 2
+            entry_offset, = _OFFSET.unpack_from(
+                self._map,
+                self._keys_offset + middle * _OFFSET.size
+            )
+            key_len, count = _KEY.unpack_from(self._map, entry_offset)
+            start = entry_offset + _KEY.size
+            candidate = self._map[start:start + key_len]
+            if candidate < wanted:
+                low = middle + 1
+            elif candidate > wanted:
+                high = middle
+            else:
+                indexes_start = start + key_len
+                result = array.array('I')
+                result.frombytes(
+                    self._map[indexes_start:indexes_start + count * 4]
+                )
+                if sys.byteorder != 'little':
+                    result.byteswap()
+                return result
+        return []
+
+    def _get_name(self, name_index):
+        name_offset, = _OFFSET.unpack_from(
+            self._map,
+            self._names_offset + name_index * _OFFSET.size
+        )
+        name_len, = _NAME.unpack_from(self._map, name_offset)
+        start = name_offset + _NAME.size
+        return self._map[start:start + name_len].decode(_ENCODING)
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+def get_suggestions(examples, program):
+    """
+    Return up to MAX_SUGGESTIONS names of programs and aliases in the Catalog
+    examples that are close to program, closest first. Ties are broken
+    alphabetically.
+    """
+    if not program:
+        return []
+
+    suggest_index = _get_index(examples)
+    if not suggest_index:
+        return []
+    try:
+        candidates = suggest_index.get_candidates(program)
+    finally:
+        suggest_index.close()
+
+    scored = []
+    for candidate in candidates:
+        if candidate == program:
+            continue
+        distance = get_distance(program, candidate, MAX_DISTANCE)
+        if distance <= MAX_DISTANCE:
+            scored.append((distance, candidate))
+    scored.sort()
+    return [candidate for distance, candidate in scored[:MAX_SUGGESTIONS]]
+
+
+def get_deletes(word, max_distance):
+    """
+    Return the set of strings made by deleting up to max_distance characters
+    from word, including word itself.
+    """
+    result = set([word])
+    current = [word]
+    for _ in range(max_distance):
+        next_deletes = []
+        for item in current:
+            for i in range(len(item)):
+                delete = item[:i] + item[i + 1:]
+                if delete not in result:
+                    result.add(delete)
+                    next_deletes.append(delete)
+        current = next_deletes
+    return result
+
+
+def get_distance(source, target, max_distance):
+    """
+    Return the Damerau-Levenshtein distance between source and target, where
+    swapping two adjacent characters counts as one edit. Any distance over
+    max_distance is returned as max_distance + 1.
+    """
+    if abs(len(source) - len(target)) > max_distance:
+        return max_distance + 1
+
+    # Only the last two rows of the table are needed.
+    previous_previous = None
+    previous = list(range(len(target) + 1))
+    for i in range(1, len(source) + 1):
+        current = [i] + [0] * len(target)
+        for j in range(1, len(target) + 1):
+            cost = 0 if source[i - 1] == target[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + cost
+            )
+            if (
+                i > 1 and
+                j > 1 and
+                source[i - 1] == target[j - 2] and
+                source[i - 2] == target[j - 1]
+            ):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+
+    return min(previous[-1], max_distance + 1)
+
+
+def write_index(index_path, names, fingerprint):
+    """
+    Write a dictionary of the deletes of names to index_path, and return its
+    contents. They are returned even if index_path couldn't be written, e.g.
+    because the cache dir is read-only.
+    """
+    names = sorted(names)
+    deletes = {}
+    for name_index, name in enumerate(names):
+        for delete in get_deletes(name, MAX_DISTANCE):
+            deletes.setdefault(delete.encode(_ENCODING), []).append(
+                name_index
+            )
+
+    keys = sorted(deletes)
+    name_table_size = len(names) * _OFFSET.size
+    key_table_size = len(keys) * _OFFSET.size
+    offset = _HEADER.size + name_table_size + key_table_size
+
+    key_table = []
+    entries = []
+    for key in keys:
+        name_indexes = array.array('I', deletes[key])
+        if sys.byteorder != 'little':
+            name_indexes.byteswap()
+        entry = b''.join([
+            _KEY.pack(len(key), len(name_indexes)),
+            key,
+            name_indexes.tobytes(),
+        ])
+        key_table.append(_OFFSET.pack(offset))
+        entries.append(entry)
+        offset += len(entry)
+
+    name_table = []
+    encoded_names = []
+    for name in names:
+        encoded = name.encode(_ENCODING)
+        name_table.append(_OFFSET.pack(offset))
+        encoded_names.append(_NAME.pack(len(encoded)) + encoded)
+        offset += _NAME.size + len(encoded)
+
+    header = _HEADER.pack(
+        SUGGEST_MAGIC,
+        SUGGEST_INDEX_VERSION,
+        len(names),
+        len(keys),
+        fingerprint
+    )
+    contents = b''.join(
+        [header] + name_table + key_table + entries + encoded_names
+    )
+    index.write_file_atomically(index_path, contents, binary=True)
+    return contents
+
+
+def get_fingerprint(names):
+    """Return a digest that changes whenever the set of names does."""
+    joined = '\0'.join(sorted(names))
+    return hashlib.sha1(joined.encode(_ENCODING)).digest()
+
+
+def _get_catalog_fingerprint(examples):
+    """
+    Return a digest of the mtimes the Catalog examples was built from, or None
+    if they can't be trusted to change when a name does.
+
+    Names only change when a file is added to or removed from a directory, or
+    when the aliases file is edited, and any of those change an mtime. This
+    costs one entry per directory rather than sorting every name.
+    """
+    items = []
+    for mtimes in examples.get_mtimes():
+        if not index.is_trusted(mtimes):
+            return None
+        for path, mtime in sorted(mtimes.items()):
+            items.append('{}\0{!r}'.format(path, mtime))
+    joined = 'mtimes\0' + '\0'.join(items)
+    return hashlib.sha1(joined.encode(_ENCODING)).digest()
+
+
+def _get_index(examples):
+    """
+    Return the SuggestIndex for the names in the Catalog examples, building it
+    first if the stored one is missing or out of date. Returns None if there
+    are no names.
+    """
+    index_path = _get_index_path(examples.examples_dir, examples.custom_dir)
+    # Gathering and sorting every name is the slow part of a lookup, so it is
+    # only done when the mtimes can't be used instead.
+    names = None
+    fingerprint = _get_catalog_fingerprint(examples)
+    if not fingerprint:
+        names = _get_names(examples)
+        fingerprint = get_fingerprint(names)
+
+    try:
+        result = SuggestIndex(index_path)
+        if result.fingerprint == fingerprint:
+            return result
+        result.close()
+    except (IOError, OSError, ValueError, struct.error):
+        pass
+
+    if names is None:
+        names = _get_names(examples)
+    if not names:
+        return None
+    contents = write_index(index_path, names, fingerprint)
+    # Read from memory rather than the file, which may not have been written.
+    return SuggestIndex(index_path, contents)
+
+
+def _get_names(examples):
+    """Return the set of programs and aliases in the Catalog examples."""
+    return (
+        examples.get_default_programs() |
+        examples.get_custom_programs() |
+        set(examples.aliases)
+    )
+
+
+def _get_index_path(examples_dir, custom_dir):
+    key = '{}\0{}'.format(examples_dir or '', custom_dir or '')
+    digest = hashlib.sha1(key.encode(_ENCODING)).hexdigest()
+    return os.path.join(
+        config.get_cache_dir(),
+        SUGGEST_DIR_NAME,
+        digest + '.bin'
+    )
@@ -1,14 +1,16 @@
-import json
 import os
-import pydoc
-import subprocess
+import sys
+import time
 
+from eg import bundle
+from eg import catalog
 from eg import color
+from eg import render_cache
 from eg import substitute
 
 
 # The file name suffix expected for example files.
-EXAMPLE_FILE_SUFFIX = '.md'
+EXAMPLE_FILE_SUFFIX = catalog.EXAMPLE_FILE_SUFFIX
 
 # Version of eg itself.
 # Also bump in setup.py.
@@ -18,11 +20,45 @@ VERSION = '1.2.2'
 FLAG_ONLY_CUSTOM = '+'
 FLAG_CUSTOM_AND_DEFAULT = '*'
 
+# Flag for showing that an alias comes from the aliases file in the custom dir.
+FLAG_CUSTOM_ALIAS = '^'
+
 # This flag indicates that we should use the fallback pager.
 FLAG_FALLBACK = 'pydoc.pager'
 
 # The name of the file storing mappings of aliases to programs with entries.
-ALIAS_FILE_NAME = 'aliases.json'
+ALIAS_FILE_NAME = catalog.ALIAS_FILE_NAME
+
+# The number of characters read from example files at a time when streaming
+# them to the pager. This bounds the memory used for all but very long lines.
+CHUNK_SIZE = 64 * 1024
+
+# How long to wait, in seconds, for a file of examples to make any progress
+# being read before skipping it. Reads only stall like this when the file is on
+# a network mount that can't be reached.
+READ_TIMEOUT_S = 5
+
+# The most files of examples read at once.
+MAX_READ_THREADS = 4
+
+# The number of chunks of a file read ahead of the chunk being used.
+_READ_AHEAD_CHUNKS = 4
+
+# Files are read by a pool of daemon threads, started as first needed and
+# kept for the life of the process, taking tasks from _read_tasks. A thread
+# whose read stalls is replaced, and exits once the read finally returns.
+_read_tasks = None
+_read_lock = None
+_num_readers = 0
+
+# The process the reader threads were started in. A process forked from it,
+# e.g. by --batch, has none of them and starts its own.
+_readers_pid = None
+
+# {path: the number of reads of it that have stalled and not yet finished}.
+# These paths are skipped straight away rather than tying up another thread,
+# until the stalled reads finally return.
+_stalled_paths = {}
 
 
 def _inform_cannot_edit_no_custom_dir():
@@ -46,22 +82,17 @@ def _inform_cannot_edit_no_custom_dir():
     print(msg)
 
 
-def _recursive_get_all_file_names(dir):
+def _inform_cannot_edit_bundle(bundle_path):
     """
-    Get all the file names in the directory. Gets all the top level file names
-    only, not the full path.
-
-    dir: a directory or string, as to hand to os.walk(). If None, returns empty
-        list.
+    Inform the user that the custom dir is a bundle, which cannot be edited in
+    place.
     """
-    if not dir:
-        return []
-
-    result = []
-    for basedir, dirs, files in os.walk(dir):
-        result.extend(files)
-
-    return result
+    print(
+        'The custom dir at ' +
+        bundle_path +
+        ' is a bundle and cannot be edited. Edit the directory it was built' +
+        ' from and run `eg --build-bundle` again.'
+    )
 
 
 def edit_custom_examples(program, config):
@@ -73,12 +104,14 @@ def edit_custom_examples(program, config):
         _inform_cannot_edit_no_custom_dir()
         return
 
+    if bundle.is_bundle(config.custom_dir):
+        _inform_cannot_edit_bundle(config.custom_dir)
+        return
+
     # resolve aliases
-    resolved_program = get_resolved_program(program, config)
-    custom_file_paths = get_file_paths_for_program(
-        resolved_program,
-        config.custom_dir
-    )
+    examples = catalog.get_catalog(config)
+    resolved_program = examples.resolve(program)
+    custom_file_paths = examples.get_custom_paths(resolved_program)
 
     if (len(custom_file_paths) > 0):
         path_to_edit = custom_file_paths[0]
@@ -87,46 +120,184 @@ def edit_custom_examples(program, config):
         path_to_edit = os.path.join(config.custom_dir, resolved_program + '.md')
 
     # Edit the first. Handles the base case.
+    import subprocess
     subprocess.call([config.editor_cmd, path_to_edit])
 
 
 def handle_program(program, config):
-    # try to resolve any aliases
-    resolved_program = get_resolved_program(program, config)
-
-    default_file_paths = get_file_paths_for_program(
-        resolved_program,
-        config.examples_dir
+    # Checking whether the catalog is stale stats the directories, which
+    # stalls like reading them if they are on a mount that can't be reached.
+    examples = _call_with_timeout(
+        (config.examples_dir, config.custom_dir),
+        lambda: catalog.get_catalog(config)
     )
+    if examples is _STALLED:
+        sys.stderr.write(
+            'Could not read the examples within ' +
+            str(READ_TIMEOUT_S) +
+            ' seconds.\n'
+        )
+        return
 
-    custom_file_paths = get_file_paths_for_program(
-        resolved_program,
-        config.custom_dir
-    )
+    # try to resolve any aliases
+    resolved_program = examples.resolve(program)
+
+    # Custom examples are shown first.
+    paths = examples.get_paths(resolved_program)
 
     # Handle the case where we have nothing for them.
-    if len(default_file_paths) == 0 and len(custom_file_paths) == 0:
-        print(
-            'No entry found for ' +
-            program +
-            '. Run `eg --list` to see all available entries.'
-        )
+    if len(paths) == 0:
+        suggestions = get_suggestions(examples, program)
+        print(get_no_entry_message(
+            program,
+            suggestions,
+            in_alias_cycle=program in examples.alias_cycles
+        ))
+        return
+
+    # With nothing to format, the files are copied straight to the pager, or
+    # to stdout if it isn't a terminal or they fit on the screen, without
+    # ever being decoded.
+    if can_pass_through(config):
+        screen_size = get_screen_size()
+        if screen_size is None or _fit_on_screen(paths, screen_size):
+            write_files_to_stdout(paths)
+        else:
+            page_files(paths, config.pager_cmd)
         return
 
-    paths = [path for path in custom_file_paths]
-    paths.extend(default_file_paths)
+    # Output is streamed as it is formatted, so the first screen appears
+    # before the last file has been read.
+    formatted_chunks = get_rendered_chunks(paths, config)
+
+    show_chunks(formatted_chunks, config.pager_cmd)
+
+
+def get_no_entry_message(program, suggestions=None, in_alias_cycle=False):
+    """
+    Return the message shown when there are no examples for program, offering
+    the names in suggestions instead if there are any. If in_alias_cycle,
+    program is an alias that leads around a cycle, which is pointed out.
+    """
+    result = 'No entry found for ' + program + '.'
+    if in_alias_cycle:
+        result += (
+            ' It is an alias that leads around a cycle of aliases, so check'
+            ' your aliases files.'
+        )
+    if suggestions:
+        result += ' Did you mean: ' + ', '.join(suggestions) + '?'
+    return result + ' Run `eg --list` to see all available entries.'
+
+
+def get_suggestions(examples, program):
+    """
+    Return the names in the Catalog examples that are close enough to program
+    to be what was meant.
+    """
+    # Only needed when a program is missing, so kept off the startup path.
+    from eg import suggest
+    return suggest.get_suggestions(examples, program)
+
+
+def get_rendered_contents(paths, config):
+    """
+    Return the contents of the files at paths, concatenated and formatted
+    according to config. The result is served from the render cache if these
+    files have been formatted the same way before.
+    """
+    # Formatting is deterministic, so if we've formatted these files the same
+    # way before we can use the cached result.
+    cache_key = _get_cache_key(paths, config)
+    if cache_key is not None:
+        formatted_contents = render_cache.get(cache_key)
+        if formatted_contents is not None:
+            return formatted_contents
+
     raw_contents = get_contents_from_files(*paths)
+    if cache_key is None:
+        # Files modified too recently to be stamped are keyed on their
+        # contents instead, which they have been read for anyway.
+        cache_key = render_cache.get_key(
+            raw_contents,
+            use_color=config.use_color,
+            color_config=config.color_config,
+            squeeze=config.squeeze,
+            subs=config.subs
+        )
+        formatted_contents = render_cache.get(cache_key)
+    else:
+        formatted_contents = None
+
+    if formatted_contents is None:
+        formatted_contents = get_formatted_contents(
+            raw_contents,
+            use_color=config.use_color,
+            color_config=config.color_config,
+            squeeze=config.squeeze,
+            subs=config.subs
+        )
+        render_cache.put(cache_key, formatted_contents)
+
+    return formatted_contents
 
-    formatted_contents = get_formatted_contents(
-        raw_contents,
+
+def get_rendered_chunks(paths, config):
+    """
+    Yield the same output as get_rendered_contents(), in chunks of strings
+    produced as the files at paths are read and formatted. Cached output is
+    streamed from the render cache, and new output is added to it once it has
+    all been produced. Nothing is read until the first chunk is asked for, so
+    the pager can be started before any of the work is done.
+    """
+    # The key is built from the stats of the files, so looking it up reads
+    # none of them, and on a miss they are only read once, to format them.
+    cache_key = _get_cache_key(paths, config)
+    chunks = None
+    if cache_key is not None:
+        chunks = render_cache.get_chunks(cache_key)
+    if chunks is None:
+        chunks = get_formatted_chunks(
+            get_chunks_from_files(*paths),
+            use_color=config.use_color,
+            color_config=config.color_config,
+            squeeze=config.squeeze,
+            subs=config.subs
+        )
+        # Files modified too recently to be stamped are streamed without
+        # being cached.
+        if cache_key is not None:
+            chunks = render_cache.put_chunks(cache_key, chunks)
+
+    for chunk in chunks:
+        yield chunk
+
+
+def _get_cache_key(paths, config):
+    """
+    Return render_cache.get_key_for_paths() for paths and config. The files
+    are stat'd by the reader threads, so that a file on a mount that can't be
+    reached is given up on after READ_TIMEOUT_S seconds, like a stalled read,
+    and None is returned.
+    """
+    stamps = []
+    # Each stamp is wrapped in a tuple, as None would end the read.
+    for path, item in _get_reads(
+        paths,
+        lambda path: [(render_cache.get_stamp(path),)]
+    ):
+        if item is _STALLED:
+            # Reading the file is skipped with a warning in turn.
+            return None
+        stamps.append(item[0])
+    return render_cache.get_key_for_stamps(
+        stamps,
         use_color=config.use_color,
         color_config=config.color_config,
         squeeze=config.squeeze,
         subs=config.subs
     )
 
-    page_string(formatted_contents, config.pager_cmd)
-
 
 def get_file_paths_for_program(program, dir_to_search):
     """
@@ -136,71 +307,645 @@ def get_file_paths_for_program(program, dir_to_search):
     Path is not guaranteed to exist. Just says where it should be if it
     existed. Paths must be fully expanded before being passed in (i.e. no ~ or
     variables).
+
+    Paths come from the persistent index of dir_to_search, which only walks the
+    directory if the index is missing or stale.
     """
     if dir_to_search is None:
         return []
     else:
         wanted_file_name = program + EXAMPLE_FILE_SUFFIX
-        result = []
-        for basedir, dirs, file_names in os.walk(dir_to_search):
-            for file_name in file_names:
-                if file_name == wanted_file_name:
-                    result.append(os.path.join(basedir, file_name))
-
-        return result
+        file_index = catalog.get_file_index(dir_to_search)
+        return list(file_index.get(wanted_file_name, []))
 
 
 def get_contents_from_files(*paths):
     """
-    Take the paths to two files and return the contents as a string. If
-    custom_file_path is valid, it will be shown before the contents of the
-    default file.
+    Take the paths to files and return their contents concatenated as a
+    string, in the order given, so custom files are shown before default ones.
+    The files are read concurrently, and any that can't be read within
+    READ_TIMEOUT_S seconds are left out with a warning.
     """
-    file_data = ''
+    return ''.join(_read_concurrently(
+        paths,
+        lambda path: [_get_contents_of_file(path)]
+    ))
 
-    for path in paths:
-        file_data += _get_contents_of_file(path)
 
-    return file_data
+def get_chunks_from_files(*paths):
+    """
+    Yield the contents of the files at paths, concatenated as by
+    get_contents_from_files(), in chunks of whole lines of about CHUNK_SIZE
+    characters. Only the last chunk may not end in a newline.
+    """
+    return get_line_aligned_chunks(_get_chunks_of_files(paths))
 
 
-def page_string(str_to_page, pager_cmd):
+def get_line_aligned_chunks(chunks):
     """
-    Page str_to_page via the pager.
+    Yield the text made up of the strings in chunks, split into chunks that
+    each end in a newline, except perhaps the last. Lines are yielded as soon
+    as the chunk completing them is seen.
     """
+    partial_line = []
+    for chunk in chunks:
+        end = chunk.rfind('\n') + 1
+        if end == 0:
+            partial_line.append(chunk)
+            continue
+        if partial_line:
+            partial_line.append(chunk[:end])
+            yield ''.join(partial_line)
+        else:
+            yield chunk[:end]
+        partial_line = [chunk[end:]] if end < len(chunk) else []
+
+    if partial_line:
+        yield ''.join(partial_line)
+
+
+def show_chunks(chunks, pager_cmd):
+    """
+    Show the strings in chunks: written straight to stdout if it isn't a
+    terminal or they fit on the screen, and otherwise paged via the pager.
+    Lines are counted as the chunks are produced, and only until there are
+    more than fit, at which point the pager is started.
+    """
+    screen_size = get_screen_size()
+    if screen_size is None:
+        write_chunks_to_stdout(chunks)
+        return
+
+    num_columns, num_rows = screen_size
+    chunks = iter(chunks)
+    seen_chunks = []
+    num_lines = 0
+    for chunk in chunks:
+        seen_chunks.append(chunk)
+        num_lines += chunk.count('\n')
+        # A line is left for the prompt after the output.
+        if num_lines >= num_rows:
+            page_chunks(_get_chained(seen_chunks, chunks), pager_cmd)
+            return
+
+    text = ''.join(seen_chunks)
+    if _get_num_screen_rows(text, num_columns) >= num_rows:
+        page_chunks([text], pager_cmd)
+    else:
+        write_chunks_to_stdout([text])
+
+
+def _fit_on_screen(paths, screen_size):
+    """
+    True if the contents of the files at paths fit on a screen of
+    screen_size, as returned by get_screen_size(), with a line left for the
+    prompt, else False. Reading stops as soon as there is more than could.
+    """
+    num_columns, num_rows = screen_size
+    # No row holds more than num_columns characters and a newline.
+    max_length = num_rows * (num_columns + 1)
+    seen_chunks = []
+    length = 0
+    for chunk in get_chunks_from_files(*paths):
+        seen_chunks.append(chunk)
+        length += len(chunk)
+        if length > max_length:
+            return False
+    return _get_num_screen_rows(''.join(seen_chunks), num_columns) < num_rows
+
+
+def _get_chained(first_chunks, rest_chunks):
+    for chunk in first_chunks:
+        yield chunk
+    for chunk in rest_chunks:
+        yield chunk
+
+
+def _get_num_screen_rows(text, num_columns):
+    """
+    Return the number of rows text takes up on a screen num_columns wide,
+    counting long lines as wrapping. Escape sequences count towards the
+    length of lines, so this can overestimate, but never underestimates.
+    """
+    result = 0
+    for line in text.split('\n'):
+        result += max(1, -(-len(line) // num_columns))
+    # The text after the final newline is where the prompt goes.
+    return result - 1
+
+
+def get_screen_size():
+    """
+    Return the (columns, rows) of the terminal stdout is writing to, or None
+    if stdout isn't a terminal.
+    """
+    try:
+        if not sys.stdout.isatty():
+            return None
+        size = os.get_terminal_size(sys.stdout.fileno())
+    except (AttributeError, ValueError, IOError, OSError):
+        # stdout may have been replaced or closed.
+        return None
+    if size.columns <= 0 or size.lines <= 0:
+        return None
+    return size.columns, size.lines
+
+
+def write_chunks_to_stdout(chunks):
+    """Write the strings in chunks to stdout as they are produced."""
+    try:
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+        sys.stdout.flush()
+    except (IOError, OSError):
+        _handle_stdout_closed()
+
+
+def write_files_to_stdout(paths):
+    """Write the raw bytes of the files at paths to stdout."""
+    buffer = bytearray(CHUNK_SIZE)
+    try:
+        sys.stdout.flush()
+        for path in paths:
+            bundle.write_file_to(path, sys.stdout.fileno(), buffer)
+    except (IOError, OSError):
+        _handle_stdout_closed()
+
+
+def _handle_stdout_closed():
+    """
+    Quietly stop writing to stdout after whatever is reading it has quit, as
+    when piping to `head`.
+    """
+    # Anything still buffered would fail again when Python flushes stdout on
+    # exit, so stdout is pointed at devnull instead.
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    try:
+        os.dup2(devnull, sys.stdout.fileno())
+    except (AttributeError, ValueError, IOError, OSError):
+        # stdout has no file descriptor, so there's nothing to flush to.
+        pass
+    finally:
+        os.close(devnull)
+
+
+def page_chunks(chunks, pager_cmd):
+    """
+    Page the strings in chunks via the pager, writing each to the pager as
+    soon as it is produced. The pager is started before the first chunk is
+    asked for, so it starts up while the chunks are being produced.
+    """
+    pager = start_pager(pager_cmd)
+    if pager is None:
+        # pydoc.pager decides how to page based on the whole of the text.
+        _page_with_pydoc(''.join(chunks))
+        return
+
+    # This is what pydoc.pipepager does with a whole string.
+    import locale
+    encoding = locale.getpreferredencoding(False)
+
+    def write_chunks(pipe):
+        for chunk in chunks:
+            pipe.write(chunk.encode(encoding, 'backslashreplace'))
+            # Flushing each chunk lets the pager show it straight away.
+            pipe.flush()
+
+    _write_to_pager(pager, write_chunks)
+
+
+def page_files(paths, pager_cmd):
+    """
+    Page the raw bytes of the files at paths via the pager, without decoding
+    them. The files must be in the encoding the pager expects, as checked by
+    can_pass_through().
+    """
+    pager = start_pager(pager_cmd)
+    if pager is None:
+        _page_with_pydoc(get_contents_from_files(*paths))
+        return
+
+    buffer = bytearray(CHUNK_SIZE)
+
+    def write_files(pipe):
+        for path in paths:
+            bundle.write_file_to(path, pipe.fileno(), buffer)
+
+    _write_to_pager(pager, write_files)
+
+
+def start_pager(pager_cmd):
+    """
+    Start pager_cmd reading from a pipe and return its Popen, or None if
+    output should be paged with pydoc.pager instead. The command is split
+    like a shell would split it, but run without a shell.
+    """
+    pager_argv = get_pager_argv(pager_cmd)
+    if pager_argv is None:
+        return None
+
+    import subprocess
+    try:
+        return subprocess.Popen(pager_argv, stdin=subprocess.PIPE)
+    except (IOError, OSError):
+        # E.g. the pager isn't executable.
+        return None
+
+
+def get_pager_argv(pager_cmd):
+    """
+    Return the argv to run pager_cmd with, or None if output should be paged
+    with pydoc.pager: if pager_cmd is None or FLAG_FALLBACK, can't be split,
+    or names a program that isn't installed.
+    """
+    if use_fallback_pager(pager_cmd):
+        return None
+
+    import shlex
+    try:
+        pager_argv = shlex.split(pager_cmd)
+    except ValueError:
+        # E.g. the quotes aren't closed.
+        return None
+
     # By default, we expect the command to be `less -R`. If that is the
     # pager_cmd, but they don't have less on their machine, odds are they're
-    # just using the default value. In this case the pager will fail, so we'll
-    # just go via pydoc.pager, which tries to do smarter checking that we don't
-    # want to bother trying to replicate.
-    use_fallback_page_function = False
-    if pager_cmd is None:
-        use_fallback_page_function = True
-    elif pager_cmd == FLAG_FALLBACK:
-        use_fallback_page_function = True
+    # just using the default value, so we go via pydoc.pager, which tries to
+    # do smarter checking that we don't want to bother trying to replicate.
+    if not pager_argv or _which(pager_argv[0]) is None:
+        return None
+    return pager_argv
+
+
+def _which(program):
+    """
+    Return the path of the executable that running program would run, or None
+    if there isn't one.
+    """
+    import shutil
+    if hasattr(shutil, 'which'):
+        return shutil.which(program)
+    # Python 2 has no shutil.which.
+    return _find_on_path(program, os.environ.get('PATH', os.defpath))
 
+
+def _find_on_path(program, search_path):
+    """
+    Return the path of the executable file program, looked up in the
+    directories in search_path unless it includes a directory, or None if
+    there is none. PATHEXT isn't consulted, so on Windows program must include
+    its extension.
+    """
+    if os.path.dirname(program):
+        candidates = [program]
+    else:
+        candidates = [
+            os.path.join(directory, program)
+            for directory in search_path.split(os.pathsep)
+            if directory
+        ]
+    for candidate in candidates:
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+
+def _write_to_pager(pager, write_fn):
+    """
+    Call write_fn with a binary pipe to the stdin of pager, a Popen, waiting
+    for the pager to be quit once write_fn returns.
+    """
     try:
-        if use_fallback_page_function:
-            pydoc.pager(str_to_page)
-        else:
-            # Otherwise, obey the user.
-            pydoc.pipepager(str_to_page, cmd=pager_cmd)
+        with pager.stdin as pipe:
+            write_fn(pipe)
+    except KeyboardInterrupt:
+        # Whatever hasn't been written is abandoned, but the pager is still in
+        # control of the terminal.
+        pass
+    except (IOError, OSError):
+        # The pager was quit before everything was written, which closing the
+        # pipe reports as a BrokenPipeError too.
+        pass
+
+    while True:
+        try:
+            pager.wait()
+            break
+        except KeyboardInterrupt:
+            # The pager ignores ctrl-c, so we wait for it to be quit rather
+            # than leave the terminal to it.
+            pass
+
+
+def can_pass_through(config):
+    """
+    True if the examples can be paged as the raw bytes of their files, which
+    is when formatting according to config would leave them unchanged and the
+    pager expects them in the encoding they're stored in, else False.
+    """
+    if config.use_color or config.squeeze or config.subs:
+        return False
+    if use_fallback_pager(config.pager_cmd):
+        return False
+
+    import codecs
+    import locale
+    encoding = locale.getpreferredencoding(False)
+    return codecs.lookup(encoding).name == bundle.BUNDLE_ENCODING
+
+
+def page_string(str_to_page, pager_cmd):
+    """
+    Page str_to_page via the pager, or via pydoc.pager if the pager can't be
+    started.
+    """
+    page_chunks([str_to_page], pager_cmd)
+
+
+def _page_with_pydoc(str_to_page):
+    import pydoc
+    try:
+        pydoc.pager(str_to_page)
     except KeyboardInterrupt:
         pass
 
 
+def use_fallback_pager(pager_cmd):
+    """
+    True if output should be paged with pydoc.pager rather than by piping it
+    to pager_cmd, else False.
+    """
+    return pager_cmd is None or pager_cmd == FLAG_FALLBACK
+
+
 def _get_contents_of_file(path):
-    """Get the contents of the file at path. The file must exist."""
-    with open(path, 'r') as f:
-        result = f.read()
-        return result
+    """
+    Get the contents of the file at path. The file must exist, either on disk
+    or in a bundle.
+    """
+    return bundle.read_file(path)
+
+
+def _get_chunks_of_files(paths):
+    """
+    Yield the contents of the files at paths, in order, in chunks of about
+    CHUNK_SIZE characters. Files are read concurrently and skipped if they
+    stall, as by get_contents_from_files().
+    """
+    return _read_concurrently(
+        paths,
+        lambda path: bundle.read_chunks(path, CHUNK_SIZE)
+    )
+
+
+def _read_concurrently(paths, read_fn):
+    """
+    Yield the strings read_fn(path) yields for each of paths, in the order of
+    paths. The files are read by up to MAX_READ_THREADS threads, each staying
+    at most _READ_AHEAD_CHUNKS chunks ahead of what has been yielded, so a slow
+    file doesn't hold up reading the ones after it. A file whose read makes no
+    progress for READ_TIMEOUT_S seconds once started is skipped with a warning
+    on stderr. Errors raised while reading a file are raised here.
+    """
+    for path, item in _get_reads(paths, read_fn):
+        if item is _STALLED:
+            sys.stderr.write(
+                'Skipping ' +
+                path +
+                ', as it could not be read within ' +
+                str(READ_TIMEOUT_S) +
+                ' seconds.\n'
+            )
+        else:
+            yield item
+
+
+def _get_reads(paths, read_fn):
+    """
+    Yield a tuple of (path, item) for each string read_fn(path) yields, as by
+    _read_concurrently(), except that a stalled file is yielded once with the
+    item _STALLED rather than skipped with a warning.
+    """
+    if not paths:
+        return
+
+    _start_readers()
+
+    tasks = [_ReadTask(path, read_fn) for path in paths]
+    for task in tasks:
+        _read_tasks.put(task)
+
+    try:
+        for task in tasks:
+            while True:
+                item = _get_next_read(task)
+                if item is None:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                yield task.path, item
+                if item is _STALLED:
+                    break
+    finally:
+        # Reads still going, e.g. if we stopped early because the pager was
+        # quit, stop at their next chunk, and those not started never start.
+        for task in tasks:
+            task.abandoned.set()
+
+
+def _call_with_timeout(key, fn):
+    """
+    Return fn(), called by a reader thread as if reading the file at key, or
+    _STALLED if it makes no progress for READ_TIMEOUT_S seconds. key need not
+    be a path, but calls with the same key are skipped while one is stalled.
+    Errors raised by fn are raised here.
+    """
+    for path, item in _get_reads([key], lambda key: [(fn(),)]):
+        if item is _STALLED:
+            return _STALLED
+        return item[0]
+
+
+def _import_queue():
+    """Return the queue module, which is called Queue in Python 2."""
+    try:
+        import queue
+    except ImportError:
+        import Queue as queue
+    return queue
+
+
+# Put in place of a file's chunks if it is skipped because reading it stalled.
+_STALLED = object()
+
+
+class _ReadTask():
+    """A file for the reader threads to read, and how reading it is going."""
+
+    def __init__(self, path, read_fn):
+        # Imported here so that only reading examples pays for these.
+        import threading
+        queue = _import_queue()
+
+        self.path = path
+        self.read_fn = read_fn
+        # The chunks read, followed by None once the file has all been read,
+        # or by the exception reading raised, or by _STALLED.
+        self.result = queue.Queue(_READ_AHEAD_CHUNKS)
+        # Set once whoever wanted the file no longer does.
+        self.abandoned = threading.Event()
+        # The time.time() at which the read started or last read a chunk, or
+        # None if it hasn't started. Waiting for a free thread is no sign of
+        # the file stalling, so the timeout only runs from here.
+        self.progress_at = None
+        # These change only with _read_lock held. finished is set once the
+        # reader thread is done with the task, and stalled if the read was
+        # given up on, and the thread replaced, before that.
+        self.finished = False
+        self.stalled = False
+
+
+def _get_next_read(task):
+    """
+    Return the next item read for task, waiting for it unless the read has
+    made no progress for READ_TIMEOUT_S seconds since it started, in which
+    case it is given up on and _STALLED is returned.
+    """
+    queue = _import_queue()
+    timeout = READ_TIMEOUT_S
+    while True:
+        try:
+            return task.result.get(timeout=timeout)
+        except queue.Empty:
+            pass
+
+        timeout = READ_TIMEOUT_S
+        progress_at = task.progress_at
+        if progress_at is None:
+            continue
+        waited = time.time() - progress_at
+        if waited < READ_TIMEOUT_S:
+            timeout = READ_TIMEOUT_S - waited
+        elif _give_up_on_read(task):
+            return _STALLED
+
+
+def _start_readers():
+    """Start reader threads until there are MAX_READ_THREADS of them."""
+    global _read_tasks, _read_lock, _num_readers, _readers_pid
+    if _num_readers >= MAX_READ_THREADS and _readers_pid == os.getpid():
+        return
+
+    import threading
+    queue = _import_queue()
+    if _readers_pid != os.getpid():
+        _read_lock = threading.Lock()
+        _read_tasks = queue.Queue()
+        _num_readers = 0
+        _stalled_paths.clear()
+        _readers_pid = os.getpid()
+    with _read_lock:
+        while _num_readers < MAX_READ_THREADS:
+            # Daemon threads, as a read stalled on a dead mount never returns
+            # and mustn't keep eg from exiting.
+            thread = threading.Thread(target=_read_files)
+            thread.daemon = True
+            thread.start()
+            _num_readers += 1
+
+
+def _give_up_on_read(task):
+    """
+    Give up on the stalled read of task, replacing the thread stuck on it.
+    Returns False, giving up on nothing, if the read has just finished after
+    all, else True.
+    """
+    global _num_readers
+    with _read_lock:
+        if task.finished:
+            return False
+        task.stalled = True
+        task.abandoned.set()
+        _stalled_paths[task.path] = _stalled_paths.get(task.path, 0) + 1
+        _num_readers -= 1
+    _start_readers()
+    return True
+
+
+def _read_files():
+    """Run read tasks until the read of one stalls."""
+    while True:
+        task = _read_tasks.get()
+        _read_into_queue(task)
+        with _read_lock:
+            task.finished = True
+            if task.stalled:
+                # This thread was replaced when the read was given up on.
+                _stalled_paths[task.path] -= 1
+                if not _stalled_paths[task.path]:
+                    del _stalled_paths[task.path]
+                return
+
+
+def _read_into_queue(task):
+    """
+    Put the chunks task.read_fn(task.path) yields in task.result, followed by
+    None, or by the exception reading raised. Gives up once the task is
+    abandoned, and puts _STALLED straight away if another read of the path is
+    stalled.
+    """
+    if task.abandoned.is_set():
+        return
+    if task.path in _stalled_paths:
+        _put_unless_abandoned(task.result, _STALLED, task.abandoned)
+        return
+
+    task.progress_at = time.time()
+    try:
+        for chunk in task.read_fn(task.path):
+            task.progress_at = time.time()
+            if not _put_unless_abandoned(task.result, chunk, task.abandoned):
+                return
+        _put_unless_abandoned(task.result, None, task.abandoned)
+    except Exception as e:
+        _put_unless_abandoned(task.result, e, task.abandoned)
+
+
+def _put_unless_abandoned(result, item, abandoned):
+    """
+    Put item in the queue result, waiting for room unless abandoned is set.
+    True if it was put, else False.
+    """
+    queue = _import_queue()
+    while not abandoned.is_set():
+        try:
+            result.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
 
 
 def _is_example_file(file_name):
     """
     True if the file_name is an example file, else False.
     """
-    return file_name.endswith(EXAMPLE_FILE_SUFFIX)
+    return catalog.is_example_file(file_name)
+
+
+def get_alias_cycle_warning(config):
+    """
+    Return a warning naming the aliases known to eg that never resolve to a
+    program because following them leads around a cycle, or None if there
+    are none.
+    """
+    alias_cycles = catalog.get_catalog(config).alias_cycles
+    if not alias_cycles:
+        return None
+    return (
+        'Warning: these aliases lead around a cycle and resolve to no'
+        ' program: ' + ', '.join(sorted(alias_cycles)) + '.'
+    )
 
 
 def get_list_of_all_supported_commands(config):
@@ -217,33 +962,20 @@ def get_list_of_all_supported_commands(config):
         cp +  (default and custom)
 
     Aliases are shown as
-    alias -> resolved, with resolved having its '*' or '+' as expected. Aliases
-    that shadow custom-only file names are expected to be shown instead of the
-    custom file names. This is intentional, as that is the behavior for file
-    resolution--an alias will hide a custom file.
+    alias -> resolved, with resolved having its '*' or '+' as expected.
+    resolved is the program the alias finally resolves to, following aliases
+    of aliases. Aliases defined in the custom dir are shown as
+    alias ^ -> resolved. Aliases that shadow custom-only file names are
+    expected to be shown instead of the custom file names. This is
+    intentional, as that is the behavior for file resolution--an alias will
+    hide a custom file.
     """
-    default_files = _recursive_get_all_file_names(config.examples_dir)
-    custom_files = _recursive_get_all_file_names(config.custom_dir)
-
-    # Now filter so we only have example files, not things like aliases.json.
-    default_files = [path for path in default_files if _is_example_file(path)]
-    custom_files = [path for path in custom_files if _is_example_file(path)]
-
-
-    def get_without_suffix(file_name):
-        """
-        Return the file name without the suffix, or the file name itself
-        if it does not have the suffix.
-        """
-        return file_name.split(EXAMPLE_FILE_SUFFIX)[0]
-
-    default_files = [get_without_suffix(f) for f in default_files]
-    custom_files = [get_without_suffix(f) for f in custom_files]
+    examples = catalog.get_catalog(config)
 
-    set_default_commands = set(default_files)
-    set_custom_commands = set(custom_files)
+    set_default_commands = examples.get_default_programs()
+    set_custom_commands = examples.get_custom_programs()
 
-    alias_dict = get_alias_dict(config)
+    alias_dict = examples.aliases
 
     both_defined = set_default_commands & set_custom_commands
     only_default = set_default_commands - set_custom_commands
@@ -270,8 +1002,12 @@ def get_list_of_all_supported_commands(config):
         if command in alias_dict:
             # aliases get precedence
             target = alias_dict[command]
-            rep_of_target = command_to_rep[target]
-            result.append(command + ' -> ' + rep_of_target)
+            # The target may have no examples if the aliases file is wrong.
+            rep_of_target = command_to_rep.get(target, target)
+            rep_of_alias = command
+            if command in examples.custom_aliases:
+                rep_of_alias = command + ' ' + FLAG_CUSTOM_ALIAS
+            result.append(rep_of_alias + ' -> ' + rep_of_target)
         else:
             rep = command_to_rep[command]
             result.append(rep)
@@ -285,23 +1021,39 @@ def get_squeezed_contents(contents):
     Squeeze the contents by removing blank lines between definition and example
     and remove duplicate blank lines except between sections.
     """
-    line_between_example_code = substitute.Substitution(
-        '\n\n    ',
-        '\n    ',
-        True
-    )
-    lines_between_examples = substitute.Substitution('\n\n\n', '\n\n', True)
-    lines_between_sections = substitute.Substitution(
-        '\n\n\n\n', '\n\n\n', True
-    )
-
+    # Each rule is applied to the whole of the contents in turn: a blank line
+    # before code is removed, then two blank lines become one, then three
+    # become two. str.replace() works left to right without overlaps, like
+    # re.sub(), but is faster and compiles nothing.
     result = contents
-    result = line_between_example_code.apply_and_get_result(result)
-    result = lines_between_examples.apply_and_get_result(result)
-    result = lines_between_sections.apply_and_get_result(result)
+    result = result.replace('\n\n    ', '\n    ')
+    result = result.replace('\n\n\n', '\n\n')
+    result = result.replace('\n\n\n\n', '\n\n\n')
     return result
 
 
+def get_squeezed_chunks(chunks):
+    """
+    Squeeze the text made up of the strings in chunks, which must each end in
+    a newline except perhaps the last, the same way as
+    get_squeezed_contents(), yielding chunks of the result.
+    """
+    # A run of newlines is squeezed according to its length and what follows
+    # it, so the run at the end of each chunk is held back until the next
+    # chunk shows where it ends. Nothing else is affected by being split.
+    newlines = ''
+    for chunk in chunks:
+        content = chunk.rstrip('\n')
+        if not content:
+            newlines += chunk
+            continue
+        yield get_squeezed_contents(newlines + content)
+        newlines = chunk[len(content):]
+
+    if newlines:
+        yield get_squeezed_contents(newlines)
+
+
 def get_colorized_contents(contents, color_config):
     """Colorize the contents based on the color_config."""
     colorizer = color.EgColorizer(color_config)
@@ -309,6 +1061,46 @@ def get_colorized_contents(contents, color_config):
     return result
 
 
+def get_colorized_chunks(chunks, color_config):
+    """
+    Colorize the text made up of the strings in chunks, which must each end in
+    a newline except perhaps the last, yielding chunks of the result.
+    """
+    # Lines are colored independently of each other, so each chunk of whole
+    # lines can be colored on its own.
+    colorizer = color.EgColorizer(color_config)
+    for chunk in chunks:
+        yield colorizer.colorize_text(chunk)
+
+
+def get_substituted_chunks(chunks, substitutions):
+    """
+    Perform a list of substitutions on the text made up of the strings in
+    chunks, yielding chunks of the result.
+    """
+    chain = substitute.get_chain(substitutions)
+    if not chain.is_line_local():
+        # A match could span lines, so the whole text is needed.
+        yield chain.apply_and_get_result(''.join(chunks))
+        return
+
+    # Each line is substituted without its newline, which is where it would
+    # end if it were the end of the text. A text ending in a newline ends
+    # with an empty line.
+    is_at_line_start = True
+    for chunk in get_line_aligned_chunks(chunks):
+        is_at_line_start = chunk.endswith('\n')
+        if is_at_line_start:
+            yield chain.apply_and_get_result(chunk[:-1]) + '\n'
+        else:
+            yield chain.apply_and_get_result(chunk)
+
+    if is_at_line_start:
+        result = chain.apply_and_get_result('')
+        if result:
+            yield result
+
+
 def get_substituted_contents(contents, substitutions):
     """
     Perform a list of substitutions and return the result.
@@ -317,10 +1109,8 @@ def get_substituted_contents(contents, substitutions):
     substitutions: list of Substitution objects to call, in order, with the
         result of the previous substitution.
     """
-    result = contents
-    for sub in substitutions:
-        result = sub.apply_and_get_result(result)
-    return result
+    chain = substitute.get_chain(substitutions)
+    return chain.apply_and_get_result(contents)
 
 
 def get_formatted_contents(
@@ -348,45 +1138,54 @@ def get_formatted_contents(
     return result
 
 
+def get_formatted_chunks(
+    raw_chunks,
+    use_color,
+    color_config,
+    squeeze,
+    subs
+):
+    """
+    Apply formatting to the text made up of the strings in raw_chunks, as
+    get_formatted_contents() does, yielding chunks of the result as they are
+    produced. Unless a substitution needs to see the whole text, only a
+    chunk's worth of text is held in memory at a time.
+    """
+    result = get_line_aligned_chunks(raw_chunks)
+
+    if use_color:
+        result = get_colorized_chunks(result, color_config)
+
+    if squeeze:
+        result = get_squeezed_chunks(result)
+
+    if subs:
+        result = get_substituted_chunks(result, subs)
+
+    return result
+
+
 def get_resolved_program(program, config_obj):
     """
     Take a program that may be an alias for another program and return the
     resolved program.
 
-    It only ever resolves a single level of aliasing, so does not support
-    aliasing to an alias.
+    Aliases of aliases are followed until they reach a program that is not an
+    alias.
 
     Returns the original program if the program is not an alias.
     """
-    alias_dict = get_alias_dict(config_obj)
-    if program in alias_dict:
-        return alias_dict[program]
-    else:
-        return program
+    return catalog.get_catalog(config_obj).resolve(program)
 
 
 def get_alias_dict(config_obj):
     """
-    Return a dictionary consisting of all aliases known to eg.
+    Return a dictionary consisting of all aliases known to eg, including those
+    in the aliases file of the custom dir.
 
-    The format is {'alias': 'resolved_program'}.
+    The format is {'alias': 'resolved_program'}, where resolved_program is the
+    program the alias finally resolves to.
 
     If the aliases file does not exist, returns an empty dict.
     """
-    if not config_obj.examples_dir:
-        return {}
-
-    alias_file_path = _get_alias_file_path(config_obj)
-    if not os.path.isfile(alias_file_path):
-        return {}
-
-    alias_file_contents = _get_contents_of_file(alias_file_path)
-    result = json.loads(alias_file_contents)
-    return result
-
-
-def _get_alias_file_path(config_obj):
-    """
-    Return the file path for the aliases dict.
-    """
-    return os.path.join(config_obj.examples_dir, ALIAS_FILE_NAME)
+    return dict(catalog.get_catalog(config_obj).aliases)
@@ -42,7 +42,7 @@ config = {
     'install_requires': [],
     'test_requires': ['mock', 'pytest'],
     'packages': ['eg'],
-    'scripts': ['bin/eg'],
+    'scripts': ['bin/eg', 'bin/eg-client'],
     'package_data': {
         'eg': ['examples/*']
     },
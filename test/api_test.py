@@ -0,0 +1,203 @@
+import os
+import pytest
+import threading
+import time
+
+from eg import api
+from eg import bundle
+from eg import config
+from mock import patch
+from test.conftest import age
+from test.conftest import make_config
+from test.util_test import _create_config
+
+
+@pytest.fixture(autouse=True)
+def fresh_api_cache():
+    """Make sure no test sees entries rendered by another test."""
+    api.clear_cache()
+    yield
+    api.set_cache_size(api.DEFAULT_CACHE_SIZE)
+    api.clear_cache()
+
+
+def test_lookup_resolves_aliases(tmpdir):
+    test_config = make_config(tmpdir)
+
+    actual = api.lookup('link', test_config)
+
+    assert actual == api.Entry(
+        program='link',
+        resolved_program='ln',
+        paths=[os.path.join(test_config.examples_dir, 'ln.md')],
+    )
+    assert api.lookup('nope', test_config) is None
+
+
+def test_is_in_alias_cycle(tmpdir):
+    test_config = make_config(tmpdir)
+    tmpdir.join('examples', 'aliases.json').write(
+        '{"link": "ln", "ping": "pong", "pong": "ping"}'
+    )
+
+    assert api.is_in_alias_cycle('ping', test_config)
+    assert not api.is_in_alias_cycle('link', test_config)
+    assert not api.is_in_alias_cycle('nope', test_config)
+
+
+def test_render_returns_formatted_examples(tmpdir):
+    test_config = make_config(tmpdir, squeeze=True)
+
+    assert api.render('link', test_config) == '# ln\n\n\nrun `ln`\n'
+    assert api.render('nope', test_config) is None
+
+
+def test_render_sees_rebuilt_bundle(tmpdir):
+    examples = tmpdir.mkdir('examples')
+    bundle_path = str(tmpdir.join('examples.egb'))
+    test_config = _create_config(examples_dir=bundle_path)
+
+    for version in ['v1', 'v2']:
+        examples.join('foo.md').write('# foo ' + version + '\n')
+        bundle.write_bundle(str(examples), bundle_path)
+        # Distinct mtimes, both old enough to be trusted.
+        past = time.time() - (60 if version == 'v1' else 30)
+        os.utime(bundle_path, (past, past))
+
+        assert api.render('foo', test_config) == '# foo ' + version + '\n'
+
+
+def test_render_colorizes_only_if_asked(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        use_color=True,
+        color_config=config.get_default_color_config()
+    )
+
+    plain = api.render('cp', test_config)
+    colored = api.render('cp', test_config, color=True)
+
+    assert '\x1b[' not in plain
+    assert colored.startswith(config.DEFAULT_COLOR_POUND)
+    # Color is turned on with the default colors if the config has none.
+    assert api.render('cp', make_config(tmpdir.mkdir('other')), True) == (
+        colored
+    )
+
+
+def test_render_uses_cached_entries(tmpdir):
+    test_config = make_config(tmpdir)
+    first = api.render('cp', test_config)
+
+    with patch('eg.util.get_formatted_contents') as mock_format:
+        assert api.render('cp', test_config) == first
+        mock_format.assert_not_called()
+
+
+def test_render_rerenders_changed_files(tmpdir):
+    test_config = make_config(tmpdir)
+    api.render('cp', test_config)
+
+    path = os.path.join(test_config.examples_dir, 'cp.md')
+    with open(path, 'w') as f:
+        f.write('# cp\n\nchanged\n')
+    age(path)
+
+    assert api.render('cp', test_config) == '# cp\n\nchanged\n'
+
+
+def test_render_does_not_cache_recently_modified_files(tmpdir):
+    test_config = make_config(tmpdir)
+    path = os.path.join(test_config.examples_dir, 'cp.md')
+    os.utime(path, None)
+
+    api.render('cp', test_config)
+
+    with patch('eg.util.get_formatted_contents') as mock_format:
+        mock_format.return_value = 'rendered again'
+        assert api.render('cp', test_config) == 'rendered again'
+
+
+def test_render_evicts_least_recently_used(tmpdir):
+    test_config = make_config(tmpdir)
+    api.set_cache_size(2)
+
+    api.render('cp', test_config)
+    api.render('ln', test_config)
+    api.render('cp', test_config)
+    api.render('tar', test_config)
+
+    with patch('eg.util.get_formatted_contents') as mock_format:
+        mock_format.return_value = 'rendered again'
+        assert api.render('cp', test_config) != 'rendered again'
+        assert api.render('tar', test_config) != 'rendered again'
+        assert api.render('ln', test_config) == 'rendered again'
+
+
+def test_render_is_thread_safe(tmpdir):
+    test_config = make_config(tmpdir)
+    api.set_cache_size(2)
+    expected = dict(
+        (program, api.render(program, test_config))
+        for program in ['cp', 'link', 'tar']
+    )
+    results = []
+
+    def render_many():
+        for i in range(200):
+            program = ['cp', 'link', 'tar'][i % 3]
+            results.append(
+                api.render(program, test_config) == expected[program]
+            )
+
+    threads = [threading.Thread(target=render_many) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 8 * 200
+    assert all(results)
+
+
+def test_list_commands_sees_new_examples(tmpdir):
+    test_config = make_config(tmpdir)
+    assert api.list_commands(test_config) == ['cp', 'link -> ln', 'ln', 'tar']
+
+    tmpdir.join('examples', 'rm.md').write('# rm\n')
+
+    assert 'rm' in api.list_commands(test_config)
+
+
+def test_get_suggestions_holds_lock(tmpdir):
+    test_config = make_config(tmpdir)
+    held = []
+
+    def get_suggestions(examples, program):
+        held.append(api._lock.locked())
+        return ['cp']
+
+    with patch('eg.util.get_suggestions', side_effect=get_suggestions):
+        assert api.get_suggestions('cpp', test_config) == ['cp']
+
+    assert held == [True]
+    assert api.resolve('link', test_config) == 'ln'
+    assert api.resolve('cpp', test_config) == 'cpp'
+
+
+@patch('eg.config.get_resolved_config')
+def test_default_config_is_resolved_once(mock_resolve, tmpdir):
+    mock_resolve.return_value = make_config(tmpdir)
+
+    api.lookup('cp')
+    api.lookup('ln')
+
+    mock_resolve.assert_called_once_with(
+        egrc_path=None,
+        examples_dir=None,
+        custom_dir=None,
+        use_color=False,
+        pager_cmd=None,
+        squeeze=None,
+        debug=False,
+    )
@@ -0,0 +1,141 @@
+import io
+import json
+import os
+
+from eg import batch
+from eg import catalog
+from mock import patch
+from test.conftest import make_config
+
+
+def test_read_programs_skips_blank_lines(tmpdir):
+    batch_file = tmpdir.join('programs')
+    batch_file.write('cp\n\n  ln  \ntar')
+
+    assert batch.read_programs(str(batch_file)) == ['cp', 'ln', 'tar']
+
+
+def test_read_programs_reads_stdin():
+    with patch('sys.stdin', io.StringIO(u'cp\nln\n')):
+        assert batch.read_programs(batch.STDIN_FILE_NAME) == ['cp', 'ln']
+
+
+def test_render_programs_keeps_order_and_resolves_aliases(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        programs=['cp', 'ln', 'tar', 'find'],
+        use_color=False,
+        squeeze=True
+    )
+    programs = ['tar', 'link', 'nope', 'cp', 'ln', 'find', 'tar']
+
+    for num_jobs in [1, 3]:
+        actual = batch.render_programs(programs, test_config, num_jobs)
+
+        assert [result.program for result in actual] == programs
+        assert [result.resolved_program for result in actual] == [
+            'tar', 'ln', 'nope', 'cp', 'ln', 'find', 'tar'
+        ]
+        assert actual[0].rendered == '# tar\n\n\nrun `tar`\n'
+        assert actual[1].rendered == '# ln\n\n\nrun `ln`\n'
+        assert actual[2].rendered is None
+
+
+def test_render_programs_renders_each_file_once(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        programs=['cp', 'ln', 'tar', 'find'],
+        use_color=False,
+        squeeze=True
+    )
+
+    with patch('eg.util.get_formatted_contents') as mock_format:
+        mock_format.side_effect = lambda contents, **kwargs: contents
+        batch.render_programs(['link', 'ln', 'ln', 'cp'], test_config, 1)
+
+    assert mock_format.call_count == 2
+
+
+def test_render_programs_resolves_catalog_once(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        programs=['cp', 'ln', 'tar', 'find'],
+        use_color=False,
+        squeeze=True
+    )
+
+    with patch('eg.catalog.get_catalog', wraps=catalog.get_catalog) as mock:
+        batch.render_programs(['cp', 'ln', 'tar'], test_config, 1)
+
+    assert mock.call_count == 1
+
+
+def test_run_batch_writes_json_lines(tmpdir, capsys):
+    test_config = make_config(
+        tmpdir,
+        programs=['cp', 'ln', 'tar', 'find'],
+        use_color=False,
+        squeeze=True
+    )
+    batch_file = tmpdir.join('programs')
+    batch_file.write('cp\nnope\n')
+
+    batch.run_batch(str(batch_file), test_config, num_jobs=2)
+
+    lines = capsys.readouterr().out.splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {
+            'program': 'cp',
+            'resolved_program': 'cp',
+            'output': '# cp\n\n\nrun `cp`\n',
+        },
+        {
+            'program': 'nope',
+            'resolved_program': 'nope',
+            'output': None,
+            'error': (
+                'No entry found for nope. Run `eg --list` to see all '
+                'available entries.'
+            ),
+        },
+    ]
+
+
+def test_run_batch_writes_output_dir(tmpdir, capsys):
+    test_config = make_config(
+        tmpdir,
+        programs=['cp', 'ln', 'tar', 'find'],
+        use_color=False,
+        squeeze=True
+    )
+    batch_file = tmpdir.join('programs')
+    batch_file.write('cp\nlink\nnope\n')
+    output_dir = tmpdir.join('out')
+
+    batch.run_batch(str(batch_file), test_config, output_dir=str(output_dir))
+
+    assert sorted(os.listdir(str(output_dir))) == ['cp.txt', 'link.txt']
+    assert output_dir.join('link.txt').read() == '# ln\n\n\nrun `ln`\n'
+    captured = capsys.readouterr()
+    assert captured.out == ''
+    assert captured.err.startswith('No entry found for nope.')
+
+
+def test_run_batch_never_writes_outside_output_dir(tmpdir, capsys):
+    test_config = make_config(
+        tmpdir,
+        programs=['cp', 'ln', 'tar', 'find'],
+        use_color=False,
+        squeeze=True
+    )
+    tmpdir.join('examples').join('aliases.json').write('{"..": "cp"}')
+    catalog.clear_catalogs()
+    batch_file = tmpdir.join('programs')
+    batch_file.write('..\n')
+    output_dir = tmpdir.mkdir('out')
+
+    batch.run_batch(str(batch_file), test_config, output_dir=str(output_dir))
+
+    assert os.listdir(str(output_dir)) == []
+    assert not tmpdir.join('..' + batch.OUTPUT_FILE_SUFFIX).exists()
+    assert 'not a valid file name' in capsys.readouterr().err
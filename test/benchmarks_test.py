@@ -0,0 +1,92 @@
+import os
+
+from benchmarks import corpus
+from benchmarks import loadtest
+from benchmarks import run
+from eg import catalog
+from eg import config
+
+
+def _results(**medians):
+    return {
+        'results': {
+            key: {'median_s': median, 'min_s': median, 'runs': 1}
+            for key, median in medians.items()
+        }
+    }
+
+
+def test_compare_flags_only_regressions_past_threshold():
+    baseline = _results(fast=0.010, same=0.010, slow=0.010, gone=0.010)
+    current = _results(fast=0.005, same=0.011, slow=0.020, new=0.010)
+
+    actual = run.compare(baseline, current, threshold=0.2)
+
+    assert [entry[0] for entry in actual] == ['fast', 'same', 'slow']
+    assert [entry[4] for entry in actual] == [False, False, True]
+
+
+def test_compare_ignores_tiny_absolute_differences():
+    baseline = _results(tiny=0.00001)
+    current = _results(tiny=0.00003)
+
+    actual = run.compare(baseline, current)
+
+    assert actual[0][4] is False
+
+
+def test_get_command_corpus_is_indexable_by_eg(tmpdir):
+    examples_dir, custom_dir = corpus.get_command_corpus(str(tmpdir), 250)
+    resolved_config = config.Config(
+        examples_dir=examples_dir,
+        custom_dir=custom_dir,
+        use_color=False,
+        color_config=None,
+        pager_cmd=None,
+        squeeze=False,
+        subs=[],
+        editor_cmd=None,
+    )
+
+    examples = catalog.get_catalog(resolved_config)
+
+    assert len(examples.get_default_programs()) == 250
+    assert len(examples.get_custom_programs()) == 25
+    assert examples.resolve('alias-cmd000200') == 'cmd000200'
+    assert len(examples.get_paths('cmd000010')) == 2
+    assert not examples.is_stale()
+
+
+def test_get_command_corpus_reuses_existing_corpus(tmpdir):
+    examples_dir, custom_dir = corpus.get_command_corpus(str(tmpdir), 10)
+    marker_path = os.path.join(examples_dir, 'd0000', 'cmd000000.md')
+    mtime = os.stat(marker_path).st_mtime
+
+    corpus.get_command_corpus(str(tmpdir), 10)
+
+    assert os.stat(marker_path).st_mtime == mtime
+
+
+def test_get_example_file_is_at_least_size(tmpdir):
+    path = corpus.get_example_file(str(tmpdir), 5000)
+
+    assert os.path.getsize(path) >= 5000
+    with open(path, 'r') as f:
+        assert f.read().startswith('# synthetic\n')
+
+
+def test_get_percentile_uses_nearest_rank():
+    values = [float(i) for i in range(101)]
+
+    assert loadtest.get_percentile(values, 0.5) == 50.0
+    assert loadtest.get_percentile(values, 0.99) == 99.0
+    assert loadtest.get_percentile([], 0.5) is None
+
+
+def test_get_summary_reports_milliseconds_and_throughput():
+    actual = loadtest.get_summary([0.003, 0.001, 0.002], elapsed_s=0.5)
+
+    assert actual['requests'] == 3
+    assert actual['p50_ms'] == 2.0
+    assert actual['max_ms'] == 3.0
+    assert actual['requests_per_s'] == 6.0
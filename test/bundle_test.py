@@ -0,0 +1,235 @@
+import json
+import os
+
+import pytest
+
+from eg import bundle
+from eg import catalog
+from eg import util
+from mock import patch
+from test.util_test import _create_config
+
+
+@pytest.fixture(autouse=True)
+def forget_bundles():
+    """Don't let bundles opened by one test leak into another."""
+    bundle._bundles.clear()
+    yield
+    bundle._bundles.clear()
+
+
+def _make_examples(tmpdir):
+    """Create a small examples dir and return it as a string."""
+    examples = tmpdir.mkdir('examples')
+    nested = examples.mkdir('nested')
+    examples.join('cp.md').write('# cp\n\ncopy\n')
+    examples.join('ln.md').write(u'# ln\n\nlink → target\n'.encode('utf-8'),
+                                 mode='wb')
+    examples.join(catalog.ALIAS_FILE_NAME).write(json.dumps({'link': 'ln'}))
+    nested.join('cp.md').write('# nested cp\n')
+    return str(examples)
+
+
+def _build(tmpdir):
+    """Bundle a small examples dir and return the path to the bundle."""
+    examples = _make_examples(tmpdir)
+    bundle_path = str(tmpdir.join('examples.egb'))
+    bundle.write_bundle(examples, bundle_path)
+    return bundle_path
+
+
+def test_write_bundle_returns_number_of_files(tmpdir):
+    examples = _make_examples(tmpdir)
+    bundle_path = str(tmpdir.join('examples.egb'))
+
+    assert bundle.write_bundle(examples, bundle_path) == 4
+    assert bundle.is_bundle(bundle_path)
+
+
+def test_write_bundle_is_deterministic(tmpdir):
+    examples = _make_examples(tmpdir)
+    first = str(tmpdir.join('first.egb'))
+    second = str(tmpdir.join('second.egb'))
+
+    bundle.write_bundle(examples, first)
+    bundle.write_bundle(examples, second)
+
+    with open(first, 'rb') as f, open(second, 'rb') as g:
+        assert f.read() == g.read()
+
+
+def test_write_bundle_skips_itself(tmpdir):
+    examples = _make_examples(tmpdir)
+    bundle_path = os.path.join(examples, 'examples.egb')
+
+    bundle.write_bundle(examples, bundle_path)
+    # Writing it again with the old bundle in place must not include it.
+    assert bundle.write_bundle(examples, bundle_path) == 4
+
+
+def test_bundle_get_paths_and_read(tmpdir):
+    bundle_path = _build(tmpdir)
+    opened = bundle.get_bundle(bundle_path)
+
+    paths = opened.get_paths('cp.md')
+
+    assert paths == [
+        os.path.join(bundle_path, 'cp.md'),
+        os.path.join(bundle_path, 'nested', 'cp.md'),
+    ]
+    assert opened.read(paths[0]) == '# cp\n\ncopy\n'
+    assert opened.read(paths[1]) == '# nested cp\n'
+    assert opened.get_paths('missing.md') == []
+
+
+def test_bundle_get_index_matches_directory_index(tmpdir):
+    bundle_path = _build(tmpdir)
+
+    actual = bundle.get_bundle(bundle_path).get_index()
+
+    assert sorted(actual) == ['aliases.json', 'cp.md', 'ln.md']
+    assert len(actual['cp.md']) == 2
+
+
+def test_get_bundle_reopens_rewritten_bundle(tmpdir):
+    bundle_path = _build(tmpdir)
+    first = bundle.get_bundle(bundle_path)
+    assert bundle.get_bundle(bundle_path) is first
+
+    tmpdir.join('examples', 'cp.md').write('# cp\n\nchanged\n')
+    bundle.write_bundle(str(tmpdir.join('examples')), bundle_path)
+    second = bundle.get_bundle(bundle_path)
+
+    assert second is not first
+    assert bundle.read_file(os.path.join(bundle_path, 'cp.md')) == (
+        '# cp\n\nchanged\n'
+    )
+    # Whatever still holds the old bundle can still read from it.
+    assert first.read(os.path.join(bundle_path, 'cp.md')) == '# cp\n\ncopy\n'
+
+
+def test_read_file_reads_from_bundles_and_disk(tmpdir):
+    bundle_path = _build(tmpdir)
+    bundle.get_bundle(bundle_path)
+    plain = tmpdir.join('plain.md')
+    plain.write('plain')
+
+    actual = bundle.read_file(os.path.join(bundle_path, 'ln.md'))
+
+    assert actual == u'# ln\n\nlink → target\n'
+    assert bundle.read_file(str(plain)) == 'plain'
+
+
+def test_read_chunks_reads_from_bundles_and_disk(tmpdir):
+    bundle_path = _build(tmpdir)
+    bundle.get_bundle(bundle_path)
+    plain = tmpdir.join('plain.md')
+    plain.write('plain\ntext')
+
+    actual = list(
+        bundle.read_chunks(os.path.join(bundle_path, 'ln.md'), 3)
+    )
+
+    # Chunks end after a newline, so characters are never split.
+    assert actual == [u'# ln\n', u'\n', u'link → target\n']
+    assert list(bundle.read_chunks(str(plain), 4)) == ['plai', 'n\nte', 'xt']
+
+
+def test_read_missing_file_in_bundle_raises(tmpdir):
+    bundle_path = _build(tmpdir)
+    opened = bundle.get_bundle(bundle_path)
+
+    with pytest.raises(IOError):
+        opened.read(os.path.join(bundle_path, 'rm.md'))
+
+
+def test_is_bundle_false_for_dirs_and_other_files(tmpdir):
+    other = tmpdir.join('other.md')
+    other.write('# not a bundle')
+    empty = tmpdir.join('empty')
+    empty.write('')
+
+    assert not bundle.is_bundle(str(tmpdir))
+    assert not bundle.is_bundle(str(other))
+    assert not bundle.is_bundle(str(empty))
+    assert not bundle.is_bundle(None)
+
+
+def test_bundle_rejects_other_files(tmpdir):
+    other = tmpdir.join('other.md')
+    other.write('# not a bundle, but long enough for a header')
+    empty = tmpdir.join('empty')
+    empty.write('')
+
+    with pytest.raises(bundle.BundleError):
+        bundle.Bundle(str(other))
+    with pytest.raises(bundle.BundleError):
+        bundle.Bundle(str(empty))
+
+
+def test_catalog_accepts_bundles(tmpdir):
+    bundle_path = _build(tmpdir)
+    custom = tmpdir.mkdir('custom')
+    custom.join('cp.md').write('custom cp\n')
+
+    examples = catalog.Catalog(bundle_path, str(custom))
+
+    assert examples.resolve('link') == 'ln'
+    assert examples.get_default_programs() == set(['cp', 'ln'])
+    assert examples.get_paths('cp') == [
+        str(custom.join('cp.md')),
+        os.path.join(bundle_path, 'cp.md'),
+        os.path.join(bundle_path, 'nested', 'cp.md'),
+    ]
+
+
+def test_get_contents_from_files_reads_bundles(tmpdir):
+    bundle_path = _build(tmpdir)
+    config = _create_config(examples_dir=bundle_path)
+    paths = catalog.get_catalog(config).get_paths('cp')
+
+    actual = util.get_contents_from_files(*paths)
+
+    assert actual == '# cp\n\ncopy\n# nested cp\n'
+
+
+def _write_files_to(paths, tmpdir):
+    """Return the bytes bundle.write_file_to() writes for each of paths."""
+    out_path = str(tmpdir.join('out'))
+    buffer = bytearray(4)
+    fd = os.open(out_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    try:
+        for path in paths:
+            bundle.write_file_to(path, fd, buffer)
+    finally:
+        os.close(fd)
+    with open(out_path, 'rb') as f:
+        return f.read()
+
+
+def test_write_file_to_copies_raw_bytes(tmpdir):
+    bundle_path = _build(tmpdir)
+    bundle.get_bundle(bundle_path)
+    examples = tmpdir.join('examples')
+    paths = [
+        str(examples.join('ln.md')),
+        os.path.join(bundle_path, 'ln.md'),
+        os.path.join(bundle_path, 'nested', 'cp.md'),
+    ]
+    ln_bytes = u'# ln\n\nlink → target\n'.encode('utf-8')
+
+    assert _write_files_to(paths, tmpdir) == (
+        ln_bytes + ln_bytes + b'# nested cp\n'
+    )
+
+
+def test_write_file_to_reads_if_sendfile_is_unsupported(tmpdir):
+    examples = _make_examples(tmpdir)
+    path = os.path.join(examples, 'ln.md')
+    unsupported = OSError(bundle.errno.EINVAL, 'Invalid argument')
+
+    with patch('os.sendfile', side_effect=unsupported) as mock_sendfile:
+        actual = _write_files_to([path], tmpdir)
+
+    assert mock_sendfile.call_count == 1
+    assert actual == u'# ln\n\nlink → target\n'.encode('utf-8')
@@ -0,0 +1,335 @@
+import json
+import os
+
+from eg import catalog
+from mock import patch
+from test.conftest import age
+from test.conftest import make_dirs
+from test.util_test import _create_config
+
+
+# The files of the examples dir and custom dir most tests use.
+_DEFAULT_FILES = {
+    'cp.md': 'default cp',
+    'nested/cp.md': 'nested default cp',
+    'ln.md': 'default ln',
+}
+_CUSTOM_FILES = {
+    'cp.md': 'custom cp',
+    'mine.md': 'custom only',
+    'notes.txt': 'not an example',
+}
+
+
+def test_catalog_collects_default_and_custom_paths(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, _DEFAULT_FILES, _CUSTOM_FILES)
+
+    actual = catalog.Catalog(examples_dir, custom_dir)
+
+    assert actual.get_default_programs() == set(['cp', 'ln'])
+    assert actual.get_custom_programs() == set(['cp', 'mine'])
+    assert sorted(actual.get_default_paths('cp')) == [
+        os.path.join(examples_dir, 'cp.md'),
+        os.path.join(examples_dir, 'nested', 'cp.md'),
+    ]
+    assert actual.get_custom_paths('cp') == [
+        os.path.join(custom_dir, 'cp.md'),
+    ]
+    assert actual.get_default_paths('mine') == []
+
+
+def test_catalog_get_paths_puts_custom_first(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, _DEFAULT_FILES, _CUSTOM_FILES)
+
+    actual = catalog.Catalog(examples_dir, custom_dir).get_paths('cp')
+
+    assert actual[0] == os.path.join(custom_dir, 'cp.md')
+    assert sorted(actual[1:]) == [
+        os.path.join(examples_dir, 'cp.md'),
+        os.path.join(examples_dir, 'nested', 'cp.md'),
+    ]
+
+
+def test_catalog_reads_aliases(tmpdir):
+    aliases = {'link': 'ln', 'copy': 'cp'}
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        aliases=aliases
+    )
+
+    actual = catalog.Catalog(examples_dir, custom_dir)
+
+    assert actual.aliases == aliases
+    assert actual.resolve('link') == 'ln'
+    assert actual.resolve('ln') == 'ln'
+    assert actual.resolve('unknown') == 'unknown'
+
+
+def test_catalog_resolves_aliases_of_aliases(tmpdir):
+    aliases = {'hardlink': 'link', 'link': 'ln', 'loop': 'loop'}
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        aliases=aliases
+    )
+
+    actual = catalog.Catalog(examples_dir, custom_dir)
+
+    assert actual.aliases == {'hardlink': 'ln', 'link': 'ln'}
+    assert actual.alias_cycles == set(['loop'])
+    assert actual.resolve('hardlink') == 'ln'
+    assert actual.resolve('loop') == 'loop'
+
+
+def test_catalog_merges_custom_aliases_over_default(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        aliases={'link': 'ln', 'copy': 'cp'},
+        custom_aliases={'copy': 'mine', 'symlink': 'link'}
+    )
+
+    actual = catalog.Catalog(examples_dir, custom_dir)
+
+    assert actual.aliases == {'link': 'ln', 'copy': 'mine', 'symlink': 'ln'}
+    assert actual.custom_aliases == set(['copy', 'symlink'])
+
+
+def test_catalog_loads_aliases_from_snapshot(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        aliases={'link': 'ln'},
+        custom_aliases={'symlink': 'link'}
+    )
+    age(
+        os.path.join(examples_dir, catalog.ALIAS_FILE_NAME),
+        os.path.join(custom_dir, catalog.ALIAS_FILE_NAME)
+    )
+    first = catalog.Catalog(examples_dir, custom_dir)
+
+    with patch('eg.catalog._get_aliases') as mock_get_aliases:
+        second = catalog.Catalog(examples_dir, custom_dir)
+        mock_get_aliases.assert_not_called()
+
+    assert second.aliases == first.aliases
+    assert second.alias_cycles == first.alias_cycles
+    assert second.custom_aliases == set(['symlink'])
+
+
+def test_catalog_reloads_aliases_if_edited(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        custom_aliases={'a': 'cp'}
+    )
+    custom_alias_path = os.path.join(custom_dir, catalog.ALIAS_FILE_NAME)
+    age(custom_alias_path)
+    catalog.Catalog(examples_dir, custom_dir)
+
+    with open(custom_alias_path, 'w') as f:
+        f.write(json.dumps({'b': 'cp', 'c': 'b'}))
+    age(custom_alias_path)
+
+    actual = catalog.Catalog(examples_dir, custom_dir)
+
+    assert actual.aliases == {'b': 'cp', 'c': 'cp'}
+
+
+def test_catalog_ignores_damaged_alias_snapshot(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        aliases={'link': 'ln'}
+    )
+    alias_file_path = os.path.join(examples_dir, catalog.ALIAS_FILE_NAME)
+    age(alias_file_path)
+    catalog.Catalog(examples_dir, custom_dir)
+
+    snapshot_path = catalog._get_alias_snapshot_path([alias_file_path, None])
+    with open(snapshot_path, 'wb') as f:
+        f.write(b'not a snapshot')
+
+    assert catalog.Catalog(examples_dir, custom_dir).aliases == {'link': 'ln'}
+
+
+def test_get_alias_closure_follows_chains():
+    aliases = {'a': 'b', 'b': 'c', 'c': 'cp', 'd': 'c', 'e': 'ls'}
+
+    closure, cycles = catalog.get_alias_closure(aliases)
+
+    assert closure == {'a': 'cp', 'b': 'cp', 'c': 'cp', 'd': 'cp', 'e': 'ls'}
+    assert cycles == set()
+
+
+def test_get_alias_closure_detects_cycles():
+    aliases = {
+        'a': 'b',
+        'b': 'c',
+        'c': 'a',
+        'into-cycle': 'a',
+        'self': 'self',
+        'fine': 'cp',
+    }
+
+    closure, cycles = catalog.get_alias_closure(aliases)
+
+    assert closure == {'fine': 'cp'}
+    assert cycles == set(['a', 'b', 'c', 'into-cycle', 'self'])
+
+
+def test_get_alias_closure_handles_long_chains():
+    aliases = dict(
+        ('alias{}'.format(i), 'alias{}'.format(i + 1)) for i in range(10000)
+    )
+    aliases['alias10000'] = 'cp'
+
+    closure, cycles = catalog.get_alias_closure(aliases)
+
+    assert set(closure.values()) == set(['cp'])
+    assert len(closure) == len(aliases)
+    assert cycles == set()
+
+
+def test_catalog_handles_missing_alias_file(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, _DEFAULT_FILES, _CUSTOM_FILES)
+
+    assert catalog.Catalog(examples_dir, custom_dir).aliases == {}
+
+
+def test_catalog_handles_no_dirs():
+    actual = catalog.Catalog(None, None)
+
+    assert actual.aliases == {}
+    assert actual.get_default_programs() == set()
+    assert actual.get_custom_programs() == set()
+    assert actual.get_paths('cp') == []
+
+
+def test_catalog_reads_each_file_once(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        aliases={'link': 'ln'}
+    )
+
+    with patch('eg.index.load_index', wraps=catalog.index.load_index) as mock:
+        examples = catalog.Catalog(examples_dir, custom_dir)
+        examples.resolve('link')
+        examples.get_paths('ln')
+        examples.get_default_programs()
+        assert mock.call_count == 2
+
+
+def test_get_catalog_builds_once_per_dirs(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, _DEFAULT_FILES, _CUSTOM_FILES)
+    config = _create_config(examples_dir=examples_dir, custom_dir=custom_dir)
+
+    first = catalog.get_catalog(config)
+    second = catalog.get_catalog(config)
+    other = catalog.get_catalog(_create_config(examples_dir=examples_dir))
+
+    assert first is second
+    assert other is not first
+    assert other.get_custom_programs() == set()
+
+
+def test_clear_catalogs_forgets_catalogs(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, _DEFAULT_FILES, _CUSTOM_FILES)
+    config = _create_config(examples_dir=examples_dir, custom_dir=custom_dir)
+
+    first = catalog.get_catalog(config)
+    catalog.clear_catalogs()
+
+    assert catalog.get_catalog(config) is not first
+
+
+def test_get_program_from_file_name():
+    assert catalog.get_program_from_file_name('cp.md') == 'cp'
+    assert catalog.get_program_from_file_name('a.md.md') == 'a.md'
+    assert catalog.get_program_from_file_name('aliases.json') == 'aliases.json'
+
+
+def test_catalog_is_not_stale_if_nothing_changed(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        aliases={'link': 'ln'}
+    )
+    age(examples_dir, os.path.join(examples_dir, 'nested'), custom_dir)
+
+    assert not catalog.Catalog(examples_dir, custom_dir).is_stale()
+
+
+def test_catalog_is_stale_if_example_added(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, _DEFAULT_FILES, _CUSTOM_FILES)
+    age(examples_dir, os.path.join(examples_dir, 'nested'), custom_dir)
+    examples = catalog.Catalog(examples_dir, custom_dir)
+
+    with open(os.path.join(custom_dir, 'rm.md'), 'w') as f:
+        f.write('rm')
+
+    assert examples.is_stale()
+
+
+def test_catalog_is_stale_if_aliases_edited(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        aliases={'link': 'ln'}
+    )
+    alias_file_path = os.path.join(examples_dir, catalog.ALIAS_FILE_NAME)
+    age(
+        examples_dir,
+        os.path.join(examples_dir, 'nested'),
+        custom_dir,
+        alias_file_path
+    )
+    examples = catalog.Catalog(examples_dir, custom_dir)
+
+    with open(alias_file_path, 'w') as f:
+        f.write(json.dumps({'copy': 'cp'}))
+
+    assert examples.is_stale()
+
+
+def test_catalog_is_stale_if_custom_aliases_edited(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        _DEFAULT_FILES,
+        _CUSTOM_FILES,
+        custom_aliases={'a': 'cp'}
+    )
+    alias_file_path = os.path.join(custom_dir, catalog.ALIAS_FILE_NAME)
+    age(
+        examples_dir,
+        os.path.join(examples_dir, 'nested'),
+        custom_dir,
+        alias_file_path
+    )
+    examples = catalog.Catalog(examples_dir, custom_dir)
+
+    with open(alias_file_path, 'w') as f:
+        f.write(json.dumps({'b': 'cp'}))
+
+    assert examples.is_stale()
+
+
+def test_get_catalog_refreshes_stale_catalogs_if_asked(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, _DEFAULT_FILES, _CUSTOM_FILES)
+    config = _create_config(examples_dir=examples_dir, custom_dir=custom_dir)
+    first = catalog.get_catalog(config)
+
+    with patch.object(catalog.Catalog, 'is_stale', return_value=True):
+        assert catalog.get_catalog(config) is first
+        assert catalog.get_catalog(config, refresh_if_stale=True) is not first
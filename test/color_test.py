@@ -1,4 +1,5 @@
 import os
+import random
 
 from collections import namedtuple
 from eg import color
@@ -206,12 +207,105 @@ def test_colorize_backticks():
 @patch('eg.color.EgColorizer.colorize_block_indent',
        return_value='text-heading-indent')
 @patch('eg.color.EgColorizer.colorize_heading', return_value='text-heading')
-def test_colorize_text_calls_all_sub_methods(heading, indent, backticks):
-    """colorize_text should call all of the helper colorize methods."""
+def test_colorize_text_in_passes_calls_all_sub_methods(
+    heading,
+    indent,
+    backticks
+):
+    """colorize_text_in_passes should call all of the helper methods."""
     colorizer = color.EgColorizer(None)
     text = 'text'
-    actual = colorizer.colorize_text(text)
+    actual = colorizer.colorize_text_in_passes(text)
     heading.assert_called_once_with(text)
     indent.assert_called_once_with('text-heading')
     backticks.assert_called_once_with('text-heading-indent')
     assert 'text-heading-indent-backticks' == actual
+
+
+def _get_test_color_configs():
+    """
+    Return color configs with distinct values for everything, so that
+    differences in what is colored how show up in the output.
+    """
+    return [
+        config.get_default_color_config(),
+        config.ColorConfig(
+            '<P>', '<H>', '<C>', '<B>', '<$>', '</P>', '</H>', '</C>', '</B>',
+            '</$>'
+        ),
+        config.ColorConfig('', '', '', '', '', '', '', '', '', ''),
+    ]
+
+
+def _assert_colorizes_like_passes(text):
+    for color_config in _get_test_color_configs():
+        colorizer = color.EgColorizer(color_config)
+        assert colorizer.colorize_text(text) == (
+            colorizer.colorize_text_in_passes(text)
+        )
+
+
+def test_colorize_text_matches_passes_for_shipped_examples():
+    examples_dir = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)),
+        'eg',
+        'examples'
+    )
+    for file_name in sorted(os.listdir(examples_dir)):
+        with open(os.path.join(examples_dir, file_name), 'r') as f:
+            _assert_colorizes_like_passes(f.read())
+
+
+def test_colorize_text_matches_passes_for_test_file():
+    _assert_colorizes_like_passes(get_clean_find_file())
+
+
+def test_colorize_text_matches_passes_for_fuzzed_text():
+    pieces = [
+        '#', '##', ' ', '    ', '     ', '$', '$ ', '`', '``', 'a', 'word',
+        '\n', '\n\n', '\t', '\r', '\\1', u'é',
+    ]
+    rng = random.Random(0)
+    for _ in range(2000):
+        text = ''.join(
+            rng.choice(pieces) for _ in range(rng.randint(0, 30))
+        )
+        _assert_colorizes_like_passes(text)
+
+
+def test_colorize_text_colors_each_kind_of_line():
+    colorizer = color.EgColorizer(_get_test_color_configs()[1])
+    text = '## Head `x`\n    $ code `y`\n    more\nprose `z` and `w`\n'
+
+    assert colorizer.colorize_text(text) == (
+        '<P>##</P><H> Head `<B>x</B>`</H>\n'
+        '    <$>$</$><C> code `y`</C>\n'
+        '    <$></$><C>more</C>\n'
+        'prose `<B>z</B>` and `<B>w</B>`\n'
+    )
+
+
+def test_colorize_text_falls_back_to_passes_for_unusual_colors():
+    unusual_configs = [
+        config.ColorConfig('\n', '', '', '', '', '', '', '', '', ''),
+        config.ColorConfig('', '', '', '`', '', '', '', '', '', ''),
+        config.ColorConfig('', r'\g<0>', '', '', '', '', '', '', '', ''),
+        config.ColorConfig('    ', '', '', '', '', '', '', '', '', ''),
+        config.ColorConfig(None, '', '', '', '', '', '', '', '', ''),
+    ]
+    for color_config in unusual_configs:
+        colorizer = color.EgColorizer(color_config)
+        with patch.object(
+            colorizer,
+            'colorize_text_in_passes',
+            return_value='passes'
+        ):
+            assert colorizer.colorize_text('# text') == 'passes'
+
+    # Outputs still agree for those the passes can handle.
+    for color_config in unusual_configs[:4]:
+        colorizer = color.EgColorizer(color_config)
+        text = '# a `b`\n    $ c\n`d`'
+        assert colorizer.colorize_text(text) == (
+            colorizer.colorize_text_in_passes(text)
+        )
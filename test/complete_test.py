@@ -0,0 +1,135 @@
+import os
+
+from eg import complete
+from mock import patch
+from test.conftest import age_tree
+from test.conftest import make_dirs
+
+
+def test_get_completions_includes_custom_programs_and_aliases(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        ['tar', 'tail', 'top', 'find'],
+        ['tac'],
+        aliases={'tarball': 'tar'}
+    )
+
+    assert complete.get_completions('ta', examples_dir, custom_dir) == [
+        'tac', 'tail', 'tar', 'tarball'
+    ]
+    assert complete.get_completions('tar', examples_dir, custom_dir) == [
+        'tar', 'tarball'
+    ]
+    assert complete.get_completions('x', examples_dir, custom_dir) == []
+    assert complete.get_completions('', examples_dir, custom_dir) == [
+        'find', 'tac', 'tail', 'tar', 'tarball', 'top'
+    ]
+
+
+def test_get_completions_handles_missing_dirs(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, ['tar'])
+
+    assert complete.get_completions('t', examples_dir, None) == ['tar']
+    assert complete.get_completions(
+        't',
+        str(tmpdir.join('nope')),
+        None
+    ) == []
+
+
+def test_get_completions_reuses_table(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        ['tar', 'top'],
+        aliases={'tarball': 'tar'}
+    )
+    age_tree(examples_dir, custom_dir)
+    expected = ['tar', 'tarball', 'top']
+    assert complete.get_completions('t', examples_dir, custom_dir) == expected
+
+    with patch('eg.catalog.Catalog') as mock_catalog:
+        assert complete.get_completions(
+            't',
+            examples_dir,
+            custom_dir
+        ) == expected
+        mock_catalog.assert_not_called()
+
+
+def test_get_completions_reuses_empty_table(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, [])
+    age_tree(examples_dir, custom_dir)
+    assert complete.get_completions('t', examples_dir, custom_dir) == []
+
+    with patch('eg.catalog.Catalog') as mock_catalog:
+        assert complete.get_completions('t', examples_dir, custom_dir) == []
+        mock_catalog.assert_not_called()
+
+
+def test_get_completions_sees_new_programs(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, ['tar'])
+    age_tree(examples_dir, custom_dir)
+    assert complete.get_completions('t', examples_dir, custom_dir) == ['tar']
+
+    tmpdir.join('custom', 'tee.md').write('# tee')
+
+    assert complete.get_completions('t', examples_dir, custom_dir) == [
+        'tar', 'tee'
+    ]
+
+
+def test_get_completions_does_not_store_racy_table(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, ['tar'])
+    complete.get_completions('t', examples_dir, custom_dir)
+
+    table_path = complete._get_table_path(examples_dir, custom_dir)
+    assert not os.path.exists(table_path)
+
+
+def test_get_completions_ignores_damaged_table(tmpdir):
+    examples_dir, custom_dir = make_dirs(tmpdir, ['tar'])
+    age_tree(examples_dir, custom_dir)
+    table_path = complete._get_table_path(examples_dir, custom_dir)
+    os.makedirs(os.path.dirname(table_path))
+    with open(table_path, 'wb') as f:
+        f.write(b'not a table')
+
+    assert complete.get_completions('t', examples_dir, custom_dir) == ['tar']
+
+
+def test_get_fast_prefix():
+    assert complete.get_fast_prefix(['--complete', 'ta']) == 'ta'
+    assert complete.get_fast_prefix(['--complete']) == ''
+    assert complete.get_fast_prefix(['tar']) is None
+    assert complete.get_fast_prefix([]) is None
+    assert complete.get_fast_prefix(
+        ['--complete', 'ta', '--examples-dir', 'dir']
+    ) is None
+
+
+@patch('eg.config.get_example_dirs', return_value=('examples', 'custom'))
+@patch('eg.complete.get_completions', return_value=['tar', 'tarball'])
+def test_show_completions(mock_get_completions, mock_get_dirs, capsys):
+    complete.show_completions('ta', examples_dir='examples')
+
+    mock_get_dirs.assert_called_once_with(None, 'examples', None)
+    mock_get_completions.assert_called_once_with('ta', 'examples', 'custom')
+    assert capsys.readouterr().out == 'tar\ntarball\n'
+
+
+def test_completion_scripts_call_complete():
+    for shell in complete.SHELLS:
+        assert 'eg --complete' in complete.get_completion_script(shell)
+
+
+def test_find_first():
+    names, offsets = complete._build_table(['ab', 'abc', 'b', 'bcd'])
+
+    assert complete._find_first(names, offsets, '') == 0
+    assert complete._find_first(names, offsets, 'abc') == 1
+    assert complete._find_first(names, offsets, 'abd') == 2
+    assert complete._find_first(names, offsets, 'bc') == 3
+    assert complete._find_first(names, offsets, 'c') == 4
+
+    names, offsets = complete._build_table([])
+    assert complete._find_first(names, offsets, 'a') == 0
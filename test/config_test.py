@@ -548,11 +548,19 @@ def test_get_config_tuple_from_egrc_when_present(mock_expand):
         substitute.Substitution('\n\n\n', '\n\n', True)
     ]
 
+    # The cache dir is expanded to find the snapshot of the egrc.
+    cache_dir = os.path.join(
+        os.environ[config.ENV_XDG_CACHE_HOME],
+        config.CACHE_DIR_NAME
+    )
+
     def return_expanded_path(*args, **kwargs):
         if args[0] == egrc_examples_dir:
             return egrc_examples_dir
         elif args[0] == egrc_custom_dir:
             return egrc_custom_dir
+        elif args[0] == cache_dir:
+            return cache_dir
         else:
             raise TypeError(
                 args[0] +
@@ -600,6 +608,137 @@ def _get_color_config_from_egrc_withdata():
     return test_color_config
 
 
+def _write_old_egrc(tmpdir, contents, age_s=60):
+    """
+    Write an egrc to tmpdir, dated long enough ago for its mtime to be
+    trusted. Returns its path.
+    """
+    egrc = tmpdir.join('egrc')
+    egrc.write(contents)
+    mtime = os.path.getmtime(str(egrc)) - age_s
+    os.utime(str(egrc), (mtime, mtime))
+    return str(egrc)
+
+
+def test_get_config_tuple_from_egrc_uses_snapshot(tmpdir):
+    with open(PATH_EGRC_WITH_DATA, 'r') as f:
+        egrc_path = _write_old_egrc(tmpdir, f.read())
+
+    parsed = config.get_config_tuple_from_egrc(egrc_path)
+
+    with patch('eg.config._get_values_from_egrc') as mock_get_values:
+        from_snapshot = config.get_config_tuple_from_egrc(egrc_path)
+        mock_get_values.assert_not_called()
+
+    assert from_snapshot == parsed
+    assert from_snapshot.subs == [
+        substitute.Substitution(r'    ', r'', False),
+        substitute.Substitution('\n\n\n', '\n\n', True)
+    ]
+
+
+def test_get_config_tuple_from_egrc_reparses_changed_egrc(tmpdir):
+    egrc_path = _write_old_egrc(tmpdir, "[eg-config]\npager-cmd = 'more'\n")
+    assert config.get_config_tuple_from_egrc(egrc_path).pager_cmd == 'more'
+
+    egrc_path = _write_old_egrc(
+        tmpdir,
+        "[eg-config]\npager-cmd = 'less -R'\n",
+        age_s=30
+    )
+    assert config.get_config_tuple_from_egrc(egrc_path).pager_cmd == 'less -R'
+
+
+def test_get_config_tuple_from_egrc_no_snapshot_of_recent_egrc(tmpdir):
+    egrc_path = _write_old_egrc(tmpdir, '[eg-config]\ncolor = true\n', 0)
+
+    config.get_config_tuple_from_egrc(egrc_path)
+
+    assert not os.path.exists(config._get_egrc_snapshot_path(egrc_path))
+
+
+def test_get_config_tuple_from_egrc_ignores_damaged_snapshot(tmpdir):
+    egrc_path = _write_old_egrc(tmpdir, '[eg-config]\ncolor = true\n')
+    config.get_config_tuple_from_egrc(egrc_path)
+
+    snapshot_path = config._get_egrc_snapshot_path(egrc_path)
+    with open(snapshot_path, 'wb') as f:
+        f.write(b'not a snapshot')
+
+    assert config.get_config_tuple_from_egrc(egrc_path).use_color is True
+
+
+def test_get_config_tuple_from_egrc_expands_snapshot_paths(
+    tmpdir, monkeypatch
+):
+    egrc_path = _write_old_egrc(
+        tmpdir,
+        '[eg-config]\ncustom-dir = $EG_TEST_DIR/custom\n'
+    )
+    monkeypatch.setenv('EG_TEST_DIR', 'first')
+    assert config.get_config_tuple_from_egrc(egrc_path).custom_dir == (
+        os.path.join('first', 'custom')
+    )
+
+    monkeypatch.setenv('EG_TEST_DIR', 'second')
+    with patch('eg.config._get_values_from_egrc') as mock_get_values:
+        actual = config.get_config_tuple_from_egrc(egrc_path)
+        mock_get_values.assert_not_called()
+    assert actual.custom_dir == os.path.join('second', 'custom')
+
+
+def test_get_resolved_config_prioritizes_cli_over_snapshot(tmpdir):
+    egrc_path = _write_old_egrc(
+        tmpdir,
+        "[eg-config]\ncolor = true\npager-cmd = 'more'\nsqueeze = true\n"
+    )
+    _call_get_resolved_config_with_defaults(egrc_path=egrc_path)
+
+    actual = _call_get_resolved_config_with_defaults(
+        egrc_path=egrc_path,
+        use_color=False,
+        pager_cmd='less',
+    )
+
+    assert actual.use_color is False
+    assert actual.color_config is None
+    assert actual.pager_cmd == 'less'
+    assert actual.squeeze is True
+
+
+def test_get_example_dirs_prioritizes_cli_then_egrc_then_defaults(tmpdir):
+    egrc_path = _write_old_egrc(
+        tmpdir,
+        '[eg-config]\nexamples-dir = egrc/examples\n'
+        'custom-dir = egrc/custom\n'
+    )
+
+    assert config.get_example_dirs(egrc_path, None, None) == (
+        'egrc/examples',
+        'egrc/custom'
+    )
+    assert config.get_example_dirs(egrc_path, 'cli/examples', None) == (
+        'cli/examples',
+        'egrc/custom'
+    )
+    assert config.get_example_dirs(
+        str(tmpdir.join('no-egrc')),
+        None,
+        None
+    ) == (config.DEFAULT_EXAMPLES_DIR, config.DEFAULT_CUSTOM_DIR)
+
+
+def test_get_pager_cmd_prioritizes_cli_then_egrc_then_default(tmpdir):
+    egrc_path = _write_old_egrc(tmpdir, "[eg-config]\npager-cmd = 'more'\n")
+
+    assert config.get_pager_cmd(egrc_path, None) == 'more'
+    assert config.get_pager_cmd(egrc_path, 'cat') == 'cat'
+    assert config.get_pager_cmd(
+        str(tmpdir.join('no-egrc')),
+        None
+    ) == config.DEFAULT_PAGER_CMD
+
+
 def test_merge_color_configs_first_all_none():
     second = config.get_default_color_config()
 
@@ -828,3 +967,22 @@ def _get_egrc_config(egrc_path):
             config = ConfigParser()
         config.readfp(egrc)
     return config
+
+
+@patch('os.getenv')
+def test_get_cache_dir_uses_xdg_cache_home(mock_getenv):
+    mock_getenv.return_value = os.path.join('path', 'to', 'cache')
+
+    actual = config.get_cache_dir()
+
+    assert actual == os.path.join('path', 'to', 'cache', 'eg')
+    mock_getenv.assert_called_once_with(config.ENV_XDG_CACHE_HOME)
+
+
+@patch('os.getenv')
+def test_get_cache_dir_defaults_to_home_cache(mock_getenv):
+    mock_getenv.return_value = ''
+
+    actual = config.get_cache_dir()
+
+    assert actual == os.path.expanduser(os.path.join('~', '.cache', 'eg'))
@@ -0,0 +1,90 @@
+import json
+import os
+import time
+
+import pytest
+
+from eg import catalog
+from eg import config
+from test.util_test import _create_config
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmpdir, monkeypatch):
+    """
+    Point the eg cache dir at a fresh temporary directory so tests never read
+    or write the caches of the user running them.
+    """
+    cache_home = tmpdir.mkdir('cache-home')
+    monkeypatch.setenv(config.ENV_XDG_CACHE_HOME, str(cache_home))
+    return cache_home.join(config.CACHE_DIR_NAME)
+
+
+@pytest.fixture(autouse=True)
+def fresh_catalogs():
+    """Make sure no test sees a Catalog built by another test."""
+    catalog.clear_catalogs()
+    yield
+    catalog.clear_catalogs()
+
+
+def age(*paths):
+    """
+    Move the mtimes of paths into the past, so that caches and indexes trust
+    them to change whenever the files do.
+    """
+    past = time.time() - 60
+    for path in paths:
+        os.utime(str(path), (past, past))
+
+
+def age_tree(*dirs):
+    """Age dirs and everything beneath them, as age() does."""
+    for dir_to_age in dirs:
+        for root, dirnames, filenames in os.walk(str(dir_to_age)):
+            age(root, *[os.path.join(root, name) for name in filenames])
+
+
+def make_dirs(tmpdir, examples, custom=(), aliases=None, custom_aliases=None):
+    """
+    Create an examples dir and a custom dir in tmpdir and return them as
+    strings. examples and custom are each either a dict mapping the paths of
+    files, relative to the dir, to their contents, or a list of programs to
+    give a one line example. aliases and custom_aliases, unless None, are
+    written to the aliases file of each dir.
+    """
+    result = []
+    for name, files, dir_aliases in [
+        ('examples', examples, aliases),
+        ('custom', custom, custom_aliases),
+    ]:
+        if not isinstance(files, dict):
+            files = dict(
+                (program + '.md', '# ' + program) for program in files
+            )
+        new_dir = tmpdir.mkdir(name)
+        for rel_path, contents in sorted(files.items()):
+            new_dir.join(rel_path).write(contents, ensure=True)
+        if dir_aliases is not None:
+            new_dir.join(catalog.ALIAS_FILE_NAME).write(
+                json.dumps(dir_aliases, sort_keys=True)
+            )
+        result.append(str(new_dir))
+    return tuple(result)
+
+
+def make_config(tmpdir, programs=('cp', 'ln', 'tar'), **kwargs):
+    """
+    Return a Config built from kwargs for an examples dir in tmpdir with an
+    aged example for each of programs and `link` as an alias for ln. An
+    examples dir made by an earlier call is reused as it is.
+    """
+    examples = tmpdir.join('examples')
+    if not examples.check():
+        examples.mkdir()
+        for program in programs:
+            path = examples.join(program + '.md')
+            path.write('# ' + program + '\n\n\n\nrun `' + program + '`\n')
+            age(path)
+        examples.join('aliases.json').write('{"link": "ln"}')
+    return _create_config(examples_dir=str(examples), **kwargs)
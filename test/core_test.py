@@ -1,6 +1,7 @@
 from collections import namedtuple
 from mock import patch
 
+from eg import complete
 from eg import core
 from test.util_test import _create_config
 
@@ -20,6 +21,18 @@ MockArgs = namedtuple(
         'version',
         'program',
         'edit',
+        'build_bundle',
+        'cache_command',
+        'daemon',
+        'search',
+        'batch',
+        'output_dir',
+        'jobs',
+        'prerender',
+        'serve',
+        'port',
+        'complete',
+        'completion_script',
     ]
 )
 
@@ -35,6 +48,18 @@ def _create_mock_args(
     squeeze=None,
     program=None,
     edit=False,
+    build_bundle=None,
+    cache_command=None,
+    daemon=False,
+    search=None,
+    batch=None,
+    output_dir=None,
+    jobs=None,
+    prerender=False,
+    serve=False,
+    port=None,
+    complete=None,
+    completion_script=None,
 ):
     """Helper to create an argument named tuple."""
     return MockArgs(
@@ -48,6 +73,18 @@ def _create_mock_args(
         squeeze=squeeze,
         program=program,
         edit=edit,
+        build_bundle=build_bundle,
+        cache_command=cache_command,
+        daemon=daemon,
+        search=search,
+        batch=batch,
+        output_dir=output_dir,
+        jobs=jobs,
+        prerender=prerender,
+        serve=serve,
+        port=port,
+        complete=complete,
+        completion_script=completion_script,
     )
 
 
@@ -117,6 +154,20 @@ def _helper_parses_correctly(
         assert actual_args.squeeze == expected_args.squeeze
         assert actual_args.version == expected_args.version
         assert actual_args.edit == expected_args.edit
+        assert actual_args.build_bundle == expected_args.build_bundle
+        assert actual_args.cache_command == expected_args.cache_command
+        assert actual_args.daemon == expected_args.daemon
+        assert actual_args.search == expected_args.search
+        assert actual_args.batch == expected_args.batch
+        assert actual_args.output_dir == expected_args.output_dir
+        assert actual_args.jobs == expected_args.jobs
+        assert actual_args.prerender == expected_args.prerender
+        assert actual_args.serve == expected_args.serve
+        assert actual_args.port == expected_args.port
+        assert actual_args.complete == expected_args.complete
+        assert (
+            actual_args.completion_script == expected_args.completion_script
+        )
         # Note that here we use the default, as described above.
         assert actual_args.program == default_program
 
@@ -235,6 +286,144 @@ def test_parses_squeeze_correctly():
     _helper_parses_correctly(['--squeeze'], expected_args)
 
 
+def test_parses_build_bundle_correctly():
+    """
+    Parses the directory and output path given to --build-bundle.
+    """
+    expected_args = _create_mock_args(
+        build_bundle=['path/to/examples', 'out.egb']
+    )
+
+    _helper_parses_correctly(
+        ['--build-bundle', 'path/to/examples', 'out.egb'],
+        expected_args
+    )
+
+
+@patch('sys.argv', new=['eg', '--build-bundle', 'dir', 'out.egb'])
+def test_parse_args_allows_build_bundle_without_program():
+    """
+    --build-bundle is a complete command on its own.
+    """
+    actual = core._parse_arguments()
+    assert actual.build_bundle == ['dir', 'out.egb']
+    assert actual.program is None
+
+
+def test_parses_cache_command_correctly():
+    """
+    Parses each of the cache commands.
+    """
+    for cache_command in ['stats', 'clear', 'verify']:
+        expected_args = _create_mock_args(cache_command=cache_command)
+        _helper_parses_correctly(['--cache', cache_command], expected_args)
+
+
+def test_parses_daemon_correctly():
+    """
+    Parses the daemon flag.
+    """
+    expected_args = _create_mock_args(daemon=True)
+
+    _helper_parses_correctly(['--daemon'], expected_args)
+
+
+def test_parses_search_correctly():
+    """
+    Parses the search query.
+    """
+    expected_args = _create_mock_args(search='extract tar gz')
+    _helper_parses_correctly(['--search', 'extract tar gz'], expected_args)
+
+
+def test_parses_batch_correctly():
+    """
+    Parses the batch file, output dir, and number of jobs.
+    """
+    expected_args = _create_mock_args(
+        batch='programs.txt',
+        output_dir='out',
+        jobs=4,
+    )
+    _helper_parses_correctly(
+        ['--batch', 'programs.txt', '--output-dir', 'out', '--jobs', '4'],
+        expected_args
+    )
+
+
+@patch('sys.argv', new=['eg', '--batch', '-'])
+def test_parse_args_allows_batch_without_program():
+    """
+    --batch takes its programs from the batch file rather than the command
+    line.
+    """
+    actual = core._parse_arguments()
+    assert actual.batch == '-'
+    assert actual.program is None
+
+
+def test_parses_prerender_correctly():
+    """
+    Parses the prerender flag and number of jobs.
+    """
+    expected_args = _create_mock_args(prerender=True, jobs=2)
+    _helper_parses_correctly(['--prerender', '--jobs', '2'], expected_args)
+
+
+@patch('sys.argv', new=['eg', '--prerender'])
+def test_parse_args_allows_prerender_without_program():
+    """
+    --prerender is a complete command on its own.
+    """
+    actual = core._parse_arguments()
+    assert actual.prerender
+    assert actual.program is None
+
+
+def test_parses_serve_correctly():
+    """
+    Parses the serve flag, port, and number of threads.
+    """
+    expected_args = _create_mock_args(serve=True, port=8080, jobs=4)
+    _helper_parses_correctly(
+        ['--serve', '--port', '8080', '--jobs', '4'],
+        expected_args
+    )
+
+
+@patch('sys.argv', new=['eg', '--serve'])
+def test_parse_args_allows_serve_without_program():
+    """
+    --serve is a complete command on its own.
+    """
+    actual = core._parse_arguments()
+    assert actual.serve
+    assert actual.program is None
+
+
+@patch('sys.argv', new=['eg', '--complete', 'ta'])
+def test_parse_args_allows_complete_without_program():
+    """
+    --complete is a complete command on its own, even with an empty prefix.
+    """
+    actual = core._parse_arguments()
+    assert actual.complete == 'ta'
+    assert actual.program is None
+
+    with patch('sys.argv', new=['eg', '--complete', '']):
+        assert core._parse_arguments().complete == ''
+
+
+@patch('sys.argv', new=['eg', '--completion-script', 'zsh'])
+def test_parse_args_allows_completion_script_without_program():
+    """
+    --completion-script is a complete command on its own.
+    """
+    actual = core._parse_arguments()
+    assert actual.completion_script == 'zsh'
+    assert actual.program is None
+
+
 def test_parses_all_valid_options_simultaneously():
     """
     Parses a large number of valid options at the same time.
@@ -336,6 +525,26 @@ def test_shows_version():
     _helper_run_eg_responds_to_args_correctly(args, call_show_version=True)
 
 
+@patch('eg.core._show_version')
+@patch('eg.core._parse_arguments')
+@patch('eg.config.get_resolved_config')
+def test_shows_version_without_resolving_config(
+    mock_resolved_config,
+    mock_parse_args,
+    mock_show_version,
+):
+    """
+    The version doesn't depend on the config, so --version shouldn't resolve
+    it.
+    """
+    mock_parse_args.return_value = _create_mock_args(version=True)
+
+    core.run_eg()
+
+    mock_show_version.assert_called_once_with()
+    assert mock_resolved_config.call_args_list == []
+
+
 def test_shows_list():
     """
     Should show list of programs if args.list is true.
@@ -349,7 +558,25 @@ def test_calls_handle_program():
     Without list and version, should call handle program with our config.
     """
     args = _create_mock_args(program='awk')
-    _helper_run_eg_responds_to_args_correctly(args, call_handle_program=True)
+    _helper_run_eg_responds_to_args_correctly(
+        args,
+        call_handle_program=True,
+        resolved_config=_create_config(use_color=False)
+    )
+
+
+@patch('eg.util.get_screen_size', return_value=None)
+def test_turns_color_off_if_not_a_terminal(mock_screen_size):
+    colored = _create_config(use_color=True)
+
+    actual = core._get_config_for_stdout(colored, None)
+    assert actual == colored._replace(use_color=False)
+
+    # Unless asked for at the command line.
+    assert core._get_config_for_stdout(colored, True) == colored
+
+    mock_screen_size.return_value = (80, 24)
+    assert core._get_config_for_stdout(colored, None) == colored
 
 
 def test_run_eg_informs_if_no_editor():
@@ -373,3 +600,248 @@ def test_run_eg_opens_editor():
     _helper_run_eg_responds_to_args_correctly(
         args, call_edit_custom=True, resolved_config=config_with_editor
     )
+
+
+@patch('eg.config.get_resolved_config')
+@patch('eg.core._build_bundle')
+@patch('eg.core._parse_arguments')
+def test_run_eg_builds_bundle(
+    mock_parse_args,
+    mock_build_bundle,
+    mock_resolved_config
+):
+    """
+    --build-bundle should build the bundle without resolving any config.
+    """
+    args = _create_mock_args(build_bundle=['dir', 'out.egb'])
+    mock_parse_args.return_value = args
+
+    core.run_eg()
+
+    mock_build_bundle.assert_called_once_with('dir', 'out.egb')
+    assert mock_resolved_config.call_count == 0
+
+
+@patch('eg.config.get_resolved_config')
+@patch('eg.core._handle_cache_command')
+@patch('eg.core._parse_arguments')
+def test_run_eg_handles_cache_command(
+    mock_parse_args,
+    mock_handle_cache,
+    mock_resolved_config
+):
+    """
+    --cache should operate the cache without resolving any config.
+    """
+    args = _create_mock_args(cache_command='clear')
+    mock_parse_args.return_value = args
+
+    core.run_eg()
+
+    mock_handle_cache.assert_called_once_with('clear')
+    assert mock_resolved_config.call_count == 0
+
+
+@patch('eg.config.get_resolved_config')
+@patch('eg.daemon.serve')
+@patch('eg.core._parse_arguments')
+def test_run_eg_serves_daemon(
+    mock_parse_args,
+    mock_serve,
+    mock_resolved_config
+):
+    """
+    --daemon should start the daemon, which resolves config per request.
+    """
+    args = _create_mock_args(daemon=True)
+    mock_parse_args.return_value = args
+
+    core.run_eg()
+
+    mock_serve.assert_called_once_with()
+    assert mock_resolved_config.call_count == 0
+
+
+@patch('eg.core._show_search_results')
+@patch('eg.core._parse_arguments')
+@patch('eg.config.get_resolved_config')
+def test_run_eg_searches(
+    mock_resolved_config,
+    mock_parse_args,
+    mock_show_search_results
+):
+    """
+    --search should search the examples of the resolved config.
+    """
+    mock_resolved_config.return_value = 'stand-in-config'
+    mock_parse_args.return_value = _create_mock_args(search='tar gz')
+
+    core.run_eg()
+
+    mock_show_search_results.assert_called_once_with(
+        'stand-in-config',
+        'tar gz'
+    )
+
+
+@patch('eg.search.search')
+def test_show_search_results_shows_program_and_heading(
+    mock_search,
+    capsys
+):
+    """
+    Each result is shown as its program and heading, with the heading left
+    out for the section introducing the program.
+    """
+    from eg import search
+    mock_search.return_value = [
+        search.SearchResult('tar', 'Extracting', '/tar.md', 2.0),
+        search.SearchResult('tar', 'tar', '/tar.md', 1.0),
+        search.SearchResult('cp', '', '/cp.md', 0.5),
+    ]
+
+    core._show_search_results('stand-in-config', 'tar gz')
+
+    mock_search.assert_called_once_with('stand-in-config', 'tar gz')
+    assert capsys.readouterr().out == 'tar: Extracting\ntar\ncp\n'
+
+
+@patch('eg.search.search', return_value=[])
+def test_show_search_results_says_when_nothing_matches(mock_search, capsys):
+    core._show_search_results('stand-in-config', 'unicorn')
+
+    assert capsys.readouterr().out == 'No examples match: unicorn\n'
+
+
+@patch('eg.batch.run_batch')
+@patch('eg.core._parse_arguments')
+@patch('eg.config.get_resolved_config')
+def test_run_eg_renders_batch(
+    mock_resolved_config,
+    mock_parse_args,
+    mock_run_batch
+):
+    """
+    --batch should render the listed programs with the resolved config, but
+    without color, as the output isn't going to a terminal.
+    """
+    mock_resolved_config.return_value = _create_config(use_color=True)
+    mock_parse_args.return_value = _create_mock_args(
+        batch='programs.txt',
+        output_dir='out',
+        jobs=2,
+    )
+
+    core.run_eg()
+
+    mock_run_batch.assert_called_once_with(
+        'programs.txt',
+        _create_config(use_color=False),
+        output_dir='out',
+        num_jobs=2
+    )
+
+
+def test_batch_is_colored_only_if_asked_for():
+    colored = _create_config(use_color=True)
+
+    assert core._get_config_for_batch(colored, None) == colored._replace(
+        use_color=False
+    )
+    assert core._get_config_for_batch(colored, True) == colored
+
+
+@patch('eg.prerender.get_report', return_value='report')
+@patch('eg.prerender.prerender', return_value='stand-in-stats')
+@patch('eg.core._parse_arguments')
+@patch('eg.config.get_resolved_config')
+def test_run_eg_prerenders(
+    mock_resolved_config,
+    mock_parse_args,
+    mock_prerender,
+    mock_get_report,
+    capsys
+):
+    """
+    --prerender should pre-render with the resolved config and report on it.
+    """
+    mock_resolved_config.return_value = 'stand-in-config'
+    mock_parse_args.return_value = _create_mock_args(prerender=True, jobs=3)
+
+    core.run_eg()
+
+    mock_prerender.assert_called_once_with('stand-in-config', num_jobs=3)
+    mock_get_report.assert_called_once_with('stand-in-stats')
+    assert capsys.readouterr().out == 'report\n'
+
+
+@patch('eg.complete.show_completions')
+@patch('eg.core._parse_arguments')
+@patch('eg.config.get_resolved_config')
+def test_run_eg_completes(
+    mock_resolved_config,
+    mock_parse_args,
+    mock_show_completions
+):
+    """
+    --complete should complete without resolving the rest of the config.
+    """
+    mock_parse_args.return_value = _create_mock_args(
+        complete='ta',
+        config_file='egrc',
+        examples_dir='examples',
+        custom_dir='custom'
+    )
+
+    core.run_eg()
+
+    mock_show_completions.assert_called_once_with(
+        'ta',
+        egrc_path='egrc',
+        examples_dir='examples',
+        custom_dir='custom'
+    )
+    assert mock_resolved_config.call_count == 0
+
+
+@patch('eg.core._parse_arguments')
+@patch('eg.config.get_resolved_config')
+def test_run_eg_shows_completion_script(
+    mock_resolved_config,
+    mock_parse_args,
+    capsys
+):
+    """
+    --completion-script should print the script for the shell.
+    """
+    mock_parse_args.return_value = _create_mock_args(
+        completion_script='fish'
+    )
+
+    core.run_eg()
+
+    assert capsys.readouterr().out == complete.get_completion_script('fish')
+    assert mock_resolved_config.call_count == 0
+
+
+@patch('eg.server.serve')
+@patch('eg.core._parse_arguments')
+@patch('eg.config.get_resolved_config')
+def test_run_eg_serves(mock_resolved_config, mock_parse_args, mock_serve):
+    """
+    --serve should serve the examples with the resolved config.
+    """
+    mock_resolved_config.return_value = 'stand-in-config'
+    mock_parse_args.return_value = _create_mock_args(
+        serve=True,
+        port=8080,
+        jobs=4
+    )
+
+    core.run_eg()
+
+    mock_serve.assert_called_once_with(
+        'stand-in-config',
+        port=8080,
+        num_threads=4
+    )
@@ -0,0 +1,347 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+if sys.version_info[0] < 3:
+    pytest.skip('eg --daemon needs Python 3', allow_module_level=True)
+
+from eg import client
+from eg import daemon
+from eg import util
+from mock import patch
+from test.conftest import age
+
+
+@pytest.fixture
+def examples_dir(tmpdir):
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n\n\n\ncopy\n')
+    examples.join('aliases.json').write(json.dumps({'copy': 'cp'}))
+    age(str(examples), str(examples.join('aliases.json')))
+    return str(examples)
+
+
+@pytest.fixture
+def egrc(tmpdir):
+    egrc = tmpdir.join('egrc')
+    egrc.write('[eg-config]\npager-cmd = \'cat\'\n')
+    age(str(egrc))
+    return str(egrc)
+
+
+def _handle(state, examples_dir, egrc, *argv):
+    """Ask state to handle argv with a test egrc and examples dir."""
+    full_argv = [
+        '--config-file', egrc,
+        '--examples-dir', examples_dir,
+        '--no-color',
+    ] + list(argv)
+    return state.handle(full_argv, os.getcwd())
+
+
+def test_handle_renders_program(examples_dir, egrc):
+    state = daemon.DaemonState()
+
+    header, body = _handle(state, examples_dir, egrc, 'copy')
+
+    assert header == {client.FIELD_STATUS: client.STATUS_OK}
+    assert body == '# cp\n\n\n\ncopy\n'
+
+
+def test_handle_applies_formatting_args(examples_dir, egrc):
+    state = daemon.DaemonState()
+
+    header, body = _handle(state, examples_dir, egrc, '--squeeze', 'cp')
+
+    assert body == '# cp\n\n\ncopy\n'
+
+
+def test_handle_reports_missing_entries(examples_dir, egrc):
+    state = daemon.DaemonState()
+
+    header, body = _handle(state, examples_dir, egrc, 'nope')
+
+    assert header[client.FIELD_STATUS] == client.STATUS_NO_ENTRY
+    assert 'No entry found for nope' in header[client.FIELD_MESSAGE]
+    assert body == ''
+
+
+def test_handle_falls_back_for_other_commands(examples_dir, egrc):
+    state = daemon.DaemonState()
+
+    for argv in [['--list'], ['--version'], ['--edit', 'cp'], ['--bogus']]:
+        header, body = _handle(state, examples_dir, egrc, *argv)
+        assert header == {client.FIELD_STATUS: client.STATUS_FALLBACK}
+
+
+def test_handle_reuses_config_until_egrc_changes(examples_dir, egrc):
+    state = daemon.DaemonState()
+
+    with patch(
+        'eg.config.get_resolved_config',
+        wraps=daemon.config.get_resolved_config
+    ) as mock_resolve:
+        _handle(state, examples_dir, egrc, 'cp')
+        _handle(state, examples_dir, egrc, 'cp')
+        assert mock_resolve.call_count == 1
+
+        with open(egrc, 'w') as f:
+            f.write('[eg-config]\nsqueeze = true\n')
+        header, body = _handle(state, examples_dir, egrc, 'cp')
+
+        assert mock_resolve.call_count == 2
+        assert body == '# cp\n\n\ncopy\n'
+
+
+def test_handle_sees_new_examples_and_aliases(examples_dir, egrc):
+    state = daemon.DaemonState()
+    _handle(state, examples_dir, egrc, 'cp')
+
+    with open(os.path.join(examples_dir, 'mv.md'), 'w') as f:
+        f.write('# mv\n')
+    with open(os.path.join(examples_dir, 'aliases.json'), 'w') as f:
+        f.write(json.dumps({'copy': 'cp', 'move': 'mv'}))
+
+    header, body = _handle(state, examples_dir, egrc, 'move')
+
+    assert header[client.FIELD_STATUS] == client.STATUS_OK
+    assert body == '# mv\n'
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to around 100 characters, so we can't use
+    # the deeply nested tmpdir.
+    socket_dir = tempfile.mkdtemp(prefix='eg-test-')
+    yield os.path.join(socket_dir, 'daemon.sock')
+    shutil.rmtree(socket_dir)
+
+
+@pytest.fixture
+def running_daemon(socket_path):
+    """Serve on socket_path for the rest of the test."""
+    server_thread = threading.Thread(target=daemon.serve, args=(socket_path,))
+    server_thread.daemon = True
+    server_thread.start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.01)
+    return socket_path
+
+
+def test_client_round_trip_through_daemon(running_daemon, examples_dir, egrc):
+    argv = [
+        '--config-file', egrc,
+        '--examples-dir', examples_dir,
+        '--no-color',
+        'copy',
+    ]
+    header, response_file = client.request(argv, os.getcwd(), running_daemon)
+    body = response_file.read()
+    response_file.close()
+
+    assert header[client.FIELD_STATUS] == client.STATUS_OK
+    assert body == b'# cp\n\n\n\ncopy\n'
+
+
+def test_client_refuses_daemon_of_another_user(running_daemon):
+    with patch('eg.client.get_peer_uid', return_value=os.getuid() + 1):
+        assert client.request(['cp'], os.getcwd(), running_daemon) is None
+
+
+def test_get_peer_uid_is_own_uid_for_own_daemon(running_daemon):
+    sock = client.connect(running_daemon)
+    try:
+        assert client.get_peer_uid(sock) in (None, os.getuid())
+    finally:
+        sock.close()
+
+
+def test_client_refuses_socket_in_shared_dir(socket_path):
+    os.chmod(os.path.dirname(socket_path), 0o755)
+
+    with patch('socket.socket') as mock_socket:
+        assert client.connect(socket_path) is None
+        mock_socket.assert_not_called()
+
+
+def test_daemon_refuses_shared_dir(socket_path):
+    os.chmod(os.path.dirname(socket_path), 0o755)
+
+    daemon.serve(socket_path)
+
+    assert not os.path.exists(socket_path)
+
+
+def test_daemon_creates_private_dir(socket_path):
+    nested_path = os.path.join(os.path.dirname(socket_path), 'eg', 'd.sock')
+
+    assert daemon._prepare_socket_path(nested_path)
+    assert client.is_private_dir(os.path.dirname(nested_path))
+
+
+def test_is_private_dir(tmpdir):
+    private_dir = tmpdir.mkdir('private')
+    private_dir.chmod(0o700)
+    shared_dir = tmpdir.mkdir('shared')
+    shared_dir.chmod(0o755)
+    link = tmpdir.join('link')
+    link.mksymlinkto(private_dir)
+
+    assert client.is_private_dir(str(private_dir))
+    assert not client.is_private_dir(str(shared_dir))
+    assert not client.is_private_dir(str(link))
+    assert not client.is_private_dir(str(tmpdir.join('missing')))
+
+    with patch('os.getuid', return_value=os.getuid() + 1):
+        assert not client.is_private_dir(str(private_dir))
+
+
+def test_request_returns_none_without_daemon(socket_path):
+    assert client.request(['cp'], os.getcwd(), socket_path) is None
+
+
+@patch('eg.core.run_eg')
+@patch('eg.client.request', return_value=None)
+def test_client_runs_in_process_without_daemon(mock_request, mock_run_eg):
+    client.main()
+
+    mock_run_eg.assert_called_once_with()
+
+
+@patch('eg.core.run_eg')
+@patch('eg.client.request')
+def test_client_runs_in_process_on_fallback(mock_request, mock_run_eg):
+    response_file = tempfile.TemporaryFile()
+    mock_request.return_value = (
+        {client.FIELD_STATUS: client.STATUS_FALLBACK},
+        response_file
+    )
+
+    client.main()
+
+    mock_run_eg.assert_called_once_with()
+    assert response_file.closed
+
+
+@patch('eg.client._is_terminal', return_value=False)
+@patch('eg.client._show_response')
+@patch('eg.client.request')
+def test_client_writes_uncolored_output_if_not_a_terminal(
+    mock_request,
+    mock_show_response,
+    mock_is_terminal,
+    capfd
+):
+    response_file = tempfile.TemporaryFile()
+    response_file.write(b'# cp\n')
+    response_file.seek(0)
+    mock_request.return_value = (
+        {client.FIELD_STATUS: client.STATUS_OK},
+        response_file
+    )
+
+    with patch('sys.argv', ['eg-client', 'cp']):
+        client.main()
+
+    assert mock_request.call_args[0][0] == ['--no-color', 'cp']
+    mock_show_response.assert_not_called()
+    assert capfd.readouterr().out == '# cp\n'
+
+
+@patch('eg.client._is_terminal', return_value=True)
+@patch('eg.client._show_response')
+@patch('eg.client.request')
+def test_client_pages_with_its_own_pager(
+    mock_request,
+    mock_show_response,
+    mock_is_terminal,
+    egrc
+):
+    response_file = tempfile.TemporaryFile()
+    mock_request.return_value = (
+        {client.FIELD_STATUS: client.STATUS_OK, 'pager_cmd': 'rm -rf ~'},
+        response_file
+    )
+
+    with patch('sys.argv', ['eg-client', '--config-file', egrc, 'cp']):
+        client.main()
+    mock_show_response.assert_called_once_with('cat', response_file)
+
+    argv = ['eg-client', '-f', egrc, '--pager-cmd=more', 'cp']
+    with patch('sys.argv', argv):
+        client.main()
+    assert mock_show_response.call_args[0][0] == 'more'
+
+
+@patch('eg.client._CHUNK_SIZE', 1)
+@patch('eg.util.get_screen_size', return_value=(80, 2))
+@patch('locale.getpreferredencoding', return_value='UTF-8')
+def test_show_response_streams_to_pager_without_a_shell(
+    mock_encoding,
+    mock_screen_size,
+    tmpdir
+):
+    response_file = tempfile.TemporaryFile()
+    response_file.write(u'# cp\n\ncopy \u2192 there\n'.encode('utf-8'))
+    response_file.seek(0)
+    out_path = str(tmpdir.join('paged'))
+
+    with patch('eg.util.start_pager', wraps=util.start_pager) as mock_start:
+        client._show_response(
+            "sh -c 'cat > " + out_path + "'",
+            response_file
+        )
+
+    mock_start.assert_called_once_with("sh -c 'cat > " + out_path + "'")
+    with open(out_path, 'rb') as f:
+        assert f.read() == u'# cp\n\ncopy \u2192 there\n'.encode('utf-8')
+
+
+@patch('eg.util.get_screen_size', return_value=(80, 24))
+@patch('eg.util.page_chunks')
+def test_show_response_writes_output_that_fits(
+    mock_page_chunks,
+    mock_screen_size,
+    capsys
+):
+    response_file = tempfile.TemporaryFile()
+    response_file.write(b'# cp\n\ncopy\n')
+    response_file.seek(0)
+
+    client._show_response('less', response_file)
+
+    mock_page_chunks.assert_not_called()
+    assert capsys.readouterr().out == '# cp\n\ncopy\n'
+
+
+def test_get_option_value():
+    options = ['-f', '--config-file']
+
+    assert client._get_option_value(['cp'], options) is None
+    assert client._get_option_value(['-f', 'a', 'cp'], options) == 'a'
+    assert client._get_option_value(['-fa', 'cp'], options) == 'a'
+    assert client._get_option_value(['--config-file=a'], options) == 'a'
+    assert client._get_option_value(
+        ['--config-file', 'a', '-f', 'b', 'cp'],
+        options
+    ) == 'b'
+    assert client._get_option_value(['--', '-f', 'a'], options) is None
+
+
+@patch('eg.client.get_runtime_dir', return_value='/run/user/1000/eg')
+def test_get_socket_path(mock_runtime_dir):
+    assert client.get_socket_path() == '/run/user/1000/eg/daemon.sock'
+
+
+@patch('os.getenv', return_value='/run/user/1000')
+def test_get_runtime_dir_uses_xdg_runtime_dir(mock_getenv):
+    assert client.get_runtime_dir() == '/run/user/1000/eg'
+    mock_getenv.assert_called_once_with(client.ENV_XDG_RUNTIME_DIR)
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+
+from eg import index
+from mock import Mock
+from mock import patch
+from test.conftest import age
+
+
+def _make_examples(tmpdir):
+    """Create a small examples tree and return (root, nested) dirs."""
+    root = tmpdir.mkdir('examples')
+    nested = root.mkdir('nested')
+    root.join('cp.md').write('cp')
+    root.join('aliases.json').write('{}')
+    nested.join('cp.md').write('nested cp')
+    nested.join('mv.md').write('mv')
+    age(root, nested)
+    return root, nested
+
+
+def test_get_index_maps_names_to_paths(tmpdir):
+    root, nested = _make_examples(tmpdir)
+
+    actual = index.get_index(str(root))
+
+    assert actual['cp.md'] == [
+        os.path.join(str(root), 'cp.md'),
+        os.path.join(str(nested), 'cp.md'),
+    ]
+    assert actual['mv.md'] == [os.path.join(str(nested), 'mv.md')]
+    assert actual['aliases.json'] == [os.path.join(str(root), 'aliases.json')]
+
+
+def test_get_index_handles_falsey_dir():
+    assert index.get_index(None) == {}
+    assert index.get_index('') == {}
+
+
+def test_get_index_reuses_fresh_index_without_walking(tmpdir):
+    root, nested = _make_examples(tmpdir)
+    expected = index.get_index(str(root))
+
+    with patch('os.walk') as mock_walk:
+        actual = index.get_index(str(root))
+        assert mock_walk.call_count == 0
+
+    assert actual == expected
+
+
+def test_get_index_rewalks_if_directory_changed(tmpdir):
+    root, nested = _make_examples(tmpdir)
+    index.get_index(str(root))
+
+    nested.join('rm.md').write('rm')
+    # Make sure the mtime differs from the saved one even on filesystems with
+    # coarse timestamps.
+    later = time.time() - 30
+    os.utime(str(nested), (later, later))
+
+    actual = index.get_index(str(root))
+    assert actual['rm.md'] == [os.path.join(str(nested), 'rm.md')]
+
+
+def test_get_index_does_not_save_recently_modified_dirs(tmpdir):
+    root = tmpdir.mkdir('examples')
+    root.join('cp.md').write('cp')
+
+    index.get_index(str(root))
+
+    assert not os.path.exists(index._get_index_path(str(root)))
+
+
+def test_get_index_does_not_save_missing_dir(tmpdir):
+    missing = str(tmpdir.join('does-not-exist'))
+
+    assert index.get_index(missing) == {}
+    assert not os.path.exists(index._get_index_path(missing))
+
+
+def test_get_index_rebuilds_if_version_changes(tmpdir):
+    root, nested = _make_examples(tmpdir)
+    index.get_index(str(root))
+
+    with patch('eg.index.INDEX_VERSION', index.INDEX_VERSION + 1):
+        with patch('os.walk', wraps=os.walk) as mock_walk:
+            index.get_index(str(root))
+            mock_walk.assert_called_once_with(str(root))
+
+
+def test_write_file_atomically_creates_parents(tmpdir):
+    path = str(tmpdir.join('a', 'b', 'file.txt'))
+
+    assert index.write_file_atomically(path, 'contents')
+
+    with open(path) as f:
+        assert f.read() == 'contents'
+    assert os.listdir(str(tmpdir.join('a', 'b'))) == ['file.txt']
+
+
+def test_get_tmp_path_differs_between_threads(tmpdir):
+    path = str(tmpdir.join('file.txt'))
+    tmp_paths = []
+    thread = threading.Thread(
+        target=lambda: tmp_paths.append(index.get_tmp_path(path))
+    )
+    thread.start()
+    thread.join()
+
+    assert index.get_tmp_path(path) == index.get_tmp_path(path)
+    assert tmp_paths[0] != index.get_tmp_path(path)
+    assert tmp_paths[0].startswith(path + '.')
+
+
+def test_load_index_returns_dir_mtimes(tmpdir):
+    root, nested = _make_examples(tmpdir)
+
+    files, dir_mtimes = index.load_index(str(root))
+
+    assert sorted(dir_mtimes) == sorted([str(root), str(nested)])
+    assert not index.is_stale(dir_mtimes)
+
+    nested.join('rm.md').write('rm')
+    assert index.is_stale(dir_mtimes)
+
+
+def test_is_stale_treats_none_as_stale():
+    assert index.is_stale(None)
+    assert not index.is_stale({})
+
+
+def test_get_stamp_changes_with_the_file(tmpdir):
+    path = tmpdir.join('cp.md')
+    path.write('cp')
+    age(path)
+
+    size, mtime, is_racy = index.get_stamp(str(path))
+    assert size == 2
+    assert not is_racy
+    assert index.get_trusted_stamp(str(path)) == (size, mtime)
+
+    path.write('cp -r')
+    size, mtime, is_racy = index.get_stamp(str(path))
+    assert size == 5
+    assert is_racy
+    assert index.get_trusted_stamp(str(path)) is None
+
+    assert index.get_stamp(str(tmpdir.join('missing.md'))) is None
+
+
+def test_get_stat_mtime_falls_back_to_seconds():
+    # What os.stat() returns on Python 2.
+    stat = Mock(spec=['st_mtime'])
+    stat.st_mtime = 1.5
+
+    assert index.get_stat_mtime(stat) == 1.5
+    assert index.get_stat_mtime(os.stat(__file__)) == os.stat(
+        __file__
+    ).st_mtime_ns
+
+
+def test_is_trusted():
+    past = time.time() - 60
+
+    assert index.is_trusted({})
+    assert index.is_trusted({'/examples': past})
+    assert not index.is_trusted(None)
+    assert not index.is_trusted({'/examples': None})
+    assert not index.is_trusted({'/examples': past, '/custom': time.time()})
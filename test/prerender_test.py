@@ -0,0 +1,185 @@
+import os
+
+from eg import config
+from eg import prerender
+from eg import render_cache
+from eg import util
+from mock import patch
+from test.conftest import age
+from test.conftest import make_config
+
+
+def test_prerender_fills_render_cache(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        color_config=config.get_default_color_config(),
+        squeeze=True
+    )
+
+    actual = prerender.prerender(test_config, num_jobs=2)
+
+    assert actual.num_programs == 3
+    assert actual.num_rendered == 3
+    assert actual.num_skipped == 0
+    assert actual.num_files == 3
+    path = os.path.join(test_config.examples_dir, 'tar.md')
+    with patch('eg.util.get_formatted_contents') as mock_format:
+        rendered = util.get_rendered_contents([path], test_config)
+    assert mock_format.call_count == 0
+    assert rendered == util.get_formatted_contents(
+        util.get_contents_from_files(path),
+        use_color=test_config.use_color,
+        color_config=test_config.color_config,
+        squeeze=test_config.squeeze,
+        subs=test_config.subs
+    )
+
+
+def test_prerender_skips_unchanged_programs(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        color_config=config.get_default_color_config(),
+        squeeze=True
+    )
+    prerender.prerender(test_config, num_jobs=1)
+
+    with patch('eg.util.get_contents_from_files') as mock_get_contents:
+        actual = prerender.prerender(test_config, num_jobs=1)
+
+    assert mock_get_contents.call_count == 0
+    assert actual.num_rendered == 0
+    assert actual.num_skipped == 3
+
+
+def test_prerender_renders_changed_programs_again(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        color_config=config.get_default_color_config(),
+        squeeze=True
+    )
+    prerender.prerender(test_config, num_jobs=1)
+    path = os.path.join(test_config.examples_dir, 'cp.md')
+    with open(path, 'w') as f:
+        f.write('# copy\n')
+    age(path)
+
+    actual = prerender.prerender(test_config, num_jobs=1)
+
+    assert actual.num_rendered == 1
+    assert actual.num_skipped == 2
+
+
+def test_prerender_renders_everything_when_options_change(tmpdir):
+    color_config = config.get_default_color_config()
+    prerender.prerender(
+        make_config(tmpdir, color_config=color_config, squeeze=True),
+        num_jobs=1
+    )
+
+    actual = prerender.prerender(
+        make_config(tmpdir, color_config=color_config, squeeze=False),
+        num_jobs=1
+    )
+
+    assert actual.num_rendered == 3
+
+
+def test_prerender_renders_evicted_programs_again(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        color_config=config.get_default_color_config(),
+        squeeze=True
+    )
+    prerender.prerender(test_config, num_jobs=1)
+    render_cache.clear()
+
+    actual = prerender.prerender(test_config, num_jobs=1)
+
+    assert actual.num_rendered == 3
+
+
+def test_prerender_checks_recently_modified_files_again(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        color_config=config.get_default_color_config(),
+        squeeze=True
+    )
+    tmpdir.join('examples').join('new.md').write('# new\n')
+    prerender.prerender(test_config, num_jobs=1)
+
+    actual = prerender.prerender(test_config, num_jobs=1)
+
+    assert actual.num_rendered == 1
+    assert actual.num_skipped == 3
+
+
+def test_prerender_reports_programs_that_did_not_fit(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        color_config=config.get_default_color_config(),
+        squeeze=True
+    )
+
+    with patch('eg.render_cache.evict') as mock_evict:
+        mock_evict.side_effect = lambda: render_cache.clear()
+        actual = prerender.prerender(test_config, num_jobs=1)
+
+    assert actual.num_evicted == 3
+    assert 'did not fit' in prerender.get_report(actual)
+    assert prerender.prerender(test_config, num_jobs=1).num_rendered == 3
+
+
+def test_prerender_reports_programs_that_could_not_be_written(
+    tmpdir,
+    monkeypatch
+):
+    test_config = make_config(
+        tmpdir,
+        color_config=config.get_default_color_config(),
+        squeeze=True
+    )
+    tmpdir.join('not-a-dir').write('')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir.join('not-a-dir')))
+
+    actual = prerender.prerender(test_config, num_jobs=1)
+
+    assert actual.num_unwritten == 3
+    assert actual.num_evicted == 0
+    report = prerender.get_report(actual)
+    assert 'could not be written' in report
+    assert 'did not fit' not in report
+
+
+def test_get_report_shows_throughput():
+    prerender_stats = prerender.PrerenderStats(
+        num_programs=10,
+        num_rendered=8,
+        num_skipped=2,
+        num_files=12,
+        num_bytes=3 * 1024 * 1024,
+        elapsed_s=2.0,
+        num_evicted=0,
+        num_unwritten=0,
+    )
+
+    assert prerender.get_report(prerender_stats) == (
+        'Pre-rendered 8 of 10 programs (2 unchanged) in 2.00 s: 6.0 files/s, '
+        '1.50 MB/s'
+    )
+
+
+def test_prerender_paths_does_not_read_cached_programs(tmpdir):
+    test_config = make_config(
+        tmpdir,
+        color_config=config.get_default_color_config(),
+        squeeze=True
+    )
+    prerender.prerender(test_config, num_jobs=1)
+    paths = [os.path.join(test_config.examples_dir, 'tar.md')]
+
+    with patch('eg.util.get_contents_from_files') as mock_get_contents:
+        render_key, size = prerender._prerender_paths(test_config, paths)
+
+    assert mock_get_contents.call_count == 0
+    assert size is None
+    assert render_cache.has(render_key)
@@ -0,0 +1,226 @@
+import os
+import time
+
+from eg import config
+from eg import render_cache
+from eg import substitute
+
+
+def _key(
+    raw_contents='# cp\n',
+    use_color=True,
+    color_config=None,
+    squeeze=False,
+    subs=None,
+):
+    """Call get_key with defaults for the arguments a test doesn't care about."""
+    if color_config is None:
+        color_config = config.get_default_color_config()
+    return render_cache.get_key(
+        raw_contents,
+        use_color=use_color,
+        color_config=color_config,
+        squeeze=squeeze,
+        subs=subs,
+    )
+
+
+def _set_mtime(key, mtime):
+    path = render_cache._get_entry_path(key)
+    os.utime(path, (mtime, mtime))
+
+
+def test_get_key_is_stable():
+    assert _key() == _key()
+
+
+def test_get_key_changes_with_every_input():
+    base = _key()
+    other_colors = config.get_default_color_config()._replace(pound='x')
+    sub = substitute.Substitution('cp', 'copy', False)
+
+    assert _key(raw_contents='# mv\n') != base
+    assert _key(use_color=False) != base
+    assert _key(color_config=other_colors) != base
+    assert _key(squeeze=True) != base
+    assert _key(subs=[sub]) != base
+    assert (
+        _key(subs=[sub]) !=
+        _key(subs=[substitute.Substitution('cp', 'copy', True)])
+    )
+
+
+def test_get_key_ignores_colors_if_not_colorizing():
+    other_colors = config.get_default_color_config()._replace(pound='x')
+
+    assert (
+        _key(use_color=False) ==
+        _key(use_color=False, color_config=other_colors)
+    )
+
+
+def test_get_returns_none_on_miss():
+    assert render_cache.get(_key()) is None
+
+
+def test_put_then_get_round_trips():
+    key = _key()
+    rendered = u'\x1b[1m# cp\x1b[0m → copy\n'
+
+    render_cache.put(key, rendered)
+
+    assert render_cache.get(key) == rendered
+
+
+def test_get_key_for_digest_matches_get_key():
+    colors = config.get_default_color_config()
+    digest = render_cache.get_digest(iter(['# c', 'p\n']))
+
+    assert render_cache.get_key_for_digest(
+        digest,
+        use_color=True,
+        color_config=colors,
+        squeeze=False,
+        subs=None,
+    ) == _key(raw_contents='# cp\n')
+
+
+def test_put_chunks_then_get_chunks_round_trips():
+    key = _key()
+    chunks = [u'\x1b[1m# cp\x1b[0m', u' → copy\r\n', u'']
+
+    assert list(render_cache.put_chunks(key, iter(chunks))) == chunks
+
+    assert render_cache.get(key) == u''.join(chunks)
+    assert u''.join(render_cache.get_chunks(key)) == u''.join(chunks)
+
+
+def test_get_chunks_returns_none_on_miss_or_corruption():
+    key = _key()
+    assert render_cache.get_chunks(key) is None
+
+    render_cache.put(key, 'rendered')
+    with open(render_cache._get_entry_path(key), 'ab') as f:
+        f.write(b'garbage')
+
+    assert render_cache.get_chunks(key) is None
+
+
+def test_put_chunks_skips_abandoned_output():
+    key = _key()
+    chunks = render_cache.put_chunks(key, iter(['one', 'two']))
+
+    assert next(chunks) == 'one'
+    chunks.close()
+
+    assert render_cache.get(key) is None
+    assert os.listdir(render_cache.get_render_cache_dir()) == []
+
+
+def test_put_chunks_skips_output_larger_than_cache():
+    key = _key()
+    chunks = ['x' * 60, 'x' * 60]
+
+    assert list(render_cache.put_chunks(key, iter(chunks), 100)) == chunks
+
+    assert render_cache.get(key) is None
+    assert os.listdir(render_cache.get_render_cache_dir()) == []
+
+
+def test_get_ignores_corrupt_entries():
+    key = _key()
+    render_cache.put(key, 'rendered')
+    with open(render_cache._get_entry_path(key), 'ab') as f:
+        f.write(b'garbage')
+
+    assert render_cache.get(key) is None
+
+
+def test_get_marks_entry_as_used():
+    key = _key()
+    render_cache.put(key, 'rendered')
+    _set_mtime(key, 1000)
+
+    render_cache.get(key)
+
+    assert os.stat(render_cache._get_entry_path(key)).st_mtime > 1000
+
+
+def test_put_evicts_least_recently_used():
+    keys = [_key(raw_contents=str(i)) for i in range(3)]
+    now = time.time()
+    for i, key in enumerate(keys):
+        render_cache.put(key, 'x' * 100)
+        _set_mtime(key, now - 100 + i)
+    # Using the oldest entry makes the second entry least recently used.
+    render_cache.get(keys[0])
+
+    entry_size = os.stat(render_cache._get_entry_path(keys[0])).st_size
+    new_key = _key(raw_contents='new')
+    render_cache.put(new_key, 'x' * 100, max_bytes=entry_size * 3)
+
+    assert render_cache.get(keys[1]) is None
+    assert render_cache.get(keys[0]) is not None
+    assert render_cache.get(keys[2]) is not None
+    assert render_cache.get(new_key) is not None
+
+
+def test_get_stats_counts_entries():
+    render_cache.put(_key(raw_contents='a'), 'aaa')
+    render_cache.put(_key(raw_contents='b'), 'bbb')
+
+    actual = render_cache.get_stats(max_bytes=1234)
+
+    assert actual.cache_dir == render_cache.get_render_cache_dir()
+    assert actual.num_entries == 2
+    assert actual.total_bytes > 6
+    assert actual.max_bytes == 1234
+
+
+def test_get_stats_handles_missing_cache_dir():
+    actual = render_cache.get_stats()
+
+    assert actual.num_entries == 0
+    assert actual.total_bytes == 0
+
+
+def test_clear_removes_all_entries():
+    render_cache.put(_key(raw_contents='a'), 'aaa')
+    render_cache.put(_key(raw_contents='b'), 'bbb')
+
+    assert render_cache.clear() == 2
+    assert render_cache.get_stats().num_entries == 0
+
+
+def test_verify_removes_only_corrupt_entries():
+    good = _key(raw_contents='good')
+    bad = _key(raw_contents='bad')
+    render_cache.put(good, 'good')
+    render_cache.put(bad, 'bad')
+    with open(render_cache._get_entry_path(bad), 'wb') as f:
+        f.write(b'not an entry')
+
+    assert render_cache.verify() == (2, 1)
+    assert render_cache.get(good) == 'good'
+    assert render_cache.get_stats().num_entries == 1
+
+
+def test_get_options_key_changes_with_options_only():
+    colors = config.get_default_color_config()
+    base = render_cache.get_options_key(True, colors, False, None)
+
+    assert render_cache.get_options_key(True, colors, False, None) == base
+    assert render_cache.get_options_key(True, colors, True, None) != base
+    assert render_cache.get_options_key(False, colors, False, None) != base
+
+
+def test_put_without_max_bytes_defers_eviction():
+    keys = [_key(raw_contents=str(i)) for i in range(3)]
+    for key in keys:
+        render_cache.put(key, 'x' * 100, max_bytes=None)
+
+    assert all(render_cache.has(key) for key in keys)
+
+    render_cache.evict(max_bytes=0)
+
+    assert not any(render_cache.has(key) for key in keys)
@@ -0,0 +1,356 @@
+import os
+
+import pytest
+
+from eg import bundle
+from eg import search
+from mock import patch
+from test.conftest import age
+from test.conftest import age_tree
+from test.conftest import make_dirs
+from test.util_test import _create_config
+
+
+TAR_CONTENTS = """# tar
+
+archive files
+
+# Extracting
+
+extract a gzipped archive
+
+    $ tar -xzf archive.tar.gz
+
+# Creating
+
+create an archive of a directory
+
+    $ tar -czf archive.tar.gz dir/
+"""
+
+FIND_CONTENTS = """# find
+
+search for files in a directory hierarchy
+
+# By Name
+
+find files by name
+
+    $ find . -name '*.md'
+"""
+
+
+@pytest.fixture(autouse=True)
+def forget_bundles():
+    bundle._bundles.clear()
+    yield
+    bundle._bundles.clear()
+
+
+@pytest.fixture
+def resolved_config(tmpdir):
+    """
+    A Config for an examples dir and a custom dir in tmpdir. Everything is
+    aged so that searches see an up to date index.
+    """
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        {'tar.md': TAR_CONTENTS, 'find.md': FIND_CONTENTS},
+        {'mine.md': '# mine\n\nmy own notes on zebras\n'}
+    )
+    age_tree(examples_dir, custom_dir)
+    return _create_config(examples_dir=examples_dir, custom_dir=custom_dir)
+
+
+def _save(path, contents):
+    """
+    Save contents to path as editors do, by replacing the file, which changes
+    the mtime of its directory. Both are aged.
+    """
+    with open(path + '.tmp', 'w') as f:
+        f.write(contents)
+    os.rename(path + '.tmp', path)
+    age(path, os.path.dirname(path))
+
+
+def _get_manifest(resolved_config):
+    search_dir = search.get_search_dir(
+        resolved_config.examples_dir,
+        resolved_config.custom_dir
+    )
+    return search._load_json(os.path.join(search_dir, 'manifest.json'))
+
+
+def test_get_tokens_lowercases_and_drops_stop_words():
+    actual = search.get_tokens('Extract THE files_from a tar.gz, ñandú')
+
+    assert actual == ['extract', 'files', 'tar', 'gz', u'ñandú']
+
+
+def test_get_sections_splits_on_headings():
+    actual = search.get_sections('preamble\n# One\nbody\n\n## Two\n')
+
+    assert actual == [
+        ('', 'preamble'),
+        ('One', 'body\n'),
+        ('Two', ''),
+    ]
+
+
+def test_get_sections_skips_empty_preamble():
+    actual = search.get_sections('\n\n# One\nbody')
+
+    assert actual == [('One', 'body')]
+
+
+def test_search_ranks_matching_section_first(resolved_config):
+    actual = search.search(resolved_config, 'extract gzipped archive')
+
+    assert actual[0].program == 'tar'
+    assert actual[0].heading == 'Extracting'
+    assert actual[0].path == os.path.join(
+        resolved_config.examples_dir,
+        'tar.md'
+    )
+    assert [result.score for result in actual] == sorted(
+        [result.score for result in actual],
+        reverse=True
+    )
+
+
+def test_search_searches_code(resolved_config):
+    actual = search.search(resolved_config, 'czf')
+
+    assert [(r.program, r.heading) for r in actual] == [('tar', 'Creating')]
+
+
+def test_search_includes_custom_examples(resolved_config):
+    actual = search.search(resolved_config, 'zebras')
+
+    assert [(r.program, r.heading) for r in actual] == [('mine', 'mine')]
+
+
+def test_search_returns_nothing_for_unknown_words(resolved_config):
+    assert search.search(resolved_config, 'unicorn') == []
+    assert search.search(resolved_config, 'the of') == []
+
+
+def test_search_respects_limit(resolved_config):
+    actual = search.search(resolved_config, 'files archive', limit=2)
+
+    assert len(actual) == 2
+
+
+def test_search_reuses_fresh_index(resolved_config):
+    search.search(resolved_config, 'tar')
+
+    with patch('eg.search.update_index') as mock_update:
+        search.search(resolved_config, 'tar')
+
+    assert mock_update.call_args_list == []
+
+
+def test_search_reads_only_edited_files(resolved_config):
+    search.search(resolved_config, 'tar')
+
+    edited_path = os.path.join(resolved_config.custom_dir, 'mine.md')
+    _save(edited_path, '# mine\n\nmy own notes on giraffes\n')
+
+    with patch('eg.search._get_docs', wraps=search._get_docs) as mock_docs:
+        actual = search.search(resolved_config, 'giraffes')
+        assert search.search(resolved_config, 'zebras') == []
+
+    mock_docs.assert_called_once_with('mine', edited_path)
+    assert [(r.program, r.heading) for r in actual] == [('mine', 'mine')]
+    manifest = _get_manifest(resolved_config)
+    assert len(manifest['segments']) == 2
+    assert len(manifest['deleted']) == 1
+    assert manifest['num_docs'] == 6
+
+
+def test_search_reads_files_edited_in_place_once_their_dir_changes(
+    resolved_config
+):
+    search.search(resolved_config, 'tar')
+
+    # Editing a file in place leaves the mtime of its directory alone, so it
+    # isn't noticed until something else changes the directory.
+    dir_stat = os.stat(resolved_config.examples_dir)
+    edited_path = os.path.join(resolved_config.examples_dir, 'find.md')
+    with open(edited_path, 'w') as f:
+        f.write('# find\n\nfind files owned by giraffes\n')
+    age(edited_path)
+    os.utime(
+        resolved_config.examples_dir,
+        (dir_stat.st_atime, dir_stat.st_mtime)
+    )
+    assert search.search(resolved_config, 'giraffes') == []
+
+    _save(
+        os.path.join(resolved_config.examples_dir, 'cp.md'),
+        '# cp\n\ncopy files\n'
+    )
+    actual = search.search(resolved_config, 'giraffes')
+
+    assert [r.program for r in actual] == ['find']
+
+
+def test_search_checks_racy_files_until_they_settle(resolved_config):
+    edited_path = os.path.join(resolved_config.examples_dir, 'find.md')
+    with open(edited_path, 'w') as f:
+        f.write('# find\n\nfind files owned by lemurs\n')
+    search.search(resolved_config, 'tar')
+    assert _get_manifest(resolved_config)['num_racy'] == 1
+
+    # Changed within the same mtime tick, which only the contents can show.
+    stat = os.stat(edited_path)
+    with open(edited_path, 'w') as f:
+        f.write('# find\n\nfind files owned by okapis\n')
+    os.utime(edited_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert [r.program for r in search.search(resolved_config, 'lemurs')] == [
+        'find'
+    ]
+
+    with patch('eg.index.RACY_MTIME_WINDOW', 0):
+        actual = search.search(resolved_config, 'okapis')
+
+    assert [r.program for r in actual] == ['find']
+    assert _get_manifest(resolved_config)['num_racy'] == 0
+
+
+def test_search_does_not_read_racy_files_again_once_settled(tmpdir):
+    examples_dir, custom_dir = make_dirs(
+        tmpdir,
+        {'tar.md': TAR_CONTENTS, 'find.md': FIND_CONTENTS}
+    )
+    resolved_config = _create_config(examples_dir=examples_dir)
+    search.search(resolved_config, 'tar')
+    age(examples_dir)
+
+    with patch('eg.index.RACY_MTIME_WINDOW', 0):
+        with patch('eg.search._get_docs') as mock_docs:
+            search.search(resolved_config, 'tar')
+            search.search(resolved_config, 'tar')
+
+    mock_docs.assert_not_called()
+    assert _get_manifest(resolved_config)['num_racy'] == 0
+
+
+def test_search_works_without_a_writable_cache(
+    resolved_config,
+    tmpdir,
+    monkeypatch
+):
+    tmpdir.join('not-a-dir').write('')
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmpdir.join('not-a-dir')))
+
+    actual = search.search(resolved_config, 'gzipped')
+
+    assert [(r.program, r.heading) for r in actual] == [('tar', 'Extracting')]
+    assert search.search(resolved_config, 'giraffes') == []
+
+
+def test_search_drops_removed_files(resolved_config):
+    search.search(resolved_config, 'tar')
+
+    os.remove(os.path.join(resolved_config.examples_dir, 'tar.md'))
+
+    assert search.search(resolved_config, 'archive') == []
+    assert [r.program for r in search.search(resolved_config, 'files')] == [
+        'find',
+        'find',
+    ]
+
+
+def test_search_finds_added_files(resolved_config):
+    search.search(resolved_config, 'tar')
+
+    with open(os.path.join(resolved_config.examples_dir, 'cp.md'), 'w') as f:
+        f.write('# cp\n\ncopy files\n')
+
+    actual = search.search(resolved_config, 'copy')
+
+    assert [r.program for r in actual] == ['cp']
+
+
+def test_search_rebuilds_once_there_are_too_many_segments(resolved_config):
+    search.search(resolved_config, 'tar')
+    edited_path = os.path.join(resolved_config.custom_dir, 'mine.md')
+
+    with patch('eg.search.MAX_SEGMENTS', 2):
+        for i in range(3):
+            _save(edited_path, '# mine\n\nnotes' + ' more' * i)
+            search.search(resolved_config, 'notes')
+
+    manifest = _get_manifest(resolved_config)
+    assert len(manifest['segments']) == 2
+    assert [r.program for r in search.search(resolved_config, 'notes')] == [
+        'mine'
+    ]
+
+
+def test_search_rebuilds_for_other_versions(resolved_config):
+    search.search(resolved_config, 'tar')
+
+    with patch('eg.search.SEARCH_INDEX_VERSION', 99):
+        actual = search.search(resolved_config, 'tar')
+
+    assert actual[0].program == 'tar'
+    assert _get_manifest(resolved_config)['version'] == 99
+
+
+def test_search_works_with_bundles(resolved_config, tmpdir):
+    bundle_path = str(tmpdir.join('examples.egb'))
+    bundle.write_bundle(resolved_config.examples_dir, bundle_path)
+    resolved_config = _create_config(examples_dir=bundle_path)
+
+    actual = search.search(resolved_config, 'gzipped')
+
+    assert actual[0].program == 'tar'
+    assert actual[0].path == os.path.join(bundle_path, 'tar.md')
+
+
+def test_search_rebuilds_damaged_index(resolved_config):
+    search.search(resolved_config, 'tar')
+    search_dir = search.get_search_dir(
+        resolved_config.examples_dir,
+        resolved_config.custom_dir
+    )
+    for name in os.listdir(search_dir):
+        if name.startswith('seg-'):
+            os.remove(os.path.join(search_dir, name))
+
+    actual = search.search(resolved_config, 'gzipped')
+
+    assert actual[0].program == 'tar'
+
+
+def test_search_with_no_dirs_finds_nothing():
+    resolved_config = _create_config()
+
+    assert search.search(resolved_config, 'tar') == []
+
+
+def test_segment_round_trips(tmpdir):
+    segment_path = str(tmpdir.join('segment.bin'))
+    docs = [
+        ('tar', 'Extracting', '/tar.md', {'tar': 2, 'extract': 1}, 3),
+        ('find', '', '/find.md', {'find': 1}, 1),
+    ]
+    search.write_segment(segment_path, docs, 2.0)
+
+    segment = search.Segment(segment_path)
+    try:
+        assert segment.num_docs == 2
+        assert segment.get_doc(0) == ('tar', 'Extracting', '/tar.md')
+        assert segment.get_doc(1) == ('find', '', '/find.md')
+
+        doc_ids, weights, max_weight = segment.get_postings('tar')
+        assert list(doc_ids) == [0]
+        assert weights[0] == pytest.approx(max_weight)
+        assert list(segment.get_postings('find')[0]) == [1]
+        assert segment.get_postings('missing') is None
+        assert segment.get_postings('a') is None
+        assert segment.get_postings('zzz') is None
+    finally:
+        segment.close()
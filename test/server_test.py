@@ -0,0 +1,208 @@
+import json
+import os
+import pytest
+import sys
+import threading
+import time
+
+if sys.version_info[0] < 3:
+    pytest.skip('eg --serve needs Python 3', allow_module_level=True)
+
+from eg import api
+from eg import config
+from eg import server
+from http import client as http_client
+from mock import patch
+from test.conftest import age
+from test.util_test import _create_config
+
+
+@pytest.fixture
+def running_server(tmpdir):
+    """
+    Serve a small examples dir on a free port for the duration of the test.
+    Yields a function making a request and returning (status, headers, body).
+    """
+    api.clear_cache()
+    examples = tmpdir.mkdir('examples')
+    for program in ['cp', 'ln']:
+        path = examples.join(program + '.md')
+        path.write('# ' + program + '\n\nrun `' + program + '` <here>\n')
+        age(path)
+    examples.join('aliases.json').write('{"link": "ln"}')
+    resolved_config = _create_config(
+        examples_dir=str(examples),
+        use_color=False,
+        color_config=config.get_default_color_config(),
+    )
+
+    httpd = server.make_server(resolved_config, num_threads=4)
+    thread = threading.Thread(
+        target=httpd.serve_forever,
+        kwargs={'poll_interval': 0.01}
+    )
+    thread.start()
+    host, port = httpd.server_address[:2]
+
+    def request(path, headers=None, method='GET'):
+        connection = http_client.HTTPConnection(host, port)
+        try:
+            connection.request(method, path, headers=headers or {})
+            response = connection.getresponse()
+            return (
+                response.status,
+                dict(response.getheaders()),
+                response.read().decode('utf-8')
+            )
+        finally:
+            connection.close()
+
+    yield request
+
+    httpd.shutdown()
+    httpd.server_close()
+    thread.join()
+    api.clear_cache()
+
+
+def test_serves_text(running_server):
+    status, headers, body = running_server('/cp')
+
+    assert status == 200
+    assert headers['Content-Type'] == 'text/plain; charset=utf-8'
+    assert body == '# cp\n\nrun `cp` <here>\n'
+    assert headers['ETag'].startswith('"')
+
+
+def test_serves_ansi(running_server):
+    status, headers, body = running_server('/cp?format=ansi')
+
+    assert status == 200
+    assert body.startswith(config.DEFAULT_COLOR_POUND)
+
+
+def test_serves_html(running_server):
+    status, headers, body = running_server('/cp?format=html')
+
+    assert status == 200
+    assert headers['Content-Type'] == 'text/html; charset=utf-8'
+    assert '<pre># cp\n\nrun `cp` &lt;here&gt;\n</pre>' in body
+
+
+def test_serves_json_resolving_aliases(running_server):
+    status, headers, body = running_server('/link?format=json')
+
+    assert status == 200
+    assert json.loads(body) == {
+        'program': 'link',
+        'resolved_program': 'ln',
+        'output': '# ln\n\nrun `ln` <here>\n',
+    }
+
+
+def test_etags_differ_by_format_and_program(running_server):
+    etags = set()
+    for path in ['/cp', '/cp?format=ansi', '/cp?format=html', '/ln', '/link']:
+        etags.add(running_server(path)[1]['ETag'])
+
+    assert len(etags) == 5
+    assert running_server('/cp')[1]['ETag'] in etags
+
+
+def test_answers_matching_etag_with_304_without_rendering(running_server):
+    etag = running_server('/cp')[1]['ETag']
+    api.clear_cache()
+
+    with patch('eg.util.get_formatted_contents') as mock_format:
+        status, headers, body = running_server(
+            '/cp',
+            headers={'If-None-Match': 'W/"other", ' + etag}
+        )
+        mock_format.assert_not_called()
+
+    assert status == 304
+    assert headers['ETag'] == etag
+    assert body == ''
+
+
+def test_etag_changes_with_examples(running_server, tmpdir):
+    etag = running_server('/cp')[1]['ETag']
+    path = str(tmpdir.join('examples', 'cp.md'))
+    with open(path, 'w') as f:
+        f.write('# cp\n\nchanged\n')
+    past = time.time() - 30
+    os.utime(path, (past, past))
+
+    status, headers, body = running_server(
+        '/cp',
+        headers={'If-None-Match': etag}
+    )
+
+    assert status == 200
+    assert headers['ETag'] != etag
+    assert body == '# cp\n\nchanged\n'
+
+
+def test_head_sends_no_body(running_server):
+    status, headers, body = running_server('/cp', method='HEAD')
+
+    assert status == 200
+    assert int(headers['Content-Length']) > 0
+    assert body == ''
+
+
+def test_lists_programs(running_server):
+    status, headers, body = running_server('/')
+    assert status == 200
+    assert body == 'cp\nlink -> ln\nln\n'
+
+    status, headers, body = running_server('/?format=json')
+    assert json.loads(body) == ['cp', 'link -> ln', 'ln']
+
+
+def test_missing_program_is_404(running_server):
+    status, headers, body = running_server('/cpp')
+
+    assert status == 404
+    assert body.startswith('No entry found for cpp.')
+
+    status, headers, body = running_server('/cpp?format=json')
+    assert status == 404
+    assert json.loads(body)['output'] is None
+
+
+def test_program_removed_while_rendering_is_404(running_server):
+    with patch('eg.api.render_with_digest', return_value=None):
+        for output_format in ['text', 'html', 'json']:
+            status, headers, body = running_server(
+                '/cp?format=' + output_format
+            )
+            assert status == 404
+
+
+def test_etag_and_body_come_from_one_read(running_server):
+    api.clear_cache()
+
+    with patch(
+        'eg.util.get_contents_from_files',
+        wraps=server.util.get_contents_from_files
+    ) as mock_read:
+        with patch('eg.util.get_chunks_from_files') as mock_read_chunks:
+            status, headers, body = running_server('/cp?format=html')
+
+    assert status == 200
+    assert mock_read.call_count == 1
+    mock_read_chunks.assert_not_called()
+
+
+def test_unknown_format_is_400(running_server):
+    assert running_server('/cp?format=pdf')[0] == 400
+
+
+def test_is_etag_match():
+    assert server.is_etag_match('"a"', '"a"')
+    assert server.is_etag_match('W/"a"', '"a"')
+    assert server.is_etag_match('"b", "a"', '"a"')
+    assert server.is_etag_match('*', '"a"')
+    assert not server.is_etag_match('"b"', '"a"')
+    assert not server.is_etag_match(None, '"a"')
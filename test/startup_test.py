@@ -0,0 +1,115 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+
+# Cold start dominates the latency of eg, so these tests fail if starting it
+# regresses past the budget recorded in the assets dir. Times are measured as
+# overhead on top of starting a bare interpreter, which keeps the budget
+# meaningful across machines of different speeds.
+
+_REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_EXAMPLES_DIR = os.path.join(_REPO_DIR, 'eg', 'examples')
+_BUDGET_PATH = os.path.join(
+    _REPO_DIR,
+    'test',
+    'assets',
+    'startup_budget.json'
+)
+
+# Each command is run this many times and the median taken.
+_NUM_RUNS = 7
+
+_EG = [sys.executable, '-m', 'eg']
+_BARE_INTERPRETER = [sys.executable, '-c', 'pass']
+
+
+def _get_budget():
+    with open(_BUDGET_PATH, 'r') as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def env(tmpdir):
+    """
+    An environment for running eg in which it finds no egrc of the user
+    running the tests. The cache dir is already isolated by conftest.py.
+    """
+    result = dict(os.environ)
+    result['HOME'] = str(tmpdir)
+    result['XDG_CONFIG_HOME'] = str(tmpdir)
+    result['PYTHONPATH'] = _REPO_DIR
+    return result
+
+
+def _run(argv, env):
+    subprocess.check_call(
+        argv,
+        env=env,
+        cwd=_REPO_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+
+def _get_median_ms(argv, env):
+    timings = []
+    for _ in range(_NUM_RUNS):
+        start = time.perf_counter()
+        _run(argv, env)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def _get_overhead_ms(argv, env):
+    # Run once first so both commands are measured with warm OS caches and any
+    # index eg keeps is already on disk.
+    _run(argv, env)
+    return _get_median_ms(argv, env) - _get_median_ms(_BARE_INTERPRETER, env)
+
+
+def _get_imported_modules(argv, env):
+    """Return the set of modules imported while running argv."""
+    output = subprocess.check_output(
+        [argv[0], '-X', 'importtime'] + argv[1:],
+        env=env,
+        cwd=_REPO_DIR,
+        stderr=subprocess.STDOUT
+    ).decode('utf-8')
+
+    result = set()
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        result.add(line.rsplit('|', 1)[-1].strip())
+    return result
+
+
+def test_version_does_not_import_heavy_modules(env):
+    imported = _get_imported_modules(_EG + ['--version'], env)
+    assert 'eg.core' in imported
+    for module in _get_budget()['version_forbidden_modules']:
+        assert module not in imported
+
+
+def test_version_starts_within_budget(env):
+    overhead = _get_overhead_ms(_EG + ['--version'], env)
+    assert overhead <= _get_budget()['version_overhead_ms']
+
+
+def test_program_starts_within_budget(env):
+    argv = _EG + [
+        '--examples-dir',
+        _EXAMPLES_DIR,
+        '--pager-cmd',
+        'cat',
+        '--no-color',
+        'find',
+    ]
+    overhead = _get_overhead_ms(argv, env)
+    assert overhead <= _get_budget()['program_overhead_ms']
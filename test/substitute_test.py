@@ -1,6 +1,8 @@
+import random
 import re
 
 from eg import substitute
+from mock import Mock
 from mock import patch
 
 
@@ -95,3 +97,196 @@ def _helper_assert_about_apply_and_get_result(
         starting_string
     )
     assert actual == subbed_result
+
+
+def test_compiles_pattern_once():
+    """The pattern is compiled when the Substitution is made, not per use."""
+    sub = substitute.Substitution('foo', 'bar', False)
+
+    with patch('re.compile') as compile_method:
+        sub.apply_and_get_result('foo')
+        sub.apply_and_get_result('foo')
+
+    assert compile_method.call_args_list == []
+
+
+def test_hash():
+    alpha = substitute.Substitution('foo', 'bar', False)
+    beta = substitute.Substitution('foo', 'bar', False)
+    gamma = substitute.Substitution('foo', 'bar', True)
+
+    assert hash(alpha) == hash(beta)
+    assert len(set([alpha, beta, gamma])) == 2
+
+
+def _apply_in_order(subs, string):
+    for sub in subs:
+        string = sub.apply_and_get_result(string)
+    return string
+
+
+def test_chain_fuses_independent_substitutions():
+    subs = [
+        substitute.Substitution('cat', 'dog', False),
+        substitute.Substitution('[0-9]+', '#', False),
+        substitute.Substitution('x|y', 'z', True),
+    ]
+    chain = substitute.SubstitutionChain(subs)
+
+    assert chain.get_num_passes() == 1
+    assert chain.apply_and_get_result('cat 12 x yak 3') == 'dog # z zak #'
+
+
+def test_chain_fuses_words_that_cannot_overlap():
+    subs = [
+        substitute.Substitution('foo', 'bar', False),
+        substitute.Substitution('baz', 'qux', False),
+        substitute.Substitution('hello', 'hi', False),
+    ]
+    chain = substitute.SubstitutionChain(subs)
+
+    assert chain.get_num_passes() == 1
+    assert chain.apply_and_get_result('foo baz hello') == 'bar qux hi'
+
+
+def test_chain_keeps_order_of_dependent_substitutions():
+    subs = [
+        substitute.Substitution('foo', 'bar', False),
+        # Matches what the first inserts.
+        substitute.Substitution('bar', 'baz', False),
+    ]
+    chain = substitute.SubstitutionChain(subs)
+
+    assert chain.get_num_passes() == 2
+    assert chain.apply_and_get_result('foo bar') == 'baz baz'
+
+
+def test_chain_keeps_order_of_overlapping_substitutions():
+    subs = [
+        substitute.Substitution('foo', 'bar', False),
+        substitute.Substitution('oof', 'X', False),
+    ]
+    chain = substitute.SubstitutionChain(subs)
+
+    assert chain.get_num_passes() == 2
+    assert chain.apply_and_get_result('oofoo') == 'oobar'
+
+
+def test_chain_does_not_fuse_after_deletions():
+    subs = [
+        substitute.Substitution('-', '', False),
+        # Deleting '-' from 'a-b' makes a match.
+        substitute.Substitution('ab', 'X', False),
+        substitute.Substitution('c', 'Y', False),
+    ]
+    chain = substitute.SubstitutionChain(subs)
+
+    assert chain.get_num_passes() == 2
+    assert chain.apply_and_get_result('a-b c') == 'X Y'
+
+
+def test_chain_does_not_fuse_context_dependent_substitutions():
+    subs = [
+        substitute.Substitution('^a', 'A', True),
+        substitute.Substitution('b(?=c)', 'B', False),
+        substitute.Substitution('(d)', r'\1\1', False),
+        substitute.Substitution('\\w', 'W', False),
+        substitute.Substitution('(?i)e', 'E', False),
+        substitute.Substitution('f*', 'F', False),
+    ]
+    chain = substitute.SubstitutionChain(subs)
+
+    assert chain.get_num_passes() == len(subs)
+
+
+def test_chain_applies_mocks_in_order():
+    sub_one = Mock()
+    sub_one.apply_and_get_result.return_value = 'one'
+    sub_two = Mock()
+    sub_two.apply_and_get_result.return_value = 'two'
+
+    chain = substitute.SubstitutionChain([sub_one, sub_two])
+
+    assert chain.apply_and_get_result('start') == 'two'
+    sub_two.apply_and_get_result.assert_called_once_with('one')
+
+
+def test_chain_matches_applying_in_order_for_fuzzed_substitutions():
+    patterns = [
+        'a', 'b', 'ab', 'ba', 'aba', 'bab', 'cab', 'a+', '[ab]', '[c-e]',
+        'c|dd', '(?:de)+', 'e?f', '\n', '\n\n', ' ', '  +', '^a', 'b$', '(a)',
+        '\\s', 'x',
+    ]
+    replacements = ['', 'a', 'b', 'ab', 'c', 'z', ' ', '\n', 'xyz', '<\\g<0>>']
+    alphabet = 'abcdefxz \n'
+    rng = random.Random(0)
+    for _ in range(1000):
+        subs = [
+            substitute.Substitution(
+                rng.choice(patterns),
+                rng.choice(replacements),
+                rng.choice([True, False])
+            )
+            for _ in range(rng.randint(1, 8))
+        ]
+        chain = substitute.SubstitutionChain(subs)
+        for _ in range(5):
+            text = ''.join(
+                rng.choice(alphabet) for _ in range(rng.randint(0, 40))
+            )
+            assert chain.apply_and_get_result(text) == (
+                _apply_in_order(subs, text)
+            )
+
+
+def test_get_chain_reuses_chains():
+    subs = [substitute.Substitution('foo', 'bar', False)]
+
+    assert substitute.get_chain(subs) is substitute.get_chain(list(subs))
+
+
+def test_chain_is_line_local():
+    def is_line_local(pattern, is_multiline=False):
+        chain = substitute.SubstitutionChain(
+            [substitute.Substitution(pattern, 'x', is_multiline)]
+        )
+        return chain.is_line_local()
+
+    assert is_line_local('foo')
+    assert is_line_local('^    \\$', True)
+    assert is_line_local('(?m)^#.*$')
+    assert is_line_local('\\bcp\\b')
+    assert is_line_local('[^\\n]+')
+    assert is_line_local('\\S+\\d*')
+    assert is_line_local('(a)\\1')
+
+    assert not is_line_local('^foo')
+    assert not is_line_local('foo$')
+    assert not is_line_local('a\\nb')
+    assert not is_line_local('a\\sb')
+    assert not is_line_local('[^x]')
+    assert not is_line_local('(?s).')
+    assert not is_line_local('a(?=b)')
+    assert not is_line_local('\\Aa', True)
+    assert not substitute.SubstitutionChain([
+        substitute.Substitution('foo', 'bar', False),
+        substitute.Substitution('a\nb', 'bar', False),
+    ]).is_line_local()
+
+
+
+def test_chain_applies_in_order_if_patterns_cannot_be_inspected():
+    subs = [
+        substitute.Substitution('cat', 'dog', False),
+        substitute.Substitution('dog', 'cow', False),
+        substitute.Substitution('x', 'y', False),
+    ]
+    # What older versions of Python return has no state attribute.
+    parsed = Mock(spec=['pattern', 'getwidth'])
+    parsed.pattern = Mock(spec=[])
+    with patch('eg.substitute.sre_parse.parse', return_value=parsed):
+        chain = substitute.SubstitutionChain(subs)
+        assert not chain.is_line_local()
+
+    assert chain.get_num_passes() == 3
+    assert chain.apply_and_get_result('cat dog x') == 'cow cow y'
@@ -0,0 +1,173 @@
+import os
+
+from eg import catalog
+from eg import config
+from eg import suggest
+from mock import patch
+from test.conftest import age
+from test.util_test import _create_config
+
+
+def _make_catalog(tmpdir, default_names, custom_names=(), aliases=None):
+    examples = tmpdir.mkdir('examples')
+    custom = tmpdir.mkdir('custom')
+    for name in default_names:
+        examples.join(name + '.md').write('# ' + name)
+    for name in custom_names:
+        custom.join(name + '.md').write('# ' + name)
+    if aliases:
+        examples.join('aliases.json').write(
+            '{' + ', '.join(
+                '"{}": "{}"'.format(key, value)
+                for key, value in sorted(aliases.items())
+            ) + '}'
+        )
+    return catalog.get_catalog(
+        _create_config(examples_dir=str(examples), custom_dir=str(custom))
+    )
+
+
+def test_get_deletes():
+    assert suggest.get_deletes('abc', 1) == set(['abc', 'bc', 'ac', 'ab'])
+    assert suggest.get_deletes('ab', 2) == set(['ab', 'a', 'b', ''])
+    assert suggest.get_deletes('', 2) == set([''])
+
+
+def test_get_distance():
+    assert suggest.get_distance('tar', 'tar', 2) == 0
+    assert suggest.get_distance('tarr', 'tar', 2) == 1
+    assert suggest.get_distance('tra', 'tar', 2) == 1
+    assert suggest.get_distance('gerp', 'grep', 2) == 1
+    assert suggest.get_distance('sl', 'ls', 2) == 1
+    assert suggest.get_distance('cut', 'cat', 2) == 1
+    assert suggest.get_distance('kitten', 'sitting', 3) == 3
+    assert suggest.get_distance('tar', 'find', 2) == 3
+    assert suggest.get_distance('a', 'abcdef', 2) == 3
+
+
+def test_get_suggestions_finds_close_names(tmpdir):
+    examples = _make_catalog(tmpdir, ['tar', 'find', 'grep', 'top'])
+
+    assert suggest.get_suggestions(examples, 'tarr') == ['tar']
+    assert suggest.get_suggestions(examples, 'gerp') == ['grep']
+    assert suggest.get_suggestions(examples, 'fnd') == ['find']
+    assert suggest.get_suggestions(examples, 'xyzzy') == []
+
+
+def test_get_suggestions_ranks_by_distance_then_name(tmpdir):
+    examples = _make_catalog(tmpdir, ['cat', 'cut', 'cp', 'at', 'chat'])
+
+    assert suggest.get_suggestions(examples, 'cat2') == ['cat', 'at', 'chat']
+
+
+def test_get_suggestions_includes_custom_programs_and_aliases(tmpdir):
+    examples = _make_catalog(
+        tmpdir,
+        ['tar'],
+        custom_names=['mytool'],
+        aliases={'gunzip': 'tar'}
+    )
+
+    assert suggest.get_suggestions(examples, 'mytol') == ['mytool']
+    assert suggest.get_suggestions(examples, 'gnzip') == ['gunzip']
+
+
+def test_get_suggestions_never_suggests_the_program_itself(tmpdir):
+    # An alias pointing at a program with no examples.
+    examples = _make_catalog(tmpdir, ['tar'], aliases={'tarr': 'nope'})
+
+    assert suggest.get_suggestions(examples, 'tarr') == ['tar']
+
+
+def test_get_suggestions_reuses_stored_index(tmpdir):
+    examples = _make_catalog(tmpdir, ['tar', 'find'])
+    suggest.get_suggestions(examples, 'tarr')
+
+    with patch('eg.suggest.write_index') as mock_write:
+        actual = suggest.get_suggestions(examples, 'fnd')
+
+    assert mock_write.call_args_list == []
+    assert actual == ['find']
+
+
+def test_get_suggestions_rebuilds_when_names_change(tmpdir):
+    examples = _make_catalog(tmpdir, ['tar'])
+    assert suggest.get_suggestions(examples, 'fnd') == []
+
+    examples_dir = examples.examples_dir
+    with open(os.path.join(examples_dir, 'find.md'), 'w') as f:
+        f.write('# find')
+    catalog.clear_catalogs()
+    examples = catalog.get_catalog(_create_config(
+        examples_dir=examples_dir,
+        custom_dir=examples.custom_dir
+    ))
+
+    assert suggest.get_suggestions(examples, 'fnd') == ['find']
+
+
+def test_get_suggestions_fingerprints_aged_catalogs_by_mtime(tmpdir):
+    examples = _make_catalog(tmpdir, ['tar'])
+    age(examples.examples_dir, examples.custom_dir)
+    catalog.clear_catalogs()
+    examples = catalog.get_catalog(_create_config(
+        examples_dir=examples.examples_dir,
+        custom_dir=examples.custom_dir
+    ))
+
+    with patch('eg.suggest.get_fingerprint') as mock_fingerprint:
+        assert suggest.get_suggestions(examples, 'tarr') == ['tar']
+
+    assert mock_fingerprint.call_args_list == []
+
+    with open(os.path.join(examples.examples_dir, 'find.md'), 'w') as f:
+        f.write('# find')
+    catalog.clear_catalogs()
+    examples = catalog.get_catalog(_create_config(
+        examples_dir=examples.examples_dir,
+        custom_dir=examples.custom_dir
+    ))
+
+    assert suggest.get_suggestions(examples, 'fnd') == ['find']
+
+
+def test_get_suggestions_rebuilds_damaged_index(tmpdir):
+    examples = _make_catalog(tmpdir, ['tar'])
+    suggest.get_suggestions(examples, 'tarr')
+    index_path = suggest._get_index_path(
+        examples.examples_dir,
+        examples.custom_dir
+    )
+    with open(index_path, 'wb') as f:
+        f.write(b'garbage')
+
+    assert suggest.get_suggestions(examples, 'tarr') == ['tar']
+
+
+def test_index_round_trips(tmpdir):
+    index_path = str(tmpdir.join('suggest.bin'))
+    names = [u'tar', u'find', u'ñandú']
+    fingerprint = suggest.get_fingerprint(names)
+    suggest.write_index(index_path, names, fingerprint)
+
+    suggest_index = suggest.SuggestIndex(index_path)
+    try:
+        assert suggest_index.fingerprint == fingerprint
+        assert suggest_index.get_candidates('tarr') == set(['tar'])
+        assert suggest_index.get_candidates(u'nandu') == set([u'ñandú'])
+        assert suggest_index.get_candidates('zzzzzz') == set()
+    finally:
+        suggest_index.close()
+
+
+def test_get_suggestions_works_without_writable_cache_dir(
+    tmpdir,
+    monkeypatch
+):
+    not_a_dir = tmpdir.join('not-a-dir')
+    not_a_dir.write('')
+    monkeypatch.setenv(config.ENV_XDG_CACHE_HOME, str(not_a_dir))
+    examples = _make_catalog(tmpdir, ['tar', 'find'])
+
+    assert suggest.get_suggestions(examples, 'tarr') == ['tar']
+    assert suggest.get_suggestions(examples, 'fnd') == ['find']
@@ -1,10 +1,18 @@
 import json
 import os
+import pytest
+import random
+import threading
+import time
 
+from eg import bundle
+from eg import catalog
 from eg import config
 from eg import substitute
 from eg import util
+from mock import ANY
 from mock import Mock
+from mock import call
 from mock import patch
 
 PATH_UNSQUEEZED_FILE = os.path.join(
@@ -117,15 +125,46 @@ def test_get_file_paths_for_program_with_no_dir(mock_walk):
     assert util.get_file_paths_for_program('cp', None) == []
 
 
-@patch('eg.util.page_string')
-@patch('eg.util.get_formatted_contents')
-@patch('eg.util.get_contents_from_files')
-@patch('eg.util.get_resolved_program')
+def _create_mock_catalog(aliases=None, default_paths=None, custom_paths=None):
+    """
+    Create a Mock standing in for a catalog.Catalog, with aliases, default
+    paths, and custom paths as dicts of the same format as a real Catalog.
+    """
+    aliases = aliases or {}
+    default_paths = default_paths or {}
+    custom_paths = custom_paths or {}
+
+    result = Mock(spec=catalog.Catalog)
+    result.aliases = aliases
+    result.resolve.side_effect = lambda program: aliases.get(program, program)
+    result.get_default_paths.side_effect = (
+        lambda program: list(default_paths.get(program, []))
+    )
+    result.get_custom_paths.side_effect = (
+        lambda program: list(custom_paths.get(program, []))
+    )
+    result.get_paths.side_effect = (
+        lambda program: (
+            list(custom_paths.get(program, [])) +
+            list(default_paths.get(program, []))
+        )
+    )
+    result.get_default_programs.return_value = set(default_paths)
+    result.get_custom_programs.return_value = set(custom_paths)
+    result.get_mtimes.return_value = [None]
+    result.alias_cycles = set()
+    result.examples_dir = None
+    result.custom_dir = None
+    return result
+
+
+@patch('eg.util.show_chunks')
+@patch('eg.util.get_rendered_chunks')
+@patch('eg.catalog.get_catalog')
 def test_handle_program_no_entries(
-    mock_resolve_program,
-    mock_get_contents,
-    mock_format,
-    mock_page_string,
+    mock_get_catalog,
+    mock_get_rendered,
+    mock_show_chunks,
 ):
     """
     We should do the right thing if there are no entries for a given program.
@@ -133,38 +172,87 @@ def test_handle_program_no_entries(
     program = 'cp'
     test_config = _create_config()
 
-    mock_resolve_program.return_value = program
+    mock_catalog = _create_mock_catalog()
+    mock_get_catalog.return_value = mock_catalog
 
     util.handle_program(program, test_config)
 
-    mock_resolve_program.assert_called_once_with(
-        program,
-        test_config
-    )
+    mock_get_catalog.assert_called_once_with(test_config)
+    mock_catalog.resolve.assert_called_once_with(program)
 
     # We should have aborted and not called any of the
     # other methods.
-    assert mock_get_contents.call_count == 0
-    assert mock_format.call_count == 0
-    assert mock_page_string.call_count == 0
+    assert mock_get_rendered.call_count == 0
+    assert mock_show_chunks.call_count == 0
 
 
-@patch('eg.util.get_resolved_program')
-@patch('eg.util.get_contents_from_files')
-@patch('eg.util.get_file_paths_for_program')
-@patch('eg.util.get_formatted_contents')
-@patch('eg.util.page_string')
+@patch('eg.util.show_chunks')
+def test_handle_program_suggests_close_programs(
+    mock_show_chunks,
+    tmpdir,
+    capsys
+):
+    examples_dir = tmpdir.mkdir('examples')
+    examples_dir.join('tar.md').write('# tar')
+    examples_dir.join('find.md').write('# find')
+    test_config = _create_config(examples_dir=str(examples_dir))
+
+    util.handle_program('tarr', test_config)
+
+    assert capsys.readouterr().out == (
+        'No entry found for tarr. Did you mean: tar? Run `eg --list` to see '
+        'all available entries.\n'
+    )
+    assert mock_show_chunks.call_count == 0
+
+
+def test_get_no_entry_message():
+    assert util.get_no_entry_message('tarr') == (
+        'No entry found for tarr. Run `eg --list` to see all available '
+        'entries.'
+    )
+    assert util.get_no_entry_message('ct', ['cat', 'cp']) == (
+        'No entry found for ct. Did you mean: cat, cp? Run `eg --list` to see '
+        'all available entries.'
+    )
+    assert util.get_no_entry_message('loop', in_alias_cycle=True) == (
+        'No entry found for loop. It is an alias that leads around a cycle of '
+        'aliases, so check your aliases files. Run `eg --list` to see all '
+        'available entries.'
+    )
+
+
+@patch('eg.util.show_chunks')
+def test_handle_program_points_out_alias_cycles(
+    mock_show_chunks,
+    tmpdir,
+    capsys
+):
+    examples_dir = tmpdir.mkdir('examples')
+    examples_dir.join('tar.md').write('# tar')
+    examples_dir.join(util.ALIAS_FILE_NAME).write(
+        json.dumps({'ping': 'pong', 'pong': 'ping'})
+    )
+    test_config = _create_config(examples_dir=str(examples_dir))
+
+    util.handle_program('ping', test_config)
+
+    assert 'leads around a cycle' in capsys.readouterr().out
+    assert mock_show_chunks.call_count == 0
+
+
+@patch('eg.catalog.get_catalog')
+@patch('eg.util.get_rendered_chunks')
+@patch('eg.util.show_chunks')
 def test_handle_program_finds_paths_and_calls_open_pager_no_alias(
     mock_page,
-    mock_format,
-    mock_get_paths,
-    mock_get_contents,
-    mock_resolve,
+    mock_get_rendered,
+    mock_get_catalog,
 ):
     """
     If there are entries for the program, handle_program needs to get the
-    paths, get the contents, format the contents, and page the resulting
-    string.
+    paths, render the contents of the files, and stream the rendered chunks
+    to the pager.
     """
     program = 'mv'
 
@@ -174,9 +262,11 @@ def test_handle_program_finds_paths_and_calls_open_pager_no_alias(
     use_color = False
     pager_cmd = 'foo bar'
     squeeze = False
-    subs = ['foo', 'bar']
+    subs = [
+        substitute.Substitution('foo', 'bar', False),
+        substitute.Substitution('bar', 'baz', True),
+    ]
 
-    file_contents = 'I am the contents of mv.md.'
     formatted_contents = 'and I am the formatted contents of mv.md.'
 
     test_config = _create_config(
@@ -190,84 +280,51 @@ def test_handle_program_finds_paths_and_calls_open_pager_no_alias(
     )
 
     default_paths = ['test-eg-dir/mv.md', 'test-eg-dir/foo/mv.md']
-    custom_paths = ['test-custom-dir/mv.md', 'test-custom-dir/bar.md']
-
-    def return_correct_path(*args, **kwargs):
-        program_param = args[0]
-        dir_param = args[1]
-        if program_param != program:
-            raise NameError('expected ' + program + ', got ' + program_param)
-        if dir_param == examples_dir:
-            return default_paths
-        elif dir_param == custom_dir:
-            return custom_paths
-        else:
-            raise NameError(
-                'got ' +
-                dir_param +
-                ', expected ' +
-                examples_dir +
-                ' or ' +
-                custom_dir)
-
-    mock_format.return_value = formatted_contents
-    mock_get_paths.side_effect=return_correct_path
-    mock_get_contents.return_value = file_contents
-    mock_resolve.return_value = program
-
-    util.handle_program(program, test_config)
+    custom_paths = ['test-custom-dir/mv.md', 'test-custom-dir/bar/mv.md']
 
-    mock_resolve.assert_called_once_with(
-        program,
-        test_config
+    mock_catalog = _create_mock_catalog(
+        default_paths={program: default_paths},
+        custom_paths={program: custom_paths},
     )
+    mock_get_catalog.return_value = mock_catalog
 
-    mock_get_paths.assert_any_call(
-        program,
-        examples_dir
-    )
-    mock_get_paths.assert_any_call(
-        program,
-        custom_dir,
-    )
+    formatted_chunks = iter([formatted_contents])
+    mock_get_rendered.return_value = formatted_chunks
 
-    mock_get_contents.assert_called_once_with(
-        custom_paths[0],
-        custom_paths[1],
-        default_paths[0],
-        default_paths[1],
-    )
+    util.handle_program(program, test_config)
+
+    mock_get_catalog.assert_called_once_with(test_config)
+    mock_catalog.resolve.assert_called_once_with(program)
+    mock_catalog.get_paths.assert_called_once_with(program)
 
-    mock_format.assert_called_once_with(
-        file_contents,
-        use_color=test_config.use_color,
-        color_config=test_config.color_config,
-        squeeze=test_config.squeeze,
-        subs=test_config.subs
+    mock_get_rendered.assert_called_once_with(
+        [
+            custom_paths[0],
+            custom_paths[1],
+            default_paths[0],
+            default_paths[1],
+        ],
+        test_config
     )
 
     mock_page.assert_called_once_with(
-        formatted_contents,
+        formatted_chunks,
         test_config.pager_cmd
     )
 
 
-@patch('eg.util.get_resolved_program')
-@patch('eg.util.get_contents_from_files')
-@patch('eg.util.get_file_paths_for_program')
-@patch('eg.util.get_formatted_contents')
-@patch('eg.util.page_string')
+@patch('eg.catalog.get_catalog')
+@patch('eg.util.get_rendered_chunks')
+@patch('eg.util.show_chunks')
 def test_handle_program_finds_paths_and_calls_open_pager_with_alias(
     mock_page,
-    mock_format,
-    mock_get_paths,
-    mock_get_contents,
-    mock_resolve,
+    mock_get_rendered,
+    mock_get_catalog,
 ):
     """
     If there are entries for the program, handle_program needs to get the
-    paths, get the contents, format the contents, and page the resulting
-    string.
+    paths, render the contents of the files, and stream the rendered chunks
+    to the pager.
     """
     alias_for_program = 'link'
     resolved_program = 'ln'
@@ -278,9 +335,11 @@ def test_handle_program_finds_paths_and_calls_open_pager_with_alias(
     use_color = False
     pager_cmd = 'foo bar'
     squeeze = False
-    subs = ['foo', 'bar']
+    subs = [
+        substitute.Substitution('foo', 'bar', False),
+        substitute.Substitution('bar', 'baz', True),
+    ]
 
-    file_contents = 'I am the contents of ln.md.'
     formatted_contents = 'and I am the formatted contents of ln.md.'
 
     test_config = _create_config(
@@ -296,68 +355,32 @@ def test_handle_program_finds_paths_and_calls_open_pager_with_alias(
     default_paths = ['test-eg-dir/ln.md']
     custom_paths = ['test-custom-dir/ln.md']
 
-    def return_correct_path(*args, **kwargs):
-        program_param = args[0]
-        dir_param = args[1]
-        if program_param != resolved_program:
-            raise NameError(
-                'expected ' +
-                resolved_program +
-                ', got ' +
-                program_param
-            )
-        if dir_param == examples_dir:
-            return default_paths
-        elif dir_param == custom_dir:
-            return custom_paths
-        else:
-            raise NameError(
-                'got ' +
-                dir_param +
-                ', expected ' +
-                examples_dir +
-                ' or ' +
-                custom_dir)
-
-    mock_format.return_value = formatted_contents
-    mock_get_paths.side_effect = return_correct_path
-    mock_get_contents.return_value = file_contents
-    mock_resolve.return_value = resolved_program
-
-    util.handle_program(
-        alias_for_program,
-        test_config
+    mock_catalog = _create_mock_catalog(
+        aliases={alias_for_program: resolved_program},
+        default_paths={resolved_program: default_paths},
+        custom_paths={resolved_program: custom_paths},
     )
+    mock_get_catalog.return_value = mock_catalog
+
+    formatted_chunks = iter([formatted_contents])
+    mock_get_rendered.return_value = formatted_chunks
 
-    mock_resolve.assert_called_once_with(
+    util.handle_program(
         alias_for_program,
         test_config
     )
 
-    mock_get_paths.assert_any_call(
-        resolved_program,
-        examples_dir
-    )
-    mock_get_paths.assert_any_call(
-        resolved_program,
-        custom_dir,
-    )
-
-    mock_get_contents.assert_called_once_with(
-        custom_paths[0],
-        default_paths[0]
-    )
+    mock_get_catalog.assert_called_once_with(test_config)
+    mock_catalog.resolve.assert_called_once_with(alias_for_program)
+    mock_catalog.get_paths.assert_called_once_with(resolved_program)
 
-    mock_format.assert_called_once_with(
-        file_contents,
-        use_color=test_config.use_color,
-        color_config=test_config.color_config,
-        squeeze=test_config.squeeze,
-        subs=test_config.subs
+    mock_get_rendered.assert_called_once_with(
+        [custom_paths[0], default_paths[0]],
+        test_config
     )
 
     mock_page.assert_called_once_with(
-        formatted_contents,
+        formatted_chunks,
         test_config.pager_cmd
     )
 
@@ -381,13 +404,16 @@ def test_get_list_of_all_supported_commands(tmpdir):
         'g-both-different-levels *',
         't-a-only-default-alias -> a-only-default',
         'u-b-both-alias -> b-both *',
-        'v-c-only-custom-alias -> c-only-custom +'
+        'v-c-only-custom-alias -> c-only-custom +',
+        'w-alias-of-alias -> b-both *',
+        'x-custom-alias ^ -> a-only-default'
     ]
 
     aliases = {
         't-a-only-default-alias': 'a-only-default',
         'u-b-both-alias': 'b-both',
-        'v-c-only-custom-alias': 'c-only-custom'
+        'v-c-only-custom-alias': 'c-only-custom',
+        'w-alias-of-alias': 'u-b-both-alias'
     }
 
     # Make the directory structure we expect.
@@ -410,13 +436,28 @@ def test_get_list_of_all_supported_commands(tmpdir):
     dir_example.join('g-both-different-levels.md').write('foo')
     dir_custom_nested.join('g-both-different-levels.md').write('foo')
 
-    # Use the 'with' context manager rather than the @decorator, because the
-    # tmpdir fixture doesn't play nice with the decorator.
-    with patch('eg.util.get_alias_dict') as mock_get_alias:
-        mock_get_alias.return_value = aliases
-        actual = util.get_list_of_all_supported_commands(config)
-        assert actual == expected
-        mock_get_alias.assert_called_once_with(config)
+    dir_example.join(util.ALIAS_FILE_NAME).write(json.dumps(aliases))
+    dir_custom.join(util.ALIAS_FILE_NAME).write(
+        json.dumps({'x-custom-alias': 't-a-only-default-alias'})
+    )
+
+    actual = util.get_list_of_all_supported_commands(config)
+    assert actual == expected
+
+
+def test_get_alias_cycle_warning(tmpdir):
+    examples_dir = tmpdir.mkdir('examples')
+    examples_dir.join('tar.md').write('# tar')
+    examples_dir.join(util.ALIAS_FILE_NAME).write(
+        json.dumps({'ping': 'pong', 'pong': 'ping', 'tarball': 'tar'})
+    )
+    test_config = _create_config(examples_dir=str(examples_dir))
+
+    assert util.get_alias_cycle_warning(_create_config()) is None
+    assert util.get_alias_cycle_warning(test_config) == (
+        'Warning: these aliases lead around a cycle and resolve to no '
+        'program: ping, pong.'
+    )
 
 
 def test_list_supported_programs_fails_gracefully_if_no_dirs():
@@ -428,11 +469,10 @@ def test_list_supported_programs_fails_gracefully_if_no_dirs():
     assert actual == target
 
 
-def test_calls_pipepager_if_not_less():
+def test_calls_pager_cmd_if_not_less():
     """
     We're special casing less a bit, as it is the default value, so if a custom
-    command has been set that is NOT less, we should call pipepager straight
-    away.
+    command has been set that is NOT less, we should pipe to it straight away.
     """
     _helper_assert_about_pager('page me plz', 'cat', False)
 
@@ -444,14 +484,27 @@ def test_calls_fallback_pager_if_none():
     _helper_assert_about_pager('page me plz', None, True)
 
 
-def test_calls_pipepager_if_less():
+def test_calls_pager_cmd_if_less():
     """
-    We should call pipepager if we ask to use less and less is installed on the
+    We should pipe to less if we ask to use less and less is installed on the
     machine.
     """
     _helper_assert_about_pager('a fancy value to page', 'less -R', False)
 
 
+def test_calls_fallback_if_pager_is_not_installed():
+    """
+    If the pager isn't on the machine, as when the default of less is used
+    where there is no less, we should use the fallback pager.
+    """
+    _helper_assert_about_pager(
+        'a fancy value to page',
+        'less -R',
+        True,
+        installed=False
+    )
+
+
 def test_calls_fallback_if_cmd_is_flag_string():
     """
     We are using a flag string to indicate if we should use the fallback pager.
@@ -463,49 +516,109 @@ def test_calls_fallback_if_cmd_is_flag_string():
     )
 
 
+@patch('shutil.which')
 @patch('pydoc.pager')
-@patch('pydoc.pipepager')
+@patch('eg.util._write_to_pager')
+@patch('subprocess.Popen')
 def _helper_assert_about_pager(
     str_to_page,
     pager_cmd,
     use_fallback,
-    pipepager,
+    popen,
+    write_to_pager,
     default_pager,
+    which,
+    installed=True,
 ):
     """
     Help with asserting about pager.
 
     str_to_page: what you're paging
-    pager_cmd: the string you're passing to pipepager (or None)
-    use_default: false if we should actually use pydoc.pipepager, true if we
+    pager_cmd: the command you're paging with (or None)
+    use_default: false if we should actually pipe to pager_cmd, true if we
         instead are going to fallback to pydoc.pager
+    installed: whether the program pager_cmd runs is on the machine
     """
+    which.side_effect = lambda name: '/usr/bin/' + name if installed else None
+
     util.page_string(str_to_page, pager_cmd)
 
     if use_fallback:
         default_pager.assert_called_once_with(str_to_page)
-        assert pipepager.call_count == 0
+        assert popen.call_count == 0
     else:
         assert default_pager.call_count == 0
-        pipepager.assert_called_once_with(
-            str_to_page,
-            cmd=pager_cmd
-        )
+        popen.assert_called_once_with(pager_cmd.split(), stdin=ANY)
+        write_to_pager.assert_called_once_with(popen.return_value, ANY)
+
+
+def test_find_on_path(tmpdir):
+    bin_dir = tmpdir.mkdir('bin')
+    bin_dir.join('less').write('')
+    os.chmod(str(bin_dir.join('less')), 0o755)
+    bin_dir.join('more').write('')
+    search_path = os.pathsep.join([str(tmpdir.join('missing')), str(bin_dir)])
+
+    assert util._find_on_path('less', search_path) == str(bin_dir.join('less'))
+    assert util._find_on_path('more', search_path) is None
+    assert util._find_on_path('most', search_path) is None
+    assert util._find_on_path(str(bin_dir.join('less')), '') == str(
+        bin_dir.join('less')
+    )
+
+
+def test_get_pager_argv_splits_without_shell():
+    with patch('shutil.which', return_value='/usr/bin/less'):
+        assert util.get_pager_argv('less -R --prompt "eg: %f"') == [
+            'less',
+            '-R',
+            '--prompt',
+            'eg: %f',
+        ]
+        assert util.get_pager_argv('less "-R') is None
+        assert util.get_pager_argv('') is None
+
+
+@patch('subprocess.Popen')
+def test_page_chunks_starts_pager_before_producing_chunks(mock_popen):
+    events = []
+
+    def start(*args, **kwargs):
+        events.append('started')
+        return Mock()
+
+    mock_popen.side_effect = start
+
+    def get_chunks():
+        events.append('producing')
+        yield 'one\n'
+
+    with patch('eg.util._write_to_pager') as mock_write:
+        util.page_chunks(get_chunks(), 'cat')
+        mock_write.call_args[0][1](Mock())
+
+    mock_popen.assert_called_once_with(['cat'], stdin=ANY)
+    assert events == ['started', 'producing']
 
 
-@patch('eg.util.pydoc.pipepager', side_effect=KeyboardInterrupt)
-def test_page_string_excepts_keyboard_interrupt_if_not_less(pipepager_mock):
+@patch('subprocess.Popen')
+def test_page_chunks_excepts_keyboard_interrupt(mock_popen):
     """
-    Do not fail when user hits ctrl-c while in pager.
+    Do not fail when user hits ctrl-c while the pager is running, but wait
+    for the pager to be quit.
     """
-    try:
-        util.page_string('page me plz', 'cat')
-    except KeyboardInterrupt:
-        raise AssertionError('Should not have got this far')
-    pipepager_mock.assert_called_once_with('page me plz', cmd='cat')
+    mock_popen.return_value.wait.side_effect = [KeyboardInterrupt, 0]
+
+    def get_chunks():
+        yield 'one\n'
+        raise KeyboardInterrupt
+
+    util.page_chunks(get_chunks(), 'cat')
+
+    assert mock_popen.return_value.wait.call_count == 2
 
 
-@patch('eg.util.pydoc.pager', side_effect=KeyboardInterrupt)
+@patch('pydoc.pager', side_effect=KeyboardInterrupt)
 def test_page_string_excepts_keyboard_interrupt_if_none(pager_mock):
     """
     Do not fail when user hits ctrl-c while in pipepager.
@@ -565,6 +678,146 @@ def test_get_contents_from_files_handles_multiple():
     )
 
 
+@patch('eg.util._get_contents_of_file')
+def test_get_contents_from_files_reads_concurrently(mock_get_contents):
+    """
+    Every file is being read at once, which would deadlock if they were read
+    one after another, and the contents still come back in order.
+    """
+    paths = ['custom/cp.md', 'examples/cp.md', 'examples/nested/cp.md']
+    all_reading = threading.Barrier(len(paths), timeout=5)
+
+    def read_after_all_start(path):
+        all_reading.wait()
+        return path + '\n'
+
+    mock_get_contents.side_effect = read_after_all_start
+
+    actual = util.get_contents_from_files(*paths)
+
+    assert actual == 'custom/cp.md\nexamples/cp.md\nexamples/nested/cp.md\n'
+
+
+@patch('eg.util.READ_TIMEOUT_S', 0.05)
+@patch('eg.util._get_contents_of_file')
+def test_get_contents_from_files_skips_stalled_files(
+    mock_get_contents,
+    capsys
+):
+    unmounted = threading.Event()
+
+    def read(path):
+        if path.startswith('/nfs'):
+            unmounted.wait(5)
+        return path + '\n'
+
+    mock_get_contents.side_effect = read
+
+    try:
+        actual = util.get_contents_from_files('/nfs/cp.md', 'examples/cp.md')
+        assert actual == 'examples/cp.md\n'
+        assert 'Skipping /nfs/cp.md' in capsys.readouterr().err
+
+        # The stalled read isn't started again while it's still going.
+        actual = util.get_contents_from_files('/nfs/cp.md', 'examples/cp.md')
+        assert actual == 'examples/cp.md\n'
+        assert mock_get_contents.call_args_list.count(
+            call('/nfs/cp.md')
+        ) == 1
+    finally:
+        unmounted.set()
+
+
+@patch('eg.util.READ_TIMEOUT_S', 0.1)
+@patch('eg.util._get_contents_of_file')
+def test_get_contents_from_files_does_not_time_out_queued_reads(
+    mock_get_contents,
+    capsys
+):
+    """
+    Reads waiting for a thread behind other slow but working reads aren't
+    skipped, as only a read that has started can stall.
+    """
+    def read(path):
+        if path.startswith('slow'):
+            time.sleep(0.06)
+        return path + '\n'
+
+    mock_get_contents.side_effect = read
+    slow_paths = ['slow/{}.md'.format(i) for i in range(4 * 4)]
+    slow_reader = threading.Thread(
+        target=util.get_contents_from_files,
+        args=slow_paths
+    )
+    slow_reader.start()
+    time.sleep(0.01)
+
+    try:
+        assert util.get_contents_from_files('fast.md') == 'fast.md\n'
+    finally:
+        slow_reader.join()
+
+    assert 'Skipping' not in capsys.readouterr().err
+    assert util._stalled_paths == {}
+    assert util.get_contents_from_files('fast.md') == 'fast.md\n'
+
+
+@patch('eg.util.READ_TIMEOUT_S', 0.05)
+@patch('eg.render_cache.get_stamp')
+def test_get_rendered_chunks_skips_files_that_cannot_be_stat_d(
+    mock_get_stamp,
+    tmpdir,
+    capsys
+):
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n')
+    test_config = _create_config(
+        examples_dir=str(examples),
+        use_color=False,
+        squeeze=False
+    )
+    unmounted = threading.Event()
+    mock_get_stamp.side_effect = lambda path: unmounted.wait(5)
+    nfs_path = str(tmpdir.join('nfs', 'cp.md'))
+    paths = [nfs_path, str(examples.join('cp.md'))]
+
+    try:
+        with patch('eg.render_cache.put_chunks') as mock_put:
+            actual = ''.join(util.get_rendered_chunks(paths, test_config))
+    finally:
+        unmounted.set()
+
+    assert actual == '# cp\n'
+    assert capsys.readouterr().err.count('Skipping ' + nfs_path) == 1
+    mock_put.assert_not_called()
+
+
+@patch('eg.util.READ_TIMEOUT_S', 0.05)
+@patch('eg.util.get_rendered_chunks')
+@patch('eg.catalog.get_catalog')
+def test_handle_program_gives_up_on_stalled_catalog(
+    mock_get_catalog,
+    mock_get_chunks,
+    capsys
+):
+    unmounted = threading.Event()
+    mock_get_catalog.side_effect = lambda config: unmounted.wait(5)
+    test_config = _create_config(examples_dir='/nfs/examples')
+
+    try:
+        util.handle_program('cp', test_config)
+    finally:
+        unmounted.set()
+
+    assert 'Could not read the examples' in capsys.readouterr().err
+    mock_get_chunks.assert_not_called()
+
+
+def test_get_contents_from_files_raises_read_errors(tmpdir):
+    with pytest.raises(IOError):
+        util.get_contents_from_files(str(tmpdir.join('missing.md')))
+
+
 @patch('eg.util._get_contents_of_file')
 def _helper_assert_file_contents(
     file_infos,
@@ -784,6 +1037,65 @@ def test_get_squeezed_contents_correctly_squeezes():
     assert actual == target
 
 
+def _get_squeezed_contents_with_regexes(contents):
+    """The regular expression passes get_squeezed_contents() replaced."""
+    result = contents
+    result = substitute.Substitution(
+        '\n\n    ',
+        '\n    ',
+        True
+    ).apply_and_get_result(result)
+    result = substitute.Substitution(
+        '\n\n\n',
+        '\n\n',
+        True
+    ).apply_and_get_result(result)
+    result = substitute.Substitution(
+        '\n\n\n\n',
+        '\n\n\n',
+        True
+    ).apply_and_get_result(result)
+    return result
+
+
+def _split_lines(contents):
+    """Split contents into lines the way iterating over a file does."""
+    lines = contents.split('\n')
+    result = [line + '\n' for line in lines[:-1]]
+    if lines[-1]:
+        result.append(lines[-1])
+    return result
+
+
+def _assert_squeezes_like_regexes(contents):
+    expected = _get_squeezed_contents_with_regexes(contents)
+    assert util.get_squeezed_contents(contents) == expected
+
+    squeezed_chunks = util.get_squeezed_chunks(iter(_split_lines(contents)))
+    assert ''.join(squeezed_chunks) == expected
+
+
+def test_get_squeezed_contents_matches_regexes_for_shipped_examples():
+    examples_dir = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)),
+        'eg',
+        'examples'
+    )
+    for file_name in sorted(os.listdir(examples_dir)):
+        _assert_squeezes_like_regexes(
+            _get_file_as_string(os.path.join(examples_dir, file_name))
+        )
+
+
+def test_get_squeezed_contents_matches_regexes_for_fuzzed_text():
+    pieces = ['\n', '\n\n', '\n\n\n\n', '    ', '   ', ' ', 'a', '$', '\r']
+    rng = random.Random(0)
+    for _ in range(5000):
+        _assert_squeezes_like_regexes(
+            ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 30)))
+        )
+
+
 def test_get_substituted_contents_handles_empty_subs():
     """Nothing should be formatted if there are no substitutions."""
     raw_contents = 'this should not be subbed'
@@ -851,13 +1163,13 @@ def test_get_colorized_contents_calls_methods(patched_colorizer_class):
     colorizer_instance.colorize_text.assert_called_once_with(raw_contents)
 
 
-@patch('eg.util.get_alias_dict')
+@patch('eg.catalog.get_catalog')
 def _helper_assert_get_resolved_program(
     program,
     resolved_program,
     config_obj,
     alias_dict,
-    mock_dict,
+    mock_get_catalog,
 ):
     """
     program: the program to resolved for as an alias
@@ -865,11 +1177,11 @@ def _helper_assert_get_resolved_program(
     config_obj: the config_obj to use toe resolve the alias path
     alias_dict: the dict of aliases to be returned
     """
-    mock_dict.return_value = alias_dict
+    mock_get_catalog.return_value = _create_mock_catalog(aliases=alias_dict)
 
     actual = util.get_resolved_program(program, config_obj)
     assert actual == resolved_program
-    mock_dict.assert_called_once_with(config_obj)
+    mock_get_catalog.assert_called_once_with(config_obj)
 
 
 def test_get_resolved_program_no_alias():
@@ -896,9 +1208,10 @@ def test_get_resolved_program_is_alias():
     _helper_assert_get_resolved_program('cp', 'cp', config_obj, alias_dict)
 
 
-def test_get_alias_dict_returns_contents_of_correct_file():
+@patch('eg.catalog.get_catalog')
+def test_get_alias_dict_returns_aliases_of_catalog(mock_get_catalog):
     """
-    get_alias_dict should read data from the file at the default path.
+    get_alias_dict should return a copy of the aliases known to the catalog.
     """
     alias_dict = {
         'link': 'ln',
@@ -907,94 +1220,14 @@ def test_get_alias_dict_returns_contents_of_correct_file():
     config_obj = _create_config(
         examples_dir='path/to/examples/dir',
     )
-
-    alias_file_path = 'path/to/alias/file'
-    alias_dict_str = json.dumps(alias_dict)
-    _helper_assert_get_alias_dict(
-        alias_dict_str,
-        alias_dict,
-        config_obj,
-        alias_file_path,
-        True
-    )
-
-
-def test_get_alias_dict_fails_gracefully_if_not_file():
-    """
-    Since users can specify a directory for examples that might not contain the
-    aliases file, we want to fail gracefully if the file doesn't exist.
-    """
-    contents_of_alias_dict_file = 'should never be reached'
-    config_obj = _create_config(
-        examples_dir='path/to/examples/dir',
-    )
-    alias_file_path = 'path/to/the/alias/file'
-    _helper_assert_get_alias_dict(
-        contents_of_alias_dict_file,
-        {},
-        config_obj,
-        alias_file_path,
-        False
-    )
-
-
-@patch('eg.util._get_contents_of_file')
-@patch('eg.util._get_alias_file_path')
-@patch('os.path.isfile')
-def _helper_assert_get_alias_dict(
-    contents_of_alias_dict_file,
-    target_alias_dict,
-    config_obj,
-    alias_file_path,
-    alias_file_path_is_file,
-    mock_is_file,
-    mock_get_alias_file_path,
-    mock_get_contents,
-):
-    """
-    contents_of_alias_dict_file: the string contents of the file storing the
-        dictionary of aliases
-    target_alias_dict: the target result of get_alias_dict
-    config_obj: the Config object
-    alias_file_path: the path to be returned by _get_alias_file_path
-    alias_file_path_is_file: True if the alias path is a file, else False
-    """
-    mock_is_file.return_value = alias_file_path_is_file
-    mock_get_alias_file_path.return_value = alias_file_path
-    mock_get_contents.return_value = contents_of_alias_dict_file
+    mock_catalog = _create_mock_catalog(aliases=alias_dict)
+    mock_get_catalog.return_value = mock_catalog
 
     actual = util.get_alias_dict(config_obj)
 
-    assert actual == target_alias_dict
-
-    mock_get_alias_file_path.assert_called_once_with(config_obj)
-    mock_is_file.assert_called_once_with(alias_file_path)
-
-    if alias_file_path_is_file:
-        mock_get_contents.assert_called_once_with(alias_file_path)
-    else:
-        assert mock_get_contents.call_count == 0
-
-
-@patch('os.path.join')
-def test_get_alias_file_path(mock_join):
-    """
-    _get_alias_file_path should just join the example dir and the alias file
-    name, to make sure we look in the right place for the file.
-    """
-    config_obj = _create_config(
-        examples_dir='handy/dandy/examples/dir',
-    )
-
-    join_result = 'joined path'
-    mock_join.return_value = join_result
-
-    actual = util._get_alias_file_path(config_obj)
-    assert actual == join_result
-    mock_join.assert_called_once_with(
-        config_obj.examples_dir,
-        util.ALIAS_FILE_NAME
-    )
+    assert actual == alias_dict
+    assert actual is not mock_catalog.aliases
+    mock_get_catalog.assert_called_once_with(config_obj)
 
 
 def test_is_example_file_true_if_has_suffix():
@@ -1034,13 +1267,11 @@ def test_can_parse_alias_file():
 
 @patch('os.path.exists')
 @patch('eg.util._inform_cannot_edit_no_custom_dir')
-@patch('eg.util.get_resolved_program')
-@patch('eg.util.get_file_paths_for_program')
+@patch('eg.catalog.get_catalog')
 @patch('subprocess.call')
 def test_edit_custom_examples_correct_with_custom_dir(
     mock_call,
-    mock_get_paths,
-    mock_get_program,
+    mock_get_catalog,
     mock_inform,
     mock_exists,
 ):
@@ -1052,43 +1283,45 @@ def test_edit_custom_examples_correct_with_custom_dir(
     config = _create_config(custom_dir='path/to/custom', editor_cmd='nano')
     paths = ['path/to/custom/du.md', 'foo.md']
 
-    mock_get_program.return_value = resolved_program
-    mock_get_paths.return_value = paths
+    mock_catalog = _create_mock_catalog(
+        aliases={program: resolved_program},
+        custom_paths={resolved_program: paths},
+    )
+    mock_get_catalog.return_value = mock_catalog
     mock_exists.return_value = True
 
     util.edit_custom_examples(program, config)
 
-    mock_get_program.assert_called_once_with(program, config)
-    mock_get_paths.assert_called_once_with(resolved_program, config.custom_dir)
+    mock_get_catalog.assert_called_once_with(config)
+    mock_catalog.resolve.assert_called_once_with(program)
+    mock_catalog.get_custom_paths.assert_called_once_with(resolved_program)
     mock_call.assert_called_once_with([config.editor_cmd, paths[0]])
     assert mock_inform.call_count == 0
 
 
 @patch('os.path.exists')
 @patch('eg.util._inform_cannot_edit_no_custom_dir')
-@patch('eg.util.get_resolved_program')
-@patch('eg.util.get_file_paths_for_program')
+@patch('eg.catalog.get_catalog')
 @patch('subprocess.call')
 def test_edit_custom_examples_creates_file_if_none_exist(
     mock_call,
-    mock_get_paths,
-    mock_get_program,
+    mock_get_catalog,
     mock_inform,
     mock_exists,
 ):
     program = 'du'
     resolved_program = 'alias-for-du'
     config = _create_config(custom_dir='path/to/custom', editor_cmd='nano')
-    paths = []
 
-    mock_get_program.return_value = resolved_program
-    mock_get_paths.return_value = paths
+    mock_catalog = _create_mock_catalog(aliases={program: resolved_program})
+    mock_get_catalog.return_value = mock_catalog
     mock_exists.return_value = True
 
     util.edit_custom_examples(program, config)
 
-    mock_get_program.assert_called_once_with(program, config)
-    mock_get_paths.assert_called_once_with(resolved_program, config.custom_dir)
+    mock_get_catalog.assert_called_once_with(config)
+    mock_catalog.resolve.assert_called_once_with(program)
+    mock_catalog.get_custom_paths.assert_called_once_with(resolved_program)
     mock_call.assert_called_once_with(
         [config.editor_cmd, 'path/to/custom/alias-for-du.md'])
     assert mock_inform.call_count == 0
@@ -1097,13 +1330,11 @@ def test_edit_custom_examples_creates_file_if_none_exist(
 
 @patch('os.path.exists')
 @patch('eg.util._inform_cannot_edit_no_custom_dir')
-@patch('eg.util.get_resolved_program')
-@patch('eg.util.get_file_paths_for_program')
+@patch('eg.catalog.get_catalog')
 @patch('subprocess.call')
 def test_edit_custom_examples_informs_if_no_custom_dir(
     mock_call,
-    mock_get_paths,
-    mock_get_program,
+    mock_get_catalog,
     mock_inform,
     mock_exists,
 ):
@@ -1127,5 +1358,494 @@ def test_edit_custom_examples_informs_if_no_custom_dir(
     assert mock_inform.call_count == 2
 
     assert mock_call.call_count == 0
-    assert mock_get_paths.call_count == 0
-    assert mock_get_program.call_count == 0
+    assert mock_get_catalog.call_count == 0
+
+
+@patch('eg.util._inform_cannot_edit_bundle')
+@patch('subprocess.call')
+def test_edit_custom_examples_refuses_bundles(mock_call, mock_inform, tmpdir):
+    """
+    A bundle can't be edited in place, so we should inform rather than open an
+    editor on a path that doesn't exist.
+    """
+    custom = tmpdir.mkdir('custom')
+    custom.join('du.md').write('du')
+    bundle_path = str(tmpdir.join('custom.egb'))
+    bundle.write_bundle(str(custom), bundle_path)
+    config = _create_config(custom_dir=bundle_path, editor_cmd='vi')
+
+    util.edit_custom_examples('du', config)
+
+    mock_inform.assert_called_once_with(bundle_path)
+    assert mock_call.call_count == 0
+
+
+@patch('eg.util.show_chunks')
+@patch('eg.util.get_formatted_chunks')
+def test_handle_program_pages_cached_output(mock_format, mock_page, tmpdir):
+    """
+    The second time we render the same contents the same way, we should page
+    the cached output without formatting again.
+    """
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n')
+    # The cache only trusts files whose mtimes aren't too recent.
+    past = time.time() - 60
+    os.utime(str(examples.join('cp.md')), (past, past))
+    test_config = _create_config(
+        examples_dir=str(examples),
+        use_color=False,
+        squeeze=True,
+        pager_cmd='cat',
+    )
+    mock_format.side_effect = lambda *args, **kwargs: iter(['formatted ', 'cp'])
+    paged = []
+    mock_page.side_effect = lambda chunks, pager_cmd: paged.append(
+        (''.join(chunks), pager_cmd)
+    )
+
+    util.handle_program('cp', test_config)
+    util.handle_program('cp', test_config)
+
+    assert mock_format.call_count == 1
+    assert paged == [('formatted cp', 'cat'), ('formatted cp', 'cat')]
+
+
+@patch('locale.getpreferredencoding', return_value='UTF-8')
+def test_can_pass_through(mock_encoding):
+    def can_pass_through(**kwargs):
+        options = {'pager_cmd': 'less -R', 'use_color': False}
+        options.update(kwargs)
+        return util.can_pass_through(_create_config(**options))
+
+    assert can_pass_through()
+    assert not can_pass_through(use_color=True)
+    assert not can_pass_through(squeeze=True)
+    assert not can_pass_through(
+        subs=[substitute.Substitution('foo', 'bar', False)]
+    )
+    assert not can_pass_through(pager_cmd=util.FLAG_FALLBACK)
+
+    mock_encoding.return_value = 'latin-1'
+    assert not can_pass_through()
+
+
+@patch('eg.util.get_screen_size', return_value=(80, 3))
+@patch('eg.util.can_pass_through', return_value=True)
+@patch('eg.util.get_rendered_chunks')
+@patch('eg.util.page_files')
+def test_handle_program_passes_unformatted_files_through(
+    mock_page_files,
+    mock_get_rendered,
+    mock_can_pass_through,
+    mock_screen_size,
+    tmpdir
+):
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n\ncopy\n')
+    test_config = _create_config(examples_dir=str(examples), pager_cmd='cat')
+
+    util.handle_program('cp', test_config)
+
+    mock_get_rendered.assert_not_called()
+    mock_page_files.assert_called_once_with(
+        [str(examples.join('cp.md'))],
+        'cat'
+    )
+
+
+@patch('eg.util.get_screen_size', return_value=None)
+@patch('eg.util.can_pass_through', return_value=True)
+@patch('eg.util.write_files_to_stdout')
+@patch('eg.util.page_files')
+def test_handle_program_writes_unformatted_files_if_not_a_terminal(
+    mock_page_files,
+    mock_write_files,
+    mock_can_pass_through,
+    mock_screen_size,
+    tmpdir
+):
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n')
+    test_config = _create_config(examples_dir=str(examples), pager_cmd='cat')
+
+    util.handle_program('cp', test_config)
+
+    mock_page_files.assert_not_called()
+    mock_write_files.assert_called_once_with([str(examples.join('cp.md'))])
+
+
+@patch('eg.util.get_screen_size', return_value=(10, 24))
+@patch('eg.util.can_pass_through', return_value=True)
+@patch('eg.util.write_files_to_stdout')
+@patch('eg.util.page_files')
+def test_handle_program_writes_unformatted_files_that_fit(
+    mock_page_files,
+    mock_write_files,
+    mock_can_pass_through,
+    mock_screen_size,
+    tmpdir
+):
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n\n' + 'x' * 300 + '\n')
+    examples.join('mv.md').write('# mv\n')
+    test_config = _create_config(examples_dir=str(examples), pager_cmd='cat')
+
+    util.handle_program('cp', test_config)
+    util.handle_program('mv', test_config)
+
+    # 300 characters wrap onto 30 rows of a screen 10 columns wide.
+    mock_page_files.assert_called_once_with(
+        [str(examples.join('cp.md'))],
+        'cat'
+    )
+    mock_write_files.assert_called_once_with([str(examples.join('mv.md'))])
+
+
+def test_write_files_to_stdout(tmpdir, capfd):
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n')
+    examples.join('mv.md').write('# mv\n')
+
+    util.write_files_to_stdout(
+        [str(examples.join('cp.md')), str(examples.join('mv.md'))]
+    )
+
+    assert capfd.readouterr().out == '# cp\n# mv\n'
+
+
+@patch('eg.util.get_screen_size', return_value=None)
+@patch('eg.util.page_chunks')
+def test_show_chunks_writes_to_stdout_if_not_a_terminal(
+    mock_page_chunks,
+    mock_screen_size,
+    capsys
+):
+    util.show_chunks(iter(['line\n'] * 100), 'less')
+
+    mock_page_chunks.assert_not_called()
+    assert capsys.readouterr().out == 'line\n' * 100
+
+
+@patch('eg.util.get_screen_size', return_value=(80, 5))
+@patch('eg.util.page_chunks')
+def test_show_chunks_writes_to_stdout_if_output_fits(
+    mock_page_chunks,
+    mock_screen_size,
+    capsys
+):
+    util.show_chunks(iter(['one\ntwo\n', 'three\nfour\n']), 'less')
+
+    mock_page_chunks.assert_not_called()
+    assert capsys.readouterr().out == 'one\ntwo\nthree\nfour\n'
+
+
+@patch('eg.util.get_screen_size', return_value=(80, 5))
+@patch('eg.util.page_chunks')
+def test_show_chunks_pages_output_that_does_not_fit(
+    mock_page_chunks,
+    mock_screen_size,
+    capsys
+):
+    produced = []
+
+    def get_chunks():
+        for i in range(1000):
+            produced.append(i)
+            yield 'line {}\nline {}\n'.format(i, i)
+
+    util.show_chunks(get_chunks(), 'less')
+
+    # Only enough chunks to fill the screen are produced before paging.
+    assert produced == [0, 1, 2]
+    chunks, pager_cmd = mock_page_chunks.call_args[0]
+    assert pager_cmd == 'less'
+    assert ''.join(chunks) == ''.join(
+        'line {}\nline {}\n'.format(i, i) for i in range(1000)
+    )
+    assert capsys.readouterr().out == ''
+
+
+@patch('eg.util.get_screen_size', return_value=(10, 5))
+@patch('eg.util.page_chunks')
+def test_show_chunks_counts_wrapped_lines(mock_page_chunks, mock_screen_size):
+    util.show_chunks(iter(['x' * 35 + '\n', 'y' * 5 + '\n']), 'less')
+
+    mock_page_chunks.assert_called_once_with(
+        ['x' * 35 + '\n' + 'y' * 5 + '\n'],
+        'less'
+    )
+
+
+def test_page_files_pipes_raw_bytes_to_pager(tmpdir):
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write(u'# cp\r\n\ncopy → there\n'.encode('utf-8'),
+                                 mode='wb')
+    examples.join('mv.md').write('# mv\n')
+    out_path = str(tmpdir.join('paged'))
+
+    util.page_files(
+        [str(examples.join('cp.md')), str(examples.join('mv.md'))],
+        "sh -c 'cat > " + out_path + "'"
+    )
+
+    with open(out_path, 'rb') as f:
+        assert f.read() == (
+            u'# cp\r\n\ncopy → there\n# mv\n'.encode('utf-8')
+        )
+
+
+def test_get_rendered_chunks_shares_cache_with_get_rendered_contents(tmpdir):
+    """
+    Output rendered as a string is served to the stream and the other way
+    around, as both are keyed on the same stats of the files.
+    """
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n\n\n\n    cp `a` b\n')
+    examples.join('mv.md').write('# mv\n')
+    past = time.time() - 60
+    for name in ['cp.md', 'mv.md']:
+        os.utime(str(examples.join(name)), (past, past))
+    test_config = _create_config(
+        examples_dir=str(examples),
+        color_config=config.get_default_color_config(),
+        squeeze=True,
+    )
+    cp_paths = [str(examples.join('cp.md'))]
+    mv_paths = [str(examples.join('mv.md'))]
+
+    expected_cp = util.get_rendered_contents(cp_paths, test_config)
+    with patch('eg.util.get_formatted_chunks') as mock_format:
+        actual_cp = ''.join(util.get_rendered_chunks(cp_paths, test_config))
+    assert mock_format.call_count == 0
+    assert actual_cp == expected_cp
+
+    expected_mv = ''.join(util.get_rendered_chunks(mv_paths, test_config))
+    with patch('eg.util.get_formatted_contents') as mock_format:
+        actual_mv = util.get_rendered_contents(mv_paths, test_config)
+    assert mock_format.call_count == 0
+    assert actual_mv == expected_mv
+
+
+def test_get_rendered_chunks_looks_up_cache_without_reading(tmpdir):
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n')
+    past = time.time() - 60
+    os.utime(str(examples.join('cp.md')), (past, past))
+    test_config = _create_config(
+        examples_dir=str(examples),
+        use_color=False,
+        squeeze=True
+    )
+    paths = [str(examples.join('cp.md'))]
+    expected = ''.join(util.get_rendered_chunks(paths, test_config))
+
+    with patch('eg.bundle.read_chunks') as mock_read:
+        actual = ''.join(util.get_rendered_chunks(paths, test_config))
+
+    assert actual == expected
+    mock_read.assert_not_called()
+
+    # An edit changes the size or mtime of the file, and so the key.
+    examples.join('cp.md').write('# cp\n\ncopy\n')
+    os.utime(str(examples.join('cp.md')), (past, past))
+    assert 'copy' in ''.join(util.get_rendered_chunks(paths, test_config))
+
+
+def test_get_rendered_chunks_streams_recently_modified_files(tmpdir):
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n')
+    test_config = _create_config(
+        examples_dir=str(examples),
+        use_color=False,
+        squeeze=True
+    )
+    paths = [str(examples.join('cp.md'))]
+
+    with patch('eg.render_cache.put_chunks') as mock_put:
+        actual = ''.join(util.get_rendered_chunks(paths, test_config))
+
+    assert actual == '# cp\n'
+    mock_put.assert_not_called()
+
+
+@patch('eg.util.CHUNK_SIZE', 4)
+def test_get_chunks_from_files_concatenates_whole_lines(tmpdir):
+    """
+    Files are joined like get_contents_from_files() joins them, including a
+    file without a final newline running into the next, and each chunk holds
+    whole lines.
+    """
+    custom = tmpdir.mkdir('custom')
+    custom.join('cp.md').write('custom cp\nno newline')
+    examples = tmpdir.mkdir('examples')
+    examples.join('cp.md').write('# cp\n\nx\n')
+    bundle_path = str(tmpdir.join('examples.egb'))
+    bundle.write_bundle(str(examples), bundle_path)
+    bundle.get_bundle(bundle_path)
+    paths = [str(custom.join('cp.md')), os.path.join(bundle_path, 'cp.md')]
+
+    actual = list(util.get_chunks_from_files(*paths))
+
+    assert ''.join(actual) == util.get_contents_from_files(*paths)
+    assert len(actual) > 2
+    assert all(chunk.endswith('\n') for chunk in actual)
+
+
+def test_get_line_aligned_chunks():
+    actual = list(util.get_line_aligned_chunks(
+        iter(['ab', 'c\nd', '', 'e\nf\n', 'g'])
+    ))
+
+    assert actual == ['abc\n', 'de\nf\n', 'g']
+    assert list(util.get_line_aligned_chunks(iter([]))) == []
+
+
+def test_get_formatted_chunks_streams():
+    """
+    With substitutions that only see one line at a time, output is produced
+    without waiting for the end of the input.
+    """
+    def get_raw_chunks():
+        while True:
+            yield '# cp\n\n\n\n    cp `a` b\n'
+
+    chunks = util.get_formatted_chunks(
+        get_raw_chunks(),
+        use_color=True,
+        color_config=config.get_default_color_config(),
+        squeeze=True,
+        subs=[substitute.Substitution('cp', 'copy', False)]
+    )
+
+    assert 'copy' in next(chunks)
+
+
+def test_get_substituted_chunks_needs_whole_text_for_multiline_matches():
+    subs = [substitute.Substitution('a\nb', 'X', False)]
+
+    actual = list(util.get_substituted_chunks(iter(['a\n', 'b\n']), subs))
+
+    assert actual == ['X\n']
+
+
+def test_get_substituted_chunks_substitutes_empty_last_line():
+    subs = [substitute.Substitution('^', '> ', True)]
+
+    actual = ''.join(util.get_substituted_chunks(iter(['a\n', 'b\n']), subs))
+
+    assert actual == '> a\n> b\n> '
+    assert actual == util.get_substituted_contents('a\nb\n', subs)
+
+
+def test_get_squeezed_chunks_matches_get_squeezed_contents():
+    with open(PATH_UNSQUEEZED_FILE, 'r') as f:
+        contents = f.read()
+
+    for chunk_size in [1, 2, 3, 7, 100]:
+        chunks = [
+            contents[i:i + chunk_size]
+            for i in range(0, len(contents), chunk_size)
+        ]
+        actual = ''.join(util.get_squeezed_chunks(
+            util.get_line_aligned_chunks(iter(chunks))
+        ))
+        assert actual == util.get_squeezed_contents(contents)
+
+
+def test_get_formatted_chunks_matches_get_formatted_contents():
+    """
+    Formatting a text split into random chunks with random options always
+    gives the same result as formatting the whole text.
+    """
+    rng = random.Random(13)
+    pieces = [
+        '#', '##', ' ', '    ', '$', '`', 'a', 'word', '\n', '\n\n', '\r\n',
+    ]
+    all_subs = [
+        substitute.Substitution('a', 'b', False),
+        substitute.Substitution('^    ', '  ', True),
+        substitute.Substitution('x*', '-', False),
+        substitute.Substitution('$', 'E', True),
+        substitute.Substitution('\n\n', '\n', False),
+        substitute.Substitution('a\\s', 'Q', False),
+        substitute.Substitution('\\bword\\b', 'W', False),
+        substitute.Substitution('#', '', False),
+        substitute.Substitution('b', '\n', False),
+        substitute.Substitution('^', 'T', False),
+    ]
+    default_colors = config.get_default_color_config()
+    color_configs = [
+        default_colors,
+        # Colors like these are applied in passes rather than line by line.
+        default_colors._replace(pound='    ', heading='\n', backticks='`'),
+    ]
+
+    for _ in range(2000):
+        text = ''.join(
+            rng.choice(pieces) for _ in range(rng.randint(0, 30))
+        )
+        cuts = sorted(
+            rng.randint(0, len(text)) for _ in range(rng.randint(0, 5))
+        )
+        chunks = [
+            text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])
+        ]
+        use_color = rng.random() < 0.5
+        color_config = rng.choice(color_configs)
+        squeeze = rng.random() < 0.5
+        subs = rng.sample(all_subs, rng.randint(0, 3))
+
+        expected = util.get_formatted_contents(
+            text,
+            use_color,
+            color_config,
+            squeeze,
+            subs
+        )
+        actual = ''.join(util.get_formatted_chunks(
+            iter(chunks),
+            use_color,
+            color_config,
+            squeeze,
+            subs
+        ))
+        assert actual == expected, (text, chunks, use_color, squeeze, subs)
+
+
+def test_page_chunks_writes_to_pager(tmpdir):
+    output_path = tmpdir.join('paged')
+
+    util.page_chunks(
+        iter(['one\n', 'two\n']),
+        "sh -c 'cat > " + str(output_path) + "'"
+    )
+
+    assert output_path.read() == 'one\ntwo\n'
+
+
+def test_page_chunks_stops_when_pager_quits():
+    """
+    A pager quit before the end shouldn't be an error, and nothing more should
+    be formatted for it.
+    """
+    def get_chunks():
+        while True:
+            yield 'x' * 1024 + '\n'
+
+    util.page_chunks(get_chunks(), "sh -c 'head -c 10 > /dev/null'")
+
+
+@patch('pydoc.pager')
+def test_page_chunks_joins_chunks_for_fallback_pager(mock_pager):
+    util.page_chunks(iter(['one\n', 'two\n']), None)
+
+    mock_pager.assert_called_once_with('one\ntwo\n')
+
+
+@patch('pydoc.pager')
+@patch('subprocess.Popen', side_effect=OSError)
+def test_page_chunks_falls_back_if_pager_cannot_start(mock_popen, mock_pager):
+    util.page_chunks(iter(['one\n', 'two\n']), 'cat')
+
+    mock_pager.assert_called_once_with('one\ntwo\n')